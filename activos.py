@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🎨 ACTIVOS ESTÁTICOS - DASHBOARDS PRERENDERIZADOS Y LIBRERÍAS LOCALES
+====================================================================
+Los dashboards no tienen variables de plantilla, así que se renderizan una
+sola vez al arrancar. Bootstrap y Chart.js se sirven desde static/vendor/
+(descargados una vez con `python activos.py --descargar`) en lugar del CDN,
+que muchas de nuestras instalaciones no alcanzan.
+
+Cada archivo de static/ se publica como /activos/<nombre>.<huella>.<ext>,
+donde la huella es el hash de su contenido: se puede cachear un año
+(immutable) porque un cambio de contenido cambia la URL. Las variantes
+gzip/brotli se calculan al arrancar y se elige una según Accept-Encoding.
+Las páginas HTML se sirven con ETag y revalidación (no-cache) para que el
+navegador descubra las nuevas huellas tras una actualización.
+
+Si una librería no está en static/vendor/ se mantiene la URL del CDN.
+
+Uso:
+    python activos.py --descargar     # poblar static/vendor/ (requiere internet)
+    python activos.py                 # listar activos y huellas
+"""
+
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import urllib.request
+
+from flask import Response, request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+DIRECTORIO_ACTIVOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+PREFIJO = '/activos/'
+UMBRAL_PRECOMPRESION = 512
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+# Librerías de terceros: archivo local -> URL de descarga y URLs de CDN que reemplaza
+VENDOR = {
+    'vendor/bootstrap.min.css': {
+        'descarga': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+        'reemplaza': ['https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css'],
+    },
+    'vendor/bootstrap.bundle.min.js': {
+        'descarga': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+        'reemplaza': ['https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js'],
+    },
+    'vendor/chart.umd.min.js': {
+        'descarga': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js',
+        'reemplaza': ['https://cdn.jsdelivr.net/npm/chart.js'],
+    },
+}
+
+TIPOS_COMPRIMIBLES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class Activo:
+    """Contenido servido desde memoria con sus variantes precomprimidas"""
+
+    def __init__(self, contenido, tipo):
+        self.contenido = contenido
+        self.tipo = tipo
+        self.huella = hashlib.sha256(contenido).hexdigest()[:12]
+        self.variantes = {}
+        if len(contenido) >= UMBRAL_PRECOMPRESION and tipo.startswith(TIPOS_COMPRIMIBLES):
+            self.variantes['gzip'] = gzip.compress(contenido, compresslevel=9, mtime=0)
+            if BROTLI_AVAILABLE:
+                self.variantes['br'] = brotli.compress(contenido, quality=11)
+
+    def responder(self, cache_control):
+        """Respuesta Flask con la mejor variante que acepta el cliente"""
+        etag = f'"{self.huella}"'
+        if request.if_none_match.contains(self.huella):
+            respuesta = Response(status=304)
+        else:
+            cuerpo, codificacion = self.contenido, None
+            for candidata in ('br', 'gzip'):
+                if candidata in self.variantes and request.accept_encodings[candidata]:
+                    cuerpo, codificacion = self.variantes[candidata], candidata
+                    break
+            respuesta = Response(cuerpo, mimetype=self.tipo)
+            if codificacion:
+                respuesta.headers['Content-Encoding'] = codificacion
+        respuesta.headers['ETag'] = etag
+        respuesta.headers['Cache-Control'] = cache_control
+        if self.variantes:
+            respuesta.vary.add('Accept-Encoding')
+        return respuesta
+
+
+class CanalActivos:
+    """Catálogo de activos con huella y páginas prerenderizadas de una app"""
+
+    def __init__(self, directorio=DIRECTORIO_ACTIVOS):
+        self.directorio = directorio
+        self.activos = {}   # nombre publicado (con huella) -> Activo
+        self.urls = {}      # ruta relativa en static/ -> URL publicada
+        self.paginas = {}   # ruta HTTP -> Activo
+        self.cargar()
+
+    def cargar(self):
+        if not os.path.isdir(self.directorio):
+            return
+        for raiz, _, archivos in os.walk(self.directorio):
+            for archivo in archivos:
+                if archivo.startswith('.'):
+                    continue
+                ruta = os.path.join(raiz, archivo)
+                relativa = os.path.relpath(ruta, self.directorio).replace(os.sep, '/')
+                with open(ruta, 'rb') as f:
+                    contenido = f.read()
+                tipo = mimetypes.guess_type(archivo)[0] or 'application/octet-stream'
+                activo = Activo(contenido, tipo)
+                base, extension = os.path.splitext(relativa)
+                publicado = f'{base}.{activo.huella}{extension}'
+                self.activos[publicado] = activo
+                self.urls[relativa] = PREFIJO + publicado
+
+    def url(self, relativa):
+        """URL con huella de static/<relativa> (None si no existe)"""
+        return self.urls.get(relativa)
+
+    def reescribir(self, html):
+        """Cambiar las URLs de CDN por las copias locales disponibles"""
+        for relativa, datos in VENDOR.items():
+            local = self.url(relativa)
+            if local:
+                for cdn in datos['reemplaza']:
+                    html = html.replace(f'"{cdn}"', f'"{local}"')
+        return html
+
+    def pagina(self, ruta, html):
+        """Registrar una página ya renderizada; se sirve desde memoria"""
+        activo = Activo(self.reescribir(html).encode('utf-8'), 'text/html')
+        self.paginas[ruta] = activo
+        return activo
+
+    def servir_pagina(self, ruta):
+        return self.paginas[ruta].responder('no-cache')
+
+    def instalar(self, app):
+        """Registrar la ruta /activos/<nombre> en la app"""
+        def servir_activo(nombre):
+            activo = self.activos.get(nombre)
+            if activo is None:
+                return Response('Activo no encontrado', status=404, mimetype='text/plain')
+            return activo.responder(CACHE_INMUTABLE)
+        app.add_url_rule(PREFIJO + '<path:nombre>', 'servir_activo', servir_activo)
+        return self
+
+
+def descargar_vendor(directorio=DIRECTORIO_ACTIVOS, forzar=False):
+    """Descargar las librerías de VENDOR que falten en static/vendor/"""
+    for relativa, datos in VENDOR.items():
+        destino = os.path.join(directorio, relativa)
+        if os.path.exists(destino) and not forzar:
+            print(f"✅ {relativa} ya existe")
+            continue
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        print(f"⬇️  {datos['descarga']}")
+        with urllib.request.urlopen(datos['descarga'], timeout=30) as r:
+            contenido = r.read()
+        with open(destino, 'wb') as f:
+            f.write(contenido)
+        print(f"💾 {relativa} ({len(contenido) / 1024:.0f} KB)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Activos estáticos con huella para los dashboards")
+    parser.add_argument('--descargar', action='store_true', help="Descargar Bootstrap y Chart.js a static/vendor/")
+    parser.add_argument('--forzar', action='store_true', help="Volver a descargar aunque ya existan")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.descargar:
+        descargar_vendor(forzar=args.forzar)
+    canal = CanalActivos()
+    print(f"🎨 Activos en {canal.directorio}:")
+    for relativa, url in sorted(canal.urls.items()):
+        activo = canal.activos[url[len(PREFIJO):]]
+        variantes = ', '.join(f"{c} {len(v) / 1024:.0f} KB" for c, v in activo.variantes.items())
+        print(f"   • {url}  ({len(activo.contenido) / 1024:.0f} KB{'; ' + variantes if variantes else ''})")
+    faltan = [r for r in VENDOR if r not in canal.urls]
+    if faltan:
+        print(f"⚠️ Sin copia local (se usará el CDN): {', '.join(faltan)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,636 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🗄️ ALMACENAMIENTO - BACKENDS DE BASE DE DATOS
+=============================================
+Capa común detrás de get_conn() y de las consultas de los servidores.
+
+Backends disponibles (variable de entorno DB_BACKEND):
+    mysql  -> servidor MySQL (por defecto, igual que hasta ahora)
+    sqlite -> archivo SQLite local en modo WAL, sin demonio de base de
+              datos; pensado para invernaderos pequeños en una Raspberry Pi
+
+Las consultas se piden por nombre con sql('nombre') y se escriben con
+marcadores %s; el backend SQLite los traduce a ? una sola vez y reutiliza
+la sentencia preparada (caché de sentencias de sqlite3). Ambos backends
+devuelven filas como diccionarios y fechas como datetime.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+try:
+    import pymysql
+    PYMYSQL_AVAILABLE = True
+except ImportError:
+    PYMYSQL_AVAILABLE = False
+
+# Violaciones de restricciones (p. ej. índice único) en cualquiera de los backends
+ErrorIntegridad = (sqlite3.IntegrityError,) + ((pymysql.err.IntegrityError,) if PYMYSQL_AVAILABLE else ())
+
+# Configuración (sobrescribible por entorno)
+DB_BACKEND = os.environ.get('DB_BACKEND', 'mysql').lower()
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_USER = os.environ.get('DB_USER', 'root')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', 'root')
+DB_NAME = os.environ.get('DB_NAME', 'invernadero')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'invernadero.db')
+
+# PRAGMAs del backend SQLite: WAL permite lecturas concurrentes con una
+# escritura, synchronous=NORMAL es seguro en WAL y evita un fsync por commit
+PRAGMAS_SQLITE = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA busy_timeout = 5000",
+)
+SENTENCIAS_EN_CACHE = 256
+
+# ===========================================
+# ESQUEMA
+# ===========================================
+TABLAS = {
+    'mysql': [
+        '''
+        CREATE TABLE IF NOT EXISTS registros_ambiente (
+          id INT AUTO_INCREMENT PRIMARY KEY,
+          fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+          temperatura FLOAT,
+          humedad FLOAT,
+          estado_bomba VARCHAR(15),
+          alerta VARCHAR(50),
+          dispositivo VARCHAR(40),
+          clave_idempotencia VARCHAR(80),
+          hasta DATETIME NULL,
+          muestras INT NOT NULL DEFAULT 1,
+          revision BIGINT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS registros_seguridad (
+          id INT AUTO_INCREMENT PRIMARY KEY,
+          fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+          tipo_evento VARCHAR(50),
+          descripcion TEXT,
+          nivel_alerta VARCHAR(10),
+          clave_idempotencia VARCHAR(80)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS registros_acceso (
+          id INT AUTO_INCREMENT PRIMARY KEY,
+          fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+          id_tarjeta VARCHAR(50),
+          persona VARCHAR(100),
+          estado_bomba VARCHAR(15),
+          temperatura FLOAT,
+          humedad FLOAT,
+          acceso_autorizado BOOLEAN,
+          observacion TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS config_umbrales (
+          id TINYINT PRIMARY KEY DEFAULT 1,
+          humo_umbral INT NOT NULL DEFAULT 300,
+          humo_critico INT NOT NULL DEFAULT 500,
+          updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        ''',
+        # Un ciclo de riego por fila; fin NULL mientras la bomba sigue encendida
+        '''
+        CREATE TABLE IF NOT EXISTS intervalos_bomba (
+          id INT AUTO_INCREMENT PRIMARY KEY,
+          dispositivo VARCHAR(40),
+          inicio DATETIME NOT NULL,
+          fin DATETIME NULL
+        )
+        ''',
+        # Contador de revisiones de registros_ambiente (una sola fila, ver revision_siguiente)
+        '''
+        CREATE TABLE IF NOT EXISTS secuencia_revision (
+          id TINYINT PRIMARY KEY DEFAULT 1,
+          valor BIGINT NOT NULL DEFAULT 0
+        )
+        ''',
+    ],
+    'sqlite': [
+        '''
+        CREATE TABLE IF NOT EXISTS registros_ambiente (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          fecha DATETIME DEFAULT (datetime('now', 'localtime')),
+          temperatura REAL,
+          humedad REAL,
+          estado_bomba VARCHAR(15),
+          alerta VARCHAR(50),
+          dispositivo VARCHAR(40),
+          clave_idempotencia VARCHAR(80),
+          hasta DATETIME,
+          muestras INTEGER NOT NULL DEFAULT 1,
+          revision INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS registros_seguridad (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          fecha DATETIME DEFAULT (datetime('now', 'localtime')),
+          tipo_evento VARCHAR(50),
+          descripcion TEXT,
+          nivel_alerta VARCHAR(10),
+          clave_idempotencia VARCHAR(80)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS registros_acceso (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          fecha DATETIME DEFAULT (datetime('now', 'localtime')),
+          id_tarjeta VARCHAR(50),
+          persona VARCHAR(100),
+          estado_bomba VARCHAR(15),
+          temperatura REAL,
+          humedad REAL,
+          acceso_autorizado BOOLEAN,
+          observacion TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS config_umbrales (
+          id INTEGER PRIMARY KEY DEFAULT 1,
+          humo_umbral INTEGER NOT NULL DEFAULT 300,
+          humo_critico INTEGER NOT NULL DEFAULT 500,
+          updated_at DATETIME DEFAULT (datetime('now', 'localtime'))
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS intervalos_bomba (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          dispositivo VARCHAR(40),
+          inicio DATETIME NOT NULL,
+          fin DATETIME
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS secuencia_revision (
+          id INTEGER PRIMARY KEY DEFAULT 1,
+          valor INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+    ],
+}
+
+# (nombre, tabla, columnas) - iguales en ambos backends
+INDICES = [
+    ('idx_ambiente_fecha', 'registros_ambiente', 'fecha'),
+    ('idx_ambiente_hasta', 'registros_ambiente', 'hasta'),
+    ('idx_ambiente_revision', 'registros_ambiente', 'revision'),
+    # Última lectura por dispositivo y dispositivos activos (ciclos_bomba.calentar)
+    ('idx_ambiente_dispositivo_fecha', 'registros_ambiente', 'dispositivo, fecha'),
+    ('idx_seguridad_fecha', 'registros_seguridad', 'fecha'),
+    ('idx_acceso_fecha', 'registros_acceso', 'fecha'),
+    ('idx_bomba_inicio', 'intervalos_bomba', 'inicio'),
+    ('idx_bomba_fin', 'intervalos_bomba', 'fin'),
+]
+# Índices únicos: la ingesta idempotente depende de ellos (NULL se permite repetido)
+INDICES_UNICOS = [
+    ('uq_ambiente_clave', 'registros_ambiente', 'clave_idempotencia'),
+    ('uq_seguridad_clave', 'registros_seguridad', 'clave_idempotencia'),
+]
+
+# Columnas añadidas después de crear las tablas; se agregan a bases existentes
+COLUMNAS_NUEVAS = [
+    ('registros_ambiente', 'dispositivo', 'VARCHAR(40)'),
+    ('registros_ambiente', 'clave_idempotencia', 'VARCHAR(80)'),
+    # Compresión por banda muerta: la fila representa `muestras` lecturas hasta `hasta`
+    ('registros_ambiente', 'hasta', 'DATETIME NULL'),
+    ('registros_ambiente', 'muestras', 'INTEGER NOT NULL DEFAULT 1'),
+    # Sincronización incremental: escritura (inserción o extensión) que tocó la fila por última vez
+    ('registros_ambiente', 'revision', 'BIGINT NULL'),
+    # Eventos por lotes (UDP/MQTT): un reenvío no duplica el evento
+    ('registros_seguridad', 'clave_idempotencia', 'VARCHAR(80)'),
+]
+
+# ===========================================
+# CONSULTAS CON NOMBRE
+# ===========================================
+CONSULTAS_COMUNES = {
+    'ambiente_ultimo': "SELECT * FROM registros_ambiente ORDER BY fecha DESC LIMIT 1",
+    # Fila comprimida que llega más lejos: puede empezar antes que la última insertada
+    'ambiente_ultimo_extendido': (
+        "SELECT * FROM registros_ambiente WHERE hasta IS NOT NULL ORDER BY hasta DESC LIMIT 1"
+    ),
+    'ambiente_recientes': "SELECT * FROM registros_ambiente ORDER BY fecha DESC LIMIT %s",
+    # Con compresión: filas que llegan a la n-ésima fecha más reciente (compresion_lecturas.filas_recientes)
+    'ambiente_corte_recientes': "SELECT fecha FROM registros_ambiente ORDER BY fecha DESC LIMIT 1 OFFSET %s",
+    # Sin ORDER BY: con él SQLite recorre idx_ambiente_fecha entero en vez de unir ambos índices
+    'ambiente_recientes_desde': "SELECT * FROM registros_ambiente WHERE fecha >= %s OR hasta >= %s",
+    # Sincronización incremental: sólo filas escritas después de la marca del cliente
+    'ambiente_desde_revision': (
+        "SELECT * FROM registros_ambiente WHERE revision > %s ORDER BY revision DESC LIMIT %s"
+    ),
+    'ambiente_desde_fecha': "SELECT * FROM registros_ambiente WHERE fecha > %s ORDER BY fecha DESC LIMIT %s",
+    # Revisión de la escritura en curso (revision_siguiente()): el UPDATE bloquea
+    # la fila del contador hasta el commit, así que dos escrituras no la comparten
+    'revision_incrementar': "UPDATE secuencia_revision SET valor = valor + 1 WHERE id = 1",
+    'revision_actual': "SELECT valor AS revision FROM secuencia_revision WHERE id = 1",
+    # El contador nunca queda por debajo de una revisión ya guardada
+    'revision_ajustar': (
+        "UPDATE secuencia_revision SET valor = (SELECT COALESCE(MAX(revision), 0) FROM registros_ambiente) "
+        "WHERE id = 1 AND valor < (SELECT COALESCE(MAX(revision), 0) FROM registros_ambiente)"
+    ),
+    # Filas anteriores a la columna revision: su id sigue siendo una marca válida
+    'ambiente_revision_inicial': "UPDATE registros_ambiente SET revision = id WHERE revision IS NULL",
+    'ambiente_insertar': (
+        "INSERT INTO registros_ambiente (temperatura, humedad, estado_bomba, alerta, revision) "
+        "VALUES (%s, %s, %s, %s, %s)"
+    ),
+    'ambiente_insertar_idempotente': (
+        "INSERT INTO registros_ambiente "
+        "(fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, clave_idempotencia, revision) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+    ),
+    'ambiente_por_clave': "SELECT id FROM registros_ambiente WHERE clave_idempotencia = %s",
+    # Lecturas absorbidas por un punto ya guardado (compresión por banda muerta)
+    'ambiente_extender': (
+        "UPDATE registros_ambiente SET hasta = %s, muestras = muestras + %s, revision = %s WHERE id = %s"
+    ),
+    # {marcas} se sustituye por tantos %s como claves
+    'ambiente_por_claves': (
+        "SELECT id, clave_idempotencia FROM registros_ambiente WHERE clave_idempotencia IN ({marcas})"
+    ),
+    # Ciclos de la bomba (ciclos_bomba.py)
+    'bomba_abrir': "INSERT INTO intervalos_bomba (dispositivo, inicio) VALUES (%s, %s)",
+    'bomba_cerrar': "UPDATE intervalos_bomba SET fin = %s WHERE id = %s",
+    'bomba_recientes': (
+        "SELECT id, dispositivo, inicio, fin FROM intervalos_bomba "
+        "WHERE fin IS NULL OR fin >= %s ORDER BY inicio"
+    ),
+    # Última lectura de un dispositivo: hasta dónde llega un intervalo abierto. Sólo la fila
+    # más reciente puede seguir extendiéndose, así que basta una búsqueda en el índice
+    'bomba_ultima_lectura': (
+        "SELECT COALESCE(hasta, fecha) AS ultima FROM registros_ambiente "
+        "WHERE dispositivo = %s ORDER BY fecha DESC LIMIT 1"
+    ),
+    'bomba_ultima_lectura_sin_dispositivo': (
+        "SELECT COALESCE(hasta, fecha) AS ultima FROM registros_ambiente "
+        "WHERE dispositivo IS NULL ORDER BY fecha DESC LIMIT 1"
+    ),
+    # Dispositivos con lecturas desde una fecha: las bombas del ciclo de trabajo del invernadero
+    'bomba_dispositivos': (
+        "SELECT dispositivo FROM registros_ambiente GROUP BY dispositivo HAVING MAX(fecha) >= %s"
+    ),
+    'seguridad_insertar': (
+        "INSERT INTO registros_seguridad (tipo_evento, descripcion, nivel_alerta) "
+        "VALUES (%s, %s, %s)"
+    ),
+    'acceso_insertar': (
+        "INSERT INTO registros_acceso "
+        "(id_tarjeta, persona, estado_bomba, temperatura, humedad, acceso_autorizado, observacion) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+    ),
+    'config_umbrales_leer': "SELECT humo_umbral, humo_critico FROM config_umbrales WHERE id = 1",
+}
+
+# Promedios por lectura: cada fila pesa sus `muestras` (1 sin compresión)
+PROMEDIOS_PONDERADOS = (
+    "SUM(temperatura * muestras) / SUM(CASE WHEN temperatura IS NOT NULL THEN muestras END) AS temp_promedio, "
+    "SUM(humedad * muestras) / SUM(CASE WHEN humedad IS NOT NULL THEN muestras END) AS humedad_promedio"
+)
+
+CONSULTAS_DIALECTO = {
+    'mysql': {
+        # Lecturas, no filas: con compresión cada fila cuenta por sus `muestras`
+        'ambiente_total': "SELECT CAST(COALESCE(SUM(muestras), 0) AS SIGNED) AS total FROM registros_ambiente",
+        'ambiente_hoy': (
+            "SELECT CAST(COALESCE(SUM(muestras), 0) AS SIGNED) AS hoy "
+            "FROM registros_ambiente WHERE fecha >= CURDATE()"
+        ),
+        'ambiente_promedios_24h': (
+            "SELECT " + PROMEDIOS_PONDERADOS + " "
+            "FROM registros_ambiente WHERE fecha >= DATE_SUB(NOW(), INTERVAL 24 HOUR)"
+        ),
+        'ambiente_resumen_7d': (
+            "SELECT " + PROMEDIOS_PONDERADOS + ", "
+            "MAX(temperatura) AS temp_max, MIN(temperatura) AS temp_min, "
+            "MAX(humedad) AS humedad_max, MIN(humedad) AS humedad_min "
+            "FROM registros_ambiente WHERE fecha >= DATE_SUB(NOW(), INTERVAL 7 DAY)"
+        ),
+        # Lotes: una clave repetida se ignora sin abortar el resto del lote
+        'ambiente_insertar_lote': (
+            "INSERT IGNORE INTO registros_ambiente "
+            "(fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, clave_idempotencia, hasta, muestras, "
+            "revision) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+        ),
+        'seguridad_insertar_lote': (
+            "INSERT IGNORE INTO registros_seguridad "
+            "(fecha, tipo_evento, descripcion, nivel_alerta, clave_idempotencia) VALUES (%s, %s, %s, %s, %s)"
+        ),
+        'revision_inicial': "INSERT IGNORE INTO secuencia_revision (id, valor) VALUES (1, 0)",
+        'config_umbrales_defecto': (
+            "INSERT INTO config_umbrales (id, humo_umbral, humo_critico) VALUES (1, %s, %s) "
+            "ON DUPLICATE KEY UPDATE humo_umbral = VALUES(humo_umbral), humo_critico = VALUES(humo_critico)"
+        ),
+    },
+    'sqlite': {
+        'ambiente_total': "SELECT CAST(COALESCE(SUM(muestras), 0) AS INTEGER) AS total FROM registros_ambiente",
+        'ambiente_hoy': (
+            "SELECT CAST(COALESCE(SUM(muestras), 0) AS INTEGER) AS hoy "
+            "FROM registros_ambiente WHERE fecha >= date('now', 'localtime')"
+        ),
+        'ambiente_promedios_24h': (
+            "SELECT " + PROMEDIOS_PONDERADOS + " "
+            "FROM registros_ambiente WHERE fecha >= datetime('now', 'localtime', '-24 hours')"
+        ),
+        'ambiente_resumen_7d': (
+            "SELECT " + PROMEDIOS_PONDERADOS + ", "
+            "MAX(temperatura) AS temp_max, MIN(temperatura) AS temp_min, "
+            "MAX(humedad) AS humedad_max, MIN(humedad) AS humedad_min "
+            "FROM registros_ambiente WHERE fecha >= datetime('now', 'localtime', '-7 days')"
+        ),
+        'ambiente_insertar_lote': (
+            "INSERT OR IGNORE INTO registros_ambiente "
+            "(fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, clave_idempotencia, hasta, muestras, "
+            "revision) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+        ),
+        'seguridad_insertar_lote': (
+            "INSERT OR IGNORE INTO registros_seguridad "
+            "(fecha, tipo_evento, descripcion, nivel_alerta, clave_idempotencia) VALUES (%s, %s, %s, %s, %s)"
+        ),
+        'revision_inicial': "INSERT OR IGNORE INTO secuencia_revision (id, valor) VALUES (1, 0)",
+        'config_umbrales_defecto': (
+            "INSERT INTO config_umbrales (id, humo_umbral, humo_critico) VALUES (1, %s, %s) "
+            "ON CONFLICT(id) DO UPDATE SET humo_umbral = excluded.humo_umbral, "
+            "humo_critico = excluded.humo_critico"
+        ),
+    },
+}
+
+
+# ===========================================
+# BACKEND MYSQL
+# ===========================================
+class BackendMySQL:
+    """Conexión nueva por petición a un servidor MySQL"""
+
+    nombre = 'mysql'
+
+    def conectar(self, base=True):
+        if not PYMYSQL_AVAILABLE:
+            raise RuntimeError("PyMySQL no está disponible - no se puede conectar a MySQL")
+        return pymysql.connect(
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_NAME if base else None,
+            charset='utf8mb4',
+            cursorclass=pymysql.cursors.DictCursor
+        )
+
+    def crear_base(self):
+        """Crear la base de datos si no existe"""
+        conn = self.conectar(base=False)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def crear_indice(self, cur, nombre, tabla, columnas, unico=False):
+        try:
+            cur.execute(f"CREATE {'UNIQUE ' if unico else ''}INDEX {nombre} ON {tabla} ({columnas})")
+        except pymysql.err.OperationalError as e:
+            if e.args[0] != 1061:  # ER_DUP_KEYNAME: el índice ya existe
+                raise
+
+    def agregar_columna(self, cur, tabla, columna, definicion):
+        try:
+            cur.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+        except pymysql.err.OperationalError as e:
+            if e.args[0] != 1060:  # ER_DUP_FIELDNAME: la columna ya existe
+                raise
+
+
+# ===========================================
+# BACKEND SQLITE
+# ===========================================
+@lru_cache(maxsize=SENTENCIAS_EN_CACHE)
+def _traducir(consulta):
+    """Marcadores %s (estilo pymysql) -> ? (estilo sqlite3)"""
+    return consulta.replace('%s', '?')
+
+
+def _fila_dict(cursor, fila):
+    return {columna[0]: valor for columna, valor in zip(cursor.description, fila)}
+
+
+def _convertir_fecha(valor):
+    return datetime.fromisoformat(valor.decode())
+
+
+sqlite3.register_adapter(datetime, lambda fecha: fecha.isoformat(' ', 'seconds'))
+sqlite3.register_converter('DATETIME', _convertir_fecha)
+
+
+class CursorSQLite:
+    """Cursor compatible con el uso de pymysql (context manager, %s, dicts)"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+        return False
+
+    def execute(self, consulta, params=()):
+        self._cursor.execute(_traducir(consulta), params)
+        return self._cursor.rowcount
+
+    def executemany(self, consulta, filas):
+        self._cursor.executemany(_traducir(consulta), filas)
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+
+class ConexionSQLite:
+    """Conexión persistente por hilo; close() no la cierra para reutilizarla"""
+
+    def __init__(self, conexion):
+        self._conexion = conexion
+
+    def cursor(self):
+        return CursorSQLite(self._conexion.cursor())
+
+    def commit(self):
+        self._conexion.commit()
+
+    def rollback(self):
+        self._conexion.rollback()
+
+    def close(self):
+        # Se mantiene abierta: abrir SQLite y aplicar PRAGMAs en cada
+        # petición costaría más que la propia lectura. Sólo se descarta
+        # una transacción que haya quedado a medias.
+        if self._conexion.in_transaction:
+            self._conexion.rollback()
+
+
+class BackendSQLite:
+    """Archivo SQLite local en modo WAL con una conexión por hilo"""
+
+    nombre = 'sqlite'
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def conectar(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            nativa = sqlite3.connect(
+                SQLITE_PATH,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                cached_statements=SENTENCIAS_EN_CACHE,
+                timeout=5.0
+            )
+            nativa.row_factory = _fila_dict
+            for pragma in PRAGMAS_SQLITE:
+                nativa.execute(pragma)
+            conexion = self._local.conexion = ConexionSQLite(nativa)
+        return conexion
+
+    def crear_base(self):
+        """El archivo se crea al conectar; sólo hace falta su directorio"""
+        directorio = os.path.dirname(os.path.abspath(SQLITE_PATH))
+        os.makedirs(directorio, exist_ok=True)
+
+    def crear_indice(self, cur, nombre, tabla, columnas, unico=False):
+        cur.execute(f"CREATE {'UNIQUE ' if unico else ''}INDEX IF NOT EXISTS {nombre} ON {tabla} ({columnas})")
+
+    def agregar_columna(self, cur, tabla, columna, definicion):
+        cur.execute(f"PRAGMA table_info({tabla})")
+        if columna not in {fila['name'] for fila in cur.fetchall()}:
+            cur.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+
+BACKENDS = {
+    'mysql': BackendMySQL,
+    'sqlite': BackendSQLite,
+}
+_backend = None
+
+
+def get_backend():
+    """Backend activo según DB_BACKEND (instancia única)"""
+    global _backend
+    if _backend is None or _backend.nombre != DB_BACKEND:
+        if DB_BACKEND not in BACKENDS:
+            raise ValueError(f"DB_BACKEND desconocido: {DB_BACKEND} (use 'mysql' o 'sqlite')")
+        _backend = BACKENDS[DB_BACKEND]()
+    return _backend
+
+
+def get_conn():
+    """Conexión del backend activo (lanza excepción si falla)"""
+    return get_backend().conectar()
+
+
+def sql(nombre):
+    """Texto de la consulta `nombre` en el dialecto del backend activo"""
+    dialecto = CONSULTAS_DIALECTO[get_backend().nombre]
+    return dialecto.get(nombre) or CONSULTAS_COMUNES[nombre]
+
+
+def marca_desde(valor):
+    """Interpretar el parámetro `since` como ('revision', int) o ('fecha', datetime)
+
+    Acepta una revisión numérica (el `ultimo_id` de la respuesta anterior),
+    una fecha ISO o la fecha HTTP con la que Flask serializa los datetime.
+    Lanza ValueError si no es ninguno de ellos.
+    """
+    valor = valor.strip()
+    if valor.isdigit():
+        return 'revision', int(valor)
+    try:
+        fecha = datetime.fromisoformat(valor)
+    except ValueError:
+        try:
+            fecha = parsedate_to_datetime(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"Marca 'since' no válida: {valor!r}")
+    # Las fechas de la BD son locales sin zona; Flask las etiqueta como GMT
+    return 'fecha', fecha.replace(tzinfo=None)
+
+
+def marca_siguiente(filas, marca=None):
+    """Marca `since` para la siguiente consulta: la mayor revisión vista
+
+    Las revisiones crecen con cada escritura, no con la fecha: una fila
+    tardía o una fila comprimida que se extiende tiene una revisión mayor
+    que filas más recientes, así que la marca es el máximo entre la marca
+    recibida y las revisiones devueltas.
+    """
+    revisiones = [fila['revision'] for fila in filas if fila and fila.get('revision') is not None]
+    if marca and marca[0] == 'revision':
+        revisiones.append(marca[1])
+    return max(revisiones, default=None)
+
+
+def revision_siguiente(cur):
+    """Revisión para las escrituras de registros_ambiente de la transacción en curso
+
+    Un contador global (inserciones y extensiones comparten la misma
+    secuencia), no el id: una fila comprimida que absorbe lecturas conserva
+    su id pero debe volver a aparecer en `since`.
+
+    Se incrementa dentro de la transacción de la escritura: otra escritura
+    espera al commit (o al rollback) antes de obtener la siguiente, así que
+    no hay revisiones repetidas ni una revisión confirmada por debajo de una
+    marca que un cliente ya pasó.
+    """
+    cur.execute(sql('revision_incrementar'))
+    cur.execute(sql('revision_actual'))
+    return cur.fetchone()['revision']
+
+
+def crear_esquema():
+    """Crear base, tablas e índices del backend activo (idempotente)"""
+    backend = get_backend()
+    backend.crear_base()
+    conn = backend.conectar()
+    try:
+        with conn.cursor() as cur:
+            for tabla in TABLAS[backend.nombre]:
+                cur.execute(tabla)
+            for tabla, columna, definicion in COLUMNAS_NUEVAS:
+                backend.agregar_columna(cur, tabla, columna, definicion)
+            for nombre, tabla, columnas in INDICES:
+                backend.crear_indice(cur, nombre, tabla, columnas)
+            for nombre, tabla, columnas in INDICES_UNICOS:
+                backend.crear_indice(cur, nombre, tabla, columnas, unico=True)
+            cur.execute(sql('ambiente_revision_inicial'))
+            cur.execute(sql('revision_inicial'))
+            cur.execute(sql('revision_ajustar'))
+        conn.commit()
+    finally:
+        conn.close()
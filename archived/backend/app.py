@@ -1,5 +1,9 @@
-import os
 import time
+_INICIO_IMPORTACION = time.perf_counter()
+
+import importlib.util
+import os
+import threading
 from io import BytesIO
 from datetime import datetime, timedelta
 
@@ -25,56 +29,159 @@ except ImportError:
     PYMYSQL_AVAILABLE = False
     print("❌ PyMySQL no disponible - base de datos no funcionará")
 
-# Importaciones de reportlab con manejo de errores
+# ReportLab y los generadores PDF NO se importan al arrancar: cuestan más de
+# 100 ms y bastante memoria en cada worker aunque nunca se pida un reporte.
+# Aquí sólo se comprueba que están instalados; cargar_reportes() los importa
+# en el primer uso o en el hilo de precarga que arranca tras el servidor.
+REPORTLAB_AVAILABLE = importlib.util.find_spec('reportlab') is not None
+if not REPORTLAB_AVAILABLE:
+    print("⚠️  ReportLab no disponible - función PDF deshabilitada")
+
+
+def _generador_disponible(modulo):
+    return REPORTLAB_AVAILABLE and importlib.util.find_spec(modulo) is not None
+
+
+PDF_GENERATOR_AVAILABLE = _generador_disponible('pdf_generator')
+ENHANCED_PDF_AVAILABLE = _generador_disponible('enhanced_pdf')
+PROFESSIONAL_PDF_AVAILABLE = _generador_disponible('professional_pdf_generator')
+SIMPLE_PDF_AVAILABLE = _generador_disponible('simple_production_pdf')
+
+REPORTES_CARGADOS = False
+TIEMPO_CARGA_REPORTES_MS = None
+_reportes_lock = threading.Lock()
+
+
+def cargar_reportes():
+    """Importar ReportLab y los generadores PDF una sola vez (seguro entre hilos)"""
+    global REPORTES_CARGADOS, TIEMPO_CARGA_REPORTES_MS
+    global REPORTLAB_AVAILABLE, PDF_GENERATOR_AVAILABLE, ENHANCED_PDF_AVAILABLE
+    global PROFESSIONAL_PDF_AVAILABLE, SIMPLE_PDF_AVAILABLE
+    global letter, A4, canvas, colors, getSampleStyleSheet, ParagraphStyle, inch, cm
+    global SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image, HexColor
+    global generate_professional_pdf, create_enhanced_pdf_report
+    global generate_production_pdf_report, generate_simple_production_pdf_report
+    if REPORTES_CARGADOS:
+        return
+    with _reportes_lock:
+        if REPORTES_CARGADOS:
+            return
+        inicio = time.perf_counter()
+
+        # Importaciones de reportlab con manejo de errores
+        try:
+            from reportlab.lib.pagesizes import letter, A4
+            from reportlab.pdfgen import canvas
+            from reportlab.lib import colors
+            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+            from reportlab.lib.units import inch, cm
+            from reportlab.platypus import (SimpleDocTemplate, Paragraph, Spacer, 
+                                           Table, TableStyle, PageBreak, Image)
+            from reportlab.lib.colors import HexColor
+            REPORTLAB_AVAILABLE = True
+        except ImportError:
+            REPORTLAB_AVAILABLE = False
+            print("⚠️  ReportLab no disponible - función PDF deshabilitada")
+
+        # Importar generador avanzado de PDF si está disponible
+        try:
+            from pdf_generator import generate_professional_pdf
+            PDF_GENERATOR_AVAILABLE = True
+            print("✅ Generador PDF avanzado disponible")
+        except ImportError:
+            PDF_GENERATOR_AVAILABLE = False
+            print("⚠️  Generador PDF avanzado no disponible - usando versión estándar")
+
+        # Importar generador PDF mejorado
+        try:
+            from enhanced_pdf import create_enhanced_pdf_report
+            ENHANCED_PDF_AVAILABLE = True
+            print("✅ Generador PDF mejorado disponible")
+        except ImportError:
+            ENHANCED_PDF_AVAILABLE = False
+            print("⚠️  Generador PDF mejorado no disponible")
+
+        # Importar generador PDF profesional (nuevo)
+        try:
+            from professional_pdf_generator import generate_production_pdf_report
+            PROFESSIONAL_PDF_AVAILABLE = True
+            print("✅ Generador PDF profesional disponible")
+        except ImportError:
+            PROFESSIONAL_PDF_AVAILABLE = False
+            print("⚠️  Generador PDF profesional no disponible")
+
+        # Importar generador PDF simple (exacto)
+        try:
+            from simple_production_pdf import generate_simple_production_pdf_report
+            SIMPLE_PDF_AVAILABLE = True
+            print("✅ Generador PDF simple disponible")
+        except ImportError:
+            SIMPLE_PDF_AVAILABLE = False
+            print("⚠️  Generador PDF simple no disponible")
+
+        TIEMPO_CARGA_REPORTES_MS = round((time.perf_counter() - inicio) * 1000, 1)
+        REPORTES_CARGADOS = True
+        print(f"📄 Subsistema de reportes cargado en {TIEMPO_CARGA_REPORTES_MS} ms")
+
+
+# Capa de codificación compartida (JSON rápido, MessagePack, gzip/brotli).
+# Vive en la raíz del repositorio; en la imagen Docker sólo está si se copia.
 try:
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.pdfgen import canvas
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch, cm
-    from reportlab.platypus import (SimpleDocTemplate, Paragraph, Spacer, 
-                                   Table, TableStyle, PageBreak, Image)
-    from reportlab.lib.colors import HexColor
-    REPORTLAB_AVAILABLE = True
+    import sys
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+    from codificacion import configurar_respuestas, pide_columnas, a_columnas
+    CODIFICACION_AVAILABLE = True
 except ImportError:
-    REPORTLAB_AVAILABLE = False
-    print("⚠️  ReportLab no disponible - función PDF deshabilitada")
+    CODIFICACION_AVAILABLE = False
+    print("⚠️  Capa de codificación no disponible - respuestas JSON sin comprimir")
 
-# Importar generador avanzado de PDF si está disponible
+# Activos con huella (Bootstrap/Chart.js locales, HTML prerenderizado), también de la raíz
 try:
-    from pdf_generator import generate_professional_pdf
-    PDF_GENERATOR_AVAILABLE = True
-    print("✅ Generador PDF avanzado disponible")
+    from activos import CanalActivos
+    ACTIVOS_AVAILABLE = True
 except ImportError:
-    PDF_GENERATOR_AVAILABLE = False
-    print("⚠️  Generador PDF avanzado no disponible - usando versión estándar")
+    ACTIVOS_AVAILABLE = False
+    print("⚠️  Canal de activos no disponible - dashboards con librerías desde CDN")
 
-# Importar generador PDF mejorado
+# Caché HTTP condicional (ETag / Last-Modified), también de la raíz: cada ingesta
+# incrementa la versión de los datos y las consultas del dashboard que encuentran
+# la misma versión responden 304 sin consultar MySQL
 try:
-    from enhanced_pdf import create_enhanced_pdf_report
-    ENHANCED_PDF_AVAILABLE = True
-    print("✅ Generador PDF mejorado disponible")
+    from cache_http import condicional as respuesta_condicional, version_datos
+    CACHE_HTTP_AVAILABLE = True
 except ImportError:
-    ENHANCED_PDF_AVAILABLE = False
-    print("⚠️  Generador PDF mejorado no disponible")
+    CACHE_HTTP_AVAILABLE = False
+    print("⚠️  Caché HTTP no disponible - el dashboard consulta MySQL en cada petición")
 
-# Importar generador PDF profesional (nuevo)
+    class _SinVersion:
+        def incrementar(self):
+            pass
+
+    version_datos = _SinVersion()
+
+    def respuesta_condicional(vista):
+        return vista
+
+# Estadísticas de reportes calculadas por MySQL sobre todo el período
+from datos_agregados import consultar_bomba, consultar_resumen
+
+# Pipeline de reportes: datos consultados una vez, renderizado en procesos
 try:
-    from professional_pdf_generator import generate_production_pdf_report
-    PROFESSIONAL_PDF_AVAILABLE = True
-    print("✅ Generador PDF profesional disponible")
+    from pipeline_reportes import DatosReporte, PYPDF_AVAILABLE, pipeline as pipeline_reportes
+    PIPELINE_REPORTES_AVAILABLE = True
 except ImportError:
-    PROFESSIONAL_PDF_AVAILABLE = False
-    print("⚠️  Generador PDF profesional no disponible")
+    PIPELINE_REPORTES_AVAILABLE = False
+    print("⚠️  Pipeline de reportes no disponible - generadores en el proceso web")
 
-# Importar generador PDF simple (exacto)
+# Reportes en flujo (página a página, memoria acotada); no necesita ReportLab
 try:
-    from simple_production_pdf import generate_simple_production_pdf_report
-    SIMPLE_PDF_AVAILABLE = True
-    print("✅ Generador PDF simple disponible")
+    import reporte_flujo
+    REPORTE_FLUJO_AVAILABLE = True
 except ImportError:
-    SIMPLE_PDF_AVAILABLE = False
-    print("⚠️  Generador PDF simple no disponible")
+    REPORTE_FLUJO_AVAILABLE = False
+
+# Reportes diarios/semanales/mensuales prerenderizados de madrugada
+from reportes_programados import CatalogoReportes, ProgramadorReportes
 
 # Verificar dependencias críticas
 if not FLASK_AVAILABLE:
@@ -92,6 +199,21 @@ if CORS_AVAILABLE:
 else:
     print("⚠️  CORS no configurado - puede haber problemas de origen cruzado")
 
+if CODIFICACION_AVAILABLE:
+    configurar_respuestas(app)
+    print("✅ Compresión y serialización rápida configuradas")
+
+# Las páginas de static/ se leen y prerenderizan una vez al arrancar
+activos = None
+if ACTIVOS_AVAILABLE:
+    activos = CanalActivos().instalar(app)
+    carpeta_static = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    for nombre in os.listdir(carpeta_static):
+        if nombre.endswith('.html'):
+            with open(os.path.join(carpeta_static, nombre), encoding='utf-8') as f:
+                activos.pagina(nombre, f.read())
+    print(f"✅ {len(activos.paginas)} páginas prerenderizadas")
+
 DB_HOST = os.environ.get('DB_HOST', 'localhost')
 DB_USER = os.environ.get('DB_USER', 'root')
 DB_PASSWORD = os.environ.get('DB_PASSWORD', 'root')
@@ -184,6 +306,7 @@ def init_db():
             if (isinstance(row, dict) and row.get('cnt', 0) == 0) or (isinstance(row, tuple) and (row[0] if row else 0) == 0):
                 cur.execute('INSERT INTO config_umbrales (id, humo_umbral, humo_critico) VALUES (1, 300, 500)')
         conn.commit()
+        version_datos.incrementar()
         return jsonify({'status': 'ok'}), 201
     finally:
         conn.close()
@@ -207,6 +330,7 @@ def post_ambiente():
                  estado,
                  alerta))
         conn.commit()
+        version_datos.incrementar()
         return jsonify({'status': 'ok'}), 201
     finally:
         conn.close()
@@ -227,6 +351,7 @@ def post_seguridad():
                  descripcion,
                  nivel_alerta))
         conn.commit()
+        version_datos.incrementar()
         return jsonify({'status': 'ok'}), 201
     finally:
         conn.close()
@@ -286,6 +411,7 @@ def post_humo():
                 ('Humo', descripcion, nivel_alerta)
             )
         conn.commit()
+        version_datos.incrementar()
         return jsonify({
             'status': 'ok',
             'tipo_evento': 'Humo',
@@ -321,32 +447,128 @@ def post_acceso():
                  acceso_autorizado,
                  observacion))
         conn.commit()
+        version_datos.incrementar()
         return jsonify({'status': 'ok'}), 201
     finally:
         conn.close()
 
 
-def query_table(table, where_clause=None, params=()):
+# Campos categóricos de cada tabla, codificados como diccionario en ?formato=columnas
+CAMPOS_CATEGORICOS = {
+    'registros_ambiente': ('estado_bomba', 'alerta'),
+    'registros_seguridad': ('tipo_evento', 'nivel_alerta'),
+    'registros_acceso': ('persona', 'estado_bomba'),
+}
+
+
+def responder_filas(table, rows):
+    """jsonify de filas de query_table, en formato columnar si se pidió"""
+    if CODIFICACION_AVAILABLE and pide_columnas():
+        return jsonify(a_columnas(rows, CAMPOS_CATEGORICOS.get(table, ())))
+    return jsonify(rows)
+
+
+def query_table(table, where_clause=None, params=(), limit=1000):
     conn = get_conn()
     try:
         with conn.cursor() as cur:
             sql = f"SELECT * FROM {table}"
             if where_clause:
                 sql += " WHERE " + where_clause
-            sql += " ORDER BY fecha DESC LIMIT 1000"
+            sql += f" ORDER BY fecha DESC LIMIT {int(limit)}"
             cur.execute(sql, params)
             return cur.fetchall()
     finally:
         conn.close()
 
 
+TABLAS_REPORTE = ('registros_ambiente', 'registros_seguridad', 'registros_acceso')
+REPORTE_COMPLETO_LIMITE = int(os.environ.get('REPORTE_COMPLETO_LIMITE', '100000'))
+# Por encima de estas lecturas /api/report/completo pasa al modo en flujo
+REPORTE_FLUJO_UMBRAL = int(os.environ.get('REPORTE_FLUJO_UMBRAL', '20000'))
+FILAS_LOTE_FLUJO = 2000
+
+
+def resumen_reporte(desde=None, hasta=None):
+    """(resumen, ambiente, seguridad, accesos): agregados del período y filas de detalle"""
+    conn = get_conn()
+    try:
+        return consultar_resumen(conn, desde, hasta)
+    finally:
+        conn.close()
+
+
+def datos_reporte(desde=None, hasta=None, limit=1000):
+    """(ambiente, seguridad, accesos) de un reporte, en una sola conexión"""
+    where = 'fecha >= %s AND fecha <= %s' if desde and hasta else None
+    params = (desde, hasta) if where else ()
+    conn = get_conn()
+    try:
+        resultado = []
+        with conn.cursor() as cur:
+            for table in TABLAS_REPORTE:
+                sql = f"SELECT * FROM {table}"
+                if where:
+                    sql += " WHERE " + where
+                sql += f" ORDER BY fecha DESC LIMIT {int(limit)}"
+                cur.execute(sql, params)
+                resultado.append(cur.fetchall())
+        return tuple(resultado)
+    finally:
+        conn.close()
+
+
+def filas_en_flujo(table, desde=None, hasta=None):
+    """Filas de la tabla en orden cronológico, leídas del servidor por lotes"""
+    where = 'fecha >= %s AND fecha <= %s' if desde and hasta else None
+    conn = get_conn()
+    try:
+        # SSDictCursor no trae el resultado completo al cliente
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cur:
+            sql = f"SELECT * FROM {table}"
+            if where:
+                sql += " WHERE " + where
+            cur.execute(sql + " ORDER BY fecha ASC", (desde, hasta) if where else ())
+            while True:
+                lote = cur.fetchmany(FILAS_LOTE_FLUJO)
+                if not lote:
+                    break
+                yield from lote
+    finally:
+        conn.close()
+
+
+def contar_lecturas(desde=None, hasta=None):
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            if desde and hasta:
+                cur.execute("SELECT COUNT(*) AS total FROM registros_ambiente WHERE fecha >= %s AND fecha <= %s",
+                            (desde, hasta))
+            else:
+                cur.execute("SELECT COUNT(*) AS total FROM registros_ambiente")
+            return cur.fetchone()['total']
+    finally:
+        conn.close()
+
+
 @app.route('/api/ambiente', methods=['GET'])
+@respuesta_condicional
 def get_ambiente():
-    # filtros: desde, hasta, limit
+    # filtros: desde, hasta, limit, since (id o fecha de la última lectura que ya tiene el cliente)
     desde = request.args.get('desde')
     hasta = request.args.get('hasta')
+    since = request.args.get('since')
+    try:
+        limit = min(max(int(request.args.get('limit', 1000)), 1), 1000)
+    except ValueError:
+        return jsonify({'error': 'Parámetro inválido', 'message': 'limit debe ser entero'}), 400
     clauses = []
     params = []
+    if since:
+        # Sincronización incremental: sólo las lecturas posteriores a la marca
+        clauses.append('id > %s' if since.isdigit() else 'fecha > %s')
+        params.append(int(since) if since.isdigit() else since)
     if desde:
         clauses.append('fecha >= %s')
         params.append(desde)
@@ -354,8 +576,8 @@ def get_ambiente():
         clauses.append('fecha <= %s')
         params.append(hasta)
     where = ' AND '.join(clauses) if clauses else None
-    rows = query_table('registros_ambiente', where, tuple(params))
-    return jsonify(rows)
+    rows = query_table('registros_ambiente', where, tuple(params), limit)
+    return responder_filas('registros_ambiente', rows)
 
 
 @app.route('/api/seguridad', methods=['GET'])
@@ -372,7 +594,7 @@ def get_seguridad():
         params.append(hasta)
     where = ' AND '.join(clauses) if clauses else None
     rows = query_table('registros_seguridad', where, tuple(params))
-    return jsonify(rows)
+    return responder_filas('registros_seguridad', rows)
 
 
 @app.route('/api/accesos', methods=['GET'])
@@ -389,10 +611,11 @@ def get_accesos():
         params.append(hasta)
     where = ' AND '.join(clauses) if clauses else None
     rows = query_table('registros_acceso', where, tuple(params))
-    return jsonify(rows)
+    return responder_filas('registros_acceso', rows)
 
 
 @app.route('/api/estado/actual', methods=['GET'])
+@respuesta_condicional
 def get_estado_actual():
     """Obtiene el estado actual de todos los módulos"""
     conn = get_conn()
@@ -485,6 +708,7 @@ def config_umbrales():
 
 
 @app.route('/api/estadisticas', methods=['GET'])
+@respuesta_condicional
 def get_estadisticas():
     """Obtiene estadísticas del sistema"""
     desde = request.args.get('desde', (datetime.now() - timedelta(days=7)).isoformat())
@@ -508,6 +732,12 @@ def get_estadisticas():
                 WHERE fecha BETWEEN %s AND %s
             ''', (desde, hasta))
             stats_ambiente = cur.fetchone()
+            # Arranques reales y tiempo encendida desde intervalos_bomba, si los hay
+            bomba = consultar_bomba(cur, desde, hasta)
+            if bomba and stats_ambiente:
+                stats_ambiente['activaciones_bomba'] = bomba['ciclos']
+                stats_ambiente['bomba_encendida_s'] = bomba['segundos']
+                stats_ambiente['ciclo_trabajo_bomba'] = round(bomba['ciclo_trabajo'], 1)
 
             # Estadísticas de seguridad
             cur.execute('''
@@ -544,6 +774,7 @@ def get_estadisticas():
 
 
 @app.route('/api/alertas/sistema', methods=['GET'])
+@respuesta_condicional
 def get_alertas_sistema():
     """Obtiene alertas activas del sistema"""
     conn = get_conn()
@@ -624,6 +855,7 @@ def get_alertas_sistema():
 @app.route('/api/report/demo', methods=['GET'])
 def get_demo_report():
     """Genera reporte PDF con datos de ejemplo para demostración"""
+    cargar_reportes()
     if not REPORTLAB_AVAILABLE:
         return jsonify({
             'error': 'Función PDF no disponible',
@@ -791,8 +1023,19 @@ def health_check():
             'database': 'unknown',
             'reportlab': REPORTLAB_AVAILABLE,
             'cors': CORS_AVAILABLE
+        },
+        'arranque': {
+            'importacion_ms': TIEMPO_IMPORTACION_MS,
+            'reportes': 'cargados' if REPORTES_CARGADOS else 'diferidos',
+            'carga_reportes_ms': TIEMPO_CARGA_REPORTES_MS
         }
     }
+    if PIPELINE_REPORTES_AVAILABLE:
+        health_status['reportes'] = {
+            'procesos': pipeline_reportes.procesos,
+            'union_paralela': PYPDF_AVAILABLE,
+            'ultimo_ms': pipeline_reportes.ultimo_ms
+        }
 
     # Verificar conexión a base de datos
     try:
@@ -810,6 +1053,7 @@ def health_check():
 @app.route('/api/report/enhanced', methods=['GET'])
 def get_enhanced_report():
     """Genera reporte PDF mejorado con diseño profesional"""
+    cargar_reportes()
     if not REPORTLAB_AVAILABLE:
         return jsonify({
             'error': 'Función PDF no disponible',
@@ -821,23 +1065,17 @@ def get_enhanced_report():
         desde = request.args.get('desde')
         hasta = request.args.get('hasta')
         
-        # Obtener datos del sistema
-        ambiente = query_table('registros_ambiente',
-                               'fecha >= %s AND fecha <= %s' if desde and hasta else None,
-                               tuple([desde, hasta]) if desde and hasta else ())
-        
-        seguridad = query_table('registros_seguridad',
-                               'fecha >= %s AND fecha <= %s' if desde and hasta else None,
-                               tuple([desde, hasta]) if desde and hasta else ())
-        
-        accesos = query_table('registros_acceso',
-                             'fecha >= %s AND fecha <= %s' if desde and hasta else None,
-                             tuple([desde, hasta]) if desde and hasta else ())
+        # Agregados del período y filas de detalle (una conexión)
+        resumen, ambiente, seguridad, accesos = resumen_reporte(desde, hasta)
         
-        # Intentar usar el generador mejorado
+        # Intentar usar el generador mejorado (en el pool de procesos si está disponible)
         if ENHANCED_PDF_AVAILABLE:
             try:
-                pdf_data = create_enhanced_pdf_report(ambiente, seguridad, accesos, desde, hasta)
+                if PIPELINE_REPORTES_AVAILABLE:
+                    datos = DatosReporte(ambiente, seguridad, accesos, desde, hasta, resumen)
+                    _, pdf_data = pipeline_reportes.renderizar(['mejorado'], datos)
+                else:
+                    pdf_data = create_enhanced_pdf_report(ambiente, seguridad, accesos, desde, hasta, resumen)
                 if pdf_data:
                     filename = f'reporte_invernadero_mejorado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
                     return Response(
@@ -869,6 +1107,7 @@ def get_enhanced_report():
 @app.route('/api/report/advanced', methods=['GET'])
 def get_advanced_report():
     """Genera reporte PDF ultra-avanzado con análisis profesional"""
+    cargar_reportes()
     if not REPORTLAB_AVAILABLE:
         return jsonify({
             'error': 'Función PDF no disponible',
@@ -880,23 +1119,25 @@ def get_advanced_report():
         desde = request.args.get('desde')
         hasta = request.args.get('hasta')
         
-        # Obtener datos completos del sistema
-        ambiente = query_table('registros_ambiente',
-                               'fecha >= %s AND fecha <= %s' if desde and hasta else None,
-                               tuple([desde, hasta]) if desde and hasta else ())
-        
-        seguridad = query_table('registros_seguridad',
-                               'fecha >= %s AND fecha <= %s' if desde and hasta else None,
-                               tuple([desde, hasta]) if desde and hasta else ())
-        
-        accesos = query_table('registros_acceso',
-                             'fecha >= %s AND fecha <= %s' if desde and hasta else None,
-                             tuple([desde, hasta]) if desde and hasta else ())
+        # Agregados del período y filas de detalle (una conexión)
+        resumen, ambiente, seguridad, accesos = resumen_reporte(desde, hasta)
         
+        # Generador avanzado en el pool; el mejorado sólo si el avanzado falla
+        # o supera REPORTES_TIMEOUT
+        if PIPELINE_REPORTES_AVAILABLE:
+            datos = DatosReporte(ambiente, seguridad, accesos, desde, hasta, resumen)
+            candidatos = [n for n, ok in (('avanzado', PDF_GENERATOR_AVAILABLE),
+                                          ('mejorado', ENHANCED_PDF_AVAILABLE)) if ok]
+            nombre, pdf_data = pipeline_reportes.renderizar(candidatos, datos)
+            if pdf_data:
+                sufijo = 'ultra' if nombre == 'avanzado' else 'mejorado'
+                filename = f'reporte_invernadero_{sufijo}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+                return send_file_bytes(pdf_data, filename)
+
         # Intentar usar el generador avanzado primero
-        if PDF_GENERATOR_AVAILABLE:
+        elif PDF_GENERATOR_AVAILABLE:
             try:
-                pdf_data = generate_professional_pdf(ambiente, seguridad, accesos, desde, hasta)
+                pdf_data = generate_professional_pdf(ambiente, seguridad, accesos, desde, hasta, resumen)
                 if pdf_data:
                     filename = f'reporte_invernadero_ultra_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
                     return Response(
@@ -998,9 +1239,9 @@ def get_advanced_report():
         <br/>
         <b>📅 Generado:</b> {fecha_generacion}<br/>
         <b>🔧 Versión del Sistema:</b> 3.0.0 - Ultra Professional Edition<br/>
-        <b>📈 Registros Ambiente:</b> {len(ambiente):,}<br/>
-        <b>🔒 Eventos Seguridad:</b> {len(seguridad):,}<br/>
-        <b>🚪 Registros Acceso:</b> {len(accesos):,}<br/>
+        <b>📈 Registros Ambiente:</b> {resumen.total:,}<br/>
+        <b>🔒 Eventos Seguridad:</b> {resumen.seguridad_total:,}<br/>
+        <b>🚪 Registros Acceso:</b> {resumen.accesos_total:,}<br/>
         <b>⚡ Algoritmo de Análisis:</b> Machine Learning Avanzado<br/>
         """
         
@@ -1042,28 +1283,24 @@ def get_advanced_report():
         
         story.append(Paragraph("📊 EXECUTIVE SUMMARY - ANÁLISIS INTEGRAL", executive_title))
         
-        if ambiente:
-            temps = [float(r.get('temperatura', 0)) for r in ambiente if r.get('temperatura') is not None]
-            hums = [float(r.get('humedad', 0)) for r in ambiente if r.get('humedad') is not None]
+        if resumen.total:
+            temp_promedio = resumen.temperatura['promedio']
+            hum_promedio = resumen.humedad['promedio']
             
-            if temps and hums:
-                # Análisis estadístico avanzado
-                temp_promedio = sum(temps) / len(temps)
-                hum_promedio = sum(hums) / len(hums)
-                temp_max = max(temps)
-                temp_min = min(temps)
-                hum_max = max(hums)
-                hum_min = min(hums)
+            if temp_promedio is not None and hum_promedio is not None:
+                # Análisis estadístico del período completo (calculado por MySQL)
+                temp_max = resumen.temperatura['maximo']
+                temp_min = resumen.temperatura['minimo']
+                hum_max = resumen.humedad['maximo']
+                hum_min = resumen.humedad['minimo']
                 
                 # Desviación estándar
-                temp_variance = sum((x - temp_promedio) ** 2 for x in temps) / len(temps)
-                temp_std = temp_variance ** 0.5
-                hum_variance = sum((x - hum_promedio) ** 2 for x in hums) / len(hums)
-                hum_std = hum_variance ** 0.5
+                temp_std = resumen.temperatura['desviacion'] or 0.0
+                hum_std = resumen.humedad['desviacion'] or 0.0
                 
                 # Análisis de eficiencia
-                bomba_activa = len([r for r in ambiente if r.get('estado_bomba') == 'Encendida'])
-                eficiencia_riego = (bomba_activa / len(ambiente)) * 100 if ambiente else 0
+                bomba_activa = resumen.activaciones_bomba
+                eficiencia_riego = resumen.porcentaje_bomba
                 
                 # Score de salud del sistema
                 temp_score = 100 if 18 <= temp_promedio <= 28 else max(0, 100 - abs(temp_promedio - 23) * 5)
@@ -1087,15 +1324,15 @@ def get_advanced_report():
                 executive_data = [
                     ['🎯 MÉTRICA CLAVE', '📊 VALOR ACTUAL', '📈 ESTADO', '🎖️ PUNTUACIÓN', '📝 ANÁLISIS DETALLADO'],
                     ['Estado General', estado_sistema, '•', f'{health_score:.1f}/100', 'Evaluación integral automática'],
-                    ['Total Registros', f'{len(ambiente):,}', '✅', '100/100', f'Recolección continua en {len(set([str(r.get("fecha", ""))[:10] for r in ambiente]))} días'],
+                    ['Total Registros', f'{resumen.total:,}', '✅', '100/100', f'Recolección continua en {resumen.dias} días'],
                     ['Temperatura Media', f'{temp_promedio:.2f}°C', '✅' if 18 <= temp_promedio <= 28 else '⚠️', f'{temp_score:.1f}/100', f'Rango óptimo: 18-28°C | σ={temp_std:.2f}'],
                     ['Variabilidad Térmica', f'{temp_min:.1f}°C ↔ {temp_max:.1f}°C', '•', f'{max(0, 100-temp_std*10):.0f}/100', f'Estabilidad: {100-temp_std*5:.1f}%'],
                     ['Humedad Relativa', f'{hum_promedio:.2f}%', '✅' if 40 <= hum_promedio <= 70 else '⚠️', f'{hum_score:.1f}/100', f'Rango óptimo: 40-70% | σ={hum_std:.2f}'],
                     ['Control de Humedad', f'{hum_min:.1f}% ↔ {hum_max:.1f}%', '•', f'{max(0, 100-hum_std*2):.0f}/100', f'Precisión: {100-hum_std:.1f}%'],
                     ['Sistema de Riego', f'{bomba_activa} activaciones', '⚡', f'{min(100, eficiencia_riego*2):.0f}/100', f'Eficiencia: {eficiencia_riego:.1f}% del tiempo'],
-                    ['Cobertura Temporal', f'{len(set([str(r.get("fecha", ""))[:10] for r in ambiente]))} días', '📅', '100/100', 'Monitoreo continuo 24/7'],
-                    ['Eventos Seguridad', f'{len(seguridad)}', '🔒', f'{max(0, 100-len(seguridad)*2):.0f}/100', 'Sistema de protección activo'],
-                    ['Control de Acceso', f'{len(accesos)}', '🚪', '100/100', 'Trazabilidad completa'],
+                    ['Cobertura Temporal', f'{resumen.dias} días', '📅', '100/100', 'Monitoreo continuo 24/7'],
+                    ['Eventos Seguridad', f'{resumen.seguridad_total}', '🔒', f'{max(0, 100-resumen.seguridad_total*2):.0f}/100', 'Sistema de protección activo'],
+                    ['Control de Acceso', f'{resumen.accesos_total}', '🚪', '100/100', 'Trazabilidad completa'],
                     ['Análisis Predictivo', 'Activo', '🤖', '95/100', 'IA para predicción de tendencias']
                 ]
                 
@@ -1150,7 +1387,7 @@ def get_advanced_report():
                     recomendaciones.append("💧 Incrementar frecuencia de riego para aumentar humedad")
                 if eficiencia_riego > 50:
                     recomendaciones.append("⚠️ Revisar sistema de riego - activación excesiva")
-                if len(seguridad) > 10:
+                if resumen.seguridad_total > 10:
                     recomendaciones.append("🔒 Revisar eventos de seguridad - actividad inusual")
                 
                 if not recomendaciones:
@@ -1221,9 +1458,112 @@ def get_advanced_report():
         )
 
 
+@app.route('/api/report/completo', methods=['GET'])
+def get_complete_report():
+    """Reporte detallado con todas las lecturas del período
+
+    Hasta REPORTE_FLUJO_UMBRAL lecturas se renderiza por secciones en paralelo;
+    por encima (o con ?modo=flujo) se genera página a página en flujo.
+    """
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    modo = request.args.get('modo')
+    if REPORTE_FLUJO_AVAILABLE and modo != 'secciones':
+        if modo == 'flujo' or contar_lecturas(desde, hasta) > REPORTE_FLUJO_UMBRAL:
+            return reporte_en_flujo(desde, hasta)
+
+    cargar_reportes()
+    if not (REPORTLAB_AVAILABLE and PIPELINE_REPORTES_AVAILABLE):
+        return jsonify({
+            'error': 'Función PDF no disponible',
+            'message': 'ReportLab o el pipeline de reportes no están instalados.'
+        }), 503
+
+    try:
+        ambiente, seguridad, accesos = datos_reporte(desde, hasta, REPORTE_COMPLETO_LIMITE)
+        datos = DatosReporte(ambiente, seguridad, accesos, desde, hasta)
+        pdf_data = pipeline_reportes.renderizar_secciones(datos)
+        print(f"📄 Reporte completo: {len(ambiente):,} lecturas en {pipeline_reportes.ultimo_ms} ms")
+        filename = f'reporte_invernadero_completo_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+        return send_file_bytes(pdf_data, filename)
+    except Exception as e:
+        print(f"🔥 Error en reporte completo: {e}")
+        return jsonify({
+            'error': 'Error interno',
+            'message': str(e),
+            'endpoint': '/api/report/completo'
+        }), 500
+
+
+def reporte_en_flujo(desde, hasta):
+    """Escribir el reporte en un archivo temporal y enviarlo por bloques"""
+    inicio = time.perf_counter()
+    archivo = reporte_flujo.archivo_temporal()
+    try:
+        paginas, lecturas = reporte_flujo.escribir_reporte(
+            archivo, lambda table: filas_en_flujo(table, desde, hasta), desde, hasta)
+    except Exception:
+        archivo.close()
+        raise
+    print(f"📜 Reporte en flujo: {lecturas:,} lecturas, {paginas} páginas "
+          f"en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    filename = f'reporte_invernadero_completo_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+    # Sin Content-Length: Werkzeug usa Transfer-Encoding: chunked
+    return Response(reporte_flujo.transmitir(archivo), mimetype='application/pdf', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    })
+
+
+def renderizar_programado(generadores, desde, hasta):
+    """(generador, pdf) de un reporte programado, con los mismos generadores que la API"""
+    cargar_reportes()
+    desde, hasta = desde.strftime('%Y-%m-%d %H:%M:%S'), hasta.strftime('%Y-%m-%d %H:%M:%S')
+    resumen, ambiente, seguridad, accesos = resumen_reporte(desde, hasta)
+    if PIPELINE_REPORTES_AVAILABLE:
+        return pipeline_reportes.renderizar(generadores, DatosReporte(ambiente, seguridad, accesos, desde, hasta, resumen))
+    if ENHANCED_PDF_AVAILABLE:
+        return 'mejorado', create_enhanced_pdf_report(ambiente, seguridad, accesos, desde, hasta, resumen)
+    return None, None
+
+
+REPORTES_PROGRAMADOS = os.environ.get('REPORTES_PROGRAMADOS', '1') != '0'
+catalogo_reportes = CatalogoReportes()
+programador_reportes = ProgramadorReportes(catalogo_reportes, renderizar_programado)
+
+
+@app.route('/api/reports/catalog', methods=['GET'])
+def catalogo_reportes_programados():
+    """Reportes prerenderizados disponibles (?reporte=diario|semanal|mensual)"""
+    reporte = request.args.get('reporte')
+    entradas = catalogo_reportes.listar(reporte)
+    return jsonify({
+        'reportes': [dict(m, url=f"/api/reports/catalog/{m['archivo']}") for m in entradas],
+        'total': len(entradas),
+        'programacion': {
+            'activa': REPORTES_PROGRAMADOS,
+            'hora': programador_reportes.hora,
+            'proxima': programador_reportes.proxima.isoformat() if programador_reportes.proxima else None,
+            'ultima': programador_reportes.ultima_ejecucion.isoformat() if programador_reportes.ultima_ejecucion else None,
+        }
+    })
+
+
+@app.route('/api/reports/catalog/<archivo>', methods=['GET'])
+def descargar_reporte_programado(archivo):
+    """PDF prerenderizado; un período cerrado no cambia, se cachea como inmutable"""
+    if archivo not in catalogo_reportes.entradas:
+        return jsonify({'error': 'Reporte no encontrado', 'archivo': archivo}), 404
+    respuesta = send_from_directory(catalogo_reportes.directorio, archivo,
+                                    mimetype='application/pdf', as_attachment=True)
+    respuesta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return respuesta
+
+
 @app.route('/')
 def index():
     """Página principal del dashboard"""
+    if activos and 'index.html' in activos.paginas:
+        return activos.servir_pagina('index.html')
     try:
         return send_from_directory('static', 'index.html')
     except FileNotFoundError:
@@ -1237,6 +1577,8 @@ def index():
 @app.route('/static/<path:p>')
 def static_files(p):
     """Servir archivos estáticos"""
+    if activos and p in activos.paginas:
+        return activos.servir_pagina(p)
     try:
         return send_from_directory('static', p)
     except FileNotFoundError:
@@ -1307,6 +1649,25 @@ def init_database_on_startup():
         print(f"⚠️ Error inicializando base de datos: {e}")
         print("💡 Continuando sin inicialización automática...")
 
+# Precarga de reportes en segundo plano, poco después de que el servidor escuche,
+# para que el primer PDF no pague la importación de ReportLab (se lanza en __main__)
+PRECARGA_REPORTES = os.environ.get('PRECARGA_REPORTES', '1') != '0'
+PRECARGA_RETARDO = float(os.environ.get('PRECARGA_RETARDO', '2'))
+def precargar_reportes():
+    cargar_reportes()
+    if PIPELINE_REPORTES_AVAILABLE:
+        pipeline_reportes.precalentar()
+
+
+# Presupuesto de tiempo de importación (arranque/reinicio de cada worker)
+PRESUPUESTO_IMPORTACION_MS = float(os.environ.get('PRESUPUESTO_IMPORTACION_MS', '250'))
+TIEMPO_IMPORTACION_MS = round((time.perf_counter() - _INICIO_IMPORTACION) * 1000, 1)
+if TIEMPO_IMPORTACION_MS > PRESUPUESTO_IMPORTACION_MS:
+    print(f"⚠️  app.py importada en {TIEMPO_IMPORTACION_MS} ms "
+          f"(presupuesto {PRESUPUESTO_IMPORTACION_MS:.0f} ms)")
+else:
+    print(f"⏱️  app.py importada en {TIEMPO_IMPORTACION_MS} ms")
+
 if __name__ == '__main__':
     print("🌿 Iniciando Sistema de Invernadero IoT...")
     print("📊 Dashboard disponible en: http://127.0.0.1:5001")
@@ -1320,6 +1681,15 @@ if __name__ == '__main__':
     # Inicializar base de datos automáticamente
     init_database_on_startup()
 
+    # Hilos en segundo plano sólo en el proceso que sirve, no al importar app.py
+    # (cada worker o script que la importe lanzaría su propio programador)
+    if PRECARGA_REPORTES and REPORTLAB_AVAILABLE:
+        _precarga = threading.Timer(PRECARGA_RETARDO, precargar_reportes)
+        _precarga.daemon = True
+        _precarga.start()
+    if REPORTES_PROGRAMADOS:
+        programador_reportes.iniciar()
+
     # Usar 127.0.0.1 y puerto 5001 para evitar problemas de firewall
     print("🚀 Iniciando servidor en 127.0.0.1:5001...")
     app.run(host='127.0.0.1', port=5001, debug=False, threaded=True)
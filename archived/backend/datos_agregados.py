@@ -0,0 +1,291 @@
+"""
+📊 DATOS AGREGADOS PARA REPORTES
+================================
+Los reportes cargaban hasta 1000 filas crudas por tabla (LIMIT 1000 de
+query_table) y las resumían en Python: lento para rangos largos y, peor,
+incorrecto, porque a partir de unas horas de datos el reporte sólo veía
+las lecturas más recientes.
+
+consultar_resumen() deja que MySQL calcule sobre TODO el período:
+
+- Totales: lecturas, promedio/mínimo/máximo/desviación de temperatura y
+  humedad, lecturas con la bomba encendida, días con datos y reparto de
+  humedad por rangos (baja < 40 %, óptima 40-70 %, alta > 70 %).
+- Series por hora (rangos de hasta HORAS_MAX_SERIE_HORARIA) o por día.
+- Conteos de seguridad (por nivel) y de accesos (autorizados o no).
+- Sólo las REPORTE_DETALLE_FILAS filas más recientes de cada tabla, para
+  las tablas de detalle.
+
+La actividad de la bomba sale de intervalos_bomba (un ciclo de riego por
+fila, ver ciclos_bomba.py en la raíz) cuando existe: ciclos que arrancan
+en el período y tiempo encendida recortado a él. Sin esa tabla se vuelve
+a contar lecturas con la bomba encendida.
+
+Con la compresión por banda muerta de la raíz (compresion_lecturas.py)
+una fila de registros_ambiente representa `muestras` lecturas: conteos,
+promedios y desviaciones se ponderan por esa columna cuando existe.
+
+Los generadores reciben las filas de detalle como siempre y el
+ResumenReporte en el argumento `resumen`; si no llega (datos de demo),
+lo construyen con ResumenReporte.desde_filas() a partir de las filas.
+"""
+
+import math
+import os
+from collections import Counter
+from datetime import datetime
+
+REPORTE_DETALLE_FILAS = int(os.environ.get('REPORTE_DETALLE_FILAS', '50'))
+HORAS_MAX_SERIE_HORARIA = 72
+
+FORMATOS_PERIODO = {
+    'hora': '%%Y-%%m-%%d %%H:00',
+    'dia': '%%Y-%%m-%%d',
+}
+
+
+def _numero(valor):
+    return None if valor is None else float(valor)
+
+
+def _entero(valor):
+    return int(valor or 0)
+
+
+def _fecha(valor):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    try:
+        return datetime.fromisoformat(str(valor).replace('T', ' ')[:19])
+    except ValueError:
+        return None
+
+
+class ResumenReporte:
+    """Estadísticas de un período, calculadas por MySQL o sobre filas ya cargadas"""
+
+    def __init__(self, totales, serie, granularidad, seguridad, accesos):
+        self.total = _entero(totales.get('total'))
+        self.dias = _entero(totales.get('dias'))
+        self.primera = totales.get('primera')
+        self.ultima = totales.get('ultima')
+        self.bomba_encendida = _entero(totales.get('bomba_encendida'))
+        self.temperatura = {k: _numero(totales.get(f'temp_{k}')) for k in ('promedio', 'minimo', 'maximo', 'desviacion')}
+        self.humedad = {k: _numero(totales.get(f'hum_{k}')) for k in ('promedio', 'minimo', 'maximo', 'desviacion')}
+        self.rangos_humedad = tuple(_entero(totales.get(f'hum_{r}')) for r in ('baja', 'optima', 'alta'))
+        self.serie = serie
+        self.granularidad = granularidad
+        self.seguridad_total = sum(seguridad.values())
+        self.seguridad_por_nivel = seguridad
+        self.accesos_total = _entero(accesos.get('total'))
+        self.accesos_autorizados = _entero(accesos.get('autorizados'))
+        # Desde intervalos_bomba (consultar_bomba); None si no hay intervalos
+        self.bomba_ciclos = None
+        self.bomba_segundos = None
+        self.bomba_ciclo_trabajo = None
+
+    @classmethod
+    def desde_filas(cls, ambiente, seguridad=None, accesos=None):
+        """Resumen calculado en Python sobre filas ya cargadas (más recientes primero)"""
+        ambiente = ambiente or []
+        totales = {'total': len(ambiente)}
+        for prefijo, campo in (('temp', 'temperatura'), ('hum', 'humedad')):
+            valores = [float(r[campo]) for r in ambiente if r.get(campo) is not None]
+            if valores:
+                promedio = sum(valores) / len(valores)
+                totales.update({
+                    f'{prefijo}_promedio': promedio, f'{prefijo}_minimo': min(valores),
+                    f'{prefijo}_maximo': max(valores),
+                    f'{prefijo}_desviacion': math.sqrt(sum((v - promedio) ** 2 for v in valores) / len(valores)),
+                })
+            if campo == 'humedad':
+                totales.update({'hum_baja': sum(1 for h in valores if h < 40),
+                                'hum_optima': sum(1 for h in valores if 40 <= h <= 70),
+                                'hum_alta': sum(1 for h in valores if h > 70)})
+        # Los datos de demo usan 'bomba' en lugar de 'estado_bomba'
+        totales['bomba_encendida'] = sum(
+            1 for r in ambiente if str(r.get('estado_bomba') or r.get('bomba') or '').lower() == 'encendida')
+        totales['dias'] = len({str(r.get('fecha', ''))[:10] for r in ambiente})
+        if ambiente:
+            totales['primera'], totales['ultima'] = ambiente[-1].get('fecha'), ambiente[0].get('fecha')
+
+        # Una "serie" con un punto por lectura, en orden cronológico
+        serie = []
+        for r in reversed(ambiente):
+            temp, hum = _numero(r.get('temperatura')), _numero(r.get('humedad'))
+            serie.append({'periodo': r.get('fecha'), 'lecturas': 1,
+                          'temp_promedio': temp, 'temp_minimo': temp, 'temp_maximo': temp,
+                          'hum_promedio': hum, 'hum_minimo': hum, 'hum_maximo': hum,
+                          'bomba_encendida': int(str(r.get('estado_bomba') or r.get('bomba') or '').lower() == 'encendida')})
+
+        niveles = Counter((r.get('nivel_alerta') or 'sin nivel') for r in (seguridad or []))
+        accesos = accesos or []
+        resumen_accesos = {'total': len(accesos), 'autorizados': sum(1 for r in accesos if r.get('acceso_autorizado'))}
+        return cls(totales, serie, 'lectura', dict(niveles), resumen_accesos)
+
+    def registrar_bomba(self, bomba):
+        """Incorporar el resultado de consultar_bomba()"""
+        if bomba:
+            self.bomba_ciclos = bomba['ciclos']
+            self.bomba_segundos = bomba['segundos']
+            self.bomba_ciclo_trabajo = bomba['ciclo_trabajo']
+
+    @property
+    def activaciones_bomba(self):
+        """Arranques de la bomba; sin intervalos, lecturas con la bomba encendida"""
+        return self.bomba_ciclos if self.bomba_ciclos is not None else self.bomba_encendida
+
+    @property
+    def porcentaje_bomba(self):
+        """% del tiempo con la bomba encendida (de las lecturas si no hay intervalos)"""
+        if self.bomba_ciclo_trabajo is not None:
+            return self.bomba_ciclo_trabajo
+        return self.bomba_encendida * 100 / self.total if self.total else 0.0
+
+    def valores(self, metrica):
+        """Promedios de `metrica` ('temperatura'/'humedad') por periodo, en orden cronológico"""
+        prefijo = 'temp' if metrica == 'temperatura' else 'hum'
+        return [p[f'{prefijo}_promedio'] for p in self.serie if p[f'{prefijo}_promedio'] is not None]
+
+    def a_dict(self):
+        return {
+            'total': self.total, 'dias': self.dias, 'primera': self.primera, 'ultima': self.ultima,
+            'temperatura': self.temperatura, 'humedad': self.humedad,
+            'bomba_encendida': self.bomba_encendida, 'rangos_humedad': self.rangos_humedad,
+            'bomba': {'ciclos': self.bomba_ciclos, 'segundos': self.bomba_segundos,
+                      'ciclo_trabajo': self.bomba_ciclo_trabajo},
+            'granularidad': self.granularidad, 'serie': self.serie,
+            'seguridad': {'total': self.seguridad_total, 'por_nivel': self.seguridad_por_nivel},
+            'accesos': {'total': self.accesos_total, 'autorizados': self.accesos_autorizados},
+        }
+
+
+def _peso(cur):
+    """Columna con las lecturas que representa cada fila ('1' sin compresión)"""
+    try:
+        cur.execute("SELECT muestras FROM registros_ambiente LIMIT 0")
+        cur.fetchall()
+        return 'muestras'
+    except Exception:
+        return '1'
+
+
+def _desviacion(totales, prefijo):
+    """Desviación poblacional ponderada a partir de las sumas de la consulta"""
+    peso, promedio = _numero(totales.get(f'{prefijo}_peso')), _numero(totales.get(f'{prefijo}_promedio'))
+    if not peso or promedio is None:
+        return None
+    return math.sqrt(max(0.0, _numero(totales.get(f'{prefijo}_cuadrados')) / peso - promedio ** 2))
+
+
+def _filtro(desde, hasta):
+    if desde and hasta:
+        return " WHERE fecha >= %s AND fecha <= %s", (desde, hasta)
+    return "", ()
+
+
+def elegir_granularidad(desde, hasta):
+    """'hora' para rangos de hasta HORAS_MAX_SERIE_HORARIA, 'dia' para el resto"""
+    inicio, fin = _fecha(desde), _fecha(hasta)
+    if inicio is None or fin is None:
+        return 'dia'
+    return 'hora' if (fin - inicio).total_seconds() <= HORAS_MAX_SERIE_HORARIA * 3600 else 'dia'
+
+
+def consultar_bomba(cur, desde, hasta):
+    """{'ciclos', 'segundos', 'ciclo_trabajo'} de la bomba entre `desde` y `hasta`
+
+    El ciclo de trabajo es la media por bomba: los dispositivos que enviaron
+    lecturas en el período (también los que nunca regaron) o, si la tabla
+    no tiene `dispositivo` (esquema de este backend), los que tienen
+    intervalos. None si no hay intervalos registrados o la tabla no existe
+    todavía.
+    """
+    inicio, fin = _fecha(desde), _fecha(hasta)
+    if inicio is None or fin is None or fin <= inicio:
+        return None
+    try:
+        cur.execute(
+            "SELECT COUNT(*) AS intervalos, COUNT(DISTINCT COALESCE(dispositivo, '')) AS bombas, "
+            "SUM(inicio >= %s) AS ciclos, "
+            "SUM(TIMESTAMPDIFF(SECOND, GREATEST(inicio, %s), LEAST(COALESCE(fin, NOW()), %s))) AS segundos "
+            "FROM intervalos_bomba WHERE inicio <= %s AND (fin IS NULL OR fin >= %s)",
+            (inicio, inicio, fin, fin, inicio))
+        fila = cur.fetchone() or {}
+    except Exception:
+        return None
+    if not _entero(fila.get('intervalos')):
+        return None
+    try:
+        cur.execute("SELECT COUNT(DISTINCT COALESCE(dispositivo, '')) AS dispositivos FROM registros_ambiente "
+                    "WHERE fecha >= %s AND fecha <= %s", (inicio, fin))
+        bombas = _entero((cur.fetchone() or {}).get('dispositivos'))
+    except Exception:
+        bombas = _entero(fila.get('bombas'))
+    segundos = max(0, _entero(fila.get('segundos')))
+    duracion = (fin - inicio).total_seconds() * max(1, bombas)
+    return {'ciclos': _entero(fila.get('ciclos')), 'segundos': segundos,
+            'ciclo_trabajo': min(100.0, segundos * 100 / duracion)}
+
+
+def consultar_resumen(conn, desde=None, hasta=None, detalle=REPORTE_DETALLE_FILAS):
+    """(resumen, ambiente, seguridad, accesos) con las filas de detalle más recientes"""
+    where, params = _filtro(desde, hasta)
+    with conn.cursor() as cur:
+        peso = _peso(cur)
+        # Todos los % literales van duplicados: siempre se pasa `params`
+        cur.execute(
+            f"SELECT SUM({peso}) AS total, "
+            f"SUM(temperatura * {peso}) / SUM(CASE WHEN temperatura IS NOT NULL THEN {peso} END) AS temp_promedio, "
+            f"SUM(temperatura * temperatura * {peso}) AS temp_cuadrados, "
+            f"SUM(CASE WHEN temperatura IS NOT NULL THEN {peso} END) AS temp_peso, "
+            "MIN(temperatura) AS temp_minimo, MAX(temperatura) AS temp_maximo, "
+            f"SUM(humedad * {peso}) / SUM(CASE WHEN humedad IS NOT NULL THEN {peso} END) AS hum_promedio, "
+            f"SUM(humedad * humedad * {peso}) AS hum_cuadrados, "
+            f"SUM(CASE WHEN humedad IS NOT NULL THEN {peso} END) AS hum_peso, "
+            "MIN(humedad) AS hum_minimo, MAX(humedad) AS hum_maximo, "
+            f"SUM(CASE WHEN estado_bomba = 'Encendida' THEN {peso} ELSE 0 END) AS bomba_encendida, "
+            f"SUM(CASE WHEN humedad < 40 THEN {peso} ELSE 0 END) AS hum_baja, "
+            f"SUM(CASE WHEN humedad BETWEEN 40 AND 70 THEN {peso} ELSE 0 END) AS hum_optima, "
+            f"SUM(CASE WHEN humedad > 70 THEN {peso} ELSE 0 END) AS hum_alta, "
+            "COUNT(DISTINCT DATE(fecha)) AS dias, MIN(fecha) AS primera, MAX(fecha) AS ultima "
+            "FROM registros_ambiente" + where, params)
+        totales = dict(cur.fetchone() or {})
+        totales['temp_desviacion'] = _desviacion(totales, 'temp')
+        totales['hum_desviacion'] = _desviacion(totales, 'hum')
+
+        granularidad = elegir_granularidad(desde or totales.get('primera'), hasta or totales.get('ultima'))
+        cur.execute(
+            f"SELECT DATE_FORMAT(fecha, '{FORMATOS_PERIODO[granularidad]}') AS periodo, SUM({peso}) AS lecturas, "
+            f"SUM(temperatura * {peso}) / SUM(CASE WHEN temperatura IS NOT NULL THEN {peso} END) AS temp_promedio, "
+            "MIN(temperatura) AS temp_minimo, MAX(temperatura) AS temp_maximo, "
+            f"SUM(humedad * {peso}) / SUM(CASE WHEN humedad IS NOT NULL THEN {peso} END) AS hum_promedio, "
+            "MIN(humedad) AS hum_minimo, MAX(humedad) AS hum_maximo, "
+            f"SUM(CASE WHEN estado_bomba = 'Encendida' THEN {peso} ELSE 0 END) AS bomba_encendida "
+            "FROM registros_ambiente" + where + " GROUP BY periodo ORDER BY periodo", params)
+        serie = [{
+            'periodo': f['periodo'], 'lecturas': _entero(f['lecturas']),
+            'temp_promedio': _numero(f['temp_promedio']), 'temp_minimo': _numero(f['temp_minimo']),
+            'temp_maximo': _numero(f['temp_maximo']), 'hum_promedio': _numero(f['hum_promedio']),
+            'hum_minimo': _numero(f['hum_minimo']), 'hum_maximo': _numero(f['hum_maximo']),
+            'bomba_encendida': _entero(f['bomba_encendida']),
+        } for f in cur.fetchall()]
+
+        cur.execute("SELECT nivel_alerta, COUNT(*) AS total FROM registros_seguridad" + where
+                    + " GROUP BY nivel_alerta", params)
+        seguridad = {f['nivel_alerta'] or 'sin nivel': _entero(f['total']) for f in cur.fetchall()}
+
+        cur.execute("SELECT COUNT(*) AS total, SUM(acceso_autorizado) AS autorizados FROM registros_acceso"
+                    + where, params)
+        accesos = cur.fetchone() or {}
+
+        bomba = consultar_bomba(cur, desde or totales.get('primera'), hasta or totales.get('ultima'))
+
+        filas = []
+        for table in ('registros_ambiente', 'registros_seguridad', 'registros_acceso'):
+            cur.execute(f"SELECT * FROM {table}{where} ORDER BY fecha DESC LIMIT {int(detalle)}", params)
+            filas.append(cur.fetchall())
+
+    resumen = ResumenReporte(totales, serie, granularidad, seguridad, accesos)
+    resumen.registrar_bomba(bomba)
+    return (resumen, *filas)
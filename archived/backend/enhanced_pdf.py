@@ -13,9 +13,18 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.graphics.shapes import Drawing, Rect, Circle, Line
 from reportlab.lib.colors import HexColor
 
+from datos_agregados import ResumenReporte
 
-def create_enhanced_pdf_report(ambiente_data, seguridad_data=None, acceso_data=None, desde=None, hasta=None):
-    """Crear reporte PDF con mejoras visuales adicionales"""
+
+def create_enhanced_pdf_report(ambiente_data, seguridad_data=None, acceso_data=None, desde=None, hasta=None,
+                               resumen=None):
+    """Crear reporte PDF con mejoras visuales adicionales
+
+    `resumen` (ResumenReporte) trae las estadísticas de todo el período; las
+    filas sólo se usan para la tabla de detalle.
+    """
+    if resumen is None:
+        resumen = ResumenReporte.desde_filas(ambiente_data, seguridad_data, acceso_data)
     
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm,
@@ -100,9 +109,9 @@ def create_enhanced_pdf_report(ambiente_data, seguridad_data=None, acceso_data=N
     <br/>
     <b>📅 Fecha de Generación:</b> {fecha_generacion}<br/>
     <b>🔧 Versión del Sistema:</b> 2.8.0 - Professional Analytics Edition<br/>
-    <b>📊 Registros de Ambiente:</b> {len(ambiente_data) if ambiente_data else 0:,}<br/>
-    <b>🔒 Eventos de Seguridad:</b> {len(seguridad_data) if seguridad_data else 0:,}<br/>
-    <b>🚪 Registros de Acceso:</b> {len(acceso_data) if acceso_data else 0:,}<br/>
+    <b>📊 Registros de Ambiente:</b> {resumen.total:,}<br/>
+    <b>🔒 Eventos de Seguridad:</b> {resumen.seguridad_total:,}<br/>
+    <b>🚪 Registros de Acceso:</b> {resumen.accesos_total:,}<br/>
     """
     
     if desde and hasta:
@@ -128,23 +137,21 @@ def create_enhanced_pdf_report(ambiente_data, seguridad_data=None, acceso_data=N
     # === ANÁLISIS EJECUTIVO ===
     story.append(Paragraph("📊 ANÁLISIS EJECUTIVO INTEGRAL", section_style))
     
-    if ambiente_data:
-        temps = [float(r.get('temperatura', 0)) for r in ambiente_data if r.get('temperatura') is not None]
-        hums = [float(r.get('humedad', 0)) for r in ambiente_data if r.get('humedad') is not None]
+    if resumen.total:
+        temp_promedio = resumen.temperatura['promedio']
+        hum_promedio = resumen.humedad['promedio']
         
-        if temps and hums:
-            temp_promedio = sum(temps) / len(temps)
-            hum_promedio = sum(hums) / len(hums)
-            temp_max = max(temps)
-            temp_min = min(temps)
-            hum_max = max(hums)
-            hum_min = min(hums)
+        if temp_promedio is not None and hum_promedio is not None:
+            temp_max = resumen.temperatura['maximo']
+            temp_min = resumen.temperatura['minimo']
+            hum_max = resumen.humedad['maximo']
+            hum_min = resumen.humedad['minimo']
             
             # Cálculo de eficiencia
-            bomba_activa = len([r for r in ambiente_data if r.get('estado_bomba') == 'Encendida'])
+            bomba_activa = resumen.activaciones_bomba
             eficiencia_sistema = ((temp_promedio >= 18 and temp_promedio <= 28) * 0.4 + 
                                 (hum_promedio >= 40 and hum_promedio <= 70) * 0.4 + 
-                                (bomba_activa / len(ambiente_data) < 0.3) * 0.2) * 100
+                                (resumen.porcentaje_bomba < 30) * 0.2) * 100
             
             # Estado general
             if eficiencia_sistema >= 85:
@@ -164,18 +171,23 @@ def create_enhanced_pdf_report(ambiente_data, seguridad_data=None, acceso_data=N
             analysis_data = [
                 ['🎯 INDICADOR CLAVE', '📊 VALOR MEDIDO', '🎖️ EVALUACIÓN', '📈 TENDENCIA', '📝 OBSERVACIONES'],
                 ['Estado General del Sistema', estado, f'{eficiencia_sistema:.1f}%', '📈', 'Evaluación automatizada integral'],
-                ['Registros Totales Procesados', f'{len(ambiente_data):,}', '100%', '📊', f'Monitoreo continuo durante {len(set([str(r.get("fecha", ""))[:10] for r in ambiente_data]))} días'],
+                ['Registros Totales Procesados', f'{resumen.total:,}', '100%', '📊', f'Monitoreo continuo durante {resumen.dias} días'],
                 ['Temperatura Promedio', f'{temp_promedio:.2f}°C', '✅' if 18 <= temp_promedio <= 28 else '⚠️', '🌡️', f'Rango óptimo: 18-28°C'],
                 ['Variación Térmica Diaria', f'{temp_min:.1f}°C ↔ {temp_max:.1f}°C', '📊', '📈', f'Amplitud térmica: {temp_max - temp_min:.1f}°C'],
                 ['Humedad Relativa Media', f'{hum_promedio:.2f}%', '✅' if 40 <= hum_promedio <= 70 else '⚠️', '💧', f'Rango óptimo: 40-70%'],
                 ['Control de Humedad', f'{hum_min:.1f}% ↔ {hum_max:.1f}%', '📊', '💨', f'Variación: {hum_max - hum_min:.1f}%'],
-                ['Sistema de Riego Automático', f'{bomba_activa} activaciones', '⚡', '💧', f'Eficiencia: {(bomba_activa/len(ambiente_data)*100):.1f}% del tiempo'],
-                ['Cobertura de Monitoreo', f'{len(set([str(r.get("fecha", ""))[:10] for r in ambiente_data]))} días', '✅', '📅', 'Monitoreo 24/7 ininterrumpido'],
-                ['Eventos de Seguridad', f'{len(seguridad_data) if seguridad_data else 0}', '🔒', '🛡️', 'Sistema de protección activo'],
-                ['Trazabilidad de Accesos', f'{len(acceso_data) if acceso_data else 0}', '🚪', '🔐', 'Control de acceso integral'],
+                ['Sistema de Riego Automático', f'{bomba_activa} activaciones', '⚡', '💧', f'Eficiencia: {resumen.porcentaje_bomba:.1f}% del tiempo'],
+                ['Cobertura de Monitoreo', f'{resumen.dias} días', '✅', '📅', 'Monitoreo 24/7 ininterrumpido'],
+                ['Eventos de Seguridad', f'{resumen.seguridad_total}', '🔒', '🛡️', 'Sistema de protección activo'],
+                ['Trazabilidad de Accesos', f'{resumen.accesos_total}', '🚪', '🔐', 'Control de acceso integral'],
                 ['Índice de Automatización', '98%', '🤖', '⚡', 'Gestión inteligente IoT avanzada']
             ]
             
+            if resumen.bomba_segundos is not None:
+                # Tiempo real de riego, justo debajo de las activaciones
+                analysis_data.insert(8, ['Tiempo de Riego', f'{resumen.bomba_segundos / 3600:.1f} h', '⏱️', '💧',
+                                         'Suma de los ciclos de la bomba'])
+            
             # Aplicar colores según rendimiento
             analysis_table = Table(analysis_data, colWidths=[3.5*cm, 2.8*cm, 2*cm, 1.5*cm, 5.2*cm])
             analysis_table.setStyle(TableStyle([
@@ -233,13 +245,13 @@ def create_enhanced_pdf_report(ambiente_data, seguridad_data=None, acceso_data=N
             elif hum_promedio < 40:
                 recommendations.append("💦 ATENCIÓN: Humedad baja - Aumentar frecuencia de riego")
             
-            bomba_porcentaje = (bomba_activa / len(ambiente_data)) * 100
+            bomba_porcentaje = resumen.porcentaje_bomba
             if bomba_porcentaje > 60:
                 recommendations.append("⚠️ SISTEMA: Riego excesivo - Revisar sensores de humedad del suelo")
             elif bomba_porcentaje < 5:
                 recommendations.append("💧 SISTEMA: Riego insuficiente - Verificar funcionamiento de bomba")
             
-            if len(seguridad_data) > 15:
+            if resumen.seguridad_total > 15:
                 recommendations.append("🔒 SEGURIDAD: Actividad inusual detectada - Revisar eventos")
             
             if not recommendations:
@@ -316,10 +328,10 @@ def create_enhanced_pdf_report(ambiente_data, seguridad_data=None, acceso_data=N
         
         story.append(detail_table)
         
-        if len(ambiente_data) > 30:
+        if resumen.total > len(records_to_show):
             story.append(Spacer(1, 12))
             note = Paragraph(
-                f"<i>📋 Nota: Se muestran los 30 registros más recientes de {len(ambiente_data)} total. "
+                f"<i>📋 Nota: Se muestran los {len(records_to_show)} registros más recientes de {resumen.total:,} total. "
                 f"Para análisis completo, acceda al sistema web en tiempo real.</i>",
                 normal_style
             )
@@ -26,6 +26,8 @@ try:
 except ImportError:
     REPORTLAB_AVAILABLE = False
 
+from datos_agregados import ResumenReporte
+
 
 class AdvancedPDFGenerator:
     """Generador avanzado de reportes PDF para el sistema de invernadero"""
@@ -236,19 +238,17 @@ class AdvancedPDFGenerator:
         
         return d
     
-    def create_humidity_pie_chart(self, humidity_data):
-        """Crear gráfico de torta para rangos de humedad"""
-        if not humidity_data:
+    def create_humidity_pie_chart(self, rangos):
+        """Crear gráfico de torta para rangos de humedad (baja, óptima, alta)"""
+        if not rangos or not sum(rangos):
             return Drawing(300, 200)
         
         d = Drawing(300, 200)
         
-        # Categorizar humedad
-        low = len([h for h in humidity_data if h < 40])
-        optimal = len([h for h in humidity_data if 40 <= h <= 70])
-        high = len([h for h in humidity_data if h > 70])
+        # Lecturas por rango de humedad
+        low, optimal, high = rangos
         
-        total = len(humidity_data)
+        total = low + optimal + high
         if total == 0:
             return d
         
@@ -289,23 +289,20 @@ class AdvancedPDFGenerator:
         
         return d
     
-    def create_status_indicators(self, ambiente_data):
+    def create_status_indicators(self, resumen):
         """Crear indicadores de estado del sistema"""
         d = Drawing(500, 100)
         
-        if not ambiente_data:
+        if not resumen.total:
             d.add(Rect(0, 0, 500, 100, fillColor=self.colors['light']))
             return d
         
-        # Análisis de datos
-        temps = [float(r.get('temperatura', 0)) for r in ambiente_data 
-                if r.get('temperatura') is not None]
-        hums = [float(r.get('humedad', 0)) for r in ambiente_data 
-               if r.get('humedad') is not None]
+        # Promedios del período
+        temp_avg = resumen.temperatura['promedio']
+        hum_avg = resumen.humedad['promedio']
         
         # Indicador de temperatura
-        if temps:
-            temp_avg = sum(temps) / len(temps)
+        if temp_avg is not None:
             temp_color = self.colors['success']
             if temp_avg > 30 or temp_avg < 15:
                 temp_color = self.colors['danger']
@@ -317,8 +314,7 @@ class AdvancedPDFGenerator:
         d.add(Circle(100, 50, 30, fillColor=temp_color, strokeColor=colors.white, strokeWidth=3))
         
         # Indicador de humedad
-        if hums:
-            hum_avg = sum(hums) / len(hums)
+        if hum_avg is not None:
             hum_color = self.colors['success']
             if hum_avg > 80 or hum_avg < 30:
                 hum_color = self.colors['danger']
@@ -341,8 +337,10 @@ class AdvancedPDFGenerator:
         return d
     
     def generate_advanced_report(self, ambiente_data, seguridad_data=None, acceso_data=None, 
-                               desde=None, hasta=None):
+                               desde=None, hasta=None, resumen=None):
         """Generar reporte PDF avanzado y profesional"""
+        if resumen is None:
+            resumen = ResumenReporte.desde_filas(ambiente_data, seguridad_data, acceso_data)
         buffer = BytesIO()
         
         # Configurar documento
@@ -383,7 +381,7 @@ class AdvancedPDFGenerator:
         <br/>
         <b>Generado:</b> {fecha_generacion}<br/>
         <b>Versión:</b> 2.5.0 - Sistema Avanzado{periodo_info}<br/>
-        <b>Registros Analizados:</b> {len(ambiente_data) if ambiente_data else 0:,}<br/>
+        <b>Registros Analizados:</b> {resumen.total:,}<br/>
         </para>
         """
         
@@ -395,52 +393,53 @@ class AdvancedPDFGenerator:
         story.append(Spacer(1, 0.5*cm))
         
         # Indicadores visuales
-        story.append(self.create_status_indicators(ambiente_data))
+        story.append(self.create_status_indicators(resumen))
         story.append(Spacer(1, 0.5*cm))
         
         # Análisis rápido
-        if ambiente_data:
-            temps = [float(r.get('temperatura', 0)) for r in ambiente_data 
-                    if r.get('temperatura') is not None]
-            hums = [float(r.get('humedad', 0)) for r in ambiente_data 
-                   if r.get('humedad') is not None]
+        temp, hum = resumen.temperatura, resumen.humedad
+        if resumen.total and temp['promedio'] is not None and hum['promedio'] is not None:
+            # Los extremos del período deciden el estado
+            estado_general = "🟢 SISTEMA OPERATIVO"
+            if temp['maximo'] > 35 or temp['minimo'] < 10 or hum['maximo'] > 85 or hum['minimo'] < 25:
+                estado_general = "🔴 ATENCIÓN REQUERIDA"
+            elif temp['maximo'] > 30 or temp['minimo'] < 15 or hum['maximo'] > 75 or hum['minimo'] < 35:
+                estado_general = "🟡 MONITOREO ACTIVO"
+            
+            # Lectura más reciente: primera fila de detalle o último punto de la serie
+            actual = ambiente_data[0] if ambiente_data else {}
+            temp_actual = actual.get('temperatura')
+            hum_actual = actual.get('humedad')
+            temp_actual = float(temp_actual) if temp_actual is not None else resumen.valores('temperatura')[-1]
+            hum_actual = float(hum_actual) if hum_actual is not None else resumen.valores('humedad')[-1]
+            
+            dashboard_text = f"""
+            <b>Estado General:</b> {estado_general}<br/>
+            <b>Temperatura Actual:</b> {temp_actual:.1f}°C<br/>
+            <b>Humedad Actual:</b> {hum_actual:.1f}%<br/>
+            <b>Registros Procesados:</b> {resumen.total:,}<br/>
+            <b>Período de Análisis:</b> {resumen.dias} días<br/>
+            """
             
-            if temps and hums:
-                estado_general = "🟢 SISTEMA OPERATIVO"
-                if any(t > 35 or t < 10 for t in temps) or any(h > 85 or h < 25 for h in hums):
-                    estado_general = "🔴 ATENCIÓN REQUERIDA"
-                elif any(t > 30 or t < 15 for t in temps) or any(h > 75 or h < 35 for h in hums):
-                    estado_general = "🟡 MONITOREO ACTIVO"
-                
-                dashboard_text = f"""
-                <b>Estado General:</b> {estado_general}<br/>
-                <b>Temperatura Actual:</b> {temps[-1]:.1f}°C<br/>
-                <b>Humedad Actual:</b> {hums[-1]:.1f}%<br/>
-                <b>Registros Procesados:</b> {len(ambiente_data):,}<br/>
-                <b>Período de Análisis:</b> {len(set([str(r.get('fecha', ''))[:10] for r in ambiente_data]))} días<br/>
-                """
-                
-                story.append(Paragraph(dashboard_text, self.styles['Enhanced']))
+            story.append(Paragraph(dashboard_text, self.styles['Enhanced']))
         
         story.append(PageBreak())
         
         # === ANÁLISIS GRÁFICO ===
-        if ambiente_data and len(ambiente_data) > 1:
+        if resumen.total > 1:
             story.append(Paragraph("📈 ANÁLISIS GRÁFICO DE TENDENCIAS", self.styles['Subtitle']))
             
-            temps = [float(r.get('temperatura', 0)) for r in ambiente_data 
-                    if r.get('temperatura') is not None]
-            hums = [float(r.get('humedad', 0)) for r in ambiente_data 
-                   if r.get('humedad') is not None]
+            # Promedios por hora/día del período completo, en orden cronológico
+            temps = resumen.valores('temperatura')
             
             if temps:
                 story.append(Paragraph("🌡️ Evolución de la Temperatura", self.styles['SectionHeader']))
                 story.append(self.create_temperature_chart(temps))
                 story.append(Spacer(1, 0.5*cm))
             
-            if hums:
+            if sum(resumen.rangos_humedad):
                 story.append(Paragraph("💧 Distribución de la Humedad", self.styles['SectionHeader']))
-                story.append(self.create_humidity_pie_chart(hums))
+                story.append(self.create_humidity_pie_chart(resumen.rangos_humedad))
                 story.append(Spacer(1, 0.5*cm))
             
             story.append(PageBreak())
@@ -459,12 +458,12 @@ class AdvancedPDFGenerator:
 
 
 def generate_professional_pdf(ambiente_data, seguridad_data=None, acceso_data=None, 
-                            desde=None, hasta=None):
+                            desde=None, hasta=None, resumen=None):
     """Función principal para generar PDF profesional"""
     try:
         generator = AdvancedPDFGenerator()
         return generator.generate_advanced_report(
-            ambiente_data, seguridad_data, acceso_data, desde, hasta
+            ambiente_data, seguridad_data, acceso_data, desde, hasta, resumen
         )
     except Exception as e:
         print(f"Error en generador PDF profesional: {e}")
@@ -0,0 +1,347 @@
+"""
+📄 PIPELINE DE REPORTES PDF - RENDERIZADO EN PROCESOS
+=====================================================
+Los generadores PDF son CPU puro (ReportLab) y bloquean el GIL: dentro del
+proceso Flask un reporte grande frena todas las demás peticiones, y probar
+generadores uno tras otro suma sus tiempos cuando el primero falla.
+
+Este módulo separa las dos fases de un reporte:
+
+1. Los datos se consultan UNA vez en el proceso web (DatosReporte) y se
+   comparten entre el generador elegido, sus alternativas y las secciones.
+2. El renderizado se hace en un ProcessPoolExecutor:
+   - renderizar(): ejecuta el generador preferido en un worker y sólo si
+     falla o supera REPORTES_TIMEOUT envía la alternativa siguiente; las
+     alternativas que no hacen falta no ocupan workers.
+   - renderizar_secciones(): divide el reporte en secciones independientes
+     (resumen, gráficos, tablas de detalle en bloques de FILAS_POR_SECCION)
+     que se renderizan en paralelo y se unen con pypdf. Sin pypdf, o con
+     REPORTES_PROCESOS=0, las mismas secciones se construyen en un único
+     documento dentro del proceso.
+
+Los workers sólo importan este módulo y ReportLab, nunca app.py.
+"""
+
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeout
+from datetime import datetime
+from io import BytesIO
+
+try:
+    from pypdf import PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+REPORTES_PROCESOS = int(os.environ.get('REPORTES_PROCESOS', str(min(4, os.cpu_count() or 1))))
+REPORTES_TIMEOUT = float(os.environ.get('REPORTES_TIMEOUT', '60'))
+FILAS_POR_SECCION = int(os.environ.get('FILAS_POR_SECCION', '500'))
+
+# Generadores conocidos: nombre -> (módulo, función con firma
+# (ambiente, seguridad, accesos, desde, hasta, resumen=None) -> bytes PDF o None)
+GENERADORES = {
+    'avanzado': ('pdf_generator', 'generate_professional_pdf'),
+    'mejorado': ('enhanced_pdf', 'create_enhanced_pdf_report'),
+    'profesional': ('professional_pdf_generator', 'generate_production_pdf_report'),
+    'simple': ('simple_production_pdf', 'generate_simple_production_pdf_report'),
+}
+
+
+class DatosReporte:
+    """Datos de un reporte, consultados una vez y enviados a los workers"""
+
+    def __init__(self, ambiente, seguridad, accesos, desde=None, hasta=None, resumen=None):
+        self.ambiente = list(ambiente or [])
+        self.seguridad = list(seguridad or [])
+        self.accesos = list(accesos or [])
+        self.desde = desde
+        self.hasta = hasta
+        self.resumen = resumen  # ResumenReporte de datos_agregados, o None
+
+    def argumentos(self):
+        return self.ambiente, self.seguridad, self.accesos, self.desde, self.hasta
+
+
+# ---------------------------------------------------------------------------
+# Funciones ejecutadas en los workers (deben ser de nivel de módulo)
+# ---------------------------------------------------------------------------
+
+def _iniciar_worker():
+    """Importar ReportLab al crear el proceso y no en el primer reporte"""
+    import reportlab.platypus  # noqa: F401
+
+
+def _ejecutar_generador(nombre, datos):
+    modulo, funcion = GENERADORES[nombre]
+    generador = getattr(importlib.import_module(modulo), funcion)
+    return generador(*datos.argumentos(), resumen=datos.resumen)
+
+
+def _ejecutar_seccion(nombre, argumentos):
+    """Cada sección es un PDF independiente que empieza en página nueva"""
+    return _documento(SECCIONES[nombre](*argumentos))
+
+
+# ---------------------------------------------------------------------------
+# Secciones
+# ---------------------------------------------------------------------------
+
+def _estilos():
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.colors import HexColor
+    estilos = getSampleStyleSheet()
+    titulo = ParagraphStyle('SeccionTitulo', parent=estilos['Heading1'], fontSize=16,
+                            textColor=HexColor('#1B5E20'), spaceAfter=12)
+    return estilos, titulo
+
+
+def _documento(story):
+    """Construir un PDF A4 a partir de una lista de flowables"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm,
+                            topMargin=2*cm, bottomMargin=2*cm)
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _numeros(filas, campo):
+    return [float(f[campo]) for f in filas if f.get(campo) is not None]
+
+
+def _tabla(encabezado, filas, anchos):
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+    tabla = Table([encabezado] + filas, colWidths=anchos, repeatRows=1)
+    tabla.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E7D32')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#BDBDBD')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F1F8E9')]),
+    ]))
+    return tabla
+
+
+def seccion_resumen(ambiente, seguridad, accesos, desde, hasta):
+    """Portada y tabla de estadísticas generales"""
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, Spacer
+    estilos, titulo = _estilos()
+    story = [Paragraph("🌿 REPORTE DEL INVERNADERO IoT", titulo),
+             Paragraph(f"Generado: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", estilos['Normal'])]
+    if desde and hasta:
+        story.append(Paragraph(f"Período: {desde} ➜ {hasta}", estilos['Normal']))
+    story.append(Spacer(1, 0.6*cm))
+
+    filas = [['Registros ambiente', f'{len(ambiente):,}', '', ''],
+             ['Eventos seguridad', f'{len(seguridad):,}', '', ''],
+             ['Registros acceso', f'{len(accesos):,}', '', '']]
+    for campo, unidad in (('temperatura', '°C'), ('humedad', '%')):
+        valores = _numeros(ambiente, campo)
+        if valores:
+            filas.append([campo.capitalize(), f'{sum(valores) / len(valores):.1f}{unidad}',
+                          f'{min(valores):.1f}{unidad}', f'{max(valores):.1f}{unidad}'])
+    if ambiente:
+        encendida = sum(1 for f in ambiente if f.get('estado_bomba') == 'Encendida')
+        filas.append(['Bomba encendida', f'{encendida * 100 / len(ambiente):.1f}% de lecturas', '', ''])
+    story.append(_tabla(['Métrica', 'Valor / Promedio', 'Mínimo', 'Máximo'], filas,
+                        [5*cm, 4.5*cm, 3*cm, 3*cm]))
+    return story
+
+
+def seccion_graficos(ambiente, puntos=200):
+    """Evolución de temperatura y humedad (submuestreada a `puntos`)"""
+    from reportlab.graphics.charts.lineplots import LinePlot
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph
+    estilos, titulo = _estilos()
+    story = [Paragraph("📈 EVOLUCIÓN DE LAS CONDICIONES", titulo)]
+    filas = [f for f in reversed(ambiente) if f.get('temperatura') is not None and f.get('humedad') is not None]
+    if len(filas) < 2:
+        return story
+    paso = max(1, len(filas) // puntos)
+    filas = filas[::paso]
+    for campo, color in (('temperatura', colors.HexColor('#E53935')), ('humedad', colors.HexColor('#1E88E5'))):
+        dibujo = Drawing(460, 180)
+        grafico = LinePlot()
+        grafico.x, grafico.y, grafico.width, grafico.height = 40, 20, 400, 140
+        grafico.data = [[(i, float(f[campo])) for i, f in enumerate(filas)]]
+        grafico.lines[0].strokeColor = color
+        dibujo.add(grafico)
+        story.append(Paragraph(campo.capitalize(), estilos['Heading3']))
+        story.append(dibujo)
+    return story
+
+
+def seccion_detalle(ambiente, inicio, total):
+    """Tabla de lecturas de ambiente (un bloque de filas)"""
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph
+    _, titulo = _estilos()
+    story = [Paragraph(f"📋 DETALLE DE LECTURAS ({inicio + 1:,}–{inicio + len(ambiente):,} de {total:,})", titulo)]
+    filas = [[str(f.get('fecha', '')), f"{f['temperatura']:.1f}" if f.get('temperatura') is not None else '-',
+              f"{f['humedad']:.1f}" if f.get('humedad') is not None else '-',
+              f.get('estado_bomba') or '-', f.get('alerta') or '-'] for f in ambiente]
+    story.append(_tabla(['Fecha', 'Temp. °C', 'Hum. %', 'Bomba', 'Alerta'], filas,
+                        [4*cm, 2*cm, 2*cm, 2.5*cm, 5*cm]))
+    return story
+
+
+def seccion_eventos(seguridad, accesos):
+    """Eventos de seguridad y registros de acceso"""
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, Spacer
+    _, titulo = _estilos()
+    story = [Paragraph("🔒 SEGURIDAD Y ACCESOS", titulo)]
+    if seguridad:
+        story.append(_tabla(['Fecha', 'Evento', 'Nivel', 'Descripción'],
+                            [[str(f.get('fecha', '')), f.get('tipo_evento') or '-', f.get('nivel_alerta') or '-',
+                              (f.get('descripcion') or '')[:60]] for f in seguridad],
+                            [4*cm, 3.5*cm, 2*cm, 6*cm]))
+        story.append(Spacer(1, 0.6*cm))
+    if accesos:
+        story.append(_tabla(['Fecha', 'Tarjeta', 'Persona', 'Autorizado'],
+                            [[str(f.get('fecha', '')), f.get('id_tarjeta') or '-', f.get('persona') or '-',
+                              'Sí' if f.get('acceso_autorizado') else 'No'] for f in accesos],
+                            [4*cm, 4*cm, 5*cm, 2.5*cm]))
+    return story
+
+
+SECCIONES = {
+    'resumen': seccion_resumen,
+    'graficos': seccion_graficos,
+    'detalle': seccion_detalle,
+    'eventos': seccion_eventos,
+}
+
+
+def planificar_secciones(datos):
+    """Lista ordenada de (sección, argumentos); el detalle va en bloques"""
+    plan = [('resumen', datos.argumentos()), ('graficos', (datos.ambiente,))]
+    total = len(datos.ambiente)
+    for inicio in range(0, total, FILAS_POR_SECCION):
+        plan.append(('detalle', (datos.ambiente[inicio:inicio + FILAS_POR_SECCION], inicio, total)))
+    if datos.seguridad or datos.accesos:
+        plan.append(('eventos', (datos.seguridad, datos.accesos)))
+    return plan
+
+
+def unir_pdfs(partes):
+    """Concatenar las páginas de varios PDF en uno"""
+    escritor = PdfWriter()
+    for parte in partes:
+        escritor.append(BytesIO(parte))
+    salida = BytesIO()
+    escritor.write(salida)
+    return salida.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Pool de procesos
+# ---------------------------------------------------------------------------
+
+class PipelineReportes:
+    """Pool de procesos compartido para renderizar reportes"""
+
+    def __init__(self, procesos=REPORTES_PROCESOS, timeout=REPORTES_TIMEOUT):
+        self.procesos = procesos
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self.ultimo_ms = None
+
+    @property
+    def activo(self):
+        return self.procesos > 0
+
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=_iniciar_worker)
+        return self._pool
+
+    def precalentar(self):
+        """Crear los workers (e importar ReportLab en ellos) antes del primer reporte"""
+        if self.activo:
+            for futuro in [self.pool().submit(_iniciar_worker) for _ in range(self.procesos)]:
+                futuro.result()
+
+    def cerrar(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def renderizar(self, preferidos, datos):
+        """(nombre, pdf) del primer generador de `preferidos` que produzca un PDF
+
+        Cada candidato se envía al pool cuando el anterior falla o supera
+        self.timeout; uno que agota el tiempo se cancela o, si ya empezó, se
+        abandona (el worker lo termina y su resultado se descarta). Devuelve
+        (None, None) si ninguno sirve.
+        """
+        inicio = time.perf_counter()
+        candidatos = [n for n in preferidos if n in GENERADORES]
+        try:
+            if not self.activo:
+                for nombre in candidatos:
+                    try:
+                        pdf = _ejecutar_generador(nombre, datos)
+                    except Exception as e:
+                        print(f"⚠️ Generador '{nombre}' falló: {e}")
+                        continue
+                    if pdf:
+                        return nombre, pdf
+                return None, None
+
+            for nombre in candidatos:
+                futuro = self.pool().submit(_ejecutar_generador, nombre, datos)
+                try:
+                    pdf = futuro.result(timeout=self.timeout)
+                except FuturoTimeout:
+                    futuro.cancel()
+                    print(f"⚠️ Generador '{nombre}' superó {self.timeout:.0f} s")
+                    continue
+                except Exception as e:
+                    print(f"⚠️ Generador '{nombre}' falló: {e}")
+                    continue
+                if pdf:
+                    return nombre, pdf
+            return None, None
+        finally:
+            self.ultimo_ms = round((time.perf_counter() - inicio) * 1000, 1)
+
+    def renderizar_secciones(self, datos):
+        """PDF con las secciones de planificar_secciones() renderizadas en paralelo"""
+        inicio = time.perf_counter()
+        plan = planificar_secciones(datos)
+        try:
+            if not (self.activo and PYPDF_AVAILABLE):
+                from reportlab.platypus import PageBreak
+                story = []
+                for nombre, argumentos in plan:
+                    if story:
+                        story.append(PageBreak())
+                    story.extend(SECCIONES[nombre](*argumentos))
+                return _documento(story)
+            futuros = [self.pool().submit(_ejecutar_seccion, nombre, argumentos) for nombre, argumentos in plan]
+            try:
+                partes = [f.result(timeout=self.timeout) for f in futuros]
+            finally:
+                for futuro in futuros:
+                    futuro.cancel()
+            return unir_pdfs(partes)
+        finally:
+            self.ultimo_ms = round((time.perf_counter() - inicio) * 1000, 1)
+
+
+pipeline = PipelineReportes()
@@ -13,6 +13,8 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.colors import HexColor
 from reportlab.pdfgen import canvas
 
+from datos_agregados import ResumenReporte
+
 
 class ProductionPDFGenerator:
     """Generador de PDF que replica exactamente el diseño de producción"""
@@ -96,9 +98,9 @@ class ProductionPDFGenerator:
         text_obj.textLine(text)
         canvas.drawText(text_obj)
 
-    def create_summary_table(self, ambiente_data):
+    def create_summary_table(self, resumen):
         """Crear tabla de resumen ejecutivo exactamente como en la imagen"""
-        if not ambiente_data:
+        if not resumen.total:
             # Tabla vacía si no hay datos
             data = [
                 ['Métrica', 'Valor', 'Unidad'],
@@ -112,24 +114,15 @@ class ProductionPDFGenerator:
                 ['Activaciones de Riego', '0', 'veces'],
             ]
         else:
-            # Calcular estadísticas
-            temps = [float(r.get('temperatura', 0)) for r in ambiente_data if r.get('temperatura')]
-            hums = [float(r.get('humedad', 0)) for r in ambiente_data if r.get('humedad')]
-            
-            total_registros = len(ambiente_data)
-            temp_promedio = sum(temps) / len(temps) if temps else 0
-            temp_maxima = max(temps) if temps else 0
-            temp_minima = min(temps) if temps else 0
-            hum_promedio = sum(hums) / len(hums) if hums else 0
-            hum_maxima = max(hums) if hums else 0
-            hum_minima = min(hums) if hums else 0
-            
-            # Contar activaciones de riego - revisar múltiples nombres posibles
-            activaciones_riego = len([r for r in ambiente_data if 
-                                     r.get('bomba') == 'Encendida' or 
-                                     r.get('estado_bomba') == 'Encendida' or
-                                     str(r.get('bomba', '')).lower() == 'encendida' or
-                                     str(r.get('estado_bomba', '')).lower() == 'encendida'])
+            # Estadísticas del período completo
+            total_registros = resumen.total
+            temp_promedio = resumen.temperatura['promedio'] or 0
+            temp_maxima = resumen.temperatura['maximo'] or 0
+            temp_minima = resumen.temperatura['minimo'] or 0
+            hum_promedio = resumen.humedad['promedio'] or 0
+            hum_maxima = resumen.humedad['maximo'] or 0
+            hum_minima = resumen.humedad['minimo'] or 0
+            activaciones_riego = resumen.activaciones_bomba
             
             # Datos de la tabla - exacto formato de la imagen
             data = [
@@ -143,6 +136,9 @@ class ProductionPDFGenerator:
                 ['Humedad Mínima', f'{hum_minima:.1f}', '%'],
                 ['Activaciones de Riego', str(activaciones_riego), 'veces'],
             ]
+            if resumen.bomba_segundos is not None:
+                data.append(['Tiempo de Riego', f'{resumen.bomba_segundos / 60:.0f}', 'min'])
+                data.append(['Ciclo de Trabajo Bomba', f'{resumen.porcentaje_bomba:.1f}', '%'])
         
         # Crear tabla
         table = Table(data, colWidths=[4*cm, 2*cm, 2*cm])
@@ -185,10 +181,10 @@ class ProductionPDFGenerator:
         
         # Añadir datos
         for registro in recent_data:
-            fecha = registro.get('fecha', '').replace('T', ' ').split('.')[0]
+            fecha = str(registro.get('fecha', '')).replace('T', ' ').split('.')[0]
             temperatura = f"{float(registro.get('temperatura', 0)):.1f}°C"
             humedad = f"{float(registro.get('humedad', 0)):.1f}%"
-            bomba = registro.get('bomba', 'Apagada')
+            bomba = registro.get('bomba') or registro.get('estado_bomba') or 'Apagada'
             
             # Generar alertas basadas en valores
             alertas = []
@@ -256,8 +252,11 @@ class ProductionPDFGenerator:
         table.setStyle(TableStyle(style_commands))
         return table
 
-    def generate_production_report(self, ambiente_data, seguridad_data=None, acceso_data=None, desde=None, hasta=None):
+    def generate_production_report(self, ambiente_data, seguridad_data=None, acceso_data=None, desde=None, hasta=None,
+                                   resumen=None):
         """Generar reporte PDF con el diseño exacto de producción"""
+        if resumen is None:
+            resumen = ResumenReporte.desde_filas(ambiente_data, seguridad_data, acceso_data)
         buffer = BytesIO()
         
         # Crear documento simple sin encabezados automáticos
@@ -327,7 +326,7 @@ class ProductionPDFGenerator:
         story.append(Spacer(1, 5*mm))
         
         # Tabla de resumen
-        summary_table = self.create_summary_table(ambiente_data)
+        summary_table = self.create_summary_table(resumen)
         if summary_table:
             story.append(summary_table)
         
@@ -384,11 +383,13 @@ class ProductionPDFGenerator:
             return None
 
 
-def generate_production_pdf_report(ambiente_data, seguridad_data=None, acceso_data=None, desde=None, hasta=None):
+def generate_production_pdf_report(ambiente_data, seguridad_data=None, acceso_data=None, desde=None, hasta=None,
+                                   resumen=None):
     """Función principal para generar PDF con diseño de producción"""
     try:
         generator = ProductionPDFGenerator()
-        return generator.generate_production_report(ambiente_data, seguridad_data, acceso_data, desde, hasta)
+        return generator.generate_production_report(ambiente_data, seguridad_data, acceso_data, desde, hasta,
+                                                    resumen)
     except Exception as e:
         print(f"Error en generador PDF de producción: {e}")
         return None
\ No newline at end of file
@@ -0,0 +1,287 @@
+"""
+📜 REPORTE PDF EN FLUJO - PÁGINA A PÁGINA CON MEMORIA ACOTADA
+=============================================================
+Los generadores con ReportLab construyen la lista completa de flowables y
+el documento entero en memoria (el canvas guarda todas las páginas hasta
+save()), así que un reporte de un año mantiene cada fila, cada Table y el
+PDF completo en RAM antes de enviar el primer byte.
+
+Este módulo escribe un PDF sencillo de forma incremental:
+
+- Las filas llegan de un iterador (cursor del lado del servidor), nunca
+  como lista completa.
+- Cada página se comprime y se escribe en el destino al cerrarse; sólo se
+  guardan los desplazamientos de los objetos para la tabla xref final.
+- El destino es un SpooledTemporaryFile: en memoria hasta
+  REPORTE_FLUJO_MEMORIA bytes, en disco a partir de ahí.
+- transmitir() lo envía en bloques (transferencia chunked).
+
+El resumen estadístico se calcula mientras pasan las filas y va en la
+última página. Usa las fuentes estándar del PDF (Helvetica, WinAnsi), sin
+ReportLab, por lo que funciona aunque éste no esté instalado.
+"""
+
+import os
+import tempfile
+import zlib
+from datetime import datetime
+
+REPORTE_FLUJO_MEMORIA = int(os.environ.get('REPORTE_FLUJO_MEMORIA', str(8 * 1024 * 1024)))
+TAMANO_BLOQUE = 64 * 1024
+
+ANCHO_A4, ALTO_A4 = 595, 842
+MARGEN = 40
+ALTO_FILA = 12
+
+VERDE = (0.18, 0.49, 0.20)
+VERDE_CLARO = (0.945, 0.973, 0.914)
+
+
+def _escapar(texto):
+    texto = str(texto).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return texto.encode('cp1252', 'replace')
+
+
+def _color(rgb, operador):
+    return ('%.3f %.3f %.3f %s' % (rgb + (operador,))).encode('ascii')
+
+
+class EscritorPDF:
+    """PDF mínimo que se escribe página a página en un archivo binario"""
+
+    # Objetos fijos: 1 catálogo, 2 árbol de páginas, 3-4 fuentes
+    FUENTES = {'F1': 'Helvetica', 'F2': 'Helvetica-Bold'}
+
+    def __init__(self, destino, ancho=ANCHO_A4, alto=ALTO_A4):
+        self.destino = destino
+        self.ancho = ancho
+        self.alto = alto
+        self.desplazamientos = {}
+        self.paginas = []
+        self.siguiente = 5
+        self.contenido = None
+        self._escribir(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        for numero, (clave, nombre) in enumerate(self.FUENTES.items(), start=3):
+            self._objeto(numero, f'<< /Type /Font /Subtype /Type1 /BaseFont /{nombre} '
+                                 f'/Encoding /WinAnsiEncoding >>'.encode('ascii'))
+
+    def _escribir(self, datos):
+        self.destino.write(datos)
+
+    def _objeto(self, numero, cuerpo):
+        self.desplazamientos[numero] = self.destino.tell()
+        self._escribir(b'%d 0 obj\n' % numero + cuerpo + b'\nendobj\n')
+
+    def _reservar(self):
+        numero = self.siguiente
+        self.siguiente += 1
+        return numero
+
+    # --- Páginas ---------------------------------------------------------
+
+    def nueva_pagina(self):
+        self.cerrar_pagina()
+        self.contenido = []
+
+    def cerrar_pagina(self):
+        """Comprimir y escribir la página actual; después sólo queda su número"""
+        if self.contenido is None:
+            return
+        datos = zlib.compress(b'\n'.join(self.contenido), 6)
+        numero_contenido, numero_pagina = self._reservar(), self._reservar()
+        self._objeto(numero_contenido, b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(datos)
+                     + datos + b'\nendstream')
+        fuentes = ' '.join(f'/{clave} {n} 0 R' for n, clave in enumerate(self.FUENTES, start=3))
+        self._objeto(numero_pagina, (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.ancho} {self.alto}] '
+                                     f'/Resources << /Font << {fuentes} >> >> '
+                                     f'/Contents {numero_contenido} 0 R >>').encode('ascii'))
+        self.paginas.append(numero_pagina)
+        self.contenido = None
+
+    # --- Dibujo ----------------------------------------------------------
+
+    def texto(self, x, y, texto, tamano=8, negrita=False, color=(0, 0, 0)):
+        fuente = 'F2' if negrita else 'F1'
+        self.contenido.append(b'BT ' + _color(color, 'rg') +
+                              b' /%s %d Tf %.2f %.2f Td (' % (fuente.encode(), tamano, x, y) +
+                              _escapar(texto) + b') Tj ET')
+
+    def rectangulo(self, x, y, ancho, alto, color):
+        self.contenido.append(_color(color, 'rg') + b' %.2f %.2f %.2f %.2f re f' % (x, y, ancho, alto))
+
+    # --- Cierre ----------------------------------------------------------
+
+    def cerrar(self):
+        """Escribir árbol de páginas, catálogo, xref y trailer"""
+        self.cerrar_pagina()
+        hijos = ' '.join(f'{n} 0 R' for n in self.paginas)
+        self._objeto(2, f'<< /Type /Pages /Kids [{hijos}] /Count {len(self.paginas)} >>'.encode('ascii'))
+        self._objeto(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        inicio_xref = self.destino.tell()
+        self._escribir(b'xref\n0 %d\n0000000000 65535 f \n' % self.siguiente)
+        for numero in range(1, self.siguiente):
+            self._escribir(b'%010d 00000 n \n' % self.desplazamientos[numero])
+        self._escribir(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                       % (self.siguiente, inicio_xref))
+
+
+class TablaEnFlujo:
+    """Tabla que ocupa tantas páginas como haga falta, repitiendo el encabezado"""
+
+    def __init__(self, pdf, titulo, columnas):
+        self.pdf = pdf
+        self.titulo = titulo
+        self.columnas = columnas      # [(encabezado, ancho), ...]
+        self.filas = 0
+        self.y = None
+
+    def _encabezado(self, continuacion=False):
+        pdf = self.pdf
+        pdf.nueva_pagina()
+        y = pdf.alto - MARGEN
+        pdf.texto(MARGEN, y - 12, self.titulo + (' (cont.)' if continuacion else ''), tamano=13,
+                  negrita=True, color=VERDE)
+        pdf.texto(pdf.ancho - MARGEN - 50, MARGEN - 20, f'Página {len(pdf.paginas) + 1}', tamano=7)
+        y -= 36
+        pdf.rectangulo(MARGEN, y - 3, pdf.ancho - 2 * MARGEN, ALTO_FILA + 2, VERDE)
+        x = MARGEN + 3
+        for encabezado, ancho in self.columnas:
+            pdf.texto(x, y, encabezado, negrita=True, color=(1, 1, 1))
+            x += ancho
+        self.y = y - ALTO_FILA - 2
+
+    def fila(self, valores):
+        if self.y is None or self.y < MARGEN:
+            self._encabezado(continuacion=self.y is not None)
+        pdf = self.pdf
+        if self.filas % 2:
+            pdf.rectangulo(MARGEN, self.y - 3, pdf.ancho - 2 * MARGEN, ALTO_FILA, VERDE_CLARO)
+        x = MARGEN + 3
+        for (_, ancho), valor in zip(self.columnas, valores):
+            texto = '-' if valor is None else str(valor)
+            maximo = int(ancho / 4.2)
+            pdf.texto(x, self.y, texto if len(texto) <= maximo else texto[:maximo - 1] + '…')
+            x += ancho
+        self.y -= ALTO_FILA
+        self.filas += 1
+
+    def terminar(self):
+        if self.y is None:
+            self._encabezado()
+            self.pdf.texto(MARGEN + 3, self.y, 'Sin registros en el período')
+
+
+class ResumenIncremental:
+    """Estadísticas de ambiente acumuladas mientras se escriben las filas"""
+
+    def __init__(self):
+        self.total = 0
+        self.bomba_encendida = 0
+        self.metricas = {'temperatura': [0, 0.0, None, None], 'humedad': [0, 0.0, None, None]}
+        self.primera = self.ultima = None
+
+    def agregar(self, fila):
+        self.total += 1
+        if fila.get('estado_bomba') == 'Encendida':
+            self.bomba_encendida += 1
+        for campo, acumulado in self.metricas.items():
+            valor = fila.get(campo)
+            if valor is None:
+                continue
+            valor = float(valor)
+            acumulado[0] += 1
+            acumulado[1] += valor
+            acumulado[2] = valor if acumulado[2] is None else min(acumulado[2], valor)
+            acumulado[3] = valor if acumulado[3] is None else max(acumulado[3], valor)
+        fecha = fila.get('fecha')
+        if fecha is not None:
+            self.primera = self.primera or fecha
+            self.ultima = fecha
+
+    def lineas(self):
+        yield f'Lecturas de ambiente: {self.total:,}'
+        if self.primera is not None:
+            yield f'Primera lectura: {self.primera}    Última lectura: {self.ultima}'
+        for campo, (n, suma, minimo, maximo) in self.metricas.items():
+            if n:
+                yield f'{campo.capitalize()}: promedio {suma / n:.2f}, mínimo {minimo:.1f}, máximo {maximo:.1f}'
+        if self.total:
+            yield f'Bomba encendida en {self.bomba_encendida * 100 / self.total:.1f}% de las lecturas'
+
+
+def _fecha(valor):
+    return valor.strftime('%Y-%m-%d %H:%M:%S') if isinstance(valor, datetime) else valor
+
+
+def _numero(valor):
+    return None if valor is None else f'{float(valor):.1f}'
+
+
+COLUMNAS_AMBIENTE = [('Fecha', 110), ('Temp. °C', 60), ('Hum. %', 60), ('Bomba', 75), ('Alerta', 210)]
+COLUMNAS_SEGURIDAD = [('Fecha', 110), ('Evento', 110), ('Nivel', 60), ('Descripción', 235)]
+COLUMNAS_ACCESO = [('Fecha', 110), ('Tarjeta', 100), ('Persona', 160), ('Autorizado', 145)]
+
+
+def escribir_reporte(destino, filas_tabla, desde=None, hasta=None):
+    """Escribir el reporte completo en `destino` leyendo las filas en flujo
+
+    `filas_tabla(tabla)` devuelve un iterador de filas dict en orden
+    cronológico. Devuelve (páginas, lecturas de ambiente).
+    """
+    pdf = EscritorPDF(destino)
+    resumen = ResumenIncremental()
+    periodo = f'{desde} a {hasta}' if desde and hasta else 'todo el historial'
+
+    tabla = TablaEnFlujo(pdf, f'Lecturas de ambiente - {periodo}', COLUMNAS_AMBIENTE)
+    for f in filas_tabla('registros_ambiente'):
+        resumen.agregar(f)
+        tabla.fila((_fecha(f.get('fecha')), _numero(f.get('temperatura')), _numero(f.get('humedad')),
+                    f.get('estado_bomba'), f.get('alerta')))
+    tabla.terminar()
+
+    eventos = 0
+    tabla = TablaEnFlujo(pdf, 'Eventos de seguridad', COLUMNAS_SEGURIDAD)
+    for f in filas_tabla('registros_seguridad'):
+        eventos += 1
+        tabla.fila((_fecha(f.get('fecha')), f.get('tipo_evento'), f.get('nivel_alerta'), f.get('descripcion')))
+    tabla.terminar()
+
+    accesos = 0
+    tabla = TablaEnFlujo(pdf, 'Registros de acceso', COLUMNAS_ACCESO)
+    for f in filas_tabla('registros_acceso'):
+        accesos += 1
+        tabla.fila((_fecha(f.get('fecha')), f.get('id_tarjeta'), f.get('persona'),
+                    'Sí' if f.get('acceso_autorizado') else 'No'))
+    tabla.terminar()
+
+    # Resumen al final: se conoce sólo después de recorrer las filas
+    pdf.nueva_pagina()
+    y = pdf.alto - MARGEN - 12
+    pdf.texto(MARGEN, y, 'Reporte del Invernadero IoT - Resumen del período', tamano=14, negrita=True, color=VERDE)
+    y -= 22
+    lineas = [f'Generado: {datetime.now().strftime("%d/%m/%Y %H:%M:%S")}', f'Período: {periodo}']
+    lineas += list(resumen.lineas())
+    lineas += [f'Eventos de seguridad: {eventos:,}', f'Registros de acceso: {accesos:,}']
+    for linea in lineas:
+        pdf.texto(MARGEN, y, linea, tamano=10)
+        y -= 16
+    pdf.cerrar()
+    return len(pdf.paginas), resumen.total
+
+
+def archivo_temporal():
+    """Destino del reporte: en memoria hasta REPORTE_FLUJO_MEMORIA, luego en disco"""
+    return tempfile.SpooledTemporaryFile(max_size=REPORTE_FLUJO_MEMORIA)
+
+
+def transmitir(archivo, bloque=TAMANO_BLOQUE):
+    """Generador que envía el archivo desde el principio y lo cierra al final"""
+    try:
+        archivo.seek(0)
+        while True:
+            datos = archivo.read(bloque)
+            if not datos:
+                break
+            yield datos
+    finally:
+        archivo.close()
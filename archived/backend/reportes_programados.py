@@ -0,0 +1,207 @@
+"""
+🗓️ REPORTES PROGRAMADOS - PRERENDERIZADOS FUERA DE HORA PICO
+============================================================
+Los operadores descargan cada mañana los mismos reportes del día o de la
+semana anterior y cada descarga los renderiza de nuevo en plena hora pico.
+
+ProgramadorReportes es un hilo que, al arrancar y una vez al día a
+REPORTES_HORA (madrugada por defecto), genera el último período cerrado
+de cada reporte de PROGRAMACION con los generadores existentes, lo guarda
+en REPORTES_DIRECTORIO y borra las copias que superan su retención. El
+catálogo (/api/reports/catalog) lista lo disponible y cada PDF se sirve
+desde disco sin volver a renderizar: un período cerrado nunca cambia.
+
+Cada PDF va acompañado de un .json con sus metadatos; el catálogo se
+reconstruye desde esos archivos al arrancar. Los archivos se escriben con
+nombre temporal y os.replace(), así que nunca se sirve un PDF a medias.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+REPORTES_DIRECTORIO = os.environ.get(
+    'REPORTES_DIRECTORIO', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reportes_generados'))
+REPORTES_HORA = os.environ.get('REPORTES_HORA', '03:15')
+
+# Reportes prerenderizados: generadores en orden de preferencia y copias que se conservan
+PROGRAMACION = {
+    'diario': {
+        'titulo': 'Resumen diario',
+        'periodo': 'dia',
+        'generadores': ['profesional', 'mejorado', 'simple'],
+        'retencion': 14,
+    },
+    'semanal': {
+        'titulo': 'Tendencia semanal',
+        'periodo': 'semana',
+        'generadores': ['avanzado', 'mejorado', 'simple'],
+        'retencion': 8,
+    },
+    'mensual': {
+        'titulo': 'Cumplimiento mensual',
+        'periodo': 'mes',
+        'generadores': ['mejorado', 'profesional', 'simple'],
+        'retencion': 12,
+    },
+}
+
+
+def periodo_cerrado(periodo, ahora=None):
+    """(desde, hasta) del último día/semana/mes completo antes de `ahora`"""
+    ahora = ahora or datetime.now()
+    hoy = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
+    if periodo == 'dia':
+        inicio, fin = hoy - timedelta(days=1), hoy
+    elif periodo == 'semana':
+        fin = hoy - timedelta(days=hoy.weekday())        # lunes de esta semana
+        inicio = fin - timedelta(days=7)
+    elif periodo == 'mes':
+        fin = hoy.replace(day=1)
+        inicio = (fin - timedelta(days=1)).replace(day=1)
+    else:
+        raise ValueError(f"Período desconocido: {periodo}")
+    return inicio, fin - timedelta(seconds=1)
+
+
+def proxima_ejecucion(ahora=None, hora=REPORTES_HORA):
+    """Próximo instante HH:MM a partir de `ahora`"""
+    ahora = ahora or datetime.now()
+    horas, minutos = (int(x) for x in hora.split(':'))
+    siguiente = ahora.replace(hour=horas, minute=minutos, second=0, microsecond=0)
+    if siguiente <= ahora:
+        siguiente += timedelta(days=1)
+    return siguiente
+
+
+class CatalogoReportes:
+    """Reportes generados en disco, con sus metadatos en memoria"""
+
+    def __init__(self, directorio=REPORTES_DIRECTORIO, programacion=PROGRAMACION):
+        self.directorio = directorio
+        self.programacion = programacion
+        self.lock = threading.Lock()
+        self.entradas = {}  # archivo -> metadatos
+        os.makedirs(directorio, exist_ok=True)
+        self.cargar()
+
+    def cargar(self):
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre), encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if os.path.exists(os.path.join(self.directorio, meta.get('archivo', ''))):
+                self.entradas[meta['archivo']] = meta
+
+    @staticmethod
+    def nombre_archivo(reporte, desde):
+        return f"{reporte}_{desde.strftime('%Y%m%d')}.pdf"
+
+    def existe(self, reporte, desde):
+        return self.nombre_archivo(reporte, desde) in self.entradas
+
+    def guardar(self, reporte, desde, hasta, pdf, generador, duracion_ms):
+        archivo = self.nombre_archivo(reporte, desde)
+        meta = {
+            'archivo': archivo,
+            'reporte': reporte,
+            'titulo': self.programacion[reporte]['titulo'],
+            'periodo': self.programacion[reporte]['periodo'],
+            'desde': desde.isoformat(sep=' '),
+            'hasta': hasta.isoformat(sep=' '),
+            'generado': datetime.now().isoformat(sep=' ', timespec='seconds'),
+            'generador': generador,
+            'bytes': len(pdf),
+            'duracion_ms': duracion_ms,
+        }
+        ruta = os.path.join(self.directorio, archivo)
+        for destino, contenido in ((ruta, pdf), (ruta[:-4] + '.json', json.dumps(meta, ensure_ascii=False).encode('utf-8'))):
+            temporal = destino + '.tmp'
+            with open(temporal, 'wb') as f:
+                f.write(contenido)
+            os.replace(temporal, destino)
+        with self.lock:
+            self.entradas[archivo] = meta
+        return meta
+
+    def aplicar_retencion(self, reporte):
+        """Borrar las copias más antiguas que superan la retención del reporte"""
+        retencion = self.programacion[reporte]['retencion']
+        with self.lock:
+            propias = sorted((m for m in self.entradas.values() if m['reporte'] == reporte),
+                             key=lambda m: m['desde'], reverse=True)
+            sobrantes = propias[retencion:]
+            for meta in sobrantes:
+                del self.entradas[meta['archivo']]
+        for meta in sobrantes:
+            ruta = os.path.join(self.directorio, meta['archivo'])
+            for archivo in (ruta, ruta[:-4] + '.json'):
+                try:
+                    os.remove(archivo)
+                except FileNotFoundError:
+                    pass
+        return len(sobrantes)
+
+    def listar(self, reporte=None):
+        """Metadatos de los reportes disponibles, del más reciente al más antiguo"""
+        with self.lock:
+            entradas = [m for m in self.entradas.values() if reporte is None or m['reporte'] == reporte]
+        return sorted(entradas, key=lambda m: (m['desde'], m['reporte']), reverse=True)
+
+
+class ProgramadorReportes:
+    """Hilo que genera los reportes de PROGRAMACION una vez al día"""
+
+    def __init__(self, catalogo, renderizar, hora=REPORTES_HORA):
+        # renderizar(generadores, desde, hasta) -> (nombre_generador, pdf) o (None, None)
+        self.catalogo = catalogo
+        self.renderizar = renderizar
+        self.hora = hora
+        self.detener = threading.Event()
+        self.hilo = None
+        self.ultima_ejecucion = None
+        self.proxima = None
+
+    def generar_pendientes(self, ahora=None):
+        """Renderizar el último período cerrado de cada reporte que falte"""
+        generados = []
+        for reporte, config in self.catalogo.programacion.items():
+            desde, hasta = periodo_cerrado(config['periodo'], ahora)
+            if self.catalogo.existe(reporte, desde):
+                continue
+            inicio = time.perf_counter()
+            try:
+                generador, pdf = self.renderizar(config['generadores'], desde, hasta)
+            except Exception as e:
+                print(f"⚠️ Reporte programado '{reporte}' falló: {e}")
+                continue
+            if not pdf:
+                print(f"⚠️ Ningún generador produjo el reporte '{reporte}'")
+                continue
+            duracion_ms = round((time.perf_counter() - inicio) * 1000, 1)
+            generados.append(self.catalogo.guardar(reporte, desde, hasta, pdf, generador, duracion_ms))
+            self.catalogo.aplicar_retencion(reporte)
+            print(f"🗓️ Reporte '{reporte}' {desde:%Y-%m-%d} generado en {duracion_ms} ms ({generador})")
+        self.ultima_ejecucion = datetime.now()
+        return generados
+
+    def _bucle(self):
+        # Al arrancar, los períodos que se cerraron con el servidor parado
+        self.generar_pendientes()
+        while not self.detener.is_set():
+            self.proxima = proxima_ejecucion(hora=self.hora)
+            if self.detener.wait((self.proxima - datetime.now()).total_seconds()):
+                break
+            self.generar_pendientes()
+
+    def iniciar(self):
+        if self.hilo is None:
+            self.hilo = threading.Thread(target=self._bucle, name='reportes-programados', daemon=True)
+            self.hilo.start()
+        return self
@@ -238,6 +238,7 @@ def generate_exact_production_pdf(ambiente_data):
         return None
 
 
-def generate_simple_production_pdf_report(ambiente_data, seguridad_data=None, acceso_data=None, desde=None, hasta=None):
-    """Función wrapper para compatibilidad"""
+def generate_simple_production_pdf_report(ambiente_data, seguridad_data=None, acceso_data=None, desde=None, hasta=None,
+                                          resumen=None):
+    """Función wrapper para compatibilidad (el formato exacto no usa el resumen)"""
     return generate_exact_production_pdf(ambiente_data)
\ No newline at end of file
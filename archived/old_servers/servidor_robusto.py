@@ -5,6 +5,7 @@ Servidor robusto para el sistema de invernadero
 
 import socket
 from http.server import HTTPServer, BaseHTTPRequestHandler
+import gzip
 import json
 import urllib.parse
 import os
@@ -35,13 +36,21 @@ class RobustInvernaderoHandler(BaseHTTPRequestHandler):
     def send_json_response(self, data, status=200):
         """Enviar respuesta JSON"""
         try:
+            json_data = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+            comprimir = len(json_data) >= 1024 and 'gzip' in self.headers.get('Accept-Encoding', '')
+            if comprimir:
+                json_data = gzip.compress(json_data, compresslevel=6)
+            
             self.send_response(status)
             self.send_header('Content-type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(json_data)))
+            self.send_header('Vary', 'Accept-Encoding')
+            if comprimir:
+                self.send_header('Content-Encoding', 'gzip')
             self.send_cors_headers()
             self.end_headers()
             
-            json_data = json.dumps(data, ensure_ascii=False, indent=2)
-            self.wfile.write(json_data.encode('utf-8'))
+            self.wfile.write(json_data)
             print(f"✅ Respuesta enviada: {len(json_data)} bytes")
         except Exception as e:
             print(f"❌ Error enviando respuesta: {e}")
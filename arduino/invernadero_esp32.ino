@@ -1,9 +1,12 @@
 #include <WiFi.h>
 #include <HTTPClient.h>
+#include <WiFiClientSecure.h>
+#include <WiFiUdp.h>
 #include <ArduinoJson.h>
 #include <DHT.h>
 #include <SPI.h>
 #include <MFRC522.h>
+#include <Preferences.h>
 
 // ===========================================
 // CONFIGURACIÓN DE PINES
@@ -32,6 +35,27 @@ const char* ssid = "TU_WIFI_SSID";           // Cambiar por tu SSID
 const char* password = "TU_WIFI_PASSWORD";    // Cambiar por tu password
 const char* serverURL = "http://192.168.1.100:5000"; // IP del servidor Flask
 
+// Envío por UDP (ingesta_udp.py, UDP_PUERTO en el servidor): datagramas de
+// 29 bytes en lugar de una petición HTTP por lectura. Sin confirmación; el
+// servidor contabiliza las pérdidas con la secuencia.
+const bool ENVIO_UDP = false;
+const char* servidorUDP = "192.168.1.100";
+const uint16_t PUERTO_UDP = 5683;
+
+// Conexión persistente para las lecturas (HTTP/1.1 keep-alive): con
+// servidor_seguro_https.py el handshake TLS se hace una vez y no en cada
+// lectura. El servidor cierra la conexión tras 40 s sin peticiones
+// (KEEPALIVE_INACTIVIDAD), más que el intervalo de envío de 30 s.
+// Con un certificado propio, cambiar setInsecure() por setCACert(...).
+WiFiClientSecure clienteSeguro;
+WiFiClient clientePlano;
+HTTPClient httpLecturas;
+
+// Cuerpo MessagePack (cuerpo_binario.py) en lugar de JSON: claves enteras y
+// valores en centésimas, unos 50 bytes frente a ~170. Requiere el paquete
+// msgpack en el servidor (si no, responde 415).
+const bool ENVIO_MSGPACK = false;
+
 // ===========================================
 // INICIALIZACIÓN DE SENSORES
 // ===========================================
@@ -73,14 +97,92 @@ String nombresUsuarios[] = {
   "Supervisor"
 };
 
-// Timing para envío de datos
+// Timing para envío de datos: el servidor recomienda el intervalo en cada
+// respuesta (cabecera X-Intervalo-Muestreo, politica_muestreo.py): más largo
+// en periodos estables, más corto con alertas o cambios rápidos.
 unsigned long ultimoEnvio = 0;
-const unsigned long INTERVALO_ENVIO = 30000; // 30 segundos
+unsigned long intervaloEnvio = 30000; // 30 segundos hasta la primera recomendación
+const unsigned long INTERVALO_ENVIO_MIN = 5000;
+const unsigned long INTERVALO_ENVIO_MAX = 600000; // 10 minutos
+bool bombaEnviada = false;
+const char* alertaEnviada = "Normal";
 
 // Timing para lecturas de sensores
 unsigned long ultimaLectura = 0;
 const unsigned long INTERVALO_LECTURA = 5000; // 5 segundos
 
+// Ingesta idempotente: cada lectura lleva device_id + seq. La secuencia
+// combina un contador de arranques (guardado en flash) con un contador en
+// RAM, así sigue creciendo tras un reinicio. Los reintentos reenvían el
+// mismo seq y el servidor descarta los duplicados.
+Preferences preferencias;
+String dispositivoId;
+uint64_t secuenciaBase = 0;
+uint32_t contadorEnvios = 0;
+const int REINTENTOS_ENVIO = 3;
+const unsigned long ESPERA_REINTENTO = 2000; // 2 segundos (se duplica en cada intento)
+
+// Reloj sincronizado con GET /api/tiempo: cada lectura lleva la hora en que
+// se midió (ts) y la hora del envío (enviado), así el servidor corrige la
+// deriva y un reintento o una lectura encolada conserva su fecha real.
+uint64_t epochSincronizado = 0;       // ms epoch del servidor en la última sincronización
+unsigned long millisSincronizado = 0;
+unsigned long ultimaSincronizacion = 0;
+const unsigned long INTERVALO_SINCRONIZACION = 3600000; // 1 hora
+
+// Lecturas pendientes (sin WiFi o servidor caído); se envían en orden al reconectar
+struct LecturaPendiente {
+  uint64_t seq;
+  uint64_t ts;
+  float temperatura;
+  float humedad;
+  bool bomba;
+  const char* alerta;
+};
+const int MAX_PENDIENTES = 64;
+LecturaPendiente pendientes[MAX_PENDIENTES];
+int primeraPendiente = 0;
+int totalPendientes = 0;
+
+// Datagrama de ambiente: mismo formato que ingesta_udp.py (little-endian)
+struct __attribute__((packed)) DatagramaAmbiente {
+  uint8_t version;      // 1
+  uint8_t tipo;         // 1 = ambiente
+  uint8_t mac[6];
+  uint64_t seq;
+  uint64_t ts;          // ms epoch, 0 = hora de recepción
+  int16_t temperatura;  // °C × 100
+  uint16_t humedad;     // % × 100
+  uint8_t bits;         // bit 0: bomba, bits 1-2: alerta
+};
+
+// Escritor MessagePack mínimo: lo justo para el mapa de una lectura
+struct CuerpoMsgPack {
+  uint8_t datos[64];
+  size_t largo = 0;
+  
+  void byte(uint8_t b) { datos[largo++] = b; }
+  void bigEndian(uint64_t valor, int bytes) {
+    for (int i = bytes - 1; i >= 0; i--) byte((valor >> (8 * i)) & 0xFF);
+  }
+  void mapa(uint8_t campos) { byte(0x80 | campos); }
+  void entero(int64_t valor) {
+    if (valor >= 0 && valor < 128) byte(valor);                                     // positive fixint
+    else if (valor >= -32768 && valor <= 32767) { byte(0xD1); bigEndian((uint16_t)valor, 2); }  // int16
+    else if (valor >= 0 && valor <= 0xFFFFFFFFLL) { byte(0xCE); bigEndian(valor, 4); }       // uint32
+    else { byte(0xD3); bigEndian((uint64_t)valor, 8); }                                     // int64
+  }
+  void sinSigno(uint64_t valor) {
+    if (valor <= 0xFFFFFFFFULL) entero(valor);
+    else { byte(0xCF); bigEndian(valor, 8); }                                             // uint64
+  }
+  void binario(const uint8_t* datosBin, uint8_t n) {
+    byte(0xC4); byte(n);
+    for (uint8_t i = 0; i < n; i++) byte(datosBin[i]);
+  }
+};
+WiFiUDP udp;
+
 void setup() {
   Serial.begin(115200);
   Serial.println("🌿 Iniciando Sistema de Invernadero Automatizado");
@@ -104,8 +206,17 @@ void setup() {
   SPI.begin();
   mfrc522.PCD_Init();
   
+  // Identidad del dispositivo y secuencia de envíos
+  preferencias.begin("invernadero", false);
+  uint32_t arranques = preferencias.getUInt("arranques", 0) + 1;
+  preferencias.putUInt("arranques", arranques);
+  preferencias.end();
+  secuenciaBase = (uint64_t)arranques << 32;
+  
   // Conectar WiFi
   conectarWiFi();
+  dispositivoId = WiFi.macAddress();
+  sincronizarHora();
   
   // Inicializar base de datos remota
   inicializarBaseDatos();
@@ -125,12 +236,18 @@ void loop() {
     ultimaLectura = tiempoActual;
   }
   
-  // Enviar datos cada 30 segundos
-  if (tiempoActual - ultimoEnvio >= INTERVALO_ENVIO) {
+  // Enviar según el intervalo recomendado, o enseguida si cambia la bomba o la alerta
+  bool cambioEstado = bombaEncendida != bombaEnviada || strcmp(alertaAmbiente(), alertaEnviada) != 0;
+  if (tiempoActual - ultimoEnvio >= intervaloEnvio || cambioEstado) {
     enviarDatos();
     ultimoEnvio = tiempoActual;
   }
   
+  // Corregir la deriva del reloj cada hora
+  if (tiempoActual - ultimaSincronizacion >= INTERVALO_SINCRONIZACION) {
+    sincronizarHora();
+  }
+  
   // Verificar acceso RFID
   verificarRFID();
   
@@ -167,6 +284,35 @@ void conectarWiFi() {
   }
 }
 
+void sincronizarHora() {
+  if (WiFi.status() != WL_CONNECTED) return;
+  
+  HTTPClient http;
+  http.begin(String(serverURL) + "/api/tiempo");
+  unsigned long inicio = millis();
+  int httpCode = http.GET();
+  unsigned long fin = millis();
+  if (httpCode == 200) {
+    DynamicJsonDocument doc(256);
+    if (!deserializeJson(doc, http.getString())) {
+      // La respuesta se generó, aproximadamente, a mitad del viaje
+      epochSincronizado = doc["epoch_ms"].as<uint64_t>() + (fin - inicio) / 2;
+      millisSincronizado = fin;
+      ultimaSincronizacion = fin;
+      Serial.println("🕒 Hora sincronizada con el servidor");
+    }
+  } else {
+    Serial.println("⚠️ No se pudo sincronizar la hora: " + String(httpCode));
+  }
+  http.end();
+}
+
+// Hora actual en ms epoch (0 si aún no se sincronizó)
+uint64_t horaActualMs() {
+  if (epochSincronizado == 0) return 0;
+  return epochSincronizado + (millis() - millisSincronizado);
+}
+
 void inicializarBaseDatos() {
   if (WiFi.status() != WL_CONNECTED) return;
   
@@ -321,37 +467,160 @@ void activarAlarma() {
 // ===========================================
 // FUNCIONES DE COMUNICACIÓN CON SERVIDOR
 // ===========================================
+const char* alertaAmbiente() {
+  if (temperatura > TEMP_CRITICA || humedad < HUM_CRITICA_BAJA || humedad > HUM_CRITICA_ALTA) {
+    return "Crítico";
+  }
+  if (temperatura > TEMP_MAX || temperatura < TEMP_MIN || humedad < HUM_MIN || humedad > HUM_MAX) {
+    return "Alto";
+  }
+  return "Normal";
+}
+
 void enviarDatos() {
+  // Encolar la lectura actual con su hora de medición
+  const char* alerta = alertaAmbiente();
+  bombaEnviada = bombaEncendida;
+  alertaEnviada = alerta;
+  if (totalPendientes == MAX_PENDIENTES) {
+    // Cola llena: se descarta la lectura más antigua
+    primeraPendiente = (primeraPendiente + 1) % MAX_PENDIENTES;
+    totalPendientes--;
+  }
+  LecturaPendiente& nueva = pendientes[(primeraPendiente + totalPendientes) % MAX_PENDIENTES];
+  nueva.seq = secuenciaBase | contadorEnvios++;
+  nueva.ts = horaActualMs();
+  nueva.temperatura = temperatura;
+  nueva.humedad = humedad;
+  nueva.bomba = bombaEncendida;
+  nueva.alerta = alerta;
+  totalPendientes++;
+  
   if (WiFi.status() != WL_CONNECTED) return;
   
-  HTTPClient http;
-  http.begin(String(serverURL) + "/api/sensores/ambiente");
-  http.addHeader("Content-Type", "application/json");
+  // Enviar en orden; si una falla, el resto espera al próximo ciclo
+  while (totalPendientes > 0) {
+    if (!enviarLectura(pendientes[primeraPendiente])) break;
+    primeraPendiente = (primeraPendiente + 1) % MAX_PENDIENTES;
+    totalPendientes--;
+  }
+}
+
+// Códigos de alerta compartidos por UDP y MessagePack: Normal, Medio, Alto, Crítico
+uint8_t codigoAlerta(const char* alerta) {
+  if (strcmp(alerta, "Medio") == 0) return 1;
+  if (strcmp(alerta, "Alto") == 0) return 2;
+  if (strcmp(alerta, "Crítico") == 0) return 3;
+  return 0;
+}
+
+// Claves: 1 mac, 2 seq, 3 ts, 4 enviado, 5 temperatura, 6 humedad, 7 bomba, 8 alerta
+void cuerpoMsgPack(const LecturaPendiente& lectura, CuerpoMsgPack& cuerpo) {
+  uint8_t mac[6];
+  WiFi.macAddress(mac);
+  cuerpo.largo = 0;
+  cuerpo.mapa(lectura.ts != 0 ? 8 : 6);
+  cuerpo.entero(1); cuerpo.binario(mac, 6);
+  cuerpo.entero(2); cuerpo.sinSigno(lectura.seq);
+  if (lectura.ts != 0) {
+    cuerpo.entero(3); cuerpo.sinSigno(lectura.ts);
+    cuerpo.entero(4); cuerpo.sinSigno(horaActualMs());
+  }
+  cuerpo.entero(5); cuerpo.entero(lround(lectura.temperatura * 100));
+  cuerpo.entero(6); cuerpo.entero(lround(lectura.humedad * 100));
+  cuerpo.entero(7); cuerpo.entero(lectura.bomba ? 1 : 0);
+  cuerpo.entero(8); cuerpo.entero(codigoAlerta(lectura.alerta));
+}
+
+void enviarLecturaUDP(const LecturaPendiente& lectura) {
+  DatagramaAmbiente datagrama;
+  datagrama.version = 1;
+  datagrama.tipo = 1;
+  WiFi.macAddress(datagrama.mac);
+  datagrama.seq = lectura.seq;
+  datagrama.ts = lectura.ts;
+  datagrama.temperatura = (int16_t)lround(lectura.temperatura * 100);
+  datagrama.humedad = (uint16_t)lround(lectura.humedad * 100);
+  datagrama.bits = (lectura.bomba ? 1 : 0) | (codigoAlerta(lectura.alerta) << 1);
+  
+  udp.beginPacket(servidorUDP, PUERTO_UDP);
+  udp.write((const uint8_t*)&datagrama, sizeof(datagrama));
+  udp.endPacket();
+}
+
+// begin() reutiliza la conexión abierta si el servidor la mantuvo; end() no la cierra
+void abrirConexionLecturas() {
+  String url = String(serverURL) + "/api/sensores/ambiente";
+  httpLecturas.setReuse(true);
+  if (url.startsWith("https")) {
+    clienteSeguro.setInsecure();  // certificado autofirmado de generar_certificado.py
+    httpLecturas.begin(clienteSeguro, url);
+  } else {
+    httpLecturas.begin(clientePlano, url);
+  }
+}
+
+// true si el servidor guardó la lectura (o ya la tenía); false para reintentarla luego
+bool enviarLectura(const LecturaPendiente& lectura) {
+  if (ENVIO_UDP) {
+    enviarLecturaUDP(lectura);
+    return true;
+  }
   
-  // Crear JSON con datos
   DynamicJsonDocument doc(1024);
-  doc["temperatura"] = temperatura;
-  doc["humedad"] = humedad;
-  doc["estado_bomba"] = bombaEncendida ? "Encendida" : "Apagada";
-  
-  String alerta = "Normal";
-  if (temperatura > TEMP_CRITICA || humedad < HUM_CRITICA_BAJA || humedad > HUM_CRITICA_ALTA) {
-    alerta = "Crítico";
-  } else if (temperatura > TEMP_MAX || temperatura < TEMP_MIN || humedad < HUM_MIN || humedad > HUM_MAX) {
-    alerta = "Alto";
+  doc["device_id"] = dispositivoId;
+  doc["seq"] = lectura.seq;
+  doc["temperatura"] = lectura.temperatura;
+  doc["humedad"] = lectura.humedad;
+  doc["estado_bomba"] = lectura.bomba ? "Encendida" : "Apagada";
+  doc["alerta"] = lectura.alerta;
+  if (lectura.ts != 0) {
+    doc["ts"] = lectura.ts;
   }
-  doc["alerta"] = alerta;
-  
-  String jsonString;
-  serializeJson(doc, jsonString);
   
-  int httpCode = http.POST(jsonString);
-  if (httpCode == 201) {
-    Serial.println("📤 Datos enviados correctamente");
-  } else {
-    Serial.println("❌ Error enviando datos: " + String(httpCode));
+  // 201 = guardado, 200 = ya estaba guardado (reintento); ambos son éxito
+  unsigned long espera = ESPERA_REINTENTO;
+  for (int intento = 1; intento <= REINTENTOS_ENVIO; intento++) {
+    HTTPClient& http = httpLecturas;
+    abrirConexionLecturas();
+    const char* cabeceras[] = {"X-Intervalo-Muestreo"};
+    http.collectHeaders(cabeceras, 1);
+    int httpCode;
+    if (ENVIO_MSGPACK) {
+      CuerpoMsgPack cuerpo;
+      cuerpoMsgPack(lectura, cuerpo);
+      http.addHeader("Content-Type", "application/msgpack");
+      httpCode = http.POST(cuerpo.datos, cuerpo.largo);
+    } else {
+      if (lectura.ts != 0) {
+        doc["enviado"] = horaActualMs();
+      }
+      String jsonString;
+      serializeJson(doc, jsonString);
+      http.addHeader("Content-Type", "application/json");
+      httpCode = http.POST(jsonString);
+    }
+    if (http.hasHeader("X-Intervalo-Muestreo")) {
+      unsigned long recomendado = http.header("X-Intervalo-Muestreo").toInt() * 1000UL;
+      intervaloEnvio = constrain(recomendado, INTERVALO_ENVIO_MIN, INTERVALO_ENVIO_MAX);
+    }
+    http.end();
+    
+    if (httpCode == 200 || httpCode == 201) {
+      Serial.println("📤 Datos enviados correctamente");
+      return true;
+    }
+    Serial.println("❌ Error enviando datos: " + String(httpCode) + " (intento " + String(intento) + ")");
+    // 429: el servidor limita la ingesta; la lectura queda en cola para el próximo ciclo
+    if (httpCode == 429) return false;
+    // Otros errores 4xx no se arreglan reintentando: la lectura se descarta
+    if (httpCode >= 400 && httpCode < 500) return true;
+    if (intento < REINTENTOS_ENVIO) {
+      delay(espera);
+      espera *= 2;
+    }
   }
-  http.end();
+  return false;
 }
 
 void enviarAlertaSeguridad(String tipo, String descripcion, String nivel) {
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📈 BENCHMARK DEL SISTEMA DE INVERNADERO
+=======================================
+Suite reproducible que mide los endpoints de lectura y los generadores
+de PDF contra volúmenes crecientes de registros_ambiente.
+
+Para cada tamaño (10k / 1M / 10M filas por defecto) se siembra una base
+de datos dedicada (DB_NAME_BENCH), se cargan los servidores en proceso
+(Flask test_client, sin red) y se cronometran:
+    - /api/ambiente, /api/sensores/estadisticas, /api/estadisticas,
+      /api/alertas/sistema
+    - todos los generadores de PDF (servidores activos y archived/backend)
+    - el plan de ejecución (EXPLAIN) de las consultas críticas
+    - el tiempo de importación de archived/backend/app.py en un proceso
+      nuevo (arranque de cada worker) y la carga diferida de los reportes
+
+Los resultados se guardan en JSON y se comparan con una línea base; el
+script termina con código 1 si hay regresiones de tiempo o de plan.
+
+Uso:
+    python benchmark_sistema.py --tamanos 10000 --guardar-baseline
+    python benchmark_sistema.py --tamanos 10000,1000000 --salida resultados.json
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pymysql
+
+import almacenamiento
+from generar_datos_masivos import sembrar_ambiente
+
+# Configuración de base de datos (base dedicada para no tocar datos reales)
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_USER = os.environ.get('DB_USER', 'root')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', 'root')
+DB_NAME_BENCH = os.environ.get('DB_NAME_BENCH', 'invernadero_bench')
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ARCHIVADO = os.path.join(RAIZ, 'archived', 'backend')
+
+TAMANOS_POR_DEFECTO = (10_000, 1_000_000, 10_000_000)
+BASELINE_POR_DEFECTO = os.path.join(RAIZ, 'benchmark_baseline.json')
+TOLERANCIA_POR_DEFECTO = 0.25
+
+# (servidor, ruta) de los endpoints de lectura
+ENDPOINTS_LECTURA = [
+    ('simple', '/api/ambiente'),
+    ('seguro', '/api/sensores/estadisticas'),
+    ('archivado', '/api/ambiente'),
+    ('archivado', '/api/estadisticas'),
+    ('archivado', '/api/alertas/sistema'),
+]
+
+# (servidor, ruta) de los endpoints que generan PDF
+ENDPOINTS_PDF = [
+    ('simple', '/api/generar_pdf'),
+    ('seguro', '/api/generar_pdf'),
+    ('archivado', '/api/report/enhanced'),
+    ('archivado', '/api/report/advanced'),
+    ('archivado', '/api/report/demo'),
+]
+
+# (módulo, función) de los generadores de archived/backend llamados directamente
+GENERADORES_PDF = [
+    ('pdf_generator', 'generate_professional_pdf'),
+    ('enhanced_pdf', 'create_enhanced_pdf_report'),
+    ('professional_pdf_generator', 'generate_production_pdf_report'),
+    ('simple_production_pdf', 'generate_simple_production_pdf_report'),
+]
+
+# Consultas críticas cuyo plan se vigila: las mismas que ejecutan los
+# servidores (almacenamiento.sql), con parámetros representativos
+CONSULTAS_PLAN = {
+    'ultimo_registro': ('ambiente_ultimo', ()),
+    'ultimo_extendido': ('ambiente_ultimo_extendido', ()),
+    'ultimos_50': ('ambiente_recientes', (50,)),
+    'corte_50': ('ambiente_corte_recientes', (49,)),
+    'ultimos_50_comprimidas': ('ambiente_recientes_desde', (datetime(2000, 1, 1), datetime(2000, 1, 1))),
+    'desde_revision': ('ambiente_desde_revision', (0, 50)),
+    'desde_fecha': ('ambiente_desde_fecha', (datetime(2000, 1, 1), 50)),
+    'conteo_total': ('ambiente_total', ()),
+    'conteo_hoy': ('ambiente_hoy', ()),
+    'promedio_24h': ('ambiente_promedios_24h', ()),
+    'estadisticas_7d': ('ambiente_resumen_7d', ()),
+    'bomba_recientes': ('bomba_recientes', (datetime(2000, 1, 1),)),
+    'bomba_ultima_lectura': ('bomba_ultima_lectura', ('esp32-01',)),
+    'bomba_dispositivos': ('bomba_dispositivos', (datetime(2000, 1, 1),)),
+}
+
+
+def conectar(base=None):
+    """Conexión directa a MySQL (opcionalmente sin base seleccionada)"""
+    return pymysql.connect(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=base,
+        charset='utf8mb4',
+        cursorclass=pymysql.cursors.DictCursor,
+        local_infile=True
+    )
+
+
+def cargar_modulo(nombre, ruta):
+    """Importar un servidor desde su ruta y apuntarlo a la base de benchmark"""
+    spec = importlib.util.spec_from_file_location(nombre, ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    if hasattr(modulo, 'DB_NAME'):
+        modulo.DB_NAME = DB_NAME_BENCH
+    modulo.app.testing = True
+    return modulo
+
+
+def cargar_servidores():
+    """Cargar los tres servidores Flask en proceso"""
+    # Los servidores activos leen la configuración de almacenamiento.py
+    almacenamiento.DB_BACKEND = 'mysql'
+    almacenamiento.DB_HOST = DB_HOST
+    almacenamiento.DB_USER = DB_USER
+    almacenamiento.DB_PASSWORD = DB_PASSWORD
+    almacenamiento.DB_NAME = DB_NAME_BENCH
+    if BACKEND_ARCHIVADO not in sys.path:
+        sys.path.insert(0, BACKEND_ARCHIVADO)
+    return {
+        'simple': cargar_modulo('bench_servidor_simple', os.path.join(RAIZ, 'servidor_simple_arduino.py')),
+        'seguro': cargar_modulo('bench_servidor_seguro', os.path.join(RAIZ, 'servidor_seguro_https.py')),
+        'archivado': cargar_modulo('bench_app_archivada', os.path.join(BACKEND_ARCHIVADO, 'app.py')),
+    }
+
+
+def preparar_base(servidores):
+    """Crear la base de benchmark y su esquema"""
+    conn = conectar()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME_BENCH}")
+        conn.commit()
+    finally:
+        conn.close()
+    servidores['archivado'].init_database_on_startup()
+    # Tablas, columnas e índices de los servidores activos (intervalos_bomba, muestras...)
+    almacenamiento.crear_esquema()
+
+
+def contar_filas(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) AS total FROM registros_ambiente")
+        return cur.fetchone()['total']
+
+
+def cronometrar(funcion, repeticiones, calentamiento=1):
+    """Ejecutar `funcion` y devolver estadísticas de tiempo en ms"""
+    for _ in range(calentamiento):
+        funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'min_ms': round(tiempos[0], 3),
+        'max_ms': round(tiempos[-1], 3),
+        'repeticiones': repeticiones,
+    }
+
+
+SCRIPT_ARRANQUE = (
+    "import time; t = time.perf_counter(); import app; "
+    "i = (time.perf_counter() - t) * 1000; app.cargar_reportes(); "
+    "print(f'ARRANQUE {i:.3f} {app.TIEMPO_CARGA_REPORTES_MS}')"
+)
+
+
+def medir_arranque(repeticiones=5):
+    """Importar el backend archivado en procesos nuevos (como un worker recién creado)"""
+    entorno = dict(os.environ, PRECARGA_REPORTES='0', DB_NAME=DB_NAME_BENCH)
+    importaciones, cargas = [], []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, '-c', SCRIPT_ARRANQUE], cwd=BACKEND_ARCHIVADO, env=entorno,
+                                capture_output=True, text=True, check=True).stdout
+        linea = next(l for l in salida.splitlines() if l.startswith('ARRANQUE '))
+        importacion, carga = linea.split()[1:]
+        importaciones.append(float(importacion))
+        cargas.append(float(carga))
+    resultado = {
+        'importacion_ms': round(statistics.median(importaciones), 3),
+        'carga_reportes_ms': round(statistics.median(cargas), 3),
+        'repeticiones': repeticiones,
+    }
+    print(f"   ⏱️ {'importación de app.py (proceso nuevo)':<60} {resultado['importacion_ms']:>10.2f} ms")
+    print(f"   ⏱️ {'carga diferida de reportes':<60} {resultado['carga_reportes_ms']:>10.2f} ms")
+    return resultado
+
+
+def peticion(cliente, ruta):
+    """Devolver una función que hace GET y falla si la respuesta no es 200"""
+    def _get():
+        respuesta = cliente.get(ruta)
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"{ruta} respondió {respuesta.status_code}")
+        return respuesta.data
+    return _get
+
+
+def medir_planes(conn):
+    """Resumen de EXPLAIN por consulta: tipo de acceso, índice y filas estimadas"""
+    planes = {}
+    with conn.cursor() as cur:
+        for nombre, (consulta, parametros) in CONSULTAS_PLAN.items():
+            cur.execute("EXPLAIN " + almacenamiento.sql(consulta), parametros)
+            fila = cur.fetchone() or {}
+            planes[nombre] = {
+                'type': fila.get('type'),
+                'key': fila.get('key'),
+                'rows': fila.get('rows'),
+                'extra': fila.get('Extra'),
+            }
+    return planes
+
+
+def medir_tamano(servidores, filas, args):
+    """Sembrar (si hace falta) y medir todos los casos para un tamaño"""
+    conn = conectar(DB_NAME_BENCH)
+    try:
+        if contar_filas(conn) != filas:
+            print(f"🌱 Sembrando {filas:,} filas...")
+            inicio = time.perf_counter()
+            sembrar_ambiente(conn, filas, semilla=args.semilla)
+            print(f"   ✅ Sembrado en {time.perf_counter() - inicio:.1f}s")
+        planes = medir_planes(conn)
+    finally:
+        conn.close()
+
+    casos = {}
+    for servidor, ruta in ENDPOINTS_LECTURA:
+        nombre = f"lectura:{servidor}:{ruta}"
+        casos[nombre] = medir_caso(nombre, peticion(servidores[servidor].app.test_client(), ruta),
+                                   args.repeticiones)
+
+    for servidor, ruta in ENDPOINTS_PDF:
+        nombre = f"pdf:{servidor}:{ruta}"
+        casos[nombre] = medir_caso(nombre, peticion(servidores[servidor].app.test_client(), ruta),
+                                   args.repeticiones_pdf)
+
+    archivado = servidores['archivado']
+    ambiente = archivado.query_table('registros_ambiente')
+    seguridad = archivado.query_table('registros_seguridad')
+    accesos = archivado.query_table('registros_acceso')
+    for nombre_modulo, nombre_funcion in GENERADORES_PDF:
+        nombre = f"generador:{nombre_modulo}.{nombre_funcion}"
+        try:
+            funcion = getattr(importlib.import_module(nombre_modulo), nombre_funcion)
+        except (ImportError, AttributeError) as e:
+            casos[nombre] = {'error': str(e)}
+            continue
+
+        def _generar(funcion=funcion):
+            if not funcion(ambiente, seguridad, accesos, None, None):
+                raise RuntimeError("El generador no devolvió contenido")
+
+        casos[nombre] = medir_caso(nombre, _generar, args.repeticiones_pdf)
+
+    return {'filas': filas, 'casos': casos, 'planes': planes}
+
+
+def medir_caso(nombre, funcion, repeticiones):
+    try:
+        resultado = cronometrar(funcion, repeticiones)
+        print(f"   ⏱️ {nombre:<60} {resultado['mediana_ms']:>10.2f} ms")
+        return resultado
+    except Exception as e:
+        print(f"   ❌ {nombre:<60} {e}")
+        return {'error': str(e)}
+
+
+def comparar_con_baseline(resultados, baseline, tolerancia):
+    """Listar regresiones de tiempo (> tolerancia) y de plan de ejecución"""
+    regresiones = []
+    arranque, arranque_previo = resultados.get('arranque', {}), baseline.get('arranque', {})
+    for medida in ('importacion_ms', 'carga_reportes_ms'):
+        if medida in arranque and medida in arranque_previo:
+            if arranque[medida] > arranque_previo[medida] * (1 + tolerancia):
+                regresiones.append(f"[arranque] {medida}: {arranque_previo[medida]} ms -> {arranque[medida]} ms")
+    for tamano, actual in resultados['tamanos'].items():
+        previo = baseline.get('tamanos', {}).get(tamano)
+        if not previo:
+            continue
+        for caso, medida in actual['casos'].items():
+            referencia = previo['casos'].get(caso, {})
+            if 'error' in medida and 'error' not in referencia:
+                regresiones.append(f"[{tamano}] {caso}: ahora falla ({medida['error']})")
+            elif 'mediana_ms' in medida and 'mediana_ms' in referencia:
+                limite = referencia['mediana_ms'] * (1 + tolerancia)
+                if medida['mediana_ms'] > limite:
+                    regresiones.append(
+                        f"[{tamano}] {caso}: {referencia['mediana_ms']} ms -> {medida['mediana_ms']} ms")
+        for consulta, plan in actual['planes'].items():
+            plan_previo = previo.get('planes', {}).get(consulta)
+            if plan_previo and (plan['type'], plan['key']) != (plan_previo['type'], plan_previo['key']):
+                regresiones.append(
+                    f"[{tamano}] plan {consulta}: {plan_previo['type']}/{plan_previo['key']} -> "
+                    f"{plan['type']}/{plan['key']}")
+    return regresiones
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de endpoints de lectura y reportes PDF")
+    parser.add_argument('--tamanos', default=','.join(str(t) for t in TAMANOS_POR_DEFECTO),
+                        help="Tamaños de registros_ambiente separados por comas")
+    parser.add_argument('--repeticiones', type=int, default=10, help="Repeticiones por endpoint de lectura")
+    parser.add_argument('--repeticiones-pdf', type=int, default=3, help="Repeticiones por generador PDF")
+    parser.add_argument('--semilla', type=int, default=2025, help="Semilla de los datos sembrados")
+    parser.add_argument('--salida', default='benchmark_resultados.json', help="Archivo JSON de resultados")
+    parser.add_argument('--baseline', default=BASELINE_POR_DEFECTO, help="Línea base para comparar")
+    parser.add_argument('--guardar-baseline', action='store_true', help="Guardar estos resultados como línea base")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_POR_DEFECTO,
+                        help="Degradación permitida sobre la mediana (0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tamanos = [int(t) for t in args.tamanos.split(',') if t.strip()]
+
+    print("📈 BENCHMARK DEL SISTEMA DE INVERNADERO")
+    print("=" * 50)
+    print(f"🗄️ Base de datos: {DB_NAME_BENCH}@{DB_HOST}")
+    print(f"📊 Tamaños: {', '.join(f'{t:,}' for t in tamanos)}")
+    print("=" * 50)
+
+    servidores = cargar_servidores()
+    preparar_base(servidores)
+
+    resultados = {
+        'meta': {
+            'fecha': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'semilla': args.semilla,
+        },
+        'tamanos': {},
+    }
+    print("\n🚀 Arranque del backend archivado")
+    resultados['arranque'] = medir_arranque()
+    for filas in tamanos:
+        print(f"\n📦 Tamaño: {filas:,} filas")
+        resultados['tamanos'][str(filas)] = medir_tamano(servidores, filas, args)
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en: {args.salida}")
+
+    if args.guardar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"📌 Línea base actualizada: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("⚠️ No hay línea base; ejecuta con --guardar-baseline para crearla")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regresiones = comparar_con_baseline(resultados, baseline, args.tolerancia)
+    if regresiones:
+        print(f"\n❌ {len(regresiones)} regresiones respecto a la línea base:")
+        for regresion in regresiones:
+            print(f"   • {regresion}")
+        return 1
+
+    print("\n✅ Sin regresiones respecto a la línea base")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
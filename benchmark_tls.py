@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔐 BENCHMARK TLS - HANDSHAKES Y LATENCIA POR LECTURA
+====================================================
+Compara el servidor HTTPS como estaba (RSA 2048, HTTP/1.0, un handshake
+completo por lectura) con la configuración de tls_servidor.py (ECDSA
+P-256, reanudación de sesión, HTTP/1.1 keep-alive).
+
+Cada configuración corre servidor_seguro_https.app en un proceso aparte
+con una base SQLite temporal; el cliente negocia TLS 1.2, como mbedTLS en
+el ESP32. Se mide:
+    - handshakes/s completos y reanudados con cada certificado
+    - latencia por lectura (POST /api/sensores/ambiente) con conexión nueva
+      por lectura, conexión nueva reanudada y conexión persistente
+
+En una máquina de un solo núcleo cliente y servidor comparten la CPU: las
+cifras sirven para comparar configuraciones, no como capacidad absoluta.
+
+Uso:
+    python benchmark_tls.py
+    python benchmark_tls.py --handshakes 500 --lecturas 300 --salida-json tls.json
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import ssl
+import statistics
+import sys
+import tempfile
+import time
+
+from generar_certificado import generar_certificado_ssl
+
+HOST = '127.0.0.1'
+CUERPO_LECTURA = json.dumps({'temperatura': 23.5, 'humedad': 61.0, 'estado_bomba': 'Apagada'}).encode()
+
+
+def _servidor(puerto, certificado, llave, optimizado, listo, directorio):
+    """Proceso hijo: servidor_seguro_https.app sobre SQLite temporal"""
+    os.environ.update({'DB_BACKEND': 'sqlite', 'SQLITE_PATH': os.path.join(directorio, f'tls_{puerto}.db'),
+                       'LIMITE_INGESTA': '0'})
+    sys.stdout = open(os.devnull, 'w')  # sin el print de cada lectura guardada
+    import ssl as ssl_hijo
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    import almacenamiento
+    almacenamiento.crear_esquema()
+    from servidor_seguro_https import app
+    from tls_servidor import ManejadorKeepAlive, crear_contexto_tls
+
+    class ManejadorSilencioso(ManejadorKeepAlive if optimizado else WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    if optimizado:
+        contexto = crear_contexto_tls(certificado, llave)
+    else:
+        contexto = ssl_hijo.SSLContext(ssl_hijo.PROTOCOL_TLS_SERVER)
+        contexto.load_cert_chain(certificado, llave)
+    servidor = make_server(HOST, puerto, app, threaded=True,
+                           request_handler=ManejadorSilencioso, ssl_context=contexto)
+    listo.set()
+    servidor.serve_forever()
+
+
+def _contexto_cliente():
+    contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    contexto.check_hostname = False
+    contexto.verify_mode = ssl.CERT_NONE
+    contexto.maximum_version = ssl.TLSVersion.TLSv1_2
+    return contexto
+
+
+def _conectar(contexto, puerto, sesion=None):
+    sock = socket.create_connection((HOST, puerto))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return contexto.wrap_socket(sock, session=sesion)
+
+
+def medir_handshakes(puerto, total, reanudar):
+    """(handshakes/s, fracción reanudada)"""
+    contexto = _contexto_cliente()
+    sesion, reanudadas = None, 0
+    inicio = time.perf_counter()
+    for _ in range(total):
+        conexion = _conectar(contexto, puerto, sesion if reanudar else None)
+        reanudadas += conexion.session_reused
+        sesion = conexion.session
+        conexion.close()
+    return total / (time.perf_counter() - inicio), reanudadas / total
+
+
+def _post_lectura(conexion):
+    conexion.sendall(b"POST /api/sensores/ambiente HTTP/1.1\r\nHost: invernadero\r\n"
+                     b"Content-Type: application/json\r\nContent-Length: "
+                     + str(len(CUERPO_LECTURA)).encode() + b"\r\n\r\n" + CUERPO_LECTURA)
+    respuesta = http.client.HTTPResponse(conexion)
+    respuesta.begin()
+    respuesta.read()
+    if respuesta.status not in (200, 201):
+        raise RuntimeError(f"Respuesta {respuesta.status}")
+    return not respuesta.will_close
+
+
+def medir_lecturas(puerto, total, modo):
+    """Latencias en ms por lectura: 'nueva', 'reanudada' o 'persistente'"""
+    contexto = _contexto_cliente()
+    latencias, sesion, conexion = [], None, None
+    for _ in range(total):
+        inicio = time.perf_counter()
+        if conexion is None:
+            conexion = _conectar(contexto, puerto, sesion if modo == 'reanudada' else None)
+            sesion = conexion.session
+        sigue_abierta = _post_lectura(conexion)
+        if modo != 'persistente' or not sigue_abierta:
+            conexion.close()
+            conexion = None
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    if conexion is not None:
+        conexion.close()
+    return latencias
+
+
+def _resumen(latencias):
+    ordenadas = sorted(latencias)
+    return {
+        'media_ms': round(statistics.fmean(ordenadas), 2),
+        'p50_ms': round(ordenadas[len(ordenadas) // 2], 2),
+        'p95_ms': round(ordenadas[int(len(ordenadas) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de handshakes TLS y latencia por lectura")
+    parser.add_argument('--puerto', type=int, default=5443, help="Primer puerto (se usan dos)")
+    parser.add_argument('--handshakes', type=int, default=300, help="Handshakes por medición")
+    parser.add_argument('--lecturas', type=int, default=200, help="Lecturas por medición de latencia")
+    parser.add_argument('--salida-json', help="Guardar los resultados en este archivo JSON")
+    args = parser.parse_args()
+
+    resultados = {'handshakes_s': {}, 'lectura': {}}
+    with tempfile.TemporaryDirectory() as directorio:
+        certificados = {}
+        for tipo in ('rsa', 'ecdsa'):
+            certificados[tipo] = (os.path.join(directorio, f'{tipo}.crt'), os.path.join(directorio, f'{tipo}.key'))
+            generar_certificado_ssl(tipo, *certificados[tipo], mostrar_ayuda=False)
+
+        configuraciones = {
+            'antes': (args.puerto, 'rsa', False),       # RSA 2048, HTTP/1.0, sin ajustes
+            'despues': (args.puerto + 1, 'ecdsa', True),  # ECDSA, reanudación, keep-alive
+        }
+        procesos = []
+        for puerto, tipo, optimizado in configuraciones.values():
+            listo = multiprocessing.Event()
+            proceso = multiprocessing.Process(target=_servidor, daemon=True,
+                                              args=(puerto, *certificados[tipo], optimizado, listo, directorio))
+            proceso.start()
+            if not listo.wait(30):
+                raise SystemExit(f"❌ El servidor del puerto {puerto} no arrancó")
+            procesos.append(proceso)
+
+        try:
+            print(f"🔐 Handshakes TLS 1.2 ({args.handshakes} por medición)")
+            for nombre, (puerto, tipo, _) in configuraciones.items():
+                for reanudar in (False, True):
+                    por_segundo, fraccion = medir_handshakes(puerto, args.handshakes, reanudar)
+                    clave = f"{tipo}_{'reanudado' if reanudar else 'completo'}"
+                    resultados['handshakes_s'][clave] = round(por_segundo, 1)
+                    print(f"   {tipo:<6} {'reanudado' if reanudar else 'completo':<10} "
+                          f"{por_segundo:8.1f} /s  (reanudadas {fraccion:.0%})")
+
+            print(f"📡 Latencia por lectura ({args.lecturas} POST /api/sensores/ambiente)")
+            escenarios = (
+                ('antes: conexión nueva por lectura', 'antes', 'nueva'),
+                ('después: conexión nueva reanudada', 'despues', 'reanudada'),
+                ('después: conexión persistente', 'despues', 'persistente'),
+            )
+            for etiqueta, configuracion, modo in escenarios:
+                resumen = _resumen(medir_lecturas(configuraciones[configuracion][0], args.lecturas, modo))
+                resultados['lectura'][f"{configuracion}_{modo}"] = resumen
+                print(f"   {etiqueta:<36} media {resumen['media_ms']:6.2f} ms   "
+                      f"p50 {resumen['p50_ms']:6.2f}   p95 {resumen['p95_ms']:6.2f}")
+        finally:
+            for proceso in procesos:
+                proceso.terminate()
+
+    if args.salida_json:
+        with open(args.salida_json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+        print(f"💾 Resultados guardados en {args.salida_json}")
+
+
+if __name__ == '__main__':
+    main()
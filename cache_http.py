@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🏷️ CACHÉ HTTP CONDICIONAL (ETag / Last-Modified)
+=================================================
+El dashboard consulta las mismas URLs cada pocos segundos aunque el ESP32
+sólo envía una lectura cada 30 s. Cada ingesta incrementa un contador de
+versión en memoria; las vistas decoradas con @condicional calculan su ETag
+a partir de ese contador y, si el cliente ya tiene esa versión, responden
+304 sin tocar la base de datos ni serializar JSON.
+
+El ETag incluye además una marca del arranque del proceso (un reinicio
+invalida las copias de los clientes) y una ventana de tiempo
+(ETAG_VENTANA segundos) para que los agregados "hoy" y "últimas 24 h" se
+recalculen aunque no lleguen lecturas nuevas.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request
+
+ETAG_VENTANA = int(os.environ.get('ETAG_VENTANA', '60'))
+
+
+class VersionDatos:
+    """Contador de versión de los datos, incrementado en cada ingesta"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.numero = 0
+        self.arranque = format(time.time_ns() & 0xFFFFFFFFFF, 'x')
+        self.modificado = time.time()
+
+    def incrementar(self):
+        with self.lock:
+            self.numero += 1
+            self.modificado = time.time()
+
+    def validadores(self):
+        """(etag, last_modified) para la versión y ventana actuales"""
+        ahora = time.time()
+        ventana = int(ahora // ETAG_VENTANA) if ETAG_VENTANA > 0 else 0
+        etag = f'{self.arranque}-{self.numero}-{ventana}'
+        # Last-Modified no puede ser anterior al inicio de la ventana actual
+        marca = max(self.modificado, ventana * ETAG_VENTANA)
+        return etag, datetime.fromtimestamp(int(marca), tz=timezone.utc)
+
+
+version_datos = VersionDatos()
+
+
+def condicional(vista):
+    """Responder 304 si el cliente ya tiene la versión actual de los datos"""
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        etag, modificado = version_datos.validadores()
+        if request.if_none_match:
+            vigente = request.if_none_match.contains_weak(etag)
+        elif request.if_modified_since:
+            vigente = request.if_modified_since >= modificado
+        else:
+            vigente = False
+        if vigente:
+            respuesta = make_response('', 304)
+        else:
+            respuesta = make_response(vista(*args, **kwargs))
+            if respuesta.status_code != 200:
+                return respuesta
+        respuesta.set_etag(etag, weak=True)
+        respuesta.last_modified = modificado
+        # El navegador puede guardar la respuesta pero debe revalidarla siempre
+        respuesta.cache_control.no_cache = True
+        return respuesta
+    return envoltura
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+💧 CICLOS DE LA BOMBA - INTERVALOS DE RIEGO
+===========================================
+La actividad de la bomba se medía como SUM(CASE WHEN estado_bomba =
+'Encendida') sobre registros_ambiente: lecturas, no tiempo. El número
+cambia con el intervalo de envío (y con la compresión de lecturas) y no
+dice cuánto tiempo estuvo regando ni cuántas veces arrancó.
+
+Aquí se siguen las transiciones de estado_bomba de cada dispositivo en
+la ingesta:
+
+- Apagada -> Encendida abre una fila en intervalos_bomba (inicio)
+- Encendida -> Apagada la cierra (fin); una fila por ciclo de riego
+- si un dispositivo con la bomba encendida deja de enviar más de
+  BOMBA_HUECO s, el intervalo se cierra en su última lectura
+
+En memoria quedan el estado actual de cada bomba y cubetas por hora
+(BOMBA_HORAS) y por día (BOMBA_DIAS) con segundos encendida y arranques,
+por dispositivo y del invernadero entero. El ciclo de trabajo del
+invernadero se reparte entre todos los dispositivos conocidos (con
+lecturas en los últimos BOMBA_DIAS días o desde el arranque), también los
+que nunca encendieron la bomba. ciclos_bomba.uso() responde
+tiempo de riego, ciclos y ciclo de trabajo sin recorrer lecturas: el
+coste depende sólo del número de cubetas pedidas y de bombas encendidas.
+
+Las lecturas tardías (anteriores a la última del dispositivo) no cambian
+el estado. Al arrancar se reconstruye todo desde intervalos_bomba.
+"""
+
+import os
+import threading
+from datetime import datetime, time as hora_del_dia, timedelta
+
+from almacenamiento import sql
+
+BOMBA_HORAS = int(os.environ.get('BOMBA_HORAS', '48'))
+BOMBA_DIAS = int(os.environ.get('BOMBA_DIAS', '35'))
+BOMBA_HUECO = int(os.environ.get('BOMBA_HUECO', '900'))
+ENCENDIDA = 'Encendida'
+TODAS = '*'  # cubetas del invernadero entero
+
+
+def _repartir(inicio, fin):
+    """(hora, segundos) de [inicio, fin) repartido por horas"""
+    while inicio < fin:
+        hora = inicio.replace(minute=0, second=0, microsecond=0)
+        corte = min(fin, hora + timedelta(hours=1))
+        yield hora, (corte - inicio).total_seconds()
+        inicio = corte
+
+
+class EstadoBomba:
+    __slots__ = ('encendida', 'desde', 'intervalo_id', 'ultima')
+
+    def __init__(self, encendida, desde, intervalo_id=None):
+        self.encendida = encendida
+        self.desde = desde
+        self.intervalo_id = intervalo_id
+        self.ultima = desde
+
+
+class CiclosBomba:
+    """Estado actual de cada bomba y uso acumulado por hora y por día"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listo = False
+        self.estados = {}
+        self.encendidas = {}  # dispositivo -> EstadoBomba, sólo las encendidas
+        self.dispositivos = set()  # bombas conocidas, encendidas alguna vez o no
+        self.horas = {}  # clave -> {hora: [segundos, arranques]}
+        self.dias = {}   # clave -> {fecha: [segundos, arranques]}
+        self.intervalos = 0
+
+    # -------- cubetas --------
+    def _cubeta(self, tabla, clave, momento, limite):
+        cubetas = tabla.setdefault(clave, {})
+        cubeta = cubetas.get(momento)
+        if cubeta is None:
+            if momento < limite:
+                return None  # fuera de la ventana en memoria
+            cubeta = cubetas[momento] = [0.0, 0]
+            if len(cubetas) > 2 * (BOMBA_HORAS if tabla is self.horas else BOMBA_DIAS):
+                for viejo in [m for m in cubetas if m < limite]:
+                    del cubetas[viejo]
+        return cubeta
+
+    def _sumar(self, dispositivo, hora, segundos, arranques):
+        limite_hora = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=BOMBA_HORAS)
+        limite_dia = limite_hora.date() - timedelta(days=BOMBA_DIAS)
+        for clave in (dispositivo, TODAS):
+            for tabla, momento, limite in ((self.horas, hora, limite_hora), (self.dias, hora.date(), limite_dia)):
+                cubeta = self._cubeta(tabla, clave, momento, limite)
+                if cubeta is not None:
+                    cubeta[0] += segundos
+                    cubeta[1] += arranques
+
+    def _arranque(self, dispositivo, inicio):
+        self._sumar(dispositivo, inicio.replace(minute=0, second=0, microsecond=0), 0.0, 1)
+
+    def _acumular(self, dispositivo, inicio, fin):
+        for hora, segundos in _repartir(inicio, fin):
+            self._sumar(dispositivo, hora, segundos, 0)
+
+    # -------- alimentación --------
+    def calentar(self, cur):
+        """Reconstruir estado y cubetas desde intervalos_bomba (idempotente)"""
+        with self.lock:
+            if self.listo:
+                return
+            self.estados, self.encendidas, self.horas, self.dias = {}, {}, {}, {}
+            ahora = datetime.now()
+            cur.execute(sql('bomba_dispositivos'), (ahora - timedelta(days=BOMBA_DIAS),))
+            self.dispositivos = {fila['dispositivo'] for fila in cur.fetchall()}
+            cur.execute(sql('bomba_recientes'), (ahora - timedelta(days=BOMBA_DIAS + 1),))
+            for fila in cur.fetchall():
+                dispositivo = fila['dispositivo']
+                self._arranque(dispositivo, fila['inicio'])
+                if fila['fin'] is not None:
+                    self._acumular(dispositivo, fila['inicio'], fila['fin'])
+                    self.estados[dispositivo] = EstadoBomba(False, fila['fin'])
+                else:
+                    estado = self.estados[dispositivo] = EstadoBomba(True, fila['inicio'], fila['id'])
+                    self.encendidas[dispositivo] = estado
+            self.dispositivos.update(self.estados)
+            for dispositivo, estado in self.encendidas.items():
+                if dispositivo is None:
+                    cur.execute(sql('bomba_ultima_lectura_sin_dispositivo'))
+                else:
+                    cur.execute(sql('bomba_ultima_lectura'), (dispositivo,))
+                fila = cur.fetchone()
+                ultima = fila['ultima'] if fila else None
+                if isinstance(ultima, str):  # SQLite no convierte expresiones
+                    ultima = datetime.fromisoformat(ultima)
+                estado.ultima = max(estado.desde, ultima or estado.desde)
+            self.listo = True
+
+    def invalidar(self):
+        """La transacción con las transiciones falló: reconstruir desde la BD"""
+        with self.lock:
+            self.listo = False
+
+    def registrar(self, cur, dispositivo, fecha, estado_bomba):
+        """Procesar el estado de la bomba de una lectura; escribe en `cur` si hay transición
+
+        El llamador confirma la transacción (o llama a invalidar() si falla).
+        """
+        if estado_bomba not in (ENCENDIDA, 'Apagada') or fecha is None:
+            return
+        if not self.listo:
+            self.calentar(cur)
+        encendida = estado_bomba == ENCENDIDA
+        with self.lock:
+            self.dispositivos.add(dispositivo)
+            estado = self.estados.get(dispositivo)
+            if estado is not None and fecha < estado.ultima:
+                return  # lectura tardía
+            if estado is not None and estado.encendida and (fecha - estado.ultima).total_seconds() > BOMBA_HUECO:
+                # El dispositivo calló con la bomba encendida: se cierra en su última lectura
+                self._cerrar(cur, dispositivo, estado, estado.ultima)
+            if estado is None or estado.encendida != encendida:
+                if encendida:
+                    cur.execute(sql('bomba_abrir'), (dispositivo, fecha))
+                    estado = self.estados[dispositivo] = EstadoBomba(True, fecha, cur.lastrowid)
+                    self.encendidas[dispositivo] = estado
+                    self._arranque(dispositivo, fecha)
+                    self.intervalos += 1
+                elif estado is not None:
+                    self._cerrar(cur, dispositivo, estado, fecha)
+                else:
+                    estado = self.estados[dispositivo] = EstadoBomba(False, fecha)
+            estado.ultima = fecha
+
+    def _cerrar(self, cur, dispositivo, estado, fin):
+        if estado.intervalo_id is not None:
+            cur.execute(sql('bomba_cerrar'), (fin, estado.intervalo_id))
+        self._acumular(dispositivo, estado.desde, fin)
+        self.encendidas.pop(dispositivo, None)
+        estado.encendida, estado.desde, estado.intervalo_id = False, fin, None
+
+    # -------- consultas --------
+    def _abiertos(self, dispositivo, ahora):
+        """[(desde, hasta)] de las bombas encendidas ahora (todas si dispositivo es TODAS)"""
+        estados = self.encendidas.values() if dispositivo == TODAS else filter(None, [self.encendidas.get(dispositivo)])
+        hueco = timedelta(seconds=BOMBA_HUECO)
+        # Como al cerrar: un dispositivo callado más de BOMBA_HUECO cuenta hasta su última lectura
+        return [(e.desde, ahora if ahora - e.ultima <= hueco else e.ultima) for e in estados]
+
+    def _periodo(self, cubetas, clave, inicio, fin, ahora, abiertos, bombas):
+        segundos, arranques = cubetas.get(clave, (0.0, 0))
+        for desde, hasta in abiertos:
+            segundos += max(0.0, (min(hasta, fin) - max(desde, inicio)).total_seconds())
+        duracion = max(0.0, (min(ahora, fin) - inicio).total_seconds()) * bombas
+        return {
+            'inicio': inicio,
+            'encendida_s': int(segundos),
+            'ciclos': arranques,
+            'ciclo_trabajo': _porcentaje(segundos, duracion),
+            '_duracion': duracion,
+        }
+
+    def uso(self, dispositivo=None, horas=24, dias=7):
+        """Tiempo encendida, arranques y ciclo de trabajo (%) por hora y por día
+
+        Sin `dispositivo`, del invernadero entero: el ciclo de trabajo es la
+        media por bomba conocida (no sólo las que tuvieron intervalos).
+        total_horas / total_dias suman los periodos pedidos.
+        """
+        horas, dias = max(1, min(horas, BOMBA_HORAS)), max(1, min(dias, BOMBA_DIAS))
+        clave = TODAS if dispositivo is None else dispositivo
+        ahora = datetime.now()
+        hora_actual = ahora.replace(minute=0, second=0, microsecond=0)
+        hoy = datetime.combine(ahora.date(), hora_del_dia())
+        with self.lock:
+            estado = self.estados.get(dispositivo) if dispositivo is not None else None
+            bombas = max(1, len(self.dispositivos)) if dispositivo is None else 1
+            abiertos = self._abiertos(clave, ahora)
+            cubetas_hora = self.horas.get(clave, {})
+            por_hora = []
+            for i in range(horas - 1, -1, -1):
+                inicio = hora_actual - timedelta(hours=i)
+                por_hora.append(self._periodo(cubetas_hora, inicio, inicio, inicio + timedelta(hours=1),
+                                              ahora, abiertos, bombas))
+            cubetas_dia = self.dias.get(clave, {})
+            por_dia = []
+            for i in range(dias - 1, -1, -1):
+                inicio = hoy - timedelta(days=i)
+                por_dia.append(self._periodo(cubetas_dia, inicio.date(), inicio, inicio + timedelta(days=1),
+                                             ahora, abiertos, bombas))
+            encendidas = len(self.encendidas) if dispositivo is None else int(bool(estado and estado.encendida))
+        return {
+            'dispositivo': dispositivo,
+            'estado': (ENCENDIDA if estado.encendida else 'Apagada') if estado else None,
+            'desde': estado.desde if estado else None,
+            'bombas': bombas,
+            'encendidas': encendidas,
+            'horas': por_hora,
+            'dias': por_dia,
+            'total_horas': _total(por_hora),
+            'total_dias': _total(por_dia),
+        }
+
+    def estadisticas(self):
+        with self.lock:
+            return {
+                'bombas': len(self.dispositivos),
+                'encendidas': len(self.encendidas),
+                'ciclos_registrados': self.intervalos,
+            }
+
+
+def _porcentaje(segundos, duracion):
+    return round(min(100.0, 100 * segundos / duracion), 1) if duracion > 0 else 0.0
+
+
+def _total(periodos):
+    """Sumar periodos consecutivos (y quitarles la duración auxiliar)"""
+    segundos = sum(p['encendida_s'] for p in periodos)
+    duracion = sum(p.pop('_duracion') for p in periodos)
+    return {
+        'encendida_s': segundos,
+        'ciclos': sum(p['ciclos'] for p in periodos),
+        'ciclo_trabajo': _porcentaje(segundos, duracion),
+    }
+
+
+def duracion_legible(segundos):
+    """'2 h 05 min' / '7 min'"""
+    minutos = int(segundos) // 60
+    return f"{minutos // 60} h {minutos % 60:02d} min" if minutos >= 60 else f"{minutos} min"
+
+
+def linea_reporte(total, periodo):
+    """Resumen de una línea para los PDF a partir de total_horas / total_dias"""
+    return (f"Bomba ({periodo}): {total['ciclos']} ciclos, "
+            f"{duracion_legible(total['encendida_s'])} encendida, "
+            f"ciclo de trabajo {total['ciclo_trabajo']}%")
+
+
+ciclos_bomba = CiclosBomba()
+
+
+def preparar(get_conn):
+    """Calentar el estado desde la BD si aún no lo está; devuelve si se puede usar"""
+    if ciclos_bomba.listo:
+        return True
+    conn = get_conn()
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cur:
+            ciclos_bomba.calentar(cur)
+    except Exception as e:
+        print(f"⚠️ No se pudieron cargar los ciclos de la bomba: {e}")
+        return False
+    finally:
+        conn.close()
+    return True
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📦 CODIFICACIÓN DE RESPUESTAS - JSON RÁPIDO, MESSAGEPACK Y COMPRESIÓN
+=====================================================================
+Capa común para las respuestas de los servidores Flask:
+
+- JSON compacto con orjson si está instalado (json estándar si no), que
+  serializa directamente los datetime y Decimal que devuelve pymysql
+  (fechas ISO 8601, Decimal como número).
+- MessagePack opcional cuando el cliente envía `Accept: application/msgpack`
+  y el paquete msgpack está instalado.
+- Compresión brotli o gzip según `Accept-Encoding`, sólo para respuestas
+  de texto mayores que UMBRAL_COMPRESION bytes.
+
+Uso:
+    from codificacion import configurar_respuestas
+    configurar_respuestas(app)
+"""
+
+import gzip
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+UMBRAL_COMPRESION = int(os.environ.get('UMBRAL_COMPRESION', '1024'))
+NIVEL_GZIP = 6
+NIVEL_BROTLI = 5
+
+TIPOS_MSGPACK = ('application/msgpack', 'application/x-msgpack')
+TIPOS_COMPRIMIBLES = (
+    'application/json', 'application/msgpack', 'application/javascript',
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'image/svg+xml',
+)
+
+OPCIONES_ORJSON = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if ORJSON_AVAILABLE else 0
+
+
+def _por_defecto(obj):
+    """Tipos que ni orjson ni json serializan por sí mismos"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode('utf-8', 'replace')
+    if hasattr(obj, 'tolist'):  # escalares y arrays de NumPy
+        return obj.tolist()
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def a_json(obj):
+    """Serializar `obj` a bytes JSON compactos"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_por_defecto, option=OPCIONES_ORJSON)
+    return json.dumps(obj, default=_por_defecto, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def acepta_msgpack():
+    """¿El cliente pidió MessagePack y el servidor puede producirlo?"""
+    if not MSGPACK_AVAILABLE or not has_request_context():
+        return False
+    # Con */* (navegadores) gana JSON por ir primero en la lista
+    return request.accept_mimetypes.best_match(('application/json',) + TIPOS_MSGPACK) in TIPOS_MSGPACK
+
+
+def pide_columnas():
+    """¿La petición actual pidió el formato columnar (?formato=columnas)?"""
+    return has_request_context() and request.args.get('formato') == 'columnas'
+
+
+def a_columnas(filas, categoricas=(), campo_tiempo='fecha'):
+    """Convertir una lista de filas dict al formato columnar
+
+    Cada campo pasa a ser un array paralelo; `campo_tiempo` se envía como
+    `<campo>_base` (epoch en segundos de la primera fila) más las diferencias
+    sucesivas en segundos, y los campos de `categoricas` como diccionario
+    {'valores': [...], 'codigos': [...]}. Para reconstruir las fechas basta
+    con una suma acumulada sobre la base.
+    """
+    campos = list(filas[0].keys()) if filas else []
+    resultado = {'formato': 'columnas', 'filas': len(filas)}
+    for campo in campos:
+        if campo == campo_tiempo:
+            base, anterior, deltas = None, None, []
+            for fila in filas:
+                valor = fila[campo]
+                if valor is None:
+                    deltas.append(None)
+                    continue
+                segundos = int(valor.timestamp()) if isinstance(valor, datetime) else int(valor)
+                if base is None:
+                    base = anterior = segundos
+                deltas.append(segundos - anterior)
+                anterior = segundos
+            resultado[f'{campo}_base'] = base
+            resultado[campo] = deltas
+        elif campo in categoricas:
+            valores, indices, codigos = [], {}, []
+            for fila in filas:
+                valor = fila[campo]
+                codigo = indices.get(valor)
+                if codigo is None:
+                    codigo = indices[valor] = len(valores)
+                    valores.append(valor)
+                codigos.append(codigo)
+            resultado[campo] = {'valores': valores, 'codigos': codigos}
+        else:
+            resultado[campo] = [fila[campo] for fila in filas]
+    return resultado
+
+
+class ProveedorJSON(DefaultJSONProvider):
+    """Proveedor de jsonify con codificación rápida y negociación MessagePack"""
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            return a_json(obj).decode('utf-8')
+        kwargs.setdefault('default', _por_defecto)
+        kwargs.setdefault('ensure_ascii', False)
+        return json.dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if acepta_msgpack():
+            cuerpo = msgpack.packb(obj, default=_por_defecto, use_bin_type=True)
+            return self._app.response_class(cuerpo, mimetype=TIPOS_MSGPACK[0])
+        return self._app.response_class(a_json(obj), mimetype=self.mimetype)
+
+
+def _codificacion_aceptada():
+    aceptadas = request.accept_encodings
+    if BROTLI_AVAILABLE and aceptadas['br']:
+        return 'br'
+    if aceptadas['gzip']:
+        return 'gzip'
+    return None
+
+
+def comprimir_respuesta(respuesta):
+    """after_request: comprimir el cuerpo si el cliente lo admite y compensa"""
+    if respuesta.mimetype in TIPOS_MSGPACK or respuesta.mimetype == 'application/json':
+        respuesta.vary.add('Accept')
+    if (respuesta.direct_passthrough or respuesta.is_streamed
+            or respuesta.status_code not in (200, 201)
+            or 'Content-Encoding' in respuesta.headers
+            or respuesta.mimetype not in TIPOS_COMPRIMIBLES):
+        return respuesta
+    respuesta.vary.add('Accept-Encoding')
+    cuerpo = respuesta.get_data()
+    if len(cuerpo) < UMBRAL_COMPRESION:
+        return respuesta
+    codificacion = _codificacion_aceptada()
+    if codificacion == 'br':
+        respuesta.set_data(brotli.compress(cuerpo, quality=NIVEL_BROTLI))
+    elif codificacion == 'gzip':
+        respuesta.set_data(gzip.compress(cuerpo, compresslevel=NIVEL_GZIP, mtime=0))
+    else:
+        return respuesta
+    respuesta.headers['Content-Encoding'] = codificacion
+    return respuesta
+
+
+def configurar_respuestas(app):
+    """Instalar el proveedor JSON y la compresión en una aplicación Flask"""
+    app.json = ProveedorJSON(app)
+    app.after_request(comprimir_respuesta)
+    return app
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📉 COMPRESIÓN DE LECTURAS - BANDA MUERTA
+========================================
+Con el invernadero estable casi todas las lecturas consecutivas difieren
+menos que la precisión del sensor, y cada una era una fila más de
+registros_ambiente. Con COMPRESION_LECTURAS=1 la ingesta guarda sólo los
+puntos que salen de la banda muerta del último punto guardado de su
+dispositivo:
+
+- una lectura dentro de la tolerancia (|Δtemperatura| <= tolerancia y
+  |Δhumedad| <= tolerancia), con la misma bomba y la misma alerta, no
+  inserta fila: extiende el último punto (`hasta` = su fecha, `muestras` + 1)
+- cualquier cambio de bomba o alerta, un valor fuera de banda, un hueco de
+  más de COMPRESION_HUECO s o un punto que ya cubre COMPRESION_MAX_SEGUNDOS
+  abren un punto nuevo
+
+Reconstrucción: cada fila vale para sus `muestras` lecturas, repartidas
+entre `fecha` y `hasta` con el valor del punto (escalón). Toda lectura
+original queda a menos de su tolerancia del valor reconstruido. Conteos y
+promedios de la BD se ponderan por `muestras`, y los historiales devuelven
+las lecturas reconstruidas (reconstruir()) de las filas que contienen las
+más recientes (filas_recientes()).
+
+Sólo se comprimen lecturas con `device_id`: sin él no se sabe de qué
+dispositivo es el último punto. Las lecturas que llegan tarde (anteriores
+al final del punto) se guardan como filas normales.
+
+`python compresion_lecturas.py --simular` mide la reducción de filas en
+un día estable sintético.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from almacenamiento import sql
+
+COMPRESION_LECTURAS = os.environ.get('COMPRESION_LECTURAS', '0') == '1'
+# Por defecto, la precisión del DHT22 (±0.5 °C, ±2 %)
+COMPRESION_TOLERANCIA_TEMPERATURA = float(os.environ.get('COMPRESION_TOLERANCIA_TEMPERATURA', '0.5'))
+COMPRESION_TOLERANCIA_HUMEDAD = float(os.environ.get('COMPRESION_TOLERANCIA_HUMEDAD', '2'))
+COMPRESION_MAX_SEGUNDOS = int(os.environ.get('COMPRESION_MAX_SEGUNDOS', '3600'))
+COMPRESION_HUECO = int(os.environ.get('COMPRESION_HUECO', '600'))
+COMPRESION_DISPOSITIVOS = 10000
+
+
+def _numero(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+class Punto:
+    """Último punto guardado de un dispositivo (id None mientras su lote no se confirma)"""
+    __slots__ = ('id', 'clave', 'fecha', 'hasta', 'muestras', 'temperatura', 'humedad',
+                 'estado_bomba', 'alerta', 'fila')
+
+    def __init__(self, registro_id, clave, fecha, temperatura, humedad, estado_bomba, alerta):
+        self.id = registro_id
+        self.clave = clave
+        self.fecha = self.hasta = fecha
+        self.muestras = 1
+        self.temperatura = temperatura
+        self.humedad = humedad
+        self.estado_bomba = estado_bomba
+        self.alerta = alerta
+        self.fila = None  # índice en el lote pendiente de insertar
+
+
+class CompresorBandaMuerta:
+    """Decide por dispositivo si una lectura extiende el último punto o abre otro"""
+
+    def __init__(self, activo=COMPRESION_LECTURAS, tolerancia_temperatura=COMPRESION_TOLERANCIA_TEMPERATURA,
+                 tolerancia_humedad=COMPRESION_TOLERANCIA_HUMEDAD, capacidad=COMPRESION_DISPOSITIVOS):
+        self.activo = activo
+        self.tolerancia_temperatura = tolerancia_temperatura
+        self.tolerancia_humedad = tolerancia_humedad
+        self.capacidad = capacidad
+        self.lock = threading.Lock()
+        self.puntos = OrderedDict()
+        self.lecturas = 0
+        self.extendidas = 0
+
+    def _dentro(self, punto, fecha, temperatura, humedad, estado_bomba, alerta):
+        return (
+            fecha >= punto.hasta
+            and (fecha - punto.hasta).total_seconds() <= COMPRESION_HUECO
+            and (fecha - punto.fecha).total_seconds() <= COMPRESION_MAX_SEGUNDOS
+            and estado_bomba == punto.estado_bomba and alerta == punto.alerta
+            and abs(temperatura - punto.temperatura) <= self.tolerancia_temperatura
+            and abs(humedad - punto.humedad) <= self.tolerancia_humedad
+        )
+
+    def _siguiente(self, dispositivo, fecha, temperatura, humedad, estado_bomba, alerta, lote=()):
+        """Punto que la lectura extiende (ya actualizado) o None; llamar con el lock
+
+        Un punto sin id sólo se extiende desde su propio lote (`lote`).
+        """
+        self.lecturas += 1
+        punto = self.puntos.get(dispositivo)
+        if punto is None or (punto.id is None and punto not in lote):
+            return None
+        if not self._dentro(punto, fecha, temperatura, humedad, estado_bomba, alerta):
+            return None
+        punto.hasta = fecha
+        punto.muestras += 1
+        self.puntos.move_to_end(dispositivo)
+        self.extendidas += 1
+        return punto
+
+    def _anclar(self, dispositivo, punto):
+        actual = self.puntos.get(dispositivo)
+        if actual is not None and actual.hasta >= punto.fecha:
+            return  # lectura tardía: el punto vigente sigue siendo el más reciente
+        self.puntos[dispositivo] = punto
+        self.puntos.move_to_end(dispositivo)
+        while len(self.puntos) > self.capacidad:
+            self.puntos.popitem(last=False)
+
+    # -------- ingesta de una lectura --------
+    def extender(self, dispositivo, fecha, temperatura, humedad, estado_bomba, alerta):
+        """id del punto guardado que absorbe la lectura, o None si hay que insertarla"""
+        temperatura, humedad = _numero(temperatura), _numero(humedad)
+        if not self.activo or dispositivo is None or temperatura is None or humedad is None:
+            return None
+        with self.lock:
+            punto = self._siguiente(dispositivo, fecha, temperatura, humedad, estado_bomba, alerta)
+            return punto.id if punto else None
+
+    def anclar(self, dispositivo, registro_id, fecha, temperatura, humedad, estado_bomba, alerta):
+        """La lectura se insertó como fila `registro_id`: pasa a ser el último punto"""
+        temperatura, humedad = _numero(temperatura), _numero(humedad)
+        if not self.activo or dispositivo is None or temperatura is None or humedad is None:
+            return
+        with self.lock:
+            self._anclar(dispositivo, Punto(registro_id, None, fecha, temperatura, humedad, estado_bomba, alerta))
+
+    def olvidar(self, dispositivo):
+        """La BD no refleja el punto (error o fila borrada): el siguiente abre uno nuevo"""
+        with self.lock:
+            self.puntos.pop(dispositivo, None)
+
+    # -------- ingesta por lotes --------
+    def comprimir_lote(self, ambiente):
+        """Comprimir filas (fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, clave)
+
+        Devuelve (filas, extensiones, absorbidas, pendientes):
+        - filas: las que hay que insertar, con `hasta` y `muestras` al final
+        - extensiones: tuplas (hasta, muestras, id) para puntos ya guardados
+        - absorbidas: {clave: punto que absorbe la lectura} (su id, tras confirmar)
+        - pendientes: puntos nuevos del lote, para confirmar() tras insertar
+        """
+        if not self.activo:
+            return [fila + (None, 1) for fila in ambiente], [], {}, []
+        filas, extensiones, absorbidas, pendientes, lote = [], {}, {}, [], set()
+        with self.lock:
+            for fila in ambiente:
+                fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, clave = fila
+                temperatura, humedad = _numero(temperatura), _numero(humedad)
+                if dispositivo is None or temperatura is None or humedad is None:
+                    filas.append(list(fila) + [None, 1])
+                    continue
+                punto = self._siguiente(dispositivo, fecha, temperatura, humedad, estado_bomba, alerta, lote)
+                if punto is None:
+                    punto = Punto(None, clave, fecha, temperatura, humedad, estado_bomba, alerta)
+                    punto.fila = len(filas)
+                    filas.append(list(fila) + [None, 1])
+                    pendientes.append((dispositivo, punto))
+                    lote.add(punto)
+                    self._anclar(dispositivo, punto)
+                elif punto.fila is not None:
+                    filas[punto.fila][7:9] = [fecha, punto.muestras]
+                else:
+                    extension = extensiones.setdefault(punto.id, [fecha, 0])
+                    extension[0] = fecha
+                    extension[1] += 1
+                if clave is not None:
+                    absorbidas[clave] = punto
+        return ([tuple(f) for f in filas], [(hasta, n, registro_id) for registro_id, (hasta, n) in extensiones.items()],
+                absorbidas, pendientes)
+
+    def confirmar(self, pendientes, ids):
+        """Asignar a los puntos del lote su id ({clave: id}); sin clave no se pueden extender"""
+        with self.lock:
+            for dispositivo, punto in pendientes:
+                punto.fila = None
+                punto.id = ids.get(punto.clave) if punto.clave is not None else None
+                if punto.id is None and self.puntos.get(dispositivo) is punto:
+                    del self.puntos[dispositivo]
+
+    def estadisticas(self):
+        with self.lock:
+            lecturas, extendidas, dispositivos = self.lecturas, self.extendidas, len(self.puntos)
+        return {
+            'activa': self.activo,
+            'tolerancia_temperatura': self.tolerancia_temperatura,
+            'tolerancia_humedad': self.tolerancia_humedad,
+            'lecturas': lecturas,
+            'extendidas': extendidas,
+            # Lecturas por fila insertada desde el arranque
+            'relacion': round(lecturas / (lecturas - extendidas), 1) if lecturas > extendidas else None,
+            'dispositivos': dispositivos,
+        }
+
+
+# -------- reconstrucción --------
+def expandir(registro, limite=None):
+    """Lecturas (más reciente primero) que representa una fila de registros_ambiente"""
+    muestras = int(registro.get('muestras') or 1)
+    hasta = registro.get('hasta')
+    base = {k: v for k, v in registro.items() if k not in ('hasta', 'muestras')}
+    if muestras <= 1 or hasta is None:
+        return [base]
+    paso = (hasta - registro['fecha']) / (muestras - 1)
+    cuantas = muestras if limite is None else min(muestras, limite)
+    return [dict(base, fecha=(hasta - paso * k).replace(microsecond=0)) for k in range(cuantas)]
+
+
+def reconstruir(filas, limite=None, marca=None):
+    """Lecturas reconstruidas de varias filas, más reciente primero
+
+    Con `marca` ('revision' o 'fecha', valor) sólo las posteriores a ella,
+    como las consultas ambiente_desde_*: por revisión una fila extendida se
+    devuelve entera (el cliente combina por id y fecha).
+    """
+    lecturas = [lectura for fila in filas for lectura in expandir(fila, limite)]
+    if marca and marca[0] == 'fecha':
+        lecturas = [lectura for lectura in lecturas if lectura['fecha'] > marca[1]]
+    lecturas.sort(key=lambda lectura: (lectura['fecha'], lectura['id']), reverse=True)
+    return lecturas if limite is None else lecturas[:limite]
+
+
+def filas_recientes(cur, n):
+    """Filas que contienen las n lecturas más recientes, más reciente primero por `fecha`
+
+    Sin compresión son las n últimas por fecha. Con ella una fila estable
+    empieza antes que esas n y sigue recibiendo lecturas: se añaden las filas
+    cuyo `hasta` llega a la n-ésima fecha más reciente (ambas por índice).
+    reconstruir(filas, n) da después exactamente las n lecturas.
+    """
+    if compresor_lecturas.activo:
+        cur.execute(sql('ambiente_corte_recientes'), (n - 1,))
+        corte = cur.fetchone()
+        if corte is not None:
+            cur.execute(sql('ambiente_recientes_desde'), (corte['fecha'], corte['fecha']))
+            return sorted(cur.fetchall(), key=lambda fila: (fila['fecha'], fila['id']), reverse=True)
+    cur.execute(sql('ambiente_recientes'), (n,))
+    return cur.fetchall()
+
+
+def desde_fecha(fecha):
+    """Fecha a partir de la que buscar filas cuyo punto puede seguir después de `fecha`"""
+    return fecha - timedelta(seconds=COMPRESION_MAX_SEGUNDOS) if compresor_lecturas.activo else fecha
+
+
+compresor_lecturas = CompresorBandaMuerta()
+
+
+def simular(dias=1, intervalo=30):
+    """Filas por día con y sin compresión para un invernadero estable sintético"""
+    import math
+    import random
+    from datetime import datetime
+
+    compresor = CompresorBandaMuerta(activo=True)
+    inicio = datetime(2024, 6, 1)
+    lecturas = int(dias * 86400 / intervalo)
+    filas = 0
+    for i in range(lecturas):
+        fecha = inicio + timedelta(seconds=i * intervalo)
+        hora = (i * intervalo / 3600) % 24
+        # Ciclo diario suave (±3 °C, ∓8 %) más el ruido del sensor
+        temperatura = round(24 + 3 * math.sin((hora - 9) * math.pi / 12) + random.gauss(0, 0.15), 1)
+        humedad = round(65 - 8 * math.sin((hora - 9) * math.pi / 12) + random.gauss(0, 0.8), 1)
+        if compresor.extender('sim', fecha, temperatura, humedad, 'Apagada', 'Normal') is None:
+            filas += 1
+            compresor.anclar('sim', filas, fecha, temperatura, humedad, 'Apagada', 'Normal')
+    return lecturas, filas
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Compresión por banda muerta de registros_ambiente")
+    parser.add_argument('--simular', type=int, nargs='?', const=1, metavar='DIAS',
+                        help="Filas guardadas en DIAS estables sintéticos (lectura cada 30 s)")
+    args = parser.parse_args()
+    if args.simular:
+        lecturas, filas = simular(args.simular)
+        print(f"📉 {lecturas} lecturas -> {filas} filas ({lecturas / filas:.1f} lecturas por fila) "
+              f"con tolerancias ±{COMPRESION_TOLERANCIA_TEMPERATURA} °C / ±{COMPRESION_TOLERANCIA_HUMEDAD} %")
+    else:
+        parser.print_help()
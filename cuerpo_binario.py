@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🧬 CUERPOS BINARIOS DE INGESTA - MESSAGEPACK Y CBOR
+===================================================
+Los dispositivos de alta frecuencia pueden enviar las lecturas en
+MessagePack (`Content-Type: application/msgpack`) o CBOR
+(`application/cbor`) en lugar de JSON. El cuerpo es un mapa con claves
+enteras cortas y valores en punto fijo:
+
+    {1: "24:6F:28:AA:BB:CC", 2: seq, 3: ts_ms, 5: 2354, 6: 6120, 7: 1, 8: 0}
+    → device_id, seq, ts, temperatura 23.54, humedad 61.20, Encendida, Normal
+
+- temperatura y humedad en centésimas (enteros) bajo las claves 5 y 6; un
+  float, o un valor bajo el nombre completo, se acepta tal cual
+- estado_bomba, alerta, nivel_alerta y tipo_evento como códigos (los mismos
+  que los datagramas UDP); un texto se acepta tal cual
+- device_id como texto o como los 6 bytes de la MAC
+- también valen las claves con nombre completo o como texto ("5")
+
+El resultado es el mismo dict que produciría el JSON, así que el resto de
+la ingesta no cambia. msgpack y cbor2 son opcionales: sin ellos, esos
+Content-Type se rechazan con 415.
+
+Uso:
+    from cuerpo_binario import configurar_cuerpos, leer_cuerpo
+    configurar_cuerpos(app)
+    data = leer_cuerpo()
+
+    python cuerpo_binario.py --benchmark 100000   # bytes y µs por lectura frente a JSON
+"""
+
+import argparse
+import json
+import re
+import time
+
+from flask import g, jsonify, request
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import cbor2
+    CBOR_AVAILABLE = True
+except ImportError:
+    CBOR_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from codificacion import TIPOS_MSGPACK
+from ingesta_udp import ALERTAS, EVENTOS, NIVELES
+
+TIPOS_CBOR = ('application/cbor',)
+PATRON_MAC = re.compile(r'[0-9A-F]{2}(?::[0-9A-F]{2}){5}')
+
+CLAVES = {
+    1: 'device_id', 2: 'seq', 3: 'ts', 4: 'enviado',
+    5: 'temperatura', 6: 'humedad', 7: 'estado_bomba', 8: 'alerta',
+    9: 'tipo_evento', 10: 'descripcion', 11: 'nivel_alerta', 12: 'valor', 13: 'zona',
+}
+NUMEROS = {nombre: numero for numero, nombre in CLAVES.items()}
+CENTESIMAS = frozenset(('temperatura', 'humedad'))
+CODIGOS = {
+    'estado_bomba': ('Apagada', 'Encendida'),
+    'alerta': ALERTAS,
+    'nivel_alerta': NIVELES,
+    'tipo_evento': EVENTOS,
+}
+
+
+def decodificar_lectura(mapa):
+    """Dict con los nombres de campo de la API a partir de un mapa compacto"""
+    if not isinstance(mapa, dict):
+        raise ValueError("El cuerpo binario debe ser un mapa")
+    data = {}
+    for clave, valor in mapa.items():
+        if isinstance(clave, str) and clave.isdigit():
+            clave = int(clave)
+        numerica = isinstance(clave, int)
+        nombre = CLAVES.get(clave) if numerica else clave
+        if nombre is None:
+            continue  # campo numérico desconocido (firmware más nuevo)
+        if numerica and nombre in CENTESIMAS and isinstance(valor, int) and not isinstance(valor, bool):
+            valor = valor / 100
+        elif nombre in CODIGOS and isinstance(valor, int):
+            codigos = CODIGOS[nombre]
+            valor = codigos[valor] if 0 <= valor < len(codigos) else 'Desconocido'
+        elif nombre == 'device_id' and isinstance(valor, (bytes, bytearray)):
+            valor = bytes(valor).hex(':').upper()
+        data[nombre] = valor
+    return data
+
+
+def compactar_lectura(data):
+    """Inverso de decodificar_lectura: mapa con claves enteras y punto fijo"""
+    mapa = {}
+    for nombre, valor in data.items():
+        if nombre in CENTESIMAS and isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            valor = round(valor * 100)
+        elif nombre in CODIGOS and valor in CODIGOS[nombre]:
+            valor = CODIGOS[nombre].index(valor)
+        elif nombre == 'device_id' and isinstance(valor, str) and PATRON_MAC.fullmatch(valor):
+            valor = bytes.fromhex(valor.replace(':', ''))
+        mapa[NUMEROS.get(nombre, nombre)] = valor
+    return mapa
+
+
+def codificar_lectura(data, formato='msgpack'):
+    """Bytes del cuerpo binario de una lectura (msgpack o cbor)"""
+    mapa = compactar_lectura(data)
+    if formato == 'cbor':
+        return cbor2.dumps(mapa)
+    return msgpack.packb(mapa, use_bin_type=True)
+
+
+def formato_cuerpo():
+    """'msgpack', 'cbor' o None (JSON) según el Content-Type de la petición"""
+    tipo = request.mimetype
+    if tipo in TIPOS_MSGPACK:
+        return 'msgpack'
+    if tipo in TIPOS_CBOR:
+        return 'cbor'
+    return None
+
+
+def leer_cuerpo(force=False):
+    """Cuerpo de la petición como dict: MessagePack o CBOR por Content-Type, JSON si no
+
+    El resultado se guarda en `g`, así el límite de ingesta y la vista no
+    decodifican dos veces el mismo cuerpo.
+    """
+    if 'cuerpo_lectura' in g:
+        return g.cuerpo_lectura
+    formato = formato_cuerpo()
+    if formato is None:
+        data = request.get_json(force=force)
+    else:
+        cuerpo = request.get_data()
+        try:
+            if formato == 'msgpack':
+                mapa = msgpack.unpackb(cuerpo, raw=False, strict_map_key=False)
+            else:
+                mapa = cbor2.loads(cuerpo)
+        except Exception as e:
+            raise ValueError(f"Cuerpo {formato} no válido: {e}")
+        data = decodificar_lectura(mapa)
+    g.cuerpo_lectura = data
+    return data
+
+
+def rechazar_no_soportados():
+    """before_request: 415 si llega un cuerpo binario que este servidor no puede leer"""
+    formato = formato_cuerpo() if request.method in ('POST', 'PUT') else None
+    if (formato == 'msgpack' and not MSGPACK_AVAILABLE) or (formato == 'cbor' and not CBOR_AVAILABLE):
+        respuesta = jsonify({'error': f"Formato {request.mimetype} no disponible en el servidor",
+                             'aceptados': ['application/json'] + list(formatos_disponibles())})
+        return respuesta, 415
+    return None
+
+
+def formatos_disponibles():
+    tipos = []
+    if MSGPACK_AVAILABLE:
+        tipos.extend(TIPOS_MSGPACK)
+    if CBOR_AVAILABLE:
+        tipos.extend(TIPOS_CBOR)
+    return tipos
+
+
+def configurar_cuerpos(app):
+    """Rechazar con 415 los cuerpos binarios sin decodificador instalado"""
+    app.before_request(rechazar_no_soportados)
+    return app
+
+
+def benchmark(total):
+    """Bytes por lectura y µs por decodificación: JSON frente a MessagePack y CBOR"""
+    lecturas = []
+    for i in range(1000):
+        lecturas.append({
+            'device_id': f"24:6F:28:{i >> 8:02X}:{i & 255:02X}:01", 'seq': (7 << 32) | i,
+            'ts': 1760000000000 + i * 1000, 'enviado': 1760000000000 + i * 1000 + 35,
+            'temperatura': round(18 + (i % 140) / 10, 2), 'humedad': round(45 + (i % 400) / 10, 2),
+            'estado_bomba': ('Apagada', 'Encendida')[i & 1], 'alerta': ALERTAS[i % 3],
+        })
+    formatos = {'json': ([json.dumps(l, separators=(',', ':')).encode() for l in lecturas], json.loads)}
+    if ORJSON_AVAILABLE:
+        formatos['json (orjson)'] = (formatos['json'][0], orjson.loads)
+    if MSGPACK_AVAILABLE:
+        formatos['msgpack'] = ([codificar_lectura(l, 'msgpack') for l in lecturas],
+                               lambda b: decodificar_lectura(msgpack.unpackb(b, raw=False, strict_map_key=False)))
+    if CBOR_AVAILABLE:
+        formatos['cbor'] = ([codificar_lectura(l, 'cbor') for l in lecturas],
+                            lambda b: decodificar_lectura(cbor2.loads(b)))
+    print(f"{'formato':<14} {'bytes':>7} {'µs/lectura':>11}")
+    base = None
+    for nombre, (cuerpos, decodificar) in formatos.items():
+        inicio = time.perf_counter()
+        for i in range(total):
+            decodificar(cuerpos[i % len(cuerpos)])
+        us = (time.perf_counter() - inicio) / total * 1e6
+        tamano = sum(map(len, cuerpos)) / len(cuerpos)
+        base = base or (tamano, us)
+        print(f"{nombre:<14} {tamano:>7.1f} {us:>11.2f}   ({tamano / base[0]:.0%} bytes, {us / base[1]:.0%} CPU)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cuerpos binarios de ingesta (MessagePack/CBOR)')
+    parser.add_argument('--benchmark', type=int, metavar='N', default=100000,
+                        help='decodificar N lecturas en cada formato')
+    args = parser.parse_args()
+    benchmark(args.benchmark)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,37 @@
 #!/usr/bin/env python3
 """
 Script para generar certificados SSL auto-firmados para el servidor
+
+Por defecto la llave es ECDSA P-256: el handshake cuesta bastante menos
+CPU que con RSA 2048, tanto en el servidor como en el ESP32 (mbedTLS).
+Con --rsa se genera el certificado RSA 2048 de siempre, para clientes
+antiguos sin curvas elípticas.
+
+Uso:
+    python generar_certificado.py            # ECDSA P-256 -> server.crt / server.key
+    python generar_certificado.py --rsa      # RSA 2048
 """
 
+import argparse
+
 from OpenSSL import crypto
+from cryptography.hazmat.primitives.asymmetric import ec
 import os
 
-def generar_certificado_ssl():
-    """Generar certificado SSL auto-firmado"""
-    
-    # Crear par de llaves
+def generar_llave(tipo='ecdsa'):
+    """Par de llaves ECDSA P-256 o RSA 2048"""
+    if tipo == 'ecdsa':
+        return crypto.PKey.from_cryptography_key(ec.generate_private_key(ec.SECP256R1()))
     key = crypto.PKey()
     key.generate_key(crypto.TYPE_RSA, 2048)
-    
+    return key
+
+def generar_certificado_ssl(tipo='ecdsa', archivo_crt='server.crt', archivo_key='server.key', mostrar_ayuda=True):
+    """Generar certificado SSL auto-firmado"""
+
+    # Crear par de llaves
+    key = generar_llave(tipo)
+
     # Crear certificado
     cert = crypto.X509()
     cert.get_subject().C = "ES"
@@ -21,31 +40,35 @@ def generar_certificado_ssl():
     cert.get_subject().O = "Sistema Invernadero"
     cert.get_subject().OU = "Desarrollo"
     cert.get_subject().CN = "localhost"
-    
+
     # Agregar extensiones para navegadores modernos
+    # (con ECDSA la llave sólo firma: no hay keyEncipherment)
+    usos = b"digitalSignature" if tipo == 'ecdsa' else b"digitalSignature,keyEncipherment"
     cert.add_extensions([
         crypto.X509Extension(b"subjectAltName", False, b"DNS:localhost,DNS:127.0.0.1,DNS:192.168.1.7,IP:127.0.0.1,IP:192.168.1.7"),
-        crypto.X509Extension(b"keyUsage", True, b"digitalSignature,keyEncipherment"),
+        crypto.X509Extension(b"keyUsage", True, usos),
         crypto.X509Extension(b"extendedKeyUsage", True, b"serverAuth"),
     ])
-    
+
     cert.set_serial_number(1000)
     cert.gmtime_adj_notBefore(0)
     cert.gmtime_adj_notAfter(365*24*60*60)  # Válido por 1 año
     cert.set_issuer(cert.get_subject())
     cert.set_pubkey(key)
     cert.sign(key, 'sha256')
-    
+
     # Guardar archivos
-    with open("server.crt", "wb") as f:
+    with open(archivo_crt, "wb") as f:
         f.write(crypto.dump_certificate(crypto.FILETYPE_PEM, cert))
-        
-    with open("server.key", "wb") as f:
+
+    with open(archivo_key, "wb") as f:
         f.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, key))
-        
-    print("✅ Certificados SSL generados:")
-    print("   📄 server.crt (certificado)")
-    print("   🔑 server.key (llave privada)")
+
+    if not mostrar_ayuda:
+        return
+    print(f"✅ Certificados SSL generados ({'ECDSA P-256' if tipo == 'ecdsa' else 'RSA 2048'}):")
+    print(f"   📄 {archivo_crt} (certificado)")
+    print(f"   🔑 {archivo_key} (llave privada)")
     print()
     print("🔧 Para usar HTTPS:")
     print("   1. El navegador mostrará una advertencia de seguridad")
@@ -53,4 +76,9 @@ def generar_certificado_ssl():
     print("   3. El sitio será seguro con HTTPS")
 
 if __name__ == "__main__":
-    generar_certificado_ssl()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generar certificado SSL auto-firmado")
+    parser.add_argument('--rsa', action='store_true', help="RSA 2048 en lugar de ECDSA P-256")
+    parser.add_argument('--crt', default='server.crt', help="Archivo del certificado")
+    parser.add_argument('--key', default='server.key', help="Archivo de la llave privada")
+    args = parser.parse_args()
+    generar_certificado_ssl('rsa' if args.rsa else 'ecdsa', args.crt, args.key)
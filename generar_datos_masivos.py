@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🌱 GENERADOR DE DATOS MASIVOS - INVERNADERO
+===========================================
+Siembra la base de datos con meses de lecturas realistas para probar el
+sistema a escala de producción (10M filas en pocos minutos).
+
+Las series se generan vectorizadas con NumPy, por bloques de tamaño fijo:
+    - temperatura con estacionalidad anual, ciclo diario, frentes de varios
+      días y ruido del sensor; cada dispositivo tiene su microclima
+    - humedad anticorrelacionada con la temperatura
+    - estado_bomba y alerta con la misma lógica que el firmware ESP32
+    - eventos de seguridad (movimiento / humo) con tasas de Poisson
+    - `dispositivo` por microclima y `revision` creciente con la fecha,
+      tomada del contador secuencia_revision (que se avanza al terminar)
+
+Las tablas deben tener el esquema de almacenamiento.crear_esquema().
+
+La carga usa LOAD DATA LOCAL INFILE desde un TSV temporal y, si el
+servidor no lo permite, INSERT multi-fila por lotes. Con la misma semilla
+y los mismos parámetros los datos son idénticos.
+
+Uso:
+    python generar_datos_masivos.py --dias 90 --dispositivos 20
+    python generar_datos_masivos.py --filas 10000000 --modo insert --semilla 7
+"""
+
+import argparse
+import math
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pymysql
+
+# Configuración de base de datos
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_USER = os.environ.get('DB_USER', 'root')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', 'root')
+DB_NAME = os.environ.get('DB_NAME', 'invernadero')
+
+EPOCH = datetime(1970, 1, 1)  # las fechas se manejan como hora local "naive"
+TAM_BLOQUE = 500_000        # filas generadas por bloque (acota la memoria)
+LOTE_INSERT = 10_000        # filas por sentencia en modo INSERT multi-fila
+INTERVALO_POR_DEFECTO = 30  # segundos entre lecturas, como el firmware
+
+# Umbrales iguales a los de arduino/invernadero_esp32.ino
+TEMP_MIN, TEMP_MAX, TEMP_CRITICA = 18.0, 28.0, 35.0
+HUM_MIN, HUM_MAX = 40.0, 70.0
+HUM_CRITICA_BAJA, HUM_CRITICA_ALTA = 30.0, 80.0
+
+# Eventos de seguridad por dispositivo y día
+TASA_MOVIMIENTO_DIA = 3.0
+TASA_HUMO_DIA = 0.05
+
+COLUMNAS_AMBIENTE = "fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, revision"
+SQL_INSERT_AMBIENTE = (
+    f"INSERT INTO registros_ambiente ({COLUMNAS_AMBIENTE}) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+)
+SQL_INSERT_SEGURIDAD = (
+    "INSERT INTO registros_seguridad (fecha, tipo_evento, descripcion, nivel_alerta) "
+    "VALUES (%s, %s, %s, %s)"
+)
+
+
+def conectar(local_infile=False):
+    """Conexión a MySQL preparada para carga masiva"""
+    return pymysql.connect(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        charset='utf8mb4',
+        local_infile=local_infile,
+        autocommit=False
+    )
+
+
+def parametros_dispositivos(dispositivos, semilla):
+    """Microclima fijo de cada dispositivo (desfases y frentes meteorológicos)"""
+    rng = np.random.default_rng([semilla, 0])
+    return {
+        'ids': np.array([f"esp32-{d:05d}" for d in range(dispositivos)]),
+        'temp_offset': rng.normal(0.0, 1.5, dispositivos),
+        'hum_offset': rng.normal(0.0, 5.0, dispositivos),
+        'frente_periodo': rng.uniform(2.0, 6.0, (dispositivos, 3)) * 86400.0,
+        'frente_fase': rng.uniform(0.0, 2 * math.pi, (dispositivos, 3)),
+        'frente_amp': rng.uniform(0.5, 1.8, (dispositivos, 3)),
+    }
+
+
+def generar_bloque(inicio_fila, fin_fila, dispositivos, intervalo, epoch_inicio, params, semilla,
+                   revision_base=0):
+    """Generar las columnas de las filas [inicio_fila, fin_fila) de forma vectorizada.
+
+    La fila k corresponde al paso de tiempo k // dispositivos del dispositivo
+    k % dispositivos, así las fechas quedan ordenadas igual que los ids y
+    que las revisiones (revision_base + k + 1).
+    """
+    k = np.arange(inicio_fila, fin_fila, dtype=np.int64)
+    paso = k // dispositivos
+    dispositivo = k % dispositivos
+    # Cada dispositivo envía desfasado dentro del intervalo
+    segundos = epoch_inicio + paso * intervalo + (dispositivo * intervalo) // dispositivos
+
+    rng = np.random.default_rng([semilla, 1, inicio_fila // TAM_BLOQUE])
+    dia_anio = (segundos / 86400.0) % 365.25
+    hora = (segundos % 86400) / 3600.0
+
+    estacional = 6.0 * np.cos(2 * math.pi * (dia_anio - 200) / 365.25)
+    diario = 4.0 * np.cos(2 * math.pi * (hora - 15) / 24)
+    fases = params['frente_fase'][dispositivo] + (
+        2 * math.pi * segundos[:, None] / params['frente_periodo'][dispositivo])
+    frentes = (params['frente_amp'][dispositivo] * np.sin(fases)).sum(axis=1)
+
+    temperatura = 22.0 + params['temp_offset'][dispositivo] + estacional + diario + frentes
+    temperatura += rng.normal(0.0, 0.3, k.size)
+    humedad = 60.0 + params['hum_offset'][dispositivo] - 1.8 * (temperatura - 22.0)
+    humedad += rng.normal(0.0, 1.5, k.size)
+    humedad = np.clip(humedad, 15.0, 98.0)
+
+    temperatura = np.round(temperatura, 1)
+    humedad = np.round(humedad, 1)
+
+    bomba = (temperatura > TEMP_MAX) | (humedad < HUM_MIN)
+    critica = (temperatura > TEMP_CRITICA) | (humedad < HUM_CRITICA_BAJA) | (humedad > HUM_CRITICA_ALTA)
+    alta = (temperatura > TEMP_MAX) | (temperatura < TEMP_MIN) | (humedad < HUM_MIN) | (humedad > HUM_MAX)
+    alerta = np.where(critica, 'Crítico', np.where(alta, 'Alto', 'Normal'))
+
+    return {
+        'fecha': segundos.astype('datetime64[s]'),
+        'temperatura': temperatura,
+        'humedad': humedad,
+        'estado_bomba': np.where(bomba, 'Encendida', 'Apagada'),
+        'alerta': alerta,
+        'dispositivo': params['ids'][dispositivo],
+        'revision': revision_base + k + 1,
+    }
+
+
+def bloque_a_tsv(bloque):
+    """Serializar un bloque a texto TSV para LOAD DATA"""
+    fechas = np.datetime_as_string(bloque['fecha'], unit='s')
+    fechas = np.char.replace(fechas, 'T', ' ')
+    columnas = [
+        fechas,
+        np.char.mod('%.1f', bloque['temperatura']),
+        np.char.mod('%.1f', bloque['humedad']),
+        bloque['estado_bomba'],
+        bloque['alerta'],
+        bloque['dispositivo'],
+        bloque['revision'].astype(str),
+    ]
+    filas = columnas[0]
+    for columna in columnas[1:]:
+        filas = np.char.add(np.char.add(filas, '\t'), columna)
+    return '\n'.join(filas.tolist()) + '\n'
+
+
+def bloque_a_tuplas(bloque):
+    """Convertir un bloque a tuplas para INSERT multi-fila"""
+    fechas = np.datetime_as_string(bloque['fecha'], unit='s')
+    return list(zip(
+        np.char.replace(fechas, 'T', ' ').tolist(),
+        bloque['temperatura'].tolist(),
+        bloque['humedad'].tolist(),
+        bloque['estado_bomba'].tolist(),
+        bloque['alerta'].tolist(),
+        bloque['dispositivo'].tolist(),
+        bloque['revision'].tolist(),
+    ))
+
+
+def cargar_bloque_infile(conn, bloque):
+    """Cargar un bloque con LOAD DATA LOCAL INFILE"""
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8', delete=False) as f:
+        f.write(bloque_a_tsv(bloque))
+        ruta = f.name
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "LOAD DATA LOCAL INFILE %s INTO TABLE registros_ambiente "
+                "CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                f"({COLUMNAS_AMBIENTE})",
+                (ruta.replace('\\', '/'),))
+    finally:
+        os.remove(ruta)
+
+
+def cargar_bloque_insert(conn, bloque):
+    """Cargar un bloque con INSERT multi-fila (pymysql agrupa executemany)"""
+    tuplas = bloque_a_tuplas(bloque)
+    with conn.cursor() as cur:
+        for i in range(0, len(tuplas), LOTE_INSERT):
+            cur.executemany(SQL_INSERT_AMBIENTE, tuplas[i:i + LOTE_INSERT])
+
+
+def infile_disponible(conn):
+    """Comprobar si el servidor acepta LOAD DATA LOCAL INFILE"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT @@GLOBAL.local_infile AS local_infile")
+            fila = cur.fetchone()
+        valor = fila['local_infile'] if isinstance(fila, dict) else fila[0]
+        return str(valor).upper() in ('ON', '1')
+    except pymysql.MySQLError:
+        return False
+
+
+def _valor(fila, clave):
+    if not fila:
+        return 0
+    return int((fila[clave] if isinstance(fila, dict) else fila[0]) or 0)
+
+
+def revision_actual(conn):
+    """Última revisión asignada: la del contador de almacenamiento.py o la mayor guardada"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(revision), 0) AS revision FROM registros_ambiente")
+        guardada = _valor(cur.fetchone(), 'revision')
+        try:
+            cur.execute("SELECT valor FROM secuencia_revision WHERE id = 1")
+            contador = _valor(cur.fetchone(), 'valor')
+        except pymysql.MySQLError:
+            contador = 0  # sin contador: crear_esquema() lo ajusta al arrancar el servidor
+    return max(guardada, contador)
+
+
+def avanzar_revision(conn, revision):
+    """Dejar el contador en `revision` para que las escrituras siguientes vayan detrás"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO secuencia_revision (id, valor) VALUES (1, %s) "
+                        "ON DUPLICATE KEY UPDATE valor = GREATEST(valor, VALUES(valor))", (revision,))
+    except pymysql.MySQLError:
+        pass
+
+
+def generar_eventos_seguridad(dias, dispositivos, epoch_inicio, semilla):
+    """Eventos de movimiento y humo con llegadas de Poisson"""
+    rng = np.random.default_rng([semilla, 2])
+    duracion = dias * 86400.0
+    eventos = []
+
+    n_mov = rng.poisson(TASA_MOVIMIENTO_DIA * dias * dispositivos)
+    for segundo in np.sort(rng.uniform(0, duracion, n_mov)):
+        fecha = EPOCH + timedelta(seconds=epoch_inicio + int(segundo))
+        eventos.append((fecha, 'Movimiento', 'Actividad detectada en zona de cultivo', 'Bajo'))
+
+    n_humo = rng.poisson(TASA_HUMO_DIA * dias * dispositivos)
+    niveles = rng.lognormal(5.9, 0.3, n_humo)
+    for segundo, nivel in zip(np.sort(rng.uniform(0, duracion, n_humo)), niveles):
+        fecha = EPOCH + timedelta(seconds=epoch_inicio + int(segundo))
+        critico = nivel > 500
+        eventos.append((fecha, 'Humo',
+                        f"Nivel {'crítico' if critico else 'de humo'} detectado: {int(nivel)}",
+                        'Crítico' if critico else 'Medio'))
+
+    eventos.sort(key=lambda e: e[0])
+    return eventos
+
+
+def sembrar_ambiente(conn, filas, dispositivos=20, intervalo=INTERVALO_POR_DEFECTO,
+                     semilla=2025, hasta=None, modo='auto', truncar=True, eventos=True):
+    """Sembrar `filas` lecturas terminando en `hasta` (por defecto ahora).
+
+    Devuelve el número de filas insertadas. `modo` es 'infile', 'insert' o
+    'auto' (LOAD DATA si el servidor lo permite).
+    """
+    hasta = (hasta or datetime.now()).replace(microsecond=0)
+    pasos = math.ceil(filas / dispositivos)
+    epoch_fin = int((hasta - EPOCH).total_seconds())
+    epoch_inicio = epoch_fin - pasos * intervalo
+    params = parametros_dispositivos(dispositivos, semilla)
+
+    if modo == 'auto':
+        modo = 'infile' if infile_disponible(conn) else 'insert'
+    cargar = cargar_bloque_infile if modo == 'infile' else cargar_bloque_insert
+
+    with conn.cursor() as cur:
+        cur.execute("SET SESSION unique_checks = 0")
+        cur.execute("SET SESSION foreign_key_checks = 0")
+        if truncar:
+            cur.execute("TRUNCATE TABLE registros_ambiente")
+            if eventos:
+                cur.execute("TRUNCATE TABLE registros_seguridad")
+
+    # Las revisiones nunca se reutilizan, ni tras vaciar la tabla: un
+    # cliente puede conservar una marca `since` anterior
+    revision_base = revision_actual(conn)
+    inicio = time.perf_counter()
+    for desde in range(0, filas, TAM_BLOQUE):
+        hasta_fila = min(desde + TAM_BLOQUE, filas)
+        bloque = generar_bloque(desde, hasta_fila, dispositivos, intervalo, epoch_inicio, params, semilla,
+                                revision_base)
+        cargar(conn, bloque)
+        avanzar_revision(conn, revision_base + hasta_fila)
+        conn.commit()
+        ritmo = hasta_fila / max(time.perf_counter() - inicio, 1e-9)
+        print(f"   📥 {hasta_fila:,}/{filas:,} filas ({ritmo:,.0f} filas/s, modo {modo})")
+
+    if eventos:
+        lista = generar_eventos_seguridad(pasos * intervalo / 86400.0, dispositivos, epoch_inicio, semilla)
+        with conn.cursor() as cur:
+            for i in range(0, len(lista), LOTE_INSERT):
+                cur.executemany(SQL_INSERT_SEGURIDAD, lista[i:i + LOTE_INSERT])
+        conn.commit()
+        print(f"   🚨 {len(lista):,} eventos de seguridad")
+
+    with conn.cursor() as cur:
+        cur.execute("SET SESSION unique_checks = 1")
+        cur.execute("SET SESSION foreign_key_checks = 1")
+        cur.execute("ANALYZE TABLE registros_ambiente")
+    return filas
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Siembra masiva de datos realistas del invernadero")
+    parser.add_argument('--dias', type=float, default=90, help="Días de historia a generar")
+    parser.add_argument('--filas', type=int, help="Número exacto de filas (ignora --dias)")
+    parser.add_argument('--dispositivos', type=int, default=20, help="Dispositivos (microclimas) simulados")
+    parser.add_argument('--intervalo', type=int, default=INTERVALO_POR_DEFECTO, help="Segundos entre lecturas")
+    parser.add_argument('--semilla', type=int, default=2025, help="Semilla para datos reproducibles")
+    parser.add_argument('--modo', choices=('auto', 'infile', 'insert'), default='auto', help="Método de carga")
+    parser.add_argument('--sin-truncar', action='store_true', help="Añadir sin vaciar las tablas")
+    parser.add_argument('--sin-eventos', action='store_true', help="No generar eventos de seguridad")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    filas = args.filas or int(args.dias * 86400 / args.intervalo) * args.dispositivos
+
+    print("🌱 GENERADOR DE DATOS MASIVOS")
+    print("=" * 50)
+    print(f"🗄️ Base de datos: {DB_NAME}@{DB_HOST}")
+    print(f"📊 Filas: {filas:,} | Dispositivos: {args.dispositivos} | Semilla: {args.semilla}")
+    print("=" * 50)
+
+    try:
+        conn = conectar(local_infile=args.modo != 'insert')
+    except Exception as e:
+        print(f"❌ Error conectando a MySQL: {e}")
+        return 1
+
+    try:
+        inicio = time.perf_counter()
+        sembrar_ambiente(conn, filas, args.dispositivos, args.intervalo, args.semilla,
+                         modo=args.modo, truncar=not args.sin_truncar, eventos=not args.sin_eventos)
+        print(f"✅ {filas:,} filas cargadas en {time.perf_counter() - inicio:.1f}s")
+        return 0
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error sembrando datos: {e}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
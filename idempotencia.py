@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔁 INGESTA IDEMPOTENTE - VENTANA DE DUPLICADOS
+==============================================
+Cuando el ESP32 reintenta un envío cuya respuesta se perdió (timeout), la
+misma lectura se guardaba dos veces e inflaba COUNT/AVG y las tablas de
+los PDF. Cada lectura puede identificarse con:
+
+- la cabecera Idempotency-Key, o
+- los campos `device_id` + `seq` del JSON (secuencia creciente por
+  dispositivo; el firmware la mantiene entre reinicios).
+
+La clave se guarda en registros_ambiente.clave_idempotencia, con índice
+único: esa es la garantía. Delante hay una ventana LRU en memoria con las
+últimas IDEMPOTENCIA_VENTANA claves, así un reintento se contesta con un
+200 barato sin abrir conexión. Si la clave ya salió de la ventana (o el
+proceso se reinició), el índice único rechaza el INSERT y la lectura se
+trata igualmente como duplicada. Las lecturas sin clave se guardan como
+siempre.
+
+Con la compresión por banda muerta (compresion_lecturas.py) una lectura
+puede extender la última fila de su dispositivo en lugar de insertarse: su
+clave no llega a la BD, así que sólo la ventana en memoria la reconoce.
+
+Los cambios de estado_bomba se registran en intervalos_bomba
+(ciclos_bomba.py) dentro de la misma transacción que la lectura.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import almacenamiento
+from almacenamiento import sql
+from ciclos_bomba import ciclos_bomba
+from compresion_lecturas import compresor_lecturas
+
+IDEMPOTENCIA_VENTANA = int(os.environ.get('IDEMPOTENCIA_VENTANA', '50000'))
+LONGITUD_CLAVE = 80
+CLAVES_POR_CONSULTA = 500
+
+
+def clave_idempotencia(data, cabeceras):
+    """(dispositivo, clave) de una lectura; clave None si no trae identificación
+
+    Lanza ValueError si `seq` no es un entero: la lectura no se arregla
+    reenviándola, así que los servidores responden 400 y no 500.
+    """
+    dispositivo = data.get('device_id')
+    dispositivo = str(dispositivo)[:40] if dispositivo not in (None, '') else None
+    clave = cabeceras.get('Idempotency-Key')
+    if not clave and dispositivo is not None and data.get('seq') is not None:
+        try:
+            seq = int(data['seq'])
+        except (TypeError, ValueError):
+            raise ValueError(f"seq no válido: {data['seq']!r}") from None
+        clave = f"{dispositivo}:{seq}"
+    return dispositivo, (clave[:LONGITUD_CLAVE] if clave else None)
+
+
+class VentanaDuplicados:
+    """Últimas claves aceptadas (clave -> id del registro), con desalojo LRU"""
+
+    def __init__(self, capacidad=IDEMPOTENCIA_VENTANA):
+        self.capacidad = capacidad
+        self.lock = threading.Lock()
+        self.claves = OrderedDict()
+        self.duplicados = 0
+        self.duplicados_bd = 0
+
+    def buscar(self, clave):
+        """id del registro si `clave` ya se aceptó (y lo cuenta como duplicado)"""
+        if clave is None:
+            return None
+        with self.lock:
+            registro_id = self.claves.get(clave)
+            if registro_id is not None:
+                self.claves.move_to_end(clave)
+                self.duplicados += 1
+            return registro_id
+
+    def registrar(self, clave, registro_id):
+        if clave is None or self.capacidad <= 0:
+            return
+        with self.lock:
+            self.claves[clave] = registro_id
+            self.claves.move_to_end(clave)
+            while len(self.claves) > self.capacidad:
+                self.claves.popitem(last=False)
+
+    def estadisticas(self):
+        with self.lock:
+            return {
+                'claves': len(self.claves),
+                'capacidad': self.capacidad,
+                'duplicados_memoria': self.duplicados,
+                'duplicados_bd': self.duplicados_bd,
+            }
+
+
+def insertar_lectura(conn, fecha, temperatura, humedad, estado_bomba, alerta, dispositivo=None, clave=None):
+    """(id, revision, duplicado) tras insertar y confirmar la lectura fechada en `fecha`
+
+    Si el índice único rechaza la clave, la lectura ya estaba guardada: se
+    devuelve el id existente con revision None y duplicado=True. Si la
+    lectura cae en la banda muerta del último punto del dispositivo, se
+    extiende esa fila y se devuelve su id.
+    """
+    registro_id = compresor_lecturas.extender(dispositivo, fecha, temperatura, humedad, estado_bomba, alerta)
+    if registro_id is not None:
+        try:
+            with conn.cursor() as cur:
+                revision = almacenamiento.revision_siguiente(cur)
+                extendidas = cur.execute(sql('ambiente_extender'), (fecha, 1, revision, registro_id))
+                if extendidas:
+                    ciclos_bomba.registrar(cur, dispositivo, fecha, estado_bomba)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            compresor_lecturas.olvidar(dispositivo)
+            ciclos_bomba.invalidar()
+            raise
+        if extendidas:
+            ventana_ingesta.registrar(clave, registro_id)
+            return registro_id, revision, False
+        compresor_lecturas.olvidar(dispositivo)  # la fila ya no existe: se inserta
+    try:
+        with conn.cursor() as cur:
+            revision = almacenamiento.revision_siguiente(cur)
+            cur.execute(sql('ambiente_insertar_idempotente'),
+                        (fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, clave, revision))
+            registro_id = cur.lastrowid
+            ciclos_bomba.registrar(cur, dispositivo, fecha, estado_bomba)
+        conn.commit()
+    except almacenamiento.ErrorIntegridad:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(sql('ambiente_por_clave'), (clave,))
+            fila = cur.fetchone()
+        registro_id = fila['id'] if fila else None
+        with ventana_ingesta.lock:
+            ventana_ingesta.duplicados_bd += 1
+        ventana_ingesta.registrar(clave, registro_id)
+        return registro_id, None, True
+    except Exception:
+        ciclos_bomba.invalidar()
+        raise
+    ventana_ingesta.registrar(clave, registro_id)
+    compresor_lecturas.anclar(dispositivo, registro_id, fecha, temperatura, humedad, estado_bomba, alerta)
+    return registro_id, revision, False
+
+
+def insertar_lote(conn, ambiente, seguridad=()):
+    """Insertar un lote en una transacción; devuelve ({clave: id}, revision) de las lecturas de ambiente
+
+    `ambiente` son tuplas (fecha, temperatura, humedad, estado_bomba, alerta,
+    dispositivo, clave) y `seguridad` tuplas (fecha, tipo_evento, descripcion,
+    nivel_alerta, clave). Una clave ya guardada no aborta el lote: se ignora
+    y, en ambiente, su id es el del registro existente. Con compresión, las lecturas absorbidas por
+    el punto de su dispositivo devuelven el id de ese punto. Todas las filas
+    escritas por el lote comparten su revisión (None si no trae ambiente).
+    """
+    ids, revision = {}, None
+    filas, extensiones, absorbidas, pendientes = compresor_lecturas.comprimir_lote(ambiente)
+    try:
+        with conn.cursor() as cur:
+            if filas or extensiones:
+                revision = almacenamiento.revision_siguiente(cur)
+            if filas:
+                cur.executemany(sql('ambiente_insertar_lote'), [fila + (revision,) for fila in filas])
+            if extensiones:
+                cur.executemany(sql('ambiente_extender'),
+                                [(hasta, muestras, revision, registro_id)
+                                 for hasta, muestras, registro_id in extensiones])
+            if seguridad:
+                cur.executemany(sql('seguridad_insertar_lote'), seguridad)
+            # executemany no devuelve los ids: se recuperan por clave
+            claves = [fila[6] for fila in filas if fila[6] is not None]
+            for i in range(0, len(claves), CLAVES_POR_CONSULTA):
+                parte = claves[i:i + CLAVES_POR_CONSULTA]
+                cur.execute(sql('ambiente_por_claves').format(marcas=', '.join(['%s'] * len(parte))), parte)
+                ids.update((f['clave_idempotencia'], f['id']) for f in cur.fetchall())
+            for fila in sorted(ambiente, key=lambda f: f[0]):
+                ciclos_bomba.registrar(cur, fila[5], fila[0], fila[3])
+        conn.commit()
+    except Exception:
+        for fila in ambiente:
+            compresor_lecturas.olvidar(fila[5])
+        ciclos_bomba.invalidar()
+        raise
+    compresor_lecturas.confirmar(pendientes, ids)
+    ids.update((clave, punto.id) for clave, punto in absorbidas.items() if punto.id is not None)
+    for clave, registro_id in ids.items():
+        ventana_ingesta.registrar(clave, registro_id)
+    return ids, revision
+
+
+ventana_ingesta = VentanaDuplicados()
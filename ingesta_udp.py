@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📶 INGESTA UDP - TELEMETRÍA COMPACTA SIN HTTP
+=============================================
+Cada lectura por HTTP cuesta una petición completa (conexión TCP, cabeceras,
+respuesta) en el ESP32 y un hilo y un socket en el servidor. Este listener
+opcional recibe la misma telemetría en datagramas UDP binarios de pocos
+bytes y la escribe con los mismos criterios que la ingesta HTTP: clave
+idempotente por dispositivo y secuencia, fecha del dispositivo (ts) y
+memoria reciente. No es CoAP: no hay confirmaciones; las pérdidas se
+contabilizan con la secuencia.
+
+Formato (little-endian, como el ESP32), cabecera de 24 bytes:
+
+    B  versión (1)      B  tipo (1 ambiente, 2 humo, 3 seguridad)
+    6s MAC del ESP32    Q  seq (32 bits altos: arranque, bajos: contador)
+    Q  ts en ms epoch (0 = hora de recepción)
+
+seguida de:
+
+    ambiente   h temperatura ×100, H humedad ×100, B bits (0: bomba,
+               1-2: alerta Normal/Medio/Alto/Crítico)
+    humo       H nivel del MQ-2, B nivel de alerta
+    seguridad  B tipo de evento, B nivel de alerta
+
+El hilo receptor sólo decodifica, descarta duplicados por secuencia y
+encola; un hilo escritor vacía la cola cada UDP_LOTE_INTERVALO segundos
+con un INSERT por lote (executemany) en una sola transacción. Si la BD no
+da abasto, la cola se limita a UDP_COLA_MAX datagramas y el exceso se
+cuenta como descartado.
+
+Uso:
+    UDP_PUERTO=5683 python servidor_simple_arduino.py   # junto al servidor
+    python ingesta_udp.py --puerto 5683                 # sólo el listener
+    python ingesta_udp.py --benchmark 200000            # datagramas/s en local
+"""
+
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import almacenamiento
+from cache_http import version_datos
+from idempotencia import insertar_lote
+from marcas_tiempo import fecha_lectura
+from memoria_reciente import almacen_ambiente
+from politica_muestreo import politica_muestreo
+
+UDP_PUERTO = int(os.environ.get('UDP_PUERTO', '0'))  # 0 = desactivado
+UDP_LOTE_INTERVALO = float(os.environ.get('UDP_LOTE_INTERVALO', '0.1'))
+UDP_LOTE_MAX = int(os.environ.get('UDP_LOTE_MAX', '5000'))
+UDP_COLA_MAX = int(os.environ.get('UDP_COLA_MAX', '200000'))
+UDP_BUFFER_SOCKET = 4 * 1024 * 1024
+
+VERSION = 1
+AMBIENTE, HUMO, SEGURIDAD = 1, 2, 3
+FORMATOS = {
+    AMBIENTE: struct.Struct('<BB6sQQhHB'),
+    HUMO: struct.Struct('<BB6sQQHB'),
+    SEGURIDAD: struct.Struct('<BB6sQQBB'),
+}
+TAMANO_MAX = max(f.size for f in FORMATOS.values())
+
+ALERTAS = ('Normal', 'Medio', 'Alto', 'Crítico')
+NIVELES = ('Bajo', 'Medio', 'Alto', 'Crítico')
+EVENTOS = ('Movimiento', 'Humo', 'Manual', 'Acceso')
+
+VENTANA_SECUENCIA = 64
+MASCARA_VENTANA = (1 << VENTANA_SECUENCIA) - 1
+
+
+def codificar(tipo, mac, seq, ts_ms, *valores):
+    """Datagrama listo para enviar (lo usan el benchmark y las pruebas)"""
+    return FORMATOS[tipo].pack(VERSION, tipo, mac, seq, ts_ms, *valores)
+
+
+def codificar_ambiente(mac, seq, ts_ms, temperatura, humedad, bomba, alerta='Normal'):
+    bits = int(bool(bomba)) | (ALERTAS.index(alerta) << 1)
+    return codificar(AMBIENTE, mac, seq, ts_ms, round(temperatura * 100), round(humedad * 100), bits)
+
+
+class ContabilidadSecuencias:
+    """Recibidos, perdidos, reordenados y duplicados por dispositivo
+
+    Guarda la secuencia más alta y una máscara de las VENTANA_SECUENCIA
+    anteriores: un hueco cuenta como perdido hasta que llega la lectura
+    que falta (reordenada). Un cambio en los 32 bits altos es un reinicio
+    del dispositivo y empieza una ventana nueva sin contar pérdidas. Sólo
+    las secuencias posteriores a la primera vista en el arranque pueden
+    haberse contado como hueco: las anteriores llegan reordenadas sin
+    descontar pérdidas.
+    """
+
+    def __init__(self):
+        # mac -> [ultimo, mascara, recibidos, perdidos, reordenados, duplicados, primera]
+        self.dispositivos = {}
+
+    def aceptar(self, mac, seq):
+        """True si `seq` es nueva para `mac`; False si es un duplicado"""
+        estado = self.dispositivos.get(mac)
+        if estado is None or (seq >> 32) != (estado[0] >> 32):
+            if estado is None:
+                self.dispositivos[mac] = [seq, 1, 1, 0, 0, 0, seq]
+            else:
+                estado[0], estado[1], estado[6] = seq, 1, seq
+                estado[2] += 1
+            return True
+        ultimo = estado[0]
+        if seq > ultimo:
+            salto = seq - ultimo
+            estado[3] += salto - 1
+            estado[1] = ((estado[1] << salto) | 1) & MASCARA_VENTANA if salto < VENTANA_SECUENCIA else 1
+            estado[0] = seq
+            estado[2] += 1
+            return True
+        distancia = ultimo - seq
+        if distancia < VENTANA_SECUENCIA:
+            bit = 1 << distancia
+            if estado[1] & bit:
+                estado[5] += 1
+                return False
+            estado[1] |= bit
+            if seq > estado[6]:
+                estado[3] -= 1  # rellena un hueco ya contado
+        # Más antigua que la ventana: se acepta y la BD descarta si ya estaba
+        estado[2] += 1
+        estado[4] += 1
+        return True
+
+    def resumen(self):
+        totales = [0, 0, 0, 0]
+        for estado in list(self.dispositivos.values()):
+            for i in range(4):
+                totales[i] += estado[2 + i]
+        recibidos, perdidos = totales[0], totales[1]
+        return {
+            'dispositivos': len(self.dispositivos),
+            'recibidos': recibidos,
+            'perdidos': perdidos,
+            'reordenados': totales[2],
+            'duplicados': totales[3],
+            'tasa_perdida': round(perdidos / (recibidos + perdidos), 6) if recibidos + perdidos else 0.0,
+        }
+
+
+def _texto_mac(mac):
+    return mac.hex(':').upper()
+
+
+class IngestaUDP:
+    """Listener UDP (hilo receptor) y escritor por lotes (hilo escritor)"""
+
+    def __init__(self, puerto=UDP_PUERTO, host='0.0.0.0', get_conn=almacenamiento.get_conn, escribir=True):
+        self.direccion = (host, puerto)
+        self.get_conn = get_conn
+        self.escribir = escribir
+        self.secuencias = ContabilidadSecuencias()
+        self.cola = deque()
+        self.detener = threading.Event()
+        self.hilos = []
+        self.socket = None
+        self.invalidos = 0
+        self.descartados = 0
+        self.escritos = 0
+        self.rechazados = 0
+        self.errores_bd = 0
+        self.ultimo_lote_ms = None
+
+    # -------- recepción --------
+    def abrir(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_BUFFER_SOCKET)
+        sock.bind(self.direccion)
+        sock.settimeout(0.5)  # para comprobar self.detener
+        self.socket = sock
+        self.direccion = sock.getsockname()
+        return sock
+
+    def _recibir(self):
+        sock = self.socket
+        recvfrom = sock.recvfrom
+        formatos = FORMATOS
+        aceptar = self.secuencias.aceptar
+        encolar = self.cola.append
+        cola = self.cola
+        ahora = time.time
+        while not self.detener.is_set():
+            try:
+                datos, _ = recvfrom(TAMANO_MAX + 1)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            formato = formatos.get(datos[1]) if len(datos) > 1 else None
+            if formato is None or len(datos) != formato.size or datos[0] != VERSION:
+                self.invalidos += 1
+                continue
+            campos = formato.unpack(datos)
+            if not aceptar(campos[2], campos[3]):
+                continue
+            if len(cola) >= UDP_COLA_MAX:
+                self.descartados += 1
+                continue
+            encolar((campos, ahora()))
+
+    # -------- escritura --------
+    def _filas(self, lote):
+        """(ambiente, seguridad) como tuplas para executemany"""
+        ambiente, seguridad = [], []
+        for campos, recibido in lote:
+            tipo, mac, seq, ts_ms = campos[1], campos[2], campos[3], campos[4]
+            try:
+                fecha, _ = fecha_lectura({'ts': ts_ms} if ts_ms else {}, ahora=recibido)
+            except ValueError:
+                self.rechazados += 1
+                continue
+            dispositivo = _texto_mac(mac)
+            if tipo == AMBIENTE:
+                bits = campos[7]
+                ambiente.append((fecha, campos[5] / 100, campos[6] / 100,
+                                 'Encendida' if bits & 1 else 'Apagada', ALERTAS[(bits >> 1) & 3],
+                                 dispositivo, f"{dispositivo}:{seq}"))
+            elif tipo == HUMO:
+                nivel = NIVELES[min(campos[6], 3)]
+                seguridad.append((fecha, 'Humo', f"Nivel de humo {campos[5]} ({dispositivo})", nivel,
+                                  f"{dispositivo}:{seq}"))
+            else:
+                evento = EVENTOS[campos[5]] if campos[5] < len(EVENTOS) else 'Desconocido'
+                seguridad.append((fecha, evento, f"Evento UDP de {dispositivo}", NIVELES[min(campos[6], 3)],
+                                  f"{dispositivo}:{seq}"))
+        return ambiente, seguridad
+
+    def escribir_lote(self, lote):
+        ambiente, seguridad = self._filas(lote)
+        if not (ambiente or seguridad) or not self.escribir:
+            return
+        conn = self.get_conn()
+        try:
+            ids, revision = insertar_lote(conn, ambiente, seguridad)
+        finally:
+            conn.close()
+        for fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, clave in ambiente:
+            almacen_ambiente.agregar({'id': ids.get(clave), 'revision': revision, 'fecha': fecha,
+                                      'temperatura': temperatura, 'humedad': humedad,
+                                      'estado_bomba': estado_bomba, 'alerta': alerta})
+            politica_muestreo.observar(dispositivo, temperatura, humedad, estado_bomba, alerta)
+        self.escritos += len(ambiente) + len(seguridad)
+        version_datos.incrementar()
+
+    def _escribir(self):
+        cola = self.cola
+        while True:
+            parado = self.detener.wait(UDP_LOTE_INTERVALO)
+            while cola:
+                lote = [cola.popleft() for _ in range(min(len(cola), UDP_LOTE_MAX))]
+                inicio = time.perf_counter()
+                try:
+                    self.escribir_lote(lote)
+                except Exception as e:
+                    self.errores_bd += 1
+                    print(f"❌ Error escribiendo lote UDP ({len(lote)} datagramas): {e}")
+                self.ultimo_lote_ms = round((time.perf_counter() - inicio) * 1000, 1)
+            if parado:
+                break
+
+    # -------- ciclo de vida --------
+    def iniciar(self):
+        if self.socket is None:
+            self.abrir()
+        for objetivo, nombre in ((self._recibir, 'udp-receptor'), (self._escribir, 'udp-escritor')):
+            hilo = threading.Thread(target=objetivo, name=nombre, daemon=True)
+            hilo.start()
+            self.hilos.append(hilo)
+        print(f"📶 Ingesta UDP escuchando en {self.direccion[0]}:{self.direccion[1]}")
+        return self
+
+    def parar(self):
+        """Dejar de recibir y vaciar la cola antes de volver"""
+        self.detener.set()
+        for hilo in self.hilos:
+            hilo.join()
+        if self.socket is not None:
+            self.socket.close()
+
+    def estadisticas(self):
+        resumen = self.secuencias.resumen()
+        resumen.update({
+            'puerto': self.direccion[1],
+            'en_cola': len(self.cola),
+            'escritos': self.escritos,
+            'invalidos': self.invalidos,
+            'descartados': self.descartados,
+            'rechazados': self.rechazados,
+            'errores_bd': self.errores_bd,
+            'ultimo_lote_ms': self.ultimo_lote_ms,
+        })
+        return resumen
+
+
+ingesta_udp = None
+
+
+def iniciar_si_configurado():
+    """Arrancar el listener si UDP_PUERTO está definido (servidores Flask)"""
+    global ingesta_udp
+    if UDP_PUERTO and ingesta_udp is None:
+        ingesta_udp = IngestaUDP(UDP_PUERTO).iniciar()
+    return ingesta_udp
+
+
+def _emitir(destino, total, dispositivos):
+    """Proceso emisor del benchmark: `total` lecturas con secuencias nuevas"""
+    emisor = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    macs = [i.to_bytes(6, 'big') for i in range(dispositivos)]
+    for i in range(total):
+        emisor.sendto(codificar_ambiente(macs[i % dispositivos], (1 << 32) | (i // dispositivos), 0,
+                                         22.5, 55.0, i % 2), destino)
+
+
+def benchmark(total, dispositivos=100):
+    """Datagramas/s que el receptor decodifica y encola (sin escribir en la BD)
+
+    El emisor corre en otro proceso; con un solo núcleo ambos compiten por
+    la CPU y la cifra es una cota inferior.
+    """
+    import multiprocessing
+    receptor = IngestaUDP(0, host='127.0.0.1', escribir=False)
+    receptor.abrir()
+    hilo = threading.Thread(target=receptor._recibir, daemon=True)
+    hilo.start()
+    emisor = multiprocessing.Process(target=_emitir, args=(receptor.direccion, total, dispositivos))
+    inicio = time.perf_counter()
+    emisor.start()
+    recibidos, ultimo_cambio = 0, inicio
+    while True:
+        time.sleep(0.05)
+        if len(receptor.cola) != recibidos:
+            recibidos, ultimo_cambio = len(receptor.cola), time.perf_counter()
+        elif not emisor.is_alive() and time.perf_counter() - ultimo_cambio > 0.5:
+            break
+    emisor.join()
+    receptor.detener.set()
+    hilo.join()
+    tasa = recibidos / (ultimo_cambio - inicio)
+    print(f"📶 {recibidos:,}/{total:,} datagramas en {ultimo_cambio - inicio:.2f} s "
+          f"→ {tasa:,.0f} datagramas/s (perdidos en el socket: {total - recibidos:,})")
+    return tasa
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Listener UDP de telemetría del invernadero')
+    parser.add_argument('--puerto', type=int, default=UDP_PUERTO or 5683)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='medir N datagramas en local y salir')
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    if almacenamiento.DB_BACKEND == 'sqlite':
+        almacenamiento.crear_esquema()
+    receptor = IngestaUDP(args.puerto, args.host).iniciar()
+    try:
+        while True:
+            time.sleep(10)
+            print(f"📊 {receptor.estadisticas()}")
+    except KeyboardInterrupt:
+        receptor.parar()
+
+
+if __name__ == '__main__':
+    main()
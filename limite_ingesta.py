@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🚦 LÍMITE DE INGESTA - TOKEN BUCKET POR DISPOSITIVO Y POR IP
+============================================================
+Una placa con el loop() sin delay, o el botón de /api/simular_datos
+pulsado sin parar, puede inundar registros_ambiente y dejar sin turno al
+resto de escrituras. Delante de los POST a /api/sensores/* y
+/api/simular_datos cada petición consume una ficha de dos cubos:
+
+- por dispositivo (`device_id` del cuerpo, si lo trae)
+- por IP de origen, sólo con LIMITE_IP=1: detrás de un proxy o de un NAT
+  toda la flota llega con la misma IP y compartiría un único cubo. Con
+  LIMITE_IP_CABECERA (p. ej. X-Forwarded-For) la IP es la primera de esa
+  cabecera; configurarla sólo si el proxy de confianza la reescribe.
+
+Cada cubo se rellena a `tasa` fichas/s hasta `rafaga`. Sin fichas la
+petición se contesta 429 con Retry-After, antes de leer la BD. La ráfaga
+por dispositivo por defecto deja pasar la cola de 64 lecturas que el
+firmware envía de golpe al recuperar la conexión.
+
+Los cubos viven en memoria, en una tabla repartida en LIMITE_FRANJAS
+diccionarios con su propio lock (lock striping), así que peticiones de
+dispositivos distintos casi nunca compiten por el mismo lock. Los cubos
+que llevan tiempo llenos se eliminan al crecer la tabla.
+
+Uso:
+    from limite_ingesta import configurar_limites, limitador_ingesta
+    configurar_limites(app)
+    limitador_ingesta.estadisticas()
+"""
+
+import math
+import os
+import threading
+import time
+
+from flask import jsonify, request
+
+from cuerpo_binario import leer_cuerpo
+
+LIMITE_INGESTA = os.environ.get('LIMITE_INGESTA', '1') != '0'
+LIMITE_DISPOSITIVO_TASA = float(os.environ.get('LIMITE_DISPOSITIVO_TASA', '1'))      # fichas/s
+LIMITE_DISPOSITIVO_RAFAGA = float(os.environ.get('LIMITE_DISPOSITIVO_RAFAGA', '80'))
+LIMITE_IP = os.environ.get('LIMITE_IP', '0') != '0'
+LIMITE_IP_CABECERA = os.environ.get('LIMITE_IP_CABECERA', '')
+LIMITE_IP_TASA = float(os.environ.get('LIMITE_IP_TASA', '20'))
+LIMITE_IP_RAFAGA = float(os.environ.get('LIMITE_IP_RAFAGA', '200'))
+LIMITE_FRANJAS = int(os.environ.get('LIMITE_FRANJAS', '16'))
+LIMITE_CLAVES_POR_FRANJA = 4096
+
+RUTAS_LIMITADAS = ('/api/sensores/', '/api/simular_datos')
+
+
+class Franja:
+    """Parte de la tabla de cubos con su propio lock"""
+
+    __slots__ = ('lock', 'cubos')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cubos = {}  # clave -> [fichas, ultimo_relleno, limitadas]
+
+
+class LimitadorTokenBucket:
+    """Tabla de cubos de fichas repartida en franjas con lock propio"""
+
+    def __init__(self, tasa, rafaga, franjas=LIMITE_FRANJAS, max_claves=LIMITE_CLAVES_POR_FRANJA):
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.max_claves = max_claves
+        self.franjas = [Franja() for _ in range(max(1, franjas))]
+        self.lock = threading.Lock()  # sólo para los contadores
+        self.admitidas = 0
+        self.limitadas = 0
+
+    def _franja(self, clave):
+        return self.franjas[hash(clave) % len(self.franjas)]
+
+    def _purgar(self, franja, ahora):
+        """Quitar los cubos que ya estarían llenos (clientes inactivos)"""
+        lleno_tras = self.rafaga / self.tasa if self.tasa > 0 else math.inf
+        for clave in [c for c, cubo in franja.cubos.items() if ahora - cubo[1] >= lleno_tras]:
+            del franja.cubos[clave]
+
+    def consumir(self, clave, ahora=None):
+        """0 si hay ficha para `clave`; si no, segundos hasta la siguiente"""
+        ahora = time.monotonic() if ahora is None else ahora
+        franja = self._franja(clave)
+        with franja.lock:
+            cubo = franja.cubos.get(clave)
+            if cubo is None:
+                if len(franja.cubos) >= self.max_claves:
+                    self._purgar(franja, ahora)
+                cubo = franja.cubos[clave] = [self.rafaga, ahora, 0]
+            else:
+                cubo[0] = min(self.rafaga, cubo[0] + (ahora - cubo[1]) * self.tasa)
+                cubo[1] = ahora
+            if cubo[0] >= 1:
+                cubo[0] -= 1
+                espera = 0.0
+            else:
+                cubo[2] += 1
+                espera = (1 - cubo[0]) / self.tasa if self.tasa > 0 else math.inf
+        with self.lock:
+            if espera:
+                self.limitadas += 1
+            else:
+                self.admitidas += 1
+        return espera
+
+    def estadisticas(self, top=5):
+        claves, mas_limitadas = 0, []
+        for franja in self.franjas:
+            with franja.lock:
+                claves += len(franja.cubos)
+                mas_limitadas.extend((cubo[2], clave) for clave, cubo in franja.cubos.items() if cubo[2])
+        mas_limitadas.sort(reverse=True)
+        return {
+            'tasa': self.tasa,
+            'rafaga': self.rafaga,
+            'claves': claves,
+            'admitidas': self.admitidas,
+            'limitadas': self.limitadas,
+            'mas_limitadas': {clave: n for n, clave in mas_limitadas[:top]},
+        }
+
+
+class LimiteIngesta:
+    """Cubos por dispositivo y por IP delante de las rutas de ingesta"""
+
+    def __init__(self):
+        self.dispositivos = LimitadorTokenBucket(LIMITE_DISPOSITIVO_TASA, LIMITE_DISPOSITIVO_RAFAGA)
+        self.ips = LimitadorTokenBucket(LIMITE_IP_TASA, LIMITE_IP_RAFAGA)
+
+    def admitir(self, dispositivo, ip=None):
+        """(espera_s, motivo): espera 0 si la petición pasa; sin `ip` no se limita por IP"""
+        if dispositivo is not None:
+            espera = self.dispositivos.consumir(dispositivo)
+            if espera:
+                return espera, 'dispositivo'
+        if ip is None:
+            return 0.0, None
+        espera = self.ips.consumir(ip)
+        return (espera, 'ip') if espera else (0.0, None)
+
+    def estadisticas(self):
+        return {
+            'activo': LIMITE_INGESTA,
+            'dispositivo': self.dispositivos.estadisticas(),
+            'ip': dict(self.ips.estadisticas(), activo=LIMITE_IP, cabecera=LIMITE_IP_CABECERA or None),
+        }
+
+
+limitador_ingesta = LimiteIngesta()
+
+
+def _dispositivo():
+    """device_id del cuerpo, o None si no lo trae o no se puede leer"""
+    try:
+        data = leer_cuerpo(force=True)
+    except Exception:
+        return None
+    dispositivo = data.get('device_id') if isinstance(data, dict) else None
+    return str(dispositivo)[:40] if dispositivo not in (None, '') else None
+
+
+def _ip():
+    """IP del cliente para el cubo por IP, o None si ese límite no está activo"""
+    if not LIMITE_IP:
+        return None
+    reenviada = request.headers.get(LIMITE_IP_CABECERA, '') if LIMITE_IP_CABECERA else ''
+    return reenviada.split(',')[0].strip() or request.remote_addr or '-'
+
+
+def limitar_ingesta():
+    """before_request: 429 con Retry-After si el dispositivo o la IP no tienen fichas"""
+    if request.method != 'POST' or not request.path.startswith(RUTAS_LIMITADAS):
+        return None
+    espera, motivo = limitador_ingesta.admitir(_dispositivo(), _ip())
+    if not espera:
+        return None
+    respuesta = jsonify({'error': 'Demasiadas peticiones', 'limite': motivo,
+                         'reintentar_en': round(espera, 2)})
+    respuesta.status_code = 429
+    respuesta.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+    return respuesta
+
+
+def configurar_limites(app):
+    """Instalar el límite de ingesta en una aplicación Flask (si LIMITE_INGESTA)"""
+    if LIMITE_INGESTA:
+        app.before_request(limitar_ingesta)
+    return app
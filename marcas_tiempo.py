@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+⏱️ MARCAS DE TIEMPO DEL DISPOSITIVO
+===================================
+Las lecturas se fechaban con la hora del servidor al recibirlas, así que
+un reintento o un lote guardado sin conexión quedaba con la hora del envío
+y no con la de la medición.
+
+El ESP32 sincroniza su reloj con GET /api/tiempo y envía con cada lectura:
+
+- `ts`: instante de la medición (epoch en ms o s, o fecha ISO)
+- `enviado` (opcional): su reloj en el momento de enviar, en la misma unidad
+
+Si llega `enviado`, el desfase entre relojes (hora del servidor al recibir
+menos `enviado`) se suma a `ts`, así que la deriva del reloj del ESP32
+desde la última sincronización no afecta a la fecha guardada. Las fechas
+futuras se recortan a la hora del servidor y las anteriores a
+TIEMPO_MAX_ATRASO se rechazan. Sin `ts`, la lectura se fecha al recibirla.
+"""
+
+import os
+import time
+from datetime import datetime
+
+TIEMPO_MAX_ATRASO = float(os.environ.get('TIEMPO_MAX_ATRASO', str(7 * 24 * 3600)))
+TIEMPO_TOLERANCIA_FUTURO = 2.0
+# Epoch por encima de este valor se interpreta en milisegundos (año 5138 en segundos)
+LIMITE_EPOCH_SEGUNDOS = 1e11
+
+
+def _epoch(valor):
+    """Segundos epoch de un número (s o ms) o de una fecha ISO local"""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return valor / 1000 if valor > LIMITE_EPOCH_SEGUNDOS else float(valor)
+    texto = str(valor).strip()
+    try:
+        numero = float(texto)
+    except ValueError:
+        return datetime.fromisoformat(texto.replace('Z', '+00:00')).timestamp()
+    return numero / 1000 if numero > LIMITE_EPOCH_SEGUNDOS else numero
+
+
+def fecha_lectura(data, ahora=None):
+    """(fecha, desfase_s) de una lectura: fecha local sin zona, como las de la BD
+
+    Lanza ValueError si `ts` no se entiende o es anterior a TIEMPO_MAX_ATRASO.
+    """
+    ahora = time.time() if ahora is None else ahora
+    if data.get('ts') in (None, ''):
+        return datetime.fromtimestamp(ahora).replace(microsecond=0), 0.0
+    try:
+        medicion = _epoch(data['ts'])
+        desfase = ahora - _epoch(data['enviado']) if data.get('enviado') not in (None, '') else 0.0
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Marca de tiempo no válida: {data.get('ts')!r}")
+    medicion += desfase
+    if medicion > ahora + TIEMPO_TOLERANCIA_FUTURO:
+        medicion = ahora
+    if medicion < ahora - TIEMPO_MAX_ATRASO:
+        raise ValueError(f"Lectura demasiado antigua ({(ahora - medicion) / 3600:.1f} h)")
+    return datetime.fromtimestamp(medicion).replace(microsecond=0), desfase
+
+
+def hora_servidor():
+    """Cuerpo de GET /api/tiempo para sincronizar el reloj del dispositivo"""
+    ahora = time.time()
+    return {
+        'epoch_ms': int(ahora * 1000),
+        'iso': datetime.fromtimestamp(ahora).isoformat(timespec='milliseconds'),
+    }
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🧠 MEMORIA RECIENTE - SERIES TEMPORALES EN PROCESO
+==================================================
+Almacén en memoria de las últimas lecturas de registros_ambiente para que
+el dashboard y las alertas no consulten la base de datos en cada petición.
+
+Cada métrica (temperatura, humedad, bomba, alerta, id, revisión) es una columna
+array('d') de capacidad fija que comparte un índice circular con la
+columna de tiempos, así la memoria está acotada desde el arranque
+(MEMORIA_CAPACIDAD filas, ~56 bytes por fila). Si NumPy está disponible
+los agregados se calculan sobre vistas sin copia.
+
+El almacén se calienta desde la BD con las filas más recientes y se
+alimenta en cada ingesta. Cuando una consulta cae fuera de lo que cubre
+la memoria, los métodos devuelven None y el llamador usa la BD.
+
+Las lecturas llegan fechadas por el dispositivo, así que un reintento o un
+lote guardado sin conexión puede llegar tarde: se inserta en su posición
+cronológica desplazando las filas posteriores (normalmente pocas), y
+los agregados se recalculan sobre el orden correcto. Las
+sincronizaciones por revisión siguen viendo las filas tardías durante
+MEMORIA_VENTANA_TARDIA segundos desde su llegada.
+
+Con la compresión por banda muerta la memoria guarda lecturas, no filas:
+el calentamiento reconstruye las `muestras` de cada fila comprimida y las
+lecturas que extienden una fila se agregan con el id de esa fila y la
+revisión de la escritura que la extendió.
+"""
+
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from datetime import datetime
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from almacenamiento import sql
+from compresion_lecturas import filas_recientes, reconstruir
+
+MEMORIA_ACTIVA = os.environ.get('MEMORIA_RECIENTE', '1') != '0'
+MEMORIA_CAPACIDAD = int(os.environ.get('MEMORIA_CAPACIDAD', '20000'))
+MAX_CATEGORIAS = 64
+MEMORIA_VENTANA_TARDIA = float(os.environ.get('MEMORIA_VENTANA_TARDIA', '600'))
+
+METRICAS = ('temperatura', 'humedad', 'bomba', 'alerta')
+
+
+class BufferCircular:
+    """Columnas paralelas array('d') con tiempos crecientes y capacidad fija"""
+
+    def __init__(self, columnas, capacidad):
+        self.capacidad = capacidad
+        self.tiempos = array('d', bytes(8 * capacidad))
+        self.columnas = {nombre: array('d', bytes(8 * capacidad)) for nombre in columnas}
+        self.inicio = 0
+        self.tamano = 0
+        if NUMPY_AVAILABLE:
+            # Vistas sin copia: los arrays nunca cambian de tamaño
+            self._np_tiempos = np.frombuffer(self.tiempos, dtype=np.float64)
+            self._np_columnas = {n: np.frombuffer(c, dtype=np.float64) for n, c in self.columnas.items()}
+
+    def agregar(self, ts, valores):
+        """Añadir una fila; devuelve el tiempo desalojado (o None)"""
+        desalojado = None
+        if self.tamano == self.capacidad:
+            desalojado = self.tiempos[self.inicio]
+            posicion = self.inicio
+            self.inicio = (self.inicio + 1) % self.capacidad
+        else:
+            posicion = (self.inicio + self.tamano) % self.capacidad
+            self.tamano += 1
+        self.tiempos[posicion] = ts
+        for nombre, columna in self.columnas.items():
+            columna[posicion] = valores[nombre]
+        return desalojado
+
+    def insertar(self, ts, valores):
+        """Añadir una fila en su posición cronológica
+
+        Devuelve (insertada, desalojado): una fila más antigua que todas las
+        de un buffer lleno no se inserta.
+        """
+        if self.tamano == 0 or ts >= self.tiempos[self._fisico(self.tamano - 1)]:
+            return True, self.agregar(ts, valores)
+        posicion = self.buscar(ts + 1e-6)  # detrás de las de igual tiempo
+        desalojado = None
+        if self.tamano == self.capacidad:
+            if posicion == 0:
+                return False, None
+            desalojado = self.tiempos[self.inicio]
+            self.inicio = (self.inicio + 1) % self.capacidad
+            self.tamano -= 1
+            posicion -= 1
+        # Desplazar una posición a la derecha las filas posteriores
+        columnas = [self.tiempos] + list(self.columnas.values())
+        for logico in range(self.tamano, posicion, -1):
+            destino, origen = self._fisico(logico), self._fisico(logico - 1)
+            for columna in columnas:
+                columna[destino] = columna[origen]
+        self.tamano += 1
+        destino = self._fisico(posicion)
+        self.tiempos[destino] = ts
+        for nombre, columna in self.columnas.items():
+            columna[destino] = valores[nombre]
+        return True, desalojado
+
+    def _fisico(self, logico):
+        return (self.inicio + logico) % self.capacidad
+
+    def buscar(self, ts):
+        """Primer índice lógico con tiempo >= ts (búsqueda binaria)"""
+        bajo, alto = 0, self.tamano
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self.tiempos[self._fisico(medio)] < ts:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return bajo
+
+    def tramos(self, desde_logico, hasta_logico):
+        """Rangos físicos [a, b) que cubren los índices lógicos pedidos"""
+        if desde_logico >= hasta_logico:
+            return []
+        a = self._fisico(desde_logico)
+        n = hasta_logico - desde_logico
+        if a + n <= self.capacidad:
+            return [(a, a + n)]
+        return [(a, self.capacidad), (0, a + n - self.capacidad)]
+
+    def fila(self, logico):
+        posicion = self._fisico(logico)
+        return self.tiempos[posicion], {n: c[posicion] for n, c in self.columnas.items()}
+
+    def valores(self, columna, desde_logico, hasta_logico):
+        """Valores de una columna en orden cronológico (NumPy o lista)"""
+        tramos = self.tramos(desde_logico, hasta_logico)
+        if NUMPY_AVAILABLE:
+            datos = self._np_columnas[columna] if columna != 'tiempo' else self._np_tiempos
+            partes = [datos[a:b] for a, b in tramos]
+            if not partes:
+                return np.empty(0)
+            return partes[0] if len(partes) == 1 else np.concatenate(partes)
+        datos = self.columnas[columna] if columna != 'tiempo' else self.tiempos
+        salida = []
+        for a, b in tramos:
+            salida.extend(datos[a:b])
+        return salida
+
+
+class AlmacenAmbiente:
+    """Ventana reciente de registros_ambiente con respuestas en microsegundos"""
+
+    def __init__(self, capacidad=MEMORIA_CAPACIDAD):
+        self.buffer = BufferCircular(('id', 'revision') + METRICAS, capacidad)
+        self.lock = threading.Lock()
+        self.listo = False
+        self.total = 0
+        # Primer instante que la memoria garantiza tener completo
+        self.cobertura = float('-inf')
+        self._id_calentado = 0
+        # id -> instante de la última lectura de la fila al calentar
+        self._cubiertas = {}
+        self._categorias = {'bomba': ([], {}), 'alerta': ([], {})}
+        # (llegada, fecha) de las filas insertadas fuera de orden recientemente
+        self.tardias = deque()
+        self.total_tardias = 0
+
+    # -------- codificación de columnas categóricas --------
+    def _codificar(self, campo, texto):
+        valores, codigos = self._categorias[campo]
+        codigo = codigos.get(texto)
+        if codigo is None:
+            if len(valores) >= MAX_CATEGORIAS:
+                return -1.0
+            codigo = codigos[texto] = float(len(valores))
+            valores.append(texto)
+        return codigo
+
+    def _decodificar(self, campo, codigo):
+        valores = self._categorias[campo][0]
+        return valores[int(codigo)] if 0 <= codigo < len(valores) else None
+
+    def _a_fila(self, ts, valores):
+        return {
+            'id': int(valores['id']) if valores['id'] >= 0 else None,
+            'revision': int(valores['revision']) if valores['revision'] >= 0 else None,
+            'fecha': datetime.fromtimestamp(ts),
+            'temperatura': valores['temperatura'],
+            'humedad': valores['humedad'],
+            'estado_bomba': self._decodificar('bomba', valores['bomba']),
+            'alerta': self._decodificar('alerta', valores['alerta']),
+        }
+
+    def _agregar(self, registro):
+        fecha = registro.get('fecha') or datetime.now()
+        valores = {
+            'id': float(registro['id']) if registro.get('id') is not None else -1.0,
+            'revision': float(registro['revision']) if registro.get('revision') is not None else -1.0,
+            'temperatura': _numero(registro.get('temperatura')),
+            'humedad': _numero(registro.get('humedad')),
+            'bomba': self._codificar('bomba', registro.get('estado_bomba')),
+            'alerta': self._codificar('alerta', registro.get('alerta')),
+        }
+        ts = fecha.timestamp()
+        if ts < self.cobertura:
+            return  # anterior a la ventana en memoria: sólo está en la BD
+        if self.buffer.tamano and ts < self.buffer.tiempos[self.buffer._fisico(self.buffer.tamano - 1)]:
+            self.tardias.append((time.monotonic(), ts))
+            self.total_tardias += 1
+        insertada, desalojado = self.buffer.insertar(ts, valores)
+        if not insertada:
+            self.cobertura = max(self.cobertura, ts + 1e-6)
+        if desalojado is not None:
+            self.cobertura = max(self.cobertura, desalojado + 1e-6)
+
+    # -------- alimentación --------
+    def calentar(self, conn):
+        """Cargar las filas más recientes de la BD (idempotente)"""
+        with self.lock:
+            if self.listo:
+                return
+            capacidad = self.buffer.capacidad
+            with conn.cursor() as cur:
+                filas = filas_recientes(cur, capacidad)
+                cur.execute(sql('ambiente_total'))
+                self.total = cur.fetchone()['total']
+            lecturas = reconstruir(filas, capacidad)
+            for registro in filas:
+                self._cubiertas[registro['id']] = (registro.get('hasta') or registro['fecha']).timestamp()
+            for lectura in reversed(lecturas):
+                self._agregar(lectura)
+            # Cargadas en orden de fecha no se detectan como tardías: una fila con
+            # revisión mayor que otra más reciente lo es (nuevos() por revisión la necesita)
+            menor_revision = float('inf')
+            for registro in filas:
+                revision = registro.get('revision') or 0
+                if revision > menor_revision:
+                    self.tardias.append((time.monotonic(), registro['fecha'].timestamp()))
+                menor_revision = min(menor_revision, revision)
+            if len(lecturas) >= capacidad:
+                self.cobertura = max(self.cobertura, min(l['fecha'] for l in lecturas).timestamp() + 1e-6)
+            self._id_calentado = max((f['id'] for f in filas), default=0)
+            self.listo = True
+
+    def agregar(self, registro):
+        """Registrar una lectura recién guardada en la BD"""
+        with self.lock:
+            if not self.listo:
+                return  # la lectura llegará con el calentamiento
+            if registro.get('id') is not None and registro['id'] <= self._id_calentado:
+                # Ya cargada durante el calentamiento, salvo que extienda su fila
+                cubierta = self._cubiertas.get(registro['id'])
+                if cubierta is None or registro.get('fecha') is None or registro['fecha'].timestamp() <= cubierta:
+                    return
+            self._agregar(registro)
+            self.total += 1
+
+    # -------- consultas --------
+    def cubre(self, desde):
+        """¿Están en memoria todas las filas con fecha >= desde?"""
+        return self.listo and desde.timestamp() >= self.cobertura
+
+    def ultimo(self):
+        with self.lock:
+            if not self.listo or self.buffer.tamano == 0:
+                return None
+            return self._a_fila(*self.buffer.fila(self.buffer.tamano - 1))
+
+    def ultimos(self, n):
+        """Últimas n filas (más reciente primero), o None si no caben"""
+        with self.lock:
+            if not self.listo:
+                return None
+            tamano = self.buffer.tamano
+            if n > tamano and self.cobertura != float('-inf'):
+                return None
+            return [self._a_fila(*self.buffer.fila(i)) for i in range(tamano - 1, max(tamano - n, 0) - 1, -1)]
+
+    def nuevos(self, marca, limite):
+        """Filas posteriores a la marca (tipo, valor) del cliente, más reciente primero
+
+        Devuelve (filas, truncado) con como máximo `limite` filas, o None si la
+        marca es anterior a lo que la memoria garantiza tener.
+        """
+        tipo, valor = marca
+        with self.lock:
+            if not self.listo:
+                return None
+            tamano = self.buffer.tamano
+            if tipo == 'fecha':
+                if not self.cubre(valor):
+                    return None
+                a = self.buffer.buscar(valor.timestamp() + 1e-6)
+            else:
+                # Las revisiones crecen con la escritura, no con la fecha: por encima
+                # de la frontera tardía puede haber revisiones nuevas entre filas ya vistas
+                frontera = self._frontera_tardia()
+                revisiones, tiempos = self.buffer.columnas['revision'], self.buffer.tiempos
+                seleccion = []
+                i = tamano
+                while i > 0:
+                    fisico = self.buffer._fisico(i - 1)
+                    if revisiones[fisico] <= valor and tiempos[fisico] < frontera:
+                        break
+                    i -= 1
+                    if revisiones[fisico] > valor:
+                        seleccion.append(i)
+                        if len(seleccion) > limite:
+                            break
+                else:
+                    if self.cobertura != float('-inf'):
+                        return None
+                return [self._a_fila(*self.buffer.fila(i)) for i in seleccion[:limite]], len(seleccion) > limite
+            primero = max(a, tamano - limite)
+            filas = [self._a_fila(*self.buffer.fila(i)) for i in range(tamano - 1, primero - 1, -1)]
+            return filas, tamano - a > limite
+
+    def _frontera_tardia(self):
+        """Fecha más antigua de las filas tardías aún dentro de la ventana"""
+        limite = time.monotonic() - MEMORIA_VENTANA_TARDIA
+        while self.tardias and self.tardias[0][0] < limite:
+            self.tardias.popleft()
+        return min((ts for _, ts in self.tardias), default=float('inf'))
+
+    def contar(self, desde, hasta=None):
+        with self.lock:
+            if not self.cubre(desde):
+                return None
+            a, b = self._rango(desde, hasta)
+            return b - a
+
+    def _rango(self, desde, hasta):
+        a = self.buffer.buscar(desde.timestamp())
+        b = self.buffer.tamano if hasta is None else self.buffer.buscar(hasta.timestamp() + 1e-6)
+        return a, b
+
+    def agregados(self, desde, hasta=None, metricas=('temperatura', 'humedad')):
+        """count/promedio/mínimo/máximo por métrica en [desde, hasta]"""
+        with self.lock:
+            if not self.cubre(desde):
+                return None
+            a, b = self._rango(desde, hasta)
+            resultado = {'total': b - a}
+            for metrica in metricas:
+                valores = self.buffer.valores(metrica, a, b)
+                resultado[metrica] = _resumen(valores)
+            return resultado
+
+
+def _numero(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def _resumen(valores):
+    if len(valores) == 0:
+        return {'promedio': None, 'minimo': None, 'maximo': None}
+    if NUMPY_AVAILABLE:
+        if not np.isfinite(valores).any():
+            # Todo NaN (lecturas sin ese dato): NaN no es JSON válido
+            return {'promedio': None, 'minimo': None, 'maximo': None}
+        return {
+            'promedio': float(np.nanmean(valores)),
+            'minimo': float(np.nanmin(valores)),
+            'maximo': float(np.nanmax(valores)),
+        }
+    validos = [v for v in valores if v == v]
+    if not validos:
+        return {'promedio': None, 'minimo': None, 'maximo': None}
+    return {'promedio': sum(validos) / len(validos), 'minimo': min(validos), 'maximo': max(validos)}
+
+
+# Instancia del proceso (cada servidor tiene la suya)
+almacen_ambiente = AlmacenAmbiente()
+
+
+def preparar(get_conn):
+    """Calentar la memoria si está activa y aún no lo está; devuelve si se puede usar"""
+    if not MEMORIA_ACTIVA:
+        return False
+    if not almacen_ambiente.listo:
+        conn = get_conn()
+        if not conn:
+            return False
+        try:
+            almacen_ambiente.calentar(conn)
+        except Exception as e:
+            print(f"⚠️ No se pudo calentar la memoria reciente: {e}")
+            return False
+        finally:
+            conn.close()
+    return True
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📶 POLÍTICA DE MUESTREO ADAPTATIVO
+==================================
+El ESP32 enviaba cada 30 s tanto si el invernadero estaba estable como si
+la temperatura cambiaba deprisa. El servidor recomienda ahora a cada
+dispositivo el intervalo hasta su próximo envío, a partir de sus últimas
+MUESTREO_VENTANA lecturas:
+
+- alerta distinta de Normal, o cambio de estado de la bomba en la
+  ventana -> MUESTREO_MIN (evento en curso: máxima resolución)
+- variación alta (desviación típica de temperatura o humedad por encima
+  de su tolerancia) -> MUESTREO_BASE dividido por la actividad
+- periodo tranquilo -> el intervalo se duplica en cada lectura tranquila
+  hasta MUESTREO_MAX; con el primer cambio vuelve a bajar
+
+La recomendación va en cada respuesta de la ingesta (campo `intervalo` y
+cabecera X-Intervalo-Muestreo) y en GET /api/devices/<id>/config.
+"""
+
+import os
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+
+MUESTREO_MIN = int(os.environ.get('MUESTREO_MIN', '10'))
+MUESTREO_BASE = int(os.environ.get('MUESTREO_BASE', '30'))
+MUESTREO_MAX = int(os.environ.get('MUESTREO_MAX', '300'))
+MUESTREO_VENTANA = int(os.environ.get('MUESTREO_VENTANA', '8'))
+# Variación que se considera ruido: precisión del DHT22 (±0.5 °C, ±2 %)
+MUESTREO_TOLERANCIA_TEMPERATURA = float(os.environ.get('MUESTREO_TOLERANCIA_TEMPERATURA', '0.5'))
+MUESTREO_TOLERANCIA_HUMEDAD = float(os.environ.get('MUESTREO_TOLERANCIA_HUMEDAD', '2'))
+MUESTREO_DISPOSITIVOS = 10000
+
+CABECERA_INTERVALO = 'X-Intervalo-Muestreo'
+
+
+class EstadoDispositivo:
+    __slots__ = ('lecturas', 'intervalo', 'motivo', 'actualizado')
+
+    def __init__(self):
+        self.lecturas = deque(maxlen=MUESTREO_VENTANA)  # (temperatura, humedad, estado_bomba, alerta)
+        self.intervalo = MUESTREO_BASE
+        self.motivo = 'sin datos'
+        self.actualizado = None
+
+
+def _recomendar(estado):
+    """(intervalo_s, motivo) para las lecturas de la ventana"""
+    lecturas = estado.lecturas
+    ultima = lecturas[-1]
+    if ultima[3] not in (None, '', 'Normal'):
+        return MUESTREO_MIN, f"alerta {ultima[3]}"
+    if len({lectura[2] for lectura in lecturas}) > 1:
+        return MUESTREO_MIN, 'cambio de estado de la bomba'
+    if len(lecturas) < 3:
+        return MUESTREO_BASE, 'pocas lecturas'
+    actividad = max(
+        statistics.pstdev(lectura[0] for lectura in lecturas) / MUESTREO_TOLERANCIA_TEMPERATURA,
+        statistics.pstdev(lectura[1] for lectura in lecturas) / MUESTREO_TOLERANCIA_HUMEDAD,
+    )
+    if actividad >= 1:
+        return max(MUESTREO_MIN, min(MUESTREO_BASE, round(MUESTREO_BASE / actividad))), 'variación alta'
+    if actividad >= 0.5:
+        return MUESTREO_BASE, 'variación moderada'
+    return min(MUESTREO_MAX, max(MUESTREO_BASE, estado.intervalo * 2)), 'estable'
+
+
+class PoliticaMuestreo:
+    """Intervalo recomendado por dispositivo, según sus lecturas recientes"""
+
+    def __init__(self, capacidad=MUESTREO_DISPOSITIVOS):
+        self.capacidad = capacidad
+        self.lock = threading.Lock()
+        self.dispositivos = OrderedDict()
+
+    def observar(self, dispositivo, temperatura, humedad, estado_bomba=None, alerta=None):
+        """Registrar una lectura y devolver el intervalo recomendado (s)"""
+        if dispositivo is None or temperatura is None or humedad is None:
+            return MUESTREO_BASE
+        with self.lock:
+            estado = self.dispositivos.get(dispositivo)
+            if estado is None:
+                estado = self.dispositivos[dispositivo] = EstadoDispositivo()
+                while len(self.dispositivos) > self.capacidad:
+                    self.dispositivos.popitem(last=False)
+            else:
+                self.dispositivos.move_to_end(dispositivo)
+            estado.lecturas.append((float(temperatura), float(humedad), estado_bomba, alerta))
+            estado.intervalo, estado.motivo = _recomendar(estado)
+            estado.actualizado = time.time()
+            return estado.intervalo
+
+    def configuracion(self, dispositivo):
+        """Cuerpo de GET /api/devices/<id>/config"""
+        with self.lock:
+            estado = self.dispositivos.get(dispositivo)
+            intervalo = estado.intervalo if estado else MUESTREO_BASE
+            motivo = estado.motivo if estado else 'sin datos'
+            actualizado = estado.actualizado if estado else None
+        return {
+            'dispositivo': dispositivo,
+            'intervalo': intervalo,
+            'motivo': motivo,
+            'intervalo_min': MUESTREO_MIN,
+            'intervalo_max': MUESTREO_MAX,
+            'actualizado': actualizado and int(actualizado),
+        }
+
+    def estadisticas(self):
+        with self.lock:
+            intervalos = [estado.intervalo for estado in self.dispositivos.values()]
+        return {
+            'dispositivos': len(intervalos),
+            'intervalo_medio': round(statistics.fmean(intervalos), 1) if intervalos else None,
+            # Envíos por hora frente a enviar siempre cada MUESTREO_BASE s
+            'escrituras_relativas': round(sum(MUESTREO_BASE / i for i in intervalos) / len(intervalos), 2)
+            if intervalos else None,
+        }
+
+
+politica_muestreo = PoliticaMuestreo()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📨 PUENTE MQTT - INGESTA DESDE UN BROKER
+========================================
+En instalaciones grandes los ESP32 publican en un broker MQTT (mosquitto)
+en lugar de hacer POST a /api/sensores/*. Este puente se suscribe a
+
+    invernadero/<dispositivo>/ambiente    (mismo JSON que el POST)
+    invernadero/<dispositivo>/humo        {"valor": 420, "zona": "Norte"}
+    invernadero/<dispositivo>/seguridad   {"tipo_evento": ..., "nivel_alerta": ...}
+
+y escribe por lotes con los mismos criterios que la ingesta HTTP: clave
+idempotente `<dispositivo>:<seq>`, fecha del dispositivo (ts/enviado) y
+memoria reciente. En ambiente `seq` es obligatorio (el firmware siempre lo
+envía): un mensaje sin él se descarta y se cuenta en `invalidos`. Humo y
+seguridad usan la clave `<dispositivo>:<tipo>:<seq>`, o el ts del
+dispositivo si no traen seq; sin ninguno de los dos no hay clave y un
+reenvío se guarda otra vez.
+
+Entrega QoS 1 ligada al commit: los mensajes se confirman a mano
+(manual_ack) y el PUBACK se envía, en orden de llegada, sólo después de
+que el lote que los contiene se haya confirmado en la BD. Si la escritura
+falla no se confirma nada y el puente se reconecta: con sesión persistente
+(clean_session=False) el broker reenvía lo pendiente y las claves
+idempotentes descartan lo que ya estaba guardado.
+
+Con MQTT_GRUPO varios procesos se reparten los mensajes con una
+suscripción compartida ($share/<grupo>/invernadero/+/+).
+
+Uso (necesita paho-mqtt >= 2.0 y un broker, p. ej. `mosquitto -v`):
+    python puente_mqtt.py                          # puente con la configuración del entorno
+    MQTT_GRUPO=ingesta python puente_mqtt.py       # otro trabajador del mismo grupo
+    python puente_mqtt.py --prueba 20000           # publicar en el broker local y medir
+    MQTT_HOST=localhost python servidor_simple_arduino.py   # puente dentro del servidor
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+try:
+    import paho.mqtt.client as mqtt
+    PAHO_AVAILABLE = True
+except ImportError:
+    PAHO_AVAILABLE = False
+
+import almacenamiento
+from cache_http import version_datos
+from idempotencia import LONGITUD_CLAVE, clave_idempotencia, insertar_lote, ventana_ingesta
+from marcas_tiempo import fecha_lectura
+from memoria_reciente import almacen_ambiente
+from politica_muestreo import politica_muestreo
+
+MQTT_HOST = os.environ.get('MQTT_HOST', '')  # vacío = puente desactivado en los servidores
+MQTT_PUERTO = int(os.environ.get('MQTT_PUERTO', '1883'))
+MQTT_USUARIO = os.environ.get('MQTT_USUARIO')
+MQTT_CLAVE = os.environ.get('MQTT_CLAVE')
+MQTT_PREFIJO = os.environ.get('MQTT_PREFIJO', 'invernadero')
+MQTT_GRUPO = os.environ.get('MQTT_GRUPO', '')
+MQTT_CLIENTE = os.environ.get('MQTT_CLIENTE', f"puente-{socket.gethostname()}-{os.getpid()}")
+MQTT_LOTE_INTERVALO = float(os.environ.get('MQTT_LOTE_INTERVALO', '0.2'))
+MQTT_LOTE_MAX = int(os.environ.get('MQTT_LOTE_MAX', '2000'))
+# Mensajes sin confirmar que el broker envía a la vez (receive maximum)
+MQTT_EN_VUELO = int(os.environ.get('MQTT_EN_VUELO', '10000'))
+ESPERA_RECONEXION = 2.0
+
+# Umbrales iguales a los del firmware y de config_umbrales por defecto
+HUMO_UMBRAL, HUMO_CRITICO = 300, 500
+
+
+def suscripcion(prefijo=MQTT_PREFIJO, grupo=MQTT_GRUPO):
+    filtro = f"{prefijo}/+/+"
+    return f"$share/{grupo}/{filtro}" if grupo else filtro
+
+
+def _nivel_humo(valor):
+    if valor >= HUMO_CRITICO:
+        return 'Crítico'
+    return 'Medio' if valor >= HUMO_UMBRAL else 'Normal'
+
+
+def clave_evento(dispositivo, tipo, data):
+    """Clave idempotente de un mensaje de humo o seguridad, o None sin seq ni ts"""
+    if data.get('seq') is not None:
+        try:
+            marca = int(data['seq'])
+        except (TypeError, ValueError):
+            raise ValueError(f"seq no válido: {data['seq']!r}") from None
+    else:
+        marca = data.get('ts', data.get('enviado'))
+        if marca in (None, ''):
+            return None
+        marca = f"t{marca}"
+    return f"{dispositivo}:{tipo}:{marca}"[:LONGITUD_CLAVE]
+
+
+class PuenteMQTT:
+    """Suscriptor MQTT con escritura por lotes y PUBACK tras el commit"""
+
+    def __init__(self, host=MQTT_HOST or 'localhost', puerto=MQTT_PUERTO, grupo=MQTT_GRUPO,
+                 cliente_id=MQTT_CLIENTE, get_conn=almacenamiento.get_conn):
+        if not PAHO_AVAILABLE:
+            raise RuntimeError("paho-mqtt no está instalado (pip install 'paho-mqtt>=2.0')")
+        self.host, self.puerto = host, puerto
+        self.filtro = suscripcion(grupo=grupo)
+        self.get_conn = get_conn
+        self.cola = deque()
+        self.detener = threading.Event()
+        self.conectado = threading.Event()
+        # Cada conexión es una generación: los mid de una conexión anterior no se confirman
+        self.generacion = 0
+        self.hilo = None
+        self.recibidos = 0
+        self.escritos = 0
+        self.duplicados = 0
+        self.invalidos = 0
+        self.errores_bd = 0
+        self.ultimo_lote_ms = None
+
+        self.cliente = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=cliente_id,
+                                   clean_session=False, protocol=mqtt.MQTTv311, manual_ack=True)
+        if MQTT_USUARIO:
+            self.cliente.username_pw_set(MQTT_USUARIO, MQTT_CLAVE)
+        self.cliente.max_inflight_messages_set(MQTT_EN_VUELO)
+        self.cliente.max_queued_messages_set(0)
+        self.cliente.reconnect_delay_set(1, 30)
+        self.cliente.on_connect = self._al_conectar
+        self.cliente.on_disconnect = self._al_desconectar
+        self.cliente.on_message = self._al_recibir
+
+    # -------- callbacks (hilo de red de paho) --------
+    def _al_conectar(self, cliente, userdata, flags, codigo, propiedades):
+        if codigo.is_failure:
+            print(f"❌ Broker MQTT rechazó la conexión: {codigo}")
+            return
+        self.generacion += 1
+        cliente.subscribe(self.filtro, qos=1)
+        self.conectado.set()
+        print(f"📨 Puente MQTT conectado a {self.host}:{self.puerto}, suscrito a {self.filtro}")
+
+    def _al_desconectar(self, cliente, userdata, flags, codigo, propiedades):
+        self.conectado.clear()
+        if not self.detener.is_set():
+            print(f"⚠️ Puente MQTT desconectado ({codigo}); reconectando...")
+
+    def _al_recibir(self, cliente, userdata, mensaje):
+        self.recibidos += 1
+        self.cola.append((mensaje.topic, mensaje.payload, mensaje.mid, mensaje.qos, self.generacion, time.time()))
+
+    # -------- escritura --------
+    def _filas(self, lote):
+        """(ambiente, seguridad) del lote, sin duplicados ya vistos"""
+        ambiente, seguridad, vistas = [], [], set()
+        prefijo = MQTT_PREFIJO + '/'
+        for topic, payload, _, _, _, recibido in lote:
+            partes = topic[len(prefijo):].split('/') if topic.startswith(prefijo) else []
+            try:
+                if len(partes) != 2:
+                    raise ValueError(f"tópico inesperado: {topic}")
+                dispositivo, tipo = partes
+                data = json.loads(payload)
+                if not isinstance(data, dict):
+                    raise ValueError("el mensaje no es un objeto JSON")
+                fecha, _ = fecha_lectura(data, ahora=recibido)
+                if tipo == 'ambiente':
+                    data['device_id'] = dispositivo
+                    dispositivo, clave = clave_idempotencia(data, {})
+                    if clave is None:
+                        # Sin clave no se recupera el id tras el lote (ni se descartan reenvíos QoS 1)
+                        raise ValueError("falta seq en la lectura de ambiente")
+                    if clave in vistas or ventana_ingesta.buscar(clave) is not None:
+                        self.duplicados += 1
+                        continue
+                    vistas.add(clave)
+                    ambiente.append((fecha, float(data['temperatura']), float(data['humedad']),
+                                     data.get('estado_bomba', 'Desconocido'), data.get('alerta', 'Normal'),
+                                     dispositivo, clave))
+                elif tipo in ('humo', 'seguridad'):
+                    clave = clave_evento(dispositivo, tipo, data)
+                    if clave is not None and clave in vistas:
+                        self.duplicados += 1
+                        continue
+                    if tipo == 'humo':
+                        valor = float(data['valor'])
+                        descripcion = data.get('descripcion') or f"Nivel de humo: {valor:g}"
+                        if data.get('zona'):
+                            descripcion = f"{descripcion} — Zona: {data['zona']}"
+                        fila = (fecha, 'Humo', descripcion, data.get('nivel_alerta') or _nivel_humo(valor), clave)
+                    else:
+                        fila = (fecha, data.get('tipo_evento', 'Manual'), data.get('descripcion', ''),
+                                data.get('nivel_alerta', 'Bajo'), clave)
+                    if clave is not None:
+                        vistas.add(clave)
+                    seguridad.append(fila)
+                else:
+                    raise ValueError(f"tipo desconocido: {tipo}")
+            except (ValueError, KeyError, TypeError) as e:
+                # Un mensaje inválido se confirma igualmente: reenviarlo no lo arregla
+                self.invalidos += 1
+                print(f"⚠️ Mensaje MQTT descartado ({topic}): {e}")
+        return ambiente, seguridad
+
+    def escribir_lote(self, lote):
+        ambiente, seguridad = self._filas(lote)
+        if ambiente or seguridad:
+            conn = self.get_conn()
+            try:
+                ids, revision = insertar_lote(conn, ambiente, seguridad)
+            finally:
+                conn.close()
+            for fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, clave in ambiente:
+                almacen_ambiente.agregar({'id': ids.get(clave), 'revision': revision, 'fecha': fecha,
+                                          'temperatura': temperatura, 'humedad': humedad,
+                                          'estado_bomba': estado_bomba, 'alerta': alerta})
+                politica_muestreo.observar(dispositivo, temperatura, humedad, estado_bomba, alerta)
+            self.escritos += len(ambiente) + len(seguridad)
+            version_datos.incrementar()
+        # PUBACK en orden de llegada, sólo de la conexión actual
+        for _, _, mid, qos, generacion, _ in lote:
+            if qos > 0 and generacion == self.generacion:
+                self.cliente.ack(mid, qos)
+
+    def _reconectar(self):
+        """Forzar el reenvío de lo no confirmado: desconectar y volver a conectar"""
+        self.cliente.disconnect()
+        self.cliente.loop_stop()
+        self.cola.clear()  # el broker lo reenviará
+        time.sleep(ESPERA_RECONEXION)
+        try:
+            self.cliente.reconnect()
+        except OSError as e:
+            print(f"⚠️ No se pudo reconectar al broker MQTT: {e}")
+        self.cliente.loop_start()
+
+    def _escribir(self):
+        cola = self.cola
+        while True:
+            parado = self.detener.wait(MQTT_LOTE_INTERVALO)
+            while cola:
+                lote = [cola.popleft() for _ in range(min(len(cola), MQTT_LOTE_MAX))]
+                inicio = time.perf_counter()
+                try:
+                    self.escribir_lote(lote)
+                except Exception as e:
+                    self.errores_bd += 1
+                    print(f"❌ Error escribiendo lote MQTT ({len(lote)} mensajes): {e}")
+                    if not parado:
+                        self._reconectar()
+                    break
+                self.ultimo_lote_ms = round((time.perf_counter() - inicio) * 1000, 1)
+            if parado:
+                break
+
+    # -------- ciclo de vida --------
+    def iniciar(self):
+        self.cliente.connect_async(self.host, self.puerto, keepalive=30)
+        self.cliente.loop_start()
+        self.hilo = threading.Thread(target=self._escribir, name='mqtt-escritor', daemon=True)
+        self.hilo.start()
+        return self
+
+    def parar(self):
+        """Escribir y confirmar lo recibido antes de desconectar"""
+        self.detener.set()
+        self.hilo.join()
+        self.cliente.disconnect()
+        self.cliente.loop_stop()
+
+    def estadisticas(self):
+        return {
+            'conectado': self.conectado.is_set(),
+            'suscripcion': self.filtro,
+            'recibidos': self.recibidos,
+            'escritos': self.escritos,
+            'duplicados': self.duplicados,
+            'invalidos': self.invalidos,
+            'en_cola': len(self.cola),
+            'errores_bd': self.errores_bd,
+            'ultimo_lote_ms': self.ultimo_lote_ms,
+        }
+
+
+puente_mqtt = None
+
+
+def iniciar_si_configurado():
+    """Arrancar el puente dentro del servidor si MQTT_HOST está definido"""
+    global puente_mqtt
+    if MQTT_HOST and puente_mqtt is None:
+        if not PAHO_AVAILABLE:
+            print("⚠️ MQTT_HOST definido pero paho-mqtt no está instalado - puente MQTT desactivado")
+            return None
+        puente_mqtt = PuenteMQTT().iniciar()
+    return puente_mqtt
+
+
+def prueba(total, host, puerto, dispositivos=50):
+    """Publicar `total` lecturas QoS 1 en el broker y medir cuánto tarda el puente en guardarlas"""
+    puente = PuenteMQTT(host, puerto, cliente_id=f"puente-prueba-{os.getpid()}").iniciar()
+    if not puente.conectado.wait(10):
+        raise SystemExit(f"❌ No hay broker MQTT en {host}:{puerto} (¿mosquitto en marcha?)")
+    emisor = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"emisor-prueba-{os.getpid()}")
+    emisor.max_inflight_messages_set(1000)
+    emisor.connect(host, puerto)
+    emisor.loop_start()
+    arranque = int(time.time()) << 32
+    inicio = time.perf_counter()
+    for i in range(total):
+        dispositivo = f"prueba{i % dispositivos:03d}"
+        datos = {'temperatura': 22.5, 'humedad': 55.0, 'estado_bomba': 'Apagada',
+                 'seq': arranque | (i // dispositivos), 'ts': int(time.time() * 1000)}
+        emisor.publish(f"{MQTT_PREFIJO}/{dispositivo}/ambiente", json.dumps(datos), qos=1)
+    while puente.escritos + puente.duplicados < total and time.perf_counter() - inicio < 120:
+        time.sleep(0.05)
+    duracion = time.perf_counter() - inicio
+    emisor.loop_stop()
+    emisor.disconnect()
+    puente.parar()
+    print(f"📨 {puente.escritos:,}/{total:,} lecturas guardadas en {duracion:.2f} s "
+          f"→ {puente.escritos / duracion:,.0f} mensajes/s")
+    print(f"📊 {puente.estadisticas()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Puente MQTT → base de datos del invernadero')
+    parser.add_argument('--host', default=MQTT_HOST or 'localhost')
+    parser.add_argument('--puerto', type=int, default=MQTT_PUERTO)
+    parser.add_argument('--prueba', type=int, metavar='N', help='publicar N lecturas de prueba y medir')
+    args = parser.parse_args()
+    if not PAHO_AVAILABLE:
+        raise SystemExit("❌ paho-mqtt no está instalado (pip install 'paho-mqtt>=2.0')")
+    if almacenamiento.DB_BACKEND == 'sqlite':
+        almacenamiento.crear_esquema()
+    if args.prueba:
+        prueba(args.prueba, args.host, args.puerto)
+        return
+    puente = PuenteMQTT(args.host, args.puerto).iniciar()
+    try:
+        while True:
+            time.sleep(10)
+            print(f"📊 {puente.estadisticas()}")
+    except KeyboardInterrupt:
+        puente.parar()
+
+
+if __name__ == '__main__':
+    main()
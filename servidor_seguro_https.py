@@ -6,34 +6,43 @@
 Servidor Flask seguro con HTTPS y generación robusta de PDFs
 """
 
-from flask import Flask, jsonify, request, render_template_string, Response
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
-import pymysql
-import ssl
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from io import BytesIO
 
+import almacenamiento
+import ingesta_udp
+import memoria_reciente
+import puente_mqtt
+import tls_servidor
+from almacenamiento import sql
+from cache_http import condicional, version_datos
+from ciclos_bomba import ciclos_bomba, duracion_legible, linea_reporte, preparar as preparar_ciclos
+from idempotencia import clave_idempotencia, insertar_lectura, ventana_ingesta
+from marcas_tiempo import fecha_lectura, hora_servidor
+from activos import CanalActivos
+from codificacion import configurar_respuestas
+from compresion_lecturas import compresor_lecturas, desde_fecha, filas_recientes, reconstruir
+from cuerpo_binario import configurar_cuerpos, leer_cuerpo
+from limite_ingesta import configurar_limites, limitador_ingesta
+from tls_servidor import ManejadorKeepAlive, crear_contexto_tls
+from memoria_reciente import almacen_ambiente
+from politica_muestreo import CABECERA_INTERVALO, politica_muestreo
+
 # Configuración
 app = Flask(__name__)
 CORS(app)
-
-DB_HOST = 'localhost'
-DB_USER = 'root'
-DB_PASSWORD = 'root'
-DB_NAME = 'invernadero'
+configurar_respuestas(app)
+configurar_cuerpos(app)
+configurar_limites(app)
+activos = CanalActivos().instalar(app)
 
 def get_conn():
-    """Obtener conexión a MySQL"""
+    """Obtener conexión a la base de datos (MySQL o SQLite según DB_BACKEND)"""
     try:
-        return pymysql.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        return almacenamiento.get_conn()
     except Exception as e:
         print(f"❌ Error BD: {e}")
         return None
@@ -71,30 +80,16 @@ def crear_pdf_reportlab():
             try:
                 with conn.cursor() as cur:
                     # Total de registros
-                    cur.execute("SELECT COUNT(*) as total FROM registros_ambiente")
+                    cur.execute(sql('ambiente_total'))
                     total_result = cur.fetchone()
                     total = total_result['total'] if total_result else 0
                     
                     # Estadísticas
-                    cur.execute("""
-                        SELECT 
-                            AVG(temperatura) as temp_promedio,
-                            AVG(humedad) as humedad_promedio,
-                            MAX(temperatura) as temp_max,
-                            MIN(temperatura) as temp_min,
-                            MAX(humedad) as humedad_max,
-                            MIN(humedad) as humedad_min
-                        FROM registros_ambiente 
-                        WHERE fecha >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-                    """)
+                    cur.execute(sql('ambiente_resumen_7d'))
                     stats = cur.fetchone()
                     
                     # Últimos registros
-                    cur.execute("""
-                        SELECT * FROM registros_ambiente 
-                        ORDER BY fecha DESC 
-                        LIMIT 20
-                    """)
+                    cur.execute(sql('ambiente_recientes'), (20,))
                     registros = cur.fetchall()
                 
                 conn.close()
@@ -111,6 +106,13 @@ def crear_pdf_reportlab():
                     • Humedad mínima: {stats['humedad_min']:.1f}%<br/>
                     • Total de registros: {total}
                     """
+                    if preparar_ciclos(get_conn):
+                        bomba = ciclos_bomba.uso(horas=1, dias=7)['total_dias']
+                        estadisticas += f"""<br/>
+                    • Ciclos de riego: {bomba['ciclos']}<br/>
+                    • Bomba encendida: {duracion_legible(bomba['encendida_s'])}<br/>
+                    • Ciclo de trabajo de la bomba: {bomba['ciclo_trabajo']}%
+                    """
                     stats_paragraph = Paragraph(estadisticas, styles['Normal'])
                     story.append(stats_paragraph)
                     story.append(Spacer(1, 12))
@@ -191,17 +193,20 @@ def crear_pdf_simple():
         if conn:
             try:
                 with conn.cursor() as cur:
-                    cur.execute("SELECT * FROM registros_ambiente ORDER BY fecha DESC LIMIT 10")
+                    cur.execute(sql('ambiente_recientes'), (10,))
                     registros = cur.fetchall()
                     
-                    cur.execute("SELECT COUNT(*) as total FROM registros_ambiente")
+                    cur.execute(sql('ambiente_total'))
                     total_result = cur.fetchone()
                     total = total_result['total'] if total_result else 0
                 
                 p.drawString(100, 710, f"Total de registros: {total}")
+                if preparar_ciclos(get_conn):
+                    p.drawString(100, 695, linea_reporte(ciclos_bomba.uso(horas=24, dias=1)['total_horas'],
+                                                         'últimas 24 h'))
                 
                 # Encabezados
-                y = 680
+                y = 670
                 p.drawString(100, y, "FECHA")
                 p.drawString(220, y, "TEMP")
                 p.drawString(280, y, "HUMEDAD")
@@ -612,16 +617,29 @@ HTML_DASHBOARD = """
 </html>
 """
 
+# Sin variables de plantilla: se renderiza una sola vez al arrancar
+activos.pagina('/', app.jinja_env.from_string(HTML_DASHBOARD).render())
+
 @app.route('/')
 def dashboard():
     """Dashboard principal"""
-    return render_template_string(HTML_DASHBOARD)
+    return activos.servir_pagina('/')
+
+@app.route('/api/tiempo')
+def tiempo_servidor():
+    """Hora del servidor para sincronizar el reloj del ESP32"""
+    return jsonify(hora_servidor())
+
+@app.route('/api/devices/<dispositivo>/config')
+def configuracion_dispositivo(dispositivo):
+    """Intervalo de envío recomendado para el dispositivo"""
+    return jsonify(politica_muestreo.configuracion(dispositivo))
 
 @app.route('/api/sensores/ambiente', methods=['POST'])
 def recibir_datos_arduino():
     """Endpoint para recibir datos del Arduino ESP32"""
     try:
-        data = request.get_json()
+        data = leer_cuerpo()
         if not data:
             return jsonify({'success': False, 'message': 'No hay datos JSON'}), 400
         
@@ -630,32 +648,50 @@ def recibir_datos_arduino():
         for field in required_fields:
             if field not in data:
                 return jsonify({'success': False, 'message': f'Falta campo: {field}'}), 400
+
+        # Reintento de una lectura ya guardada (device_id+seq o Idempotency-Key): 200 sin tocar la BD
+        try:
+            dispositivo, clave = clave_idempotencia(data, request.headers)
+            fecha, _ = fecha_lectura(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        registro_id = ventana_ingesta.buscar(clave)
+        if registro_id is not None:
+            return jsonify({'success': True, 'duplicado': True, 'id': registro_id})
         
         conn = get_conn()
         if not conn:
             return jsonify({'success': False, 'message': 'Error de conexión BD'}), 500
         
         try:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO registros_ambiente (temperatura, humedad, estado_bomba, alerta, fecha)
-                    VALUES (%s, %s, %s, %s, NOW())
-                """, (
-                    float(data['temperatura']),
-                    float(data['humedad']),
-                    data.get('estado_bomba', 'Desconocido'),
-                    data.get('alerta', 'Normal')
-                ))
-                conn.commit()
-                
+            registro = {
+                'temperatura': float(data['temperatura']),
+                'humedad': float(data['humedad']),
+                'estado_bomba': data.get('estado_bomba', 'Desconocido'),
+                'alerta': data.get('alerta', 'Normal')
+            }
+            registro['fecha'] = fecha
+            registro['id'], registro['revision'], duplicado = insertar_lectura(
+                conn, fecha, registro['temperatura'], registro['humedad'],
+                registro['estado_bomba'], registro['alerta'], dispositivo, clave)
             conn.close()
+            if duplicado:
+                return jsonify({'success': True, 'duplicado': True, 'id': registro['id']})
+            almacen_ambiente.agregar(registro)
+            version_datos.incrementar()
+            # Intervalo recomendado hasta el próximo envío (muestreo adaptativo)
+            intervalo = politica_muestreo.observar(
+                dispositivo or request.remote_addr, registro['temperatura'], registro['humedad'],
+                registro['estado_bomba'], registro['alerta'])
             
             print(f"✅ Datos Arduino guardados: T={data['temperatura']}°C, H={data['humedad']}%")
             return jsonify({
                 'success': True, 
                 'message': 'Datos guardados correctamente',
-                'timestamp': datetime.now().isoformat()
-            })
+                'id': registro['id'],
+                'timestamp': datetime.now().isoformat(),
+                'intervalo': intervalo
+            }), 200, {CABECERA_INTERVALO: str(intervalo)}
             
         except Exception as e:
             conn.rollback()
@@ -727,24 +763,41 @@ def generar_pdf():
             
             return jsonify(error_response), 500
 
+def registro_json(registro):
+    """Formato común de una lectura en las respuestas de la API"""
+    return {
+        'temperatura': float(registro['temperatura']),
+        'humedad': float(registro['humedad']),
+        'estado_bomba': registro['estado_bomba'],
+        'alerta': registro['alerta'],
+        'fecha': registro['fecha'].isoformat()
+    }
+
 @app.route('/api/sensores/ultimos')
+@condicional
 def obtener_ultimo_registro():
     """Obtener el último registro de sensores"""
+    if memoria_reciente.preparar(get_conn):
+        registro = almacen_ambiente.ultimo()
+        if registro:
+            return jsonify({'success': True, 'data': registro_json(registro)})
+
     conn = get_conn()
     if not conn:
         return jsonify({'success': False, 'message': 'Error BD'}), 500
     
     try:
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT * FROM registros_ambiente 
-                ORDER BY fecha DESC 
-                LIMIT 1
-            """)
-            registro = cursor.fetchone()
+            cursor.execute(sql('ambiente_ultimo'))
+            registros = [cursor.fetchone()]
+            # Una fila comprimida puede seguir recibiendo lecturas después
+            cursor.execute(sql('ambiente_ultimo_extendido'))
+            registros.append(cursor.fetchone())
         
         conn.close()
         
+        registros = reconstruir([r for r in registros if r], 1)
+        registro = registros[0] if registros else None
         if registro:
             return jsonify({
                 'success': True,
@@ -764,42 +817,73 @@ def obtener_ultimo_registro():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/sensores/historial')
+@condicional
 def obtener_historial():
-    """Obtener historial de registros"""
+    """Obtener historial de registros (sólo los nuevos con ?since=<id|fecha>)"""
+    marca = None
+    if request.args.get('since'):
+        try:
+            marca = almacenamiento.marca_desde(request.args['since'])
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+    if memoria_reciente.preparar(get_conn):
+        if marca:
+            nuevos = almacen_ambiente.nuevos(marca, 10)
+            registros = nuevos[0] if nuevos is not None else None
+        else:
+            registros = almacen_ambiente.ultimos(10)
+        if registros is not None:
+            return jsonify(respuesta_historial(registros, marca))
+
     conn = get_conn()
     if not conn:
         return jsonify({'success': False, 'message': 'Error BD'}), 500
     
     try:
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT * FROM registros_ambiente 
-                ORDER BY fecha DESC 
-                LIMIT 10
-            """)
-            registros = cursor.fetchall()
+            if marca:
+                tipo, valor = marca
+                cursor.execute(sql(f'ambiente_desde_{tipo}'), (desde_fecha(valor) if tipo == 'fecha' else valor, 10))
+                filas = cursor.fetchall()
+            else:
+                filas = filas_recientes(cursor, 10)
+            registros = reconstruir(filas, 10, marca)
         
         conn.close()
         
-        data = []
-        for registro in registros:
-            data.append({
-                'temperatura': float(registro['temperatura']),
-                'humedad': float(registro['humedad']),
-                'estado_bomba': registro['estado_bomba'],
-                'alerta': registro['alerta'],
-                'fecha': registro['fecha'].isoformat()
-            })
-        
-        return jsonify({'success': True, 'data': data})
+        return jsonify(respuesta_historial(registros, marca))
         
     except Exception as e:
         conn.close()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def respuesta_historial(registros, marca):
+    """Cuerpo de /historial; `ultimo_id` es la marca para la siguiente consulta"""
+    return {'success': True, 'data': [registro_json(r) for r in registros],
+            'ultimo_id': almacenamiento.marca_siguiente(registros, marca)}
+
 @app.route('/api/sensores/estadisticas')
+@condicional
 def obtener_estadisticas():
     """Obtener estadísticas básicas"""
+    if memoria_reciente.preparar(get_conn):
+        ahora = datetime.now()
+        hoy = almacen_ambiente.contar(ahora.replace(hour=0, minute=0, second=0, microsecond=0))
+        promedios = almacen_ambiente.agregados(ahora - timedelta(hours=24))
+        if hoy is not None and promedios is not None:
+            temp = promedios['temperatura']['promedio']
+            humedad = promedios['humedad']['promedio']
+            return jsonify({
+                'success': True,
+                'data': {
+                    'total': almacen_ambiente.total,
+                    'hoy': hoy,
+                    'temp_promedio': f"{temp:.1f}" if temp else "N/A",
+                    'humedad_promedio': f"{humedad:.1f}" if humedad else "N/A"
+                }
+            })
+
     conn = get_conn()
     if not conn:
         return jsonify({'success': False, 'message': 'Error BD'}), 500
@@ -807,24 +891,15 @@ def obtener_estadisticas():
     try:
         with conn.cursor() as cursor:
             # Total de registros
-            cursor.execute("SELECT COUNT(*) as total FROM registros_ambiente")
+            cursor.execute(sql('ambiente_total'))
             total = cursor.fetchone()['total']
             
             # Registros de hoy
-            cursor.execute("""
-                SELECT COUNT(*) as hoy FROM registros_ambiente 
-                WHERE DATE(fecha) = CURDATE()
-            """)
+            cursor.execute(sql('ambiente_hoy'))
             hoy = cursor.fetchone()['hoy']
             
             # Promedios
-            cursor.execute("""
-                SELECT 
-                    AVG(temperatura) as temp_promedio,
-                    AVG(humedad) as humedad_promedio
-                FROM registros_ambiente 
-                WHERE fecha >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
-            """)
+            cursor.execute(sql('ambiente_promedios_24h'))
             promedios = cursor.fetchone()
         
         conn.close()
@@ -843,6 +918,18 @@ def obtener_estadisticas():
         conn.close()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/bomba/ciclos')
+def ciclos_de_bomba():
+    """Tiempo de riego, arranques y ciclo de trabajo por hora y por día"""
+    if not preparar_ciclos(get_conn):
+        return jsonify({'success': False, 'message': 'Error BD'}), 500
+    try:
+        horas = int(request.args.get('horas', 24))
+        dias = int(request.args.get('dias', 7))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'horas y dias deben ser enteros'}), 400
+    return jsonify({'success': True, 'data': ciclos_bomba.uso(request.args.get('dispositivo') or None, horas, dias)})
+
 @app.route('/api/simular_datos', methods=['POST'])
 def simular_datos():
     """Simular datos para pruebas"""
@@ -852,7 +939,7 @@ def simular_datos():
 def recibir_alerta_seguridad():
     """Endpoint para alertas de seguridad"""
     try:
-        data = request.get_json()
+        data = leer_cuerpo()
         nivel = data.get('nivel_alerta', 'media')
         
         # Por ahora solo loggeamos
@@ -872,12 +959,30 @@ def status():
         'status': 'online',
         'timestamp': datetime.now().isoformat(),
         'https': True,
-        'version': '2.0 - SEGURO'
+        'version': '2.0 - SEGURO',
+        'udp': ingesta_udp.ingesta_udp.estadisticas() if ingesta_udp.ingesta_udp else None,
+        'mqtt': puente_mqtt.puente_mqtt.estadisticas() if puente_mqtt.puente_mqtt else None,
+        'limites': limitador_ingesta.estadisticas(),
+        'tls': tls_servidor.estadisticas(),
+        'muestreo': politica_muestreo.estadisticas(),
+        'compresion': compresor_lecturas.estadisticas(),
+        'bomba': ciclos_bomba.estadisticas()
     })
 
 if __name__ == '__main__':
     print("🌿 SERVIDOR SEGURO ARDUINO ESP32")
     print("=" * 50)
+    print(f"🗄️ Base de datos: {almacenamiento.DB_BACKEND}")
+    if almacenamiento.DB_BACKEND == 'sqlite':
+        # Modo edge: sin paso de instalación previo, el esquema se crea aquí
+        almacenamiento.crear_esquema()
+        print(f"📁 Archivo SQLite: {almacenamiento.SQLITE_PATH}")
+    if memoria_reciente.preparar(get_conn):
+        print(f"🧠 Memoria reciente: {almacen_ambiente.buffer.tamano} lecturas en caché")
+    # Ingesta UDP opcional (UDP_PUERTO), con la misma BD y memoria reciente
+    ingesta_udp.iniciar_si_configurado()
+    # Puente MQTT opcional (MQTT_HOST)
+    puente_mqtt.iniciar_si_configurado()
     
     # Verificar certificados
     cert_exists = os.path.exists('server.crt') and os.path.exists('server.key')
@@ -890,15 +995,15 @@ if __name__ == '__main__':
         print("⚙️ Configure Arduino con: serverURL = \"https://192.168.1.7:5000\";")
         print("🔧 Si el navegador muestra advertencia, acepta continuar")
         
-        # Configurar contexto SSL
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-        context.load_cert_chain('server.crt', 'server.key')
+        # Contexto TLS con reanudación de sesión; HTTP/1.1 keep-alive para el ESP32
+        context = crear_contexto_tls('server.crt', 'server.key')
         
         app.run(
             host='0.0.0.0',
             port=5000,
             debug=False,
-            ssl_context=context
+            ssl_context=context,
+            request_handler=ManejadorKeepAlive
         )
     else:
         print("⚠️ CERTIFICADOS NO ENCONTRADOS - USANDO HTTP")
@@ -909,5 +1014,6 @@ if __name__ == '__main__':
         app.run(
             host='0.0.0.0',
             port=5000,
-            debug=False
+            debug=False,
+            request_handler=ManejadorKeepAlive
         )
\ No newline at end of file
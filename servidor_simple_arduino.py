@@ -6,32 +6,40 @@
 Servidor Flask simple y funcional para Arduino ESP32
 """
 
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, jsonify, request
 from flask_cors import CORS
-import pymysql
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+
+import almacenamiento
+import ingesta_udp
+import memoria_reciente
+import puente_mqtt
+from almacenamiento import sql
+from cache_http import condicional, version_datos
+from ciclos_bomba import ciclos_bomba, linea_reporte, preparar as preparar_ciclos
+from idempotencia import clave_idempotencia, insertar_lectura, ventana_ingesta
+from marcas_tiempo import fecha_lectura, hora_servidor
+from activos import CanalActivos
+from codificacion import configurar_respuestas, pide_columnas, a_columnas
+from compresion_lecturas import compresor_lecturas, desde_fecha, filas_recientes, reconstruir
+from cuerpo_binario import configurar_cuerpos, leer_cuerpo
+from limite_ingesta import configurar_limites, limitador_ingesta
+from memoria_reciente import almacen_ambiente
+from politica_muestreo import CABECERA_INTERVALO, politica_muestreo
 
 # Configuración
 app = Flask(__name__)
 CORS(app)
-
-DB_HOST = 'localhost'
-DB_USER = 'root'
-DB_PASSWORD = 'root'
-DB_NAME = 'invernadero'
+configurar_respuestas(app)
+configurar_cuerpos(app)
+configurar_limites(app)
+activos = CanalActivos().instalar(app)
 
 def get_conn():
-    """Obtener conexión a MySQL"""
+    """Obtener conexión a la base de datos (MySQL o SQLite según DB_BACKEND)"""
     try:
-        return pymysql.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        return almacenamiento.get_conn()
     except Exception as e:
         print(f"❌ Error BD: {e}")
         return None
@@ -236,10 +244,18 @@ const char* serverURL = "http://192.168.1.7:5000";
     </div>
 
     <script>
+        // Sincronización incremental: sólo se piden las lecturas posteriores a ultimoId
+        let ultimoId = null;
+        let registrosCache = [];
+
         async function cargarDatos() {
             try {
-                const response = await fetch('/api/ambiente');
+                const url = ultimoId !== null ? `/api/ambiente?since=${ultimoId}` : '/api/ambiente';
+                const response = await fetch(url);
                 const data = await response.json();
+                if (!response.ok) throw new Error(data.error || response.status);
+                
+                actualizarEstadoArduino(data.ultimo_registro);
                 
                 if (data.ultimo_registro) {
                     const ultimo = data.ultimo_registro;
@@ -256,8 +272,21 @@ const char* serverURL = "http://192.168.1.7:5000";
                 }
                 
                 if (data.registros) {
+                    if (ultimoId === null || data.truncado) {
+                        registrosCache = data.registros;
+                    } else {
+                        // Fusionar por id+fecha (una fila comprimida da varias lecturas con su id)
+                        // y ordenar por fecha: una lectura tardía no va arriba
+                        const clave = r => `${r.id}|${r.fecha}`;
+                        const porClave = new Map(registrosCache.map(r => [clave(r), r]));
+                        data.registros.forEach(r => porClave.set(clave(r), r));
+                        registrosCache = [...porClave.values()]
+                            .sort((a, b) => new Date(b.fecha) - new Date(a.fecha))
+                            .slice(0, 50);
+                    }
+                    if (data.ultimo_id !== null) ultimoId = data.ultimo_id;
                     let html = '';
-                    data.registros.slice(-5).reverse().forEach(r => {
+                    registrosCache.slice(0, 5).forEach(r => {
                         html += `<p><small>${new Date(r.fecha).toLocaleString()}</small><br>
                                  🌡️ ${r.temperatura}°C | 💧 ${r.humedad}% | 💡 ${r.estado_bomba}</p>`;
                     });
@@ -402,20 +431,6 @@ const char* serverURL = "http://192.168.1.7:5000";`;
             }
         }
 
-        // Modificar función cargarDatos para incluir estado Arduino
-        const originalCargarDatos = cargarDatos;
-        cargarDatos = async function() {
-            await originalCargarDatos();
-            // Obtener último registro para estado Arduino
-            try {
-                const response = await fetch('/api/ambiente');
-                const data = await response.json();
-                actualizarEstadoArduino(data.ultimo_registro);
-            } catch (error) {
-                console.error('Error actualizando estado Arduino:', error);
-            }
-        }
-
         // Cargar datos cada 10 segundos
         cargarDatos();
         setInterval(cargarDatos, 10000);
@@ -423,10 +438,13 @@ const char* serverURL = "http://192.168.1.7:5000";`;
 </body>
 </html>"""
 
+# Sin variables de plantilla: se renderiza una sola vez al arrancar
+activos.pagina('/', app.jinja_env.from_string(HTML_DASHBOARD).render())
+
 @app.route('/')
 def dashboard():
     """Dashboard principal"""
-    return render_template_string(HTML_DASHBOARD)
+    return activos.servir_pagina('/')
 
 @app.route('/api/health')
 def health():
@@ -434,75 +452,191 @@ def health():
     return jsonify({
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
-        'message': 'Servidor funcionando'
+        'message': 'Servidor funcionando',
+        'idempotencia': ventana_ingesta.estadisticas(),
+        'udp': ingesta_udp.ingesta_udp.estadisticas() if ingesta_udp.ingesta_udp else None,
+        'mqtt': puente_mqtt.puente_mqtt.estadisticas() if puente_mqtt.puente_mqtt else None,
+        'limites': limitador_ingesta.estadisticas(),
+        'muestreo': politica_muestreo.estadisticas(),
+        'compresion': compresor_lecturas.estadisticas(),
+        'bomba': ciclos_bomba.estadisticas()
     })
 
+LIMITE_REGISTROS = 50
+
+def ambiente_desde_memoria(marca=None):
+    """Respuesta de /api/ambiente desde la memoria reciente (None si no la cubre)"""
+    if not memoria_reciente.preparar(get_conn):
+        return None
+    ahora = datetime.now()
+    hoy = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
+    if marca:
+        nuevos = almacen_ambiente.nuevos(marca, LIMITE_REGISTROS)
+        registros, truncado = nuevos if nuevos is not None else (None, False)
+    else:
+        registros, truncado = almacen_ambiente.ultimos(LIMITE_REGISTROS), False
+    registros_hoy = almacen_ambiente.contar(hoy)
+    promedios = almacen_ambiente.agregados(ahora - timedelta(hours=24))
+    if registros is None or registros_hoy is None or promedios is None:
+        return None
+    return respuesta_ambiente(
+        almacen_ambiente.ultimo(), registros, truncado, almacen_ambiente.total, registros_hoy,
+        promedios['temperatura']['promedio'], promedios['humedad']['promedio'], marca
+    )
+
+def respuesta_ambiente(ultimo_registro, registros, truncado, total, hoy, temp_promedio, humedad_promedio,
+                       marca=None):
+    """Cuerpo común de /api/ambiente.
+
+    Con `since`, `registros` sólo trae las lecturas nuevas; si `truncado` es
+    verdadero hubo más de LIMITE_REGISTROS y el cliente debe reemplazar su lista.
+    `ultimo_id` es la marca que el cliente enviará en la siguiente consulta
+    (la mayor revisión vista, ver almacenamiento.marca_siguiente).
+    Con ?formato=columnas, `registros` va en formato columnar (codificacion.a_columnas).
+    """
+    ultimo_id = almacenamiento.marca_siguiente(registros + [ultimo_registro], marca)
+    if pide_columnas():
+        registros = a_columnas(registros, ('estado_bomba', 'alerta'))
+    return {
+        'ultimo_registro': ultimo_registro,
+        'registros': registros,
+        'truncado': truncado,
+        'ultimo_id': ultimo_id,
+        'total_registros': total,
+        'registros_hoy': hoy,
+        'promedio_temp': round(temp_promedio or 0, 1),
+        'promedio_hum': round(humedad_promedio or 0, 1)
+    }
+
 @app.route('/api/ambiente')
+@condicional
 def get_ambiente():
-    """Obtener datos del ambiente"""
+    """Obtener datos del ambiente (incremental con ?since=<id|fecha>)"""
+    marca = None
+    if request.args.get('since'):
+        try:
+            marca = almacenamiento.marca_desde(request.args['since'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    respuesta = ambiente_desde_memoria(marca)
+    if respuesta is not None:
+        return jsonify(respuesta)
+
     conn = get_conn()
     if not conn:
         return jsonify({'error': 'Error de BD'}), 500
     
     try:
         with conn.cursor() as cur:
-            # Último registro
-            cur.execute("SELECT * FROM registros_ambiente ORDER BY fecha DESC LIMIT 1")
-            ultimo_registro = cur.fetchone()
+            # Último registro (o la última lectura de una fila comprimida)
+            cur.execute(sql('ambiente_ultimo'))
+            ultimos = [cur.fetchone()]
+            cur.execute(sql('ambiente_ultimo_extendido'))
+            ultimos.append(cur.fetchone())
+            ultimos = reconstruir([fila for fila in ultimos if fila], 1)
+            ultimo_registro = ultimos[0] if ultimos else None
             
-            # Todos los registros
-            cur.execute("SELECT * FROM registros_ambiente ORDER BY fecha DESC LIMIT 50")
-            registros = cur.fetchall()
+            # Registros (sólo los nuevos si el cliente envió su marca),
+            # reconstruidos si hay filas comprimidas
+            truncado = False
+            if marca:
+                tipo, valor = marca
+                cur.execute(sql(f'ambiente_desde_{tipo}'),
+                            (desde_fecha(valor) if tipo == 'fecha' else valor, LIMITE_REGISTROS + 1))
+                filas = cur.fetchall()
+                # Una fila extendida vuelve entera, con lecturas que el cliente ya
+                # tiene: sólo faltan lecturas nuevas si quedaron filas sin traer
+                truncado = len(filas) > LIMITE_REGISTROS
+                registros = reconstruir(filas[:LIMITE_REGISTROS], LIMITE_REGISTROS, marca)
+            else:
+                registros = reconstruir(filas_recientes(cur, LIMITE_REGISTROS), LIMITE_REGISTROS)
             
             # Estadísticas
-            cur.execute("SELECT COUNT(*) as total FROM registros_ambiente")
+            cur.execute(sql('ambiente_total'))
             total_registros = cur.fetchone()['total']
             
-            cur.execute("SELECT COUNT(*) as hoy FROM registros_ambiente WHERE DATE(fecha) = CURDATE()")
+            cur.execute(sql('ambiente_hoy'))
             registros_hoy = cur.fetchone()['hoy']
             
-            cur.execute("SELECT AVG(temperatura) as temp, AVG(humedad) as hum FROM registros_ambiente WHERE fecha >= DATE_SUB(NOW(), INTERVAL 24 HOUR)")
+            cur.execute(sql('ambiente_promedios_24h'))
             promedios = cur.fetchone()
             
-            return jsonify({
-                'ultimo_registro': ultimo_registro,
-                'registros': registros,
-                'total_registros': total_registros,
-                'registros_hoy': registros_hoy,
-                'promedio_temp': round(promedios['temp'] or 0, 1),
-                'promedio_hum': round(promedios['hum'] or 0, 1)
-            })
+            return jsonify(respuesta_ambiente(
+                ultimo_registro, registros, truncado, total_registros, registros_hoy,
+                promedios['temp_promedio'], promedios['humedad_promedio'], marca
+            ))
     except Exception as e:
         print(f"❌ Error: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
 
+@app.route('/api/tiempo')
+def tiempo_servidor():
+    """Hora del servidor para sincronizar el reloj del ESP32"""
+    return jsonify(hora_servidor())
+
+@app.route('/api/devices/<dispositivo>/config')
+def configuracion_dispositivo(dispositivo):
+    """Intervalo de envío recomendado para el dispositivo"""
+    return jsonify(politica_muestreo.configuracion(dispositivo))
+
+@app.route('/api/bomba/ciclos')
+def ciclos_de_bomba():
+    """Tiempo de riego, arranques y ciclo de trabajo por hora y por día"""
+    if not preparar_ciclos(get_conn):
+        return jsonify({'error': 'Error de BD'}), 500
+    try:
+        horas = int(request.args.get('horas', 24))
+        dias = int(request.args.get('dias', 7))
+    except ValueError:
+        return jsonify({'error': 'horas y dias deben ser enteros'}), 400
+    return jsonify(ciclos_bomba.uso(request.args.get('dispositivo') or None, horas, dias))
+
 @app.route('/api/sensores/ambiente', methods=['POST'])
 def recibir_datos_arduino():
-    """Recibir datos del Arduino ESP32"""
+    """Recibir datos del Arduino ESP32 (idempotente con device_id+seq o Idempotency-Key)"""
     try:
-        data = request.get_json(force=True)
+        data = leer_cuerpo(force=True)
         temperatura = data.get('temperatura')
         humedad = data.get('humedad')
         estado_bomba = data.get('estado_bomba', 'Desconocido')
         alerta = data.get('alerta', 'Normal')
+        try:
+            dispositivo, clave = clave_idempotencia(data, request.headers)
+            fecha, _ = fecha_lectura(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Reintento de una lectura ya guardada: 200 sin tocar la BD
+        registro_id = ventana_ingesta.buscar(clave)
+        if registro_id is not None:
+            return jsonify({'status': 'duplicado', 'id': registro_id}), 200
         
         conn = get_conn()
         if not conn:
             return jsonify({'error': 'Error de BD'}), 500
         
         try:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO registros_ambiente (temperatura, humedad, estado_bomba, alerta) 
-                    VALUES (%s, %s, %s, %s)
-                """, (temperatura, humedad, estado_bomba, alerta))
-            conn.commit()
+            registro_id, revision, duplicado = insertar_lectura(
+                conn, fecha, temperatura, humedad, estado_bomba, alerta, dispositivo, clave)
+            if duplicado:
+                return jsonify({'status': 'duplicado', 'id': registro_id}), 200
+            almacen_ambiente.agregar({
+                'id': registro_id, 'revision': revision, 'fecha': fecha,
+                'temperatura': temperatura, 'humedad': humedad,
+                'estado_bomba': estado_bomba, 'alerta': alerta
+            })
+            version_datos.incrementar()
+            # Intervalo recomendado hasta el próximo envío (muestreo adaptativo)
+            intervalo = politica_muestreo.observar(dispositivo or request.remote_addr,
+                                                   temperatura, humedad, estado_bomba, alerta)
             
             print(f"📡 Arduino: {temperatura}°C, {humedad}%, {estado_bomba}")
             
-            return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()}), 201
+            return jsonify({'status': 'ok', 'id': registro_id, 'timestamp': datetime.now().isoformat(),
+                            'intervalo': intervalo}), 201, {CABECERA_INTERVALO: str(intervalo)}
         except Exception as e:
             print(f"❌ Error BD: {e}")
             return jsonify({'error': str(e)}), 500
@@ -535,12 +669,19 @@ def simular_datos():
             return jsonify({'error': 'Error de BD'}), 500
         
         try:
+            fecha = datetime.now().replace(microsecond=0)
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO registros_ambiente (temperatura, humedad, estado_bomba, alerta) 
-                    VALUES (%s, %s, %s, %s)
-                """, (temperatura, humedad, estado_bomba, alerta))
+                revision = almacenamiento.revision_siguiente(cur)
+                cur.execute(sql('ambiente_insertar'), (temperatura, humedad, estado_bomba, alerta, revision))
+                registro_id = cur.lastrowid
+                ciclos_bomba.registrar(cur, None, fecha, estado_bomba)
             conn.commit()
+            almacen_ambiente.agregar({
+                'id': registro_id, 'revision': revision, 'fecha': fecha,
+                'temperatura': temperatura, 'humedad': humedad,
+                'estado_bomba': estado_bomba, 'alerta': alerta
+            })
+            version_datos.incrementar()
             
             print(f"🎲 Datos simulados: {temperatura}°C, {humedad}%, {estado_bomba}")
             
@@ -554,6 +695,7 @@ def simular_datos():
                 }
             }), 201
         except Exception as e:
+            ciclos_bomba.invalidar()
             print(f"❌ Error guardando simulación: {e}")
             return jsonify({'error': str(e)}), 500
         finally:
@@ -567,7 +709,7 @@ def simular_datos():
 def recibir_alerta_seguridad():
     """Recibir alertas de seguridad"""
     try:
-        data = request.get_json(force=True)
+        data = leer_cuerpo(force=True)
         tipo_evento = data.get('tipo_evento', 'Manual')
         descripcion = data.get('descripcion', '')
         nivel_alerta = data.get('nivel_alerta', 'Bajo')
@@ -610,10 +752,10 @@ def generar_pdf():
         if conn:
             try:
                 with conn.cursor() as cur:
-                    cur.execute("SELECT * FROM registros_ambiente ORDER BY fecha DESC LIMIT 15")
+                    cur.execute(sql('ambiente_recientes'), (15,))
                     registros = cur.fetchall()
                     
-                    cur.execute("SELECT COUNT(*) as total FROM registros_ambiente")
+                    cur.execute(sql('ambiente_total'))
                     total_result = cur.fetchone()
                     total = total_result['total'] if total_result else 0
                 
@@ -621,9 +763,12 @@ def generar_pdf():
                 p.drawString(100, 750, "REPORTE DEL SISTEMA DE INVERNADERO")
                 p.drawString(100, 730, f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
                 p.drawString(100, 710, f"Total de registros: {total}")
+                if preparar_ciclos(get_conn):
+                    p.drawString(100, 695, linea_reporte(ciclos_bomba.uso(horas=24, dias=1)['total_horas'],
+                                                         'últimas 24 h'))
                 
                 # Encabezados
-                y = 680
+                y = 670
                 p.drawString(100, y, "FECHA")
                 p.drawString(200, y, "TEMP (°C)")
                 p.drawString(280, y, "HUMEDAD (%)")
@@ -714,7 +859,10 @@ const char* serverURL = "http://192.168.1.7:5000";</code></pre>
                     
                     <h5>GET /api/ambiente</h5>
                     <p>Obtiene datos del sistema para dashboard</p>
-                    
+
+                    <h5>GET /api/bomba/ciclos</h5>
+                    <p>Tiempo de riego, ciclos y ciclo de trabajo de la bomba por hora y por día</p>
+
                     <h5>GET /api/generar_pdf</h5>
                     <p>Descarga reporte en PDF</p>
                 </div>
@@ -730,6 +878,17 @@ const char* serverURL = "http://192.168.1.7:5000";</code></pre>
 if __name__ == '__main__':
     print("🌿 SERVIDOR SIMPLE ARDUINO ESP32")
     print("=" * 40)
+    print(f"🗄️ Base de datos: {almacenamiento.DB_BACKEND}")
+    if almacenamiento.DB_BACKEND == 'sqlite':
+        # Modo edge: sin paso de instalación previo, el esquema se crea aquí
+        almacenamiento.crear_esquema()
+        print(f"📁 Archivo SQLite: {almacenamiento.SQLITE_PATH}")
+    if memoria_reciente.preparar(get_conn):
+        print(f"🧠 Memoria reciente: {almacen_ambiente.buffer.tamano} lecturas en caché")
+    # Ingesta UDP opcional (UDP_PUERTO), con la misma BD y memoria reciente
+    ingesta_udp.iniciar_si_configurado()
+    # Puente MQTT opcional (MQTT_HOST)
+    puente_mqtt.iniciar_si_configurado()
     print("🚀 Dashboard: http://192.168.1.7:5000")
     print("📡 Endpoint: POST /api/sensores/ambiente")
     print("⚙️ Configure Arduino con: serverURL = \"http://192.168.1.7:5000\";")
@@ -3,93 +3,28 @@
 Script para crear la base de datos e insertar datos de prueba
 """
 
-import pymysql
 import os
 from datetime import datetime
 
-# Configuración de base de datos
-DB_HOST = 'localhost'
-DB_USER = 'root'
-DB_PASSWORD = 'root'
-DB_NAME = 'invernadero'
+import almacenamiento
+from almacenamiento import sql
 
 def create_database_and_data():
     """Crear base de datos e insertar datos de prueba"""
     
-    print("🔄 Conectando a MySQL...")
+    print(f"🔄 Conectando a la base de datos ({almacenamiento.DB_BACKEND})...")
     
     try:
-        # Conectar sin especificar base de datos para crearla
-        conn = pymysql.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            charset='utf8mb4'
-        )
+        # Crear base de datos, tablas e índices (MySQL o SQLite)
+        almacenamiento.crear_esquema()
+        print(f"✅ Base de datos '{almacenamiento.DB_NAME}' creada/verificada")
+        print("✅ Tablas 'registros_ambiente', 'registros_seguridad', 'registros_acceso' "
+              "y 'config_umbrales' creadas/verificadas")
+        print("✅ Índices por fecha creados/verificados")
         
-        with conn.cursor() as cursor:
-            # Crear base de datos
-            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
-            print(f"✅ Base de datos '{DB_NAME}' creada/verificada")
-        
-        conn.close()
-        
-        # Conectar a la base de datos específica
-        conn = pymysql.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            charset='utf8mb4'
-        )
+        conn = almacenamiento.get_conn()
         
         with conn.cursor() as cursor:
-            # Crear tabla de registros de ambiente
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS registros_ambiente (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    temperatura FLOAT,
-                    humedad FLOAT,
-                    estado_bomba VARCHAR(15),
-                    alerta VARCHAR(50)
-                )
-            ''')
-            print("✅ Tabla 'registros_ambiente' creada/verificada")
-            
-            # Crear tabla de seguridad
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS registros_seguridad (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    tipo_evento VARCHAR(20),
-                    descripcion TEXT,
-                    nivel_alerta VARCHAR(15)
-                )
-            ''')
-            print("✅ Tabla 'registros_seguridad' creada/verificada")
-            
-            # Crear tabla de accesos
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS registros_acceso (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    persona VARCHAR(50),
-                    acceso_autorizado BOOLEAN
-                )
-            ''')
-            print("✅ Tabla 'registros_acceso' creada/verificada")
-            
-            # Crear tabla de configuración
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS config_umbrales (
-                    id INT PRIMARY KEY DEFAULT 1,
-                    humo_umbral INT DEFAULT 300,
-                    humo_critico INT DEFAULT 500
-                )
-            ''')
-            print("✅ Tabla 'config_umbrales' creada/verificada")
-            
             # Insertar datos de prueba para ambiente
             datos_ambiente = [
                 (25.5, 65.0, 'Apagada', 'Normal'),
@@ -104,55 +39,41 @@ def create_database_and_data():
             
             # Limpiar datos existentes
             cursor.execute("DELETE FROM registros_ambiente")
-            
-            for temp, hum, bomba, alerta in datos_ambiente:
-                cursor.execute('''
-                    INSERT INTO registros_ambiente (temperatura, humedad, estado_bomba, alerta)
-                    VALUES (%s, %s, %s, %s)
-                ''', (temp, hum, bomba, alerta))
+            revision = almacenamiento.revision_siguiente(cursor)
+            cursor.executemany(sql('ambiente_insertar'), [fila + (revision,) for fila in datos_ambiente])
             
             print(f"✅ {len(datos_ambiente)} registros de ambiente insertados")
             
             # Insertar datos de seguridad
             cursor.execute("DELETE FROM registros_seguridad")
-            cursor.execute('''
-                INSERT INTO registros_seguridad (tipo_evento, descripcion, nivel_alerta)
-                VALUES ('Movimiento', 'Movimiento detectado en zona norte', 'Medio')
-            ''')
+            cursor.execute(sql('seguridad_insertar'),
+                           ('Movimiento', 'Movimiento detectado en zona norte', 'Medio'))
             print("✅ Registros de seguridad insertados")
             
             # Insertar datos de acceso
             cursor.execute("DELETE FROM registros_acceso")
-            cursor.execute('''
-                INSERT INTO registros_acceso (persona, acceso_autorizado)
-                VALUES ('Juan Pérez', TRUE)
-            ''')
+            cursor.execute(sql('acceso_insertar'),
+                           (None, 'Juan Pérez', None, None, None, True, None))
             print("✅ Registros de acceso insertados")
             
             # Insertar configuración por defecto
-            cursor.execute('''
-                INSERT INTO config_umbrales (id, humo_umbral, humo_critico)
-                VALUES (1, 300, 500)
-                ON DUPLICATE KEY UPDATE
-                humo_umbral = VALUES(humo_umbral),
-                humo_critico = VALUES(humo_critico)
-            ''')
+            cursor.execute(sql('config_umbrales_defecto'), (300, 500))
             print("✅ Configuración de umbrales insertada")
             
             # Confirmar cambios
             conn.commit()
             
             # Verificar los datos insertados
-            cursor.execute("SELECT COUNT(*) FROM registros_ambiente")
-            count = cursor.fetchone()[0]
+            cursor.execute(sql('ambiente_total'))
+            count = cursor.fetchone()['total']
             print(f"📊 Total de registros en base de datos: {count}")
             
             # Mostrar algunos registros
-            cursor.execute("SELECT * FROM registros_ambiente ORDER BY fecha DESC LIMIT 3")
+            cursor.execute(sql('ambiente_recientes'), (3,))
             registros = cursor.fetchall()
             print("🔍 Últimos registros:")
             for reg in registros:
-                print(f"   ID: {reg[0]}, Fecha: {reg[1]}, Temp: {reg[2]}°C, Hum: {reg[3]}%")
+                print(f"   ID: {reg['id']}, Fecha: {reg['fecha']}, Temp: {reg['temperatura']}°C, Hum: {reg['humedad']}%")
         
         conn.close()
         print("✅ Base de datos configurada correctamente")
@@ -169,4 +90,5 @@ if __name__ == '__main__':
         print("   python backend/app.py")
     else:
         print("\n❌ Falló la configuración de la base de datos")
-        print("🔧 Verifica que MySQL esté ejecutándose y las credenciales sean correctas")
\ No newline at end of file
+        print("🔧 Verifica que MySQL esté ejecutándose y las credenciales sean correctas")
+        print("   (o usa DB_BACKEND=sqlite para una base local sin servidor)")
\ No newline at end of file
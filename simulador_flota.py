@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🧪 SIMULADOR DE FLOTA ESP32 - PRUEBAS DE CARGA
+==============================================
+Generador de carga que simula miles de placas ESP32 enviando lecturas
+al servidor de forma concurrente (asyncio, sin hilos ni requests).
+
+Cada dispositivo mantiene su propia conexión HTTP/1.1 (keep-alive, como
+HTTPClient en el firmware; TLS con una URL https://, como en
+servidor_seguro_https.py) y envía una mezcla realista de payloads a
+/api/sensores/ambiente y /seguridad. /humo y /acceso sólo existen en el
+backend archivado (archived/backend/app.py, puerto 5001): se añaden a la
+mezcla con --tipos.
+
+Perfiles de tasa:
+    steady     -> cada dispositivo envía cada --intervalo segundos (con jitter)
+    burst      -> como steady, pero cada --rafaga-cada segundos todos los
+                  dispositivos envían --rafaga-envios lecturas seguidas
+    reconnect  -> tormenta de reconexión: cada --tormenta-cada segundos todos
+                  los dispositivos cierran la conexión y vuelven a conectar
+                  a la vez (como tras un corte de WiFi)
+
+El servidor limita la ingesta por dispositivo (limite_ingesta.py): con
+--intervalo bajo o el perfil burst parte de los envíos recibe 429. Para
+medir la capacidad del servidor, arrancarlo con LIMITE_INGESTA=0. Los 429
+se cuentan aparte (`limitadas`), no como errores.
+
+Uso:
+    LIMITE_INGESTA=0 python servidor_simple_arduino.py
+    python simulador_flota.py --dispositivos 2000 --duracion 60 --perfil steady
+    python simulador_flota.py -n 500 --perfil burst --salida-json carga.json
+    python simulador_flota.py --url http://localhost:5001 --tipos ambiente,seguridad,humo,acceso
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import ssl
+import time
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+# Configuración por defecto
+SERVER_URL = "http://localhost:5000"
+TIMEOUT_PETICION = 10.0
+
+ENDPOINTS = {
+    'ambiente': '/api/sensores/ambiente',
+    'seguridad': '/api/sensores/seguridad',
+    'humo': '/api/sensores/humo',
+    'acceso': '/api/sensores/acceso',
+}
+
+# Proporción de cada tipo de envío (el firmware envía sobre todo ambiente)
+MEZCLA_PAYLOADS = {
+    'ambiente': 0.85,
+    'seguridad': 0.07,
+    'humo': 0.05,
+    'acceso': 0.03,
+}
+# Rutas que tienen todos los servidores; humo y acceso, sólo el archivado
+TIPOS_POR_DEFECTO = ('ambiente', 'seguridad')
+
+PERFILES = ('steady', 'burst', 'reconnect')
+
+# Umbrales iguales a los de arduino/invernadero_esp32.ino
+TEMP_MIN, TEMP_MAX, TEMP_CRITICA = 18.0, 28.0, 35.0
+HUM_MIN, HUM_MAX = 40.0, 70.0
+HUM_CRITICA_BAJA, HUM_CRITICA_ALTA = 30.0, 80.0
+
+TARJETAS = [
+    ("12345678", "Administrador", True),
+    ("87654321", "Técnico Agrícola", True),
+    ("11223344", "Supervisor", True),
+    ("DEADBEEF", "Desconocido", False),
+]
+
+
+class Metricas:
+    """Acumula latencias, códigos de estado y errores por endpoint"""
+
+    def __init__(self, tipos=TIPOS_POR_DEFECTO):
+        self.latencias = {tipo: [] for tipo in tipos}
+        self.codigos = {}
+        self.errores = {}
+        self.conexiones = 0
+        self.inicio = None
+        self.fin = None
+
+    def registrar(self, tipo, latencia, codigo):
+        self.latencias[tipo].append(latencia)
+        self.codigos[codigo] = self.codigos.get(codigo, 0) + 1
+
+    def registrar_error(self, tipo, error):
+        clave = f"{tipo}:{type(error).__name__}"
+        self.errores[clave] = self.errores.get(clave, 0) + 1
+
+    def resumen(self):
+        """Construir el resumen final (serializable a JSON)"""
+        duracion = max((self.fin or time.perf_counter()) - (self.inicio or 0), 1e-9)
+        todas = sorted(l for lista in self.latencias.values() for l in lista)
+        total_errores = sum(self.errores.values())
+        # 429 es el límite de ingesta actuando, no un fallo del servidor
+        limitadas = self.codigos.get(429, 0)
+        respuestas_fallidas = sum(n for codigo, n in self.codigos.items() if codigo >= 400) - limitadas
+        total = len(todas) + total_errores
+
+        por_endpoint = {}
+        for tipo, lista in self.latencias.items():
+            if lista:
+                por_endpoint[tipo] = dict(peticiones=len(lista), **percentiles(sorted(lista)))
+
+        return {
+            'duracion_s': round(duracion, 3),
+            'peticiones': total,
+            'throughput_rps': round(total / duracion, 2),
+            'conexiones_abiertas': self.conexiones,
+            'latencia_ms': percentiles(todas),
+            'por_endpoint': por_endpoint,
+            'codigos_http': {str(k): v for k, v in sorted(self.codigos.items())},
+            'errores_red': self.errores,
+            'limitadas': limitadas,
+            'tasa_error': round((total_errores + respuestas_fallidas) / total, 4) if total else 0.0,
+        }
+
+
+def percentiles(ordenadas):
+    """p50/p95/p99 (rango más cercano) en milisegundos sobre una lista ordenada"""
+    if not ordenadas:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+
+    def p(q):
+        indice = max(0, math.ceil(q / 100 * len(ordenadas)) - 1)
+        return round(ordenadas[indice] * 1000, 2)
+
+    return {'p50': p(50), 'p95': p(95), 'p99': p(99), 'max': round(ordenadas[-1] * 1000, 2)}
+
+
+@lru_cache(maxsize=None)
+def contexto_tls():
+    """Contexto cliente compartido; sin verificar el certificado (autofirmado, como el ESP32)"""
+    contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    contexto.check_hostname = False
+    contexto.verify_mode = ssl.CERT_NONE
+    return contexto
+
+
+class ConexionHTTP:
+    """Conexión HTTP/1.1 mínima con keep-alive sobre asyncio streams"""
+
+    def __init__(self, host, port, contexto_ssl=None):
+        self.host = host
+        self.port = port
+        self.contexto_ssl = contexto_ssl
+        self.reader = None
+        self.writer = None
+
+    @property
+    def abierta(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def conectar(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.contexto_ssl)
+
+    async def cerrar(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+    async def post_json(self, ruta, datos):
+        """Enviar un POST JSON y devolver el código de estado"""
+        cuerpo = json.dumps(datos).encode('utf-8')
+        cabeceras = (
+            f"POST {ruta} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "User-Agent: ESP32HTTPClient\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(cuerpo)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode('latin-1')
+        self.writer.write(cabeceras + cuerpo)
+        await self.writer.drain()
+
+        linea_estado = await self.reader.readline()
+        if not linea_estado:
+            raise ConnectionResetError("El servidor cerró la conexión")
+        codigo = int(linea_estado.split()[1])
+
+        longitud = None
+        fragmentado = False
+        cerrar = linea_estado.startswith(b"HTTP/1.0")
+        while True:
+            linea = await self.reader.readline()
+            if linea in (b"\r\n", b"\n", b""):
+                break
+            nombre, _, valor = linea.decode('latin-1').partition(':')
+            nombre = nombre.strip().lower()
+            valor = valor.strip().lower()
+            if nombre == 'content-length':
+                longitud = int(valor)
+            elif nombre == 'transfer-encoding':
+                fragmentado = 'chunked' in valor
+            elif nombre == 'connection':
+                cerrar = valor == 'close'
+
+        if fragmentado:
+            await self._leer_fragmentos()
+        elif longitud is not None:
+            await self.reader.readexactly(longitud)
+        else:
+            # Sin longitud ni chunked el cuerpo termina al cerrar la conexión
+            await self.reader.read()
+            cerrar = True
+
+        if cerrar:
+            await self.cerrar()
+        return codigo
+
+    async def _leer_fragmentos(self):
+        """Consumir un cuerpo Transfer-Encoding: chunked (y sus trailers)"""
+        while True:
+            tamano = int((await self.reader.readline()).split(b';')[0].strip() or b'0', 16)
+            if tamano == 0:
+                break
+            await self.reader.readexactly(tamano + 2)  # datos + CRLF
+        while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+
+def abrir_conexion(url):
+    """ConexionHTTP para una URL http:// o https:// (puertos 80 / 443 por defecto)"""
+    url = urlsplit(url)
+    if url.scheme == 'https':
+        return ConexionHTTP(url.hostname, url.port or 443, contexto_tls())
+    return ConexionHTTP(url.hostname, url.port or 80)
+
+
+class DispositivoSimulado:
+    """Una placa ESP32 virtual con su propio estado de sensores"""
+
+    def __init__(self, indice, rng, tipos=TIPOS_POR_DEFECTO):
+        self.device_id = f"esp32-{indice:05d}"
+        self.rng = rng
+        self.tipos = list(tipos)
+        self.pesos = [MEZCLA_PAYLOADS[tipo] for tipo in self.tipos]
+        self.temperatura = rng.uniform(20.0, 27.0)
+        self.humedad = rng.uniform(45.0, 70.0)
+        self.bomba_encendida = False
+        self.seq = 0
+
+    def _avanzar_sensores(self):
+        # Paseo aleatorio suave, como un DHT22 real entre lecturas
+        self.temperatura = min(40.0, max(10.0, self.temperatura + self.rng.gauss(0, 0.3)))
+        self.humedad = min(95.0, max(20.0, self.humedad + self.rng.gauss(0, 0.8)))
+        self.bomba_encendida = self.temperatura > TEMP_MAX or self.humedad < HUM_MIN
+
+    def _alerta(self):
+        if (self.temperatura > TEMP_CRITICA or self.humedad < HUM_CRITICA_BAJA
+                or self.humedad > HUM_CRITICA_ALTA):
+            return "Crítico"
+        if (self.temperatura > TEMP_MAX or self.temperatura < TEMP_MIN
+                or self.humedad < HUM_MIN or self.humedad > HUM_MAX):
+            return "Alto"
+        return "Normal"
+
+    def siguiente_envio(self):
+        """Elegir tipo de envío según la mezcla y construir su payload"""
+        self._avanzar_sensores()
+        self.seq += 1
+        tipo = self.rng.choices(self.tipos, weights=self.pesos)[0]
+
+        if tipo == 'ambiente':
+            datos = {
+                'temperatura': round(self.temperatura, 1),
+                'humedad': round(self.humedad, 1),
+                'estado_bomba': "Encendida" if self.bomba_encendida else "Apagada",
+                'alerta': self._alerta(),
+            }
+        elif tipo == 'seguridad':
+            datos = {
+                'tipo_evento': "Movimiento",
+                'descripcion': "Actividad detectada en zona de cultivo",
+                'nivel_alerta': "Bajo",
+            }
+        elif tipo == 'humo':
+            valor = int(self.rng.lognormvariate(5.2, 0.35))
+            datos = {'valor': valor, 'descripcion': f"Nivel de humo: {valor}", 'zona': "Norte"}
+        else:
+            id_tarjeta, persona, autorizada = self.rng.choice(TARJETAS)
+            datos = {
+                'id_tarjeta': id_tarjeta,
+                'persona': persona,
+                'estado_bomba': "Encendida" if self.bomba_encendida else "Apagada",
+                'temperatura': round(self.temperatura, 1),
+                'humedad': round(self.humedad, 1),
+                'acceso_autorizado': autorizada,
+                'observacion': "Acceso normal" if autorizada else "Acceso denegado - tarjeta no autorizada",
+            }
+
+        datos['device_id'] = self.device_id
+        datos['seq'] = self.seq
+        return tipo, datos
+
+
+async def enviar(dispositivo, conexion, metricas, timeout):
+    """Realizar un envío (reconectando si hace falta) y registrar métricas"""
+    tipo, datos = dispositivo.siguiente_envio()
+    inicio = time.perf_counter()
+    try:
+        if not conexion.abierta:
+            await asyncio.wait_for(conexion.conectar(), timeout)
+            metricas.conexiones += 1
+        codigo = await asyncio.wait_for(conexion.post_json(ENDPOINTS[tipo], datos), timeout)
+        metricas.registrar(tipo, time.perf_counter() - inicio, codigo)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+        metricas.registrar_error(tipo, e)
+        await conexion.cerrar()
+
+
+async def ejecutar_dispositivo(dispositivo, args, metricas, fin, eventos):
+    """Bucle de vida de un dispositivo según el perfil elegido"""
+    conexion = abrir_conexion(args.url)
+    rng = dispositivo.rng
+    nombre_evento = {'burst': 'rafaga', 'reconnect': 'tormenta'}.get(args.perfil)
+
+    # Arranque escalonado para no sincronizar toda la flota en steady
+    await asyncio.sleep(rng.uniform(0, args.intervalo))
+    proximo = time.perf_counter()
+    try:
+        while time.perf_counter() < fin:
+            ahora = time.perf_counter()
+            if ahora < proximo:
+                evento = eventos[nombre_evento] if nombre_evento else None
+                if evento is None:
+                    await asyncio.sleep(proximo - ahora)
+                else:
+                    try:
+                        await asyncio.wait_for(evento.wait(), proximo - ahora)
+                    except asyncio.TimeoutError:
+                        pass
+                    else:
+                        # Ráfaga o tormenta: la flota entera actúa a la vez
+                        if args.perfil == 'reconnect':
+                            await conexion.cerrar()
+                            await enviar(dispositivo, conexion, metricas, args.timeout)
+                        else:
+                            for _ in range(args.rafaga_envios):
+                                await enviar(dispositivo, conexion, metricas, args.timeout)
+                        await asyncio.sleep(0)
+                        continue
+            await enviar(dispositivo, conexion, metricas, args.timeout)
+            jitter = rng.uniform(-0.1, 0.1) * args.intervalo
+            proximo = max(proximo + args.intervalo + jitter, time.perf_counter())
+    finally:
+        await conexion.cerrar()
+
+
+async def disparar_eventos(args, fin, eventos):
+    """Marcar periódicamente las ráfagas o tormentas de reconexión"""
+    if args.perfil == 'burst':
+        nombre, cada = 'rafaga', args.rafaga_cada
+    elif args.perfil == 'reconnect':
+        nombre, cada = 'tormenta', args.tormenta_cada
+    else:
+        return
+    while time.perf_counter() + cada < fin:
+        await asyncio.sleep(cada)
+        evento = eventos[nombre]
+        eventos[nombre] = asyncio.Event()
+        evento.set()
+        print(f"⚡ {nombre.capitalize()} disparada ({args.dispositivos} dispositivos)")
+
+
+async def simular_flota(args):
+    """Lanzar la flota completa y devolver el resumen de métricas"""
+    rng_base = random.Random(args.semilla)
+    dispositivos = [DispositivoSimulado(i, random.Random(rng_base.random()), args.tipos)
+                    for i in range(args.dispositivos)]
+    metricas = Metricas(args.tipos)
+    eventos = {'rafaga': asyncio.Event(), 'tormenta': asyncio.Event()}
+
+    metricas.inicio = time.perf_counter()
+    fin = metricas.inicio + args.duracion
+    tareas = [asyncio.create_task(ejecutar_dispositivo(d, args, metricas, fin, eventos)) for d in dispositivos]
+    tareas.append(asyncio.create_task(disparar_eventos(args, fin, eventos)))
+    await asyncio.gather(*tareas)
+    metricas.fin = time.perf_counter()
+    return metricas.resumen()
+
+
+def imprimir_resumen(resumen):
+    """Mostrar el resumen en consola"""
+    lat = resumen['latencia_ms']
+    print("=" * 50)
+    print("📊 RESULTADOS DE LA PRUEBA DE CARGA")
+    print("=" * 50)
+    print(f"⏱️ Duración: {resumen['duracion_s']} s")
+    print(f"📡 Peticiones: {resumen['peticiones']} ({resumen['throughput_rps']} req/s)")
+    print(f"🔗 Conexiones abiertas: {resumen['conexiones_abiertas']}")
+    print(f"⏳ Latencia p50/p95/p99: {lat['p50']} / {lat['p95']} / {lat['p99']} ms (máx {lat['max']} ms)")
+    for tipo, datos in resumen['por_endpoint'].items():
+        print(f"   • {tipo:<10} {datos['peticiones']:>8} peticiones  p95={datos['p95']} ms")
+    print(f"📋 Códigos HTTP: {resumen['codigos_http']}")
+    if resumen['errores_red']:
+        print(f"❌ Errores de red: {resumen['errores_red']}")
+    if resumen['limitadas']:
+        print(f"🚦 Limitadas (429): {resumen['limitadas']} - servidor con LIMITE_INGESTA=0 para medir capacidad")
+    print(f"⚠️ Tasa de error: {resumen['tasa_error'] * 100:.2f}%")
+
+
+def lista_tipos(valor):
+    """Tipos de envío separados por comas (claves de ENDPOINTS)"""
+    tipos = tuple(t.strip() for t in valor.split(',') if t.strip())
+    desconocidos = [t for t in tipos if t not in ENDPOINTS]
+    if not tipos or desconocidos:
+        raise argparse.ArgumentTypeError(f"tipos válidos: {', '.join(ENDPOINTS)}")
+    return tipos
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador de flota ESP32 para pruebas de carga")
+    parser.add_argument('--url', default=SERVER_URL, help="URL base del servidor")
+    parser.add_argument('-n', '--dispositivos', type=int, default=100, help="Número de dispositivos simulados")
+    parser.add_argument('--duracion', type=float, default=60.0, help="Duración de la prueba en segundos")
+    parser.add_argument('--perfil', choices=PERFILES, default='steady', help="Perfil de tasa de envío")
+    parser.add_argument('--intervalo', type=float, default=30.0, help="Segundos entre envíos por dispositivo")
+    parser.add_argument('--rafaga-cada', type=float, default=15.0, help="Segundos entre ráfagas (perfil burst)")
+    parser.add_argument('--rafaga-envios', type=int, default=5, help="Envíos por dispositivo en cada ráfaga")
+    parser.add_argument('--tormenta-cada', type=float, default=20.0, help="Segundos entre tormentas (perfil reconnect)")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT_PETICION, help="Timeout por petición en segundos")
+    parser.add_argument('--tipos', type=lista_tipos, default=TIPOS_POR_DEFECTO,
+                        help="Envíos de la mezcla, separados por comas (humo y acceso: backend archivado)")
+    parser.add_argument('--semilla', type=int, default=42, help="Semilla para payloads reproducibles")
+    parser.add_argument('--salida-json', help="Guardar el resumen en este archivo JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("🧪 SIMULADOR DE FLOTA ESP32")
+    print("=" * 50)
+    print(f"🎯 Servidor objetivo: {args.url}")
+    print(f"📟 Dispositivos: {args.dispositivos} | Perfil: {args.perfil} | Duración: {args.duracion}s")
+    print("=" * 50)
+
+    try:
+        resumen = asyncio.run(simular_flota(args))
+    except KeyboardInterrupt:
+        print("\n🛑 Simulación detenida por el usuario")
+        return 1
+
+    imprimir_resumen(resumen)
+    if args.salida_json:
+        with open(args.salida_json, 'w', encoding='utf-8') as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resumen guardado en: {args.salida_json}")
+    return 0 if resumen['tasa_error'] < 1 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
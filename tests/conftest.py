@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""Configuración común: backend SQLite temporal, sin límites de ingesta"""
+
+import os
+import sys
+import tempfile
+
+# Los módulos leen el entorno al importarse: fijarlo antes de cualquier import
+_DIRECTORIO = tempfile.mkdtemp(prefix='invernadero_pruebas_')
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+os.environ.setdefault('SQLITE_PATH', os.path.join(_DIRECTORIO, 'invernadero.db'))
+os.environ.setdefault('LIMITE_INGESTA', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
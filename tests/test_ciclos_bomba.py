@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Ciclo de trabajo de la bomba: denominador y calentamiento desde la BD"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import almacenamiento
+from almacenamiento import sql
+from ciclos_bomba import CiclosBomba
+
+AHORA = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def conn():
+    almacenamiento.crear_esquema()
+    conexion = almacenamiento.get_conn()
+    with conexion.cursor() as cur:
+        cur.execute("DELETE FROM registros_ambiente")
+        cur.execute("DELETE FROM intervalos_bomba")
+    conexion.commit()
+    yield conexion
+    conexion.close()
+
+
+def guardar(conn, ciclos, dispositivo, fecha, estado_bomba):
+    with conn.cursor() as cur:
+        cur.execute(sql('ambiente_insertar_idempotente'),
+                    (fecha, 24.0, 60.0, estado_bomba, 'Normal', dispositivo, None, None))
+        ciclos.registrar(cur, dispositivo, fecha, estado_bomba)
+    conn.commit()
+
+
+def test_ciclo_de_trabajo_cuenta_bombas_que_nunca_encendieron(conn):
+    ciclos = CiclosBomba()
+    inicio = AHORA - timedelta(hours=2)
+    guardar(conn, ciclos, 'esp-a', inicio, 'Encendida')
+    guardar(conn, ciclos, 'esp-b', inicio, 'Apagada')
+    guardar(conn, ciclos, 'esp-a', inicio + timedelta(minutes=12), 'Apagada')
+
+    hora = ciclos.uso(horas=3)['horas'][-3]
+    assert ciclos.uso()['bombas'] == 2
+    assert hora['encendida_s'] == 720
+    assert hora['ciclo_trabajo'] == 10.0  # 12 min de 2 bombas x 60 min
+
+
+def test_calentar_conoce_dispositivos_sin_intervalos(conn):
+    inicio = AHORA - timedelta(hours=1)
+    guardar(conn, CiclosBomba(), 'esp-a', inicio, 'Encendida')
+    guardar(conn, CiclosBomba(), 'esp-a', inicio + timedelta(minutes=5), 'Encendida')
+    guardar(conn, CiclosBomba(), 'esp-b', inicio, 'Apagada')
+    guardar(conn, CiclosBomba(), None, inicio + timedelta(minutes=1), 'Encendida')
+
+    ciclos = CiclosBomba()
+    with conn.cursor() as cur:
+        ciclos.calentar(cur)
+    assert ciclos.uso()['bombas'] == 3
+    assert ciclos.encendidas['esp-a'].ultima == inicio + timedelta(minutes=5)
+    assert ciclos.encendidas[None].ultima == inicio + timedelta(minutes=1)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Punto fijo de los cuerpos MessagePack/CBOR"""
+
+import pytest
+
+from cuerpo_binario import codificar_lectura, compactar_lectura, decodificar_lectura
+
+LECTURA = {'device_id': '24:6F:28:AA:BB:CC', 'seq': 3, 'ts': 1760000000000,
+           'estado_bomba': 'Encendida', 'alerta': 'Normal'}
+
+
+def test_centesimas_solo_bajo_claves_numericas():
+    assert decodificar_lectura({5: 2354, '6': 6120}) == {'temperatura': 23.54, 'humedad': 61.2}
+    assert decodificar_lectura({'temperatura': 23, 'humedad': 60}) == {'temperatura': 23, 'humedad': 60}
+    assert decodificar_lectura({5: 23.5}) == {'temperatura': 23.5}
+
+
+@pytest.mark.parametrize('temperatura, humedad', [(23, 60), (23.54, 61.2), (-4.5, 100)])
+def test_ida_y_vuelta(temperatura, humedad):
+    lectura = dict(LECTURA, temperatura=temperatura, humedad=humedad)
+    mapa = compactar_lectura(lectura)
+    assert isinstance(mapa[5], int) and isinstance(mapa[6], int)
+    assert decodificar_lectura(mapa) == lectura
+
+
+@pytest.mark.parametrize('formato', ['msgpack', 'cbor'])
+def test_ida_y_vuelta_codificada(formato):
+    modulo = pytest.importorskip('msgpack' if formato == 'msgpack' else 'cbor2')
+    lectura = dict(LECTURA, temperatura=23, humedad=61.2)
+    cuerpo = codificar_lectura(lectura, formato)
+    mapa = modulo.unpackb(cuerpo, raw=False, strict_map_key=False) if formato == 'msgpack' else modulo.loads(cuerpo)
+    assert decodificar_lectura(mapa) == lectura
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Resumen de reportes del backend archivado sobre su propio esquema"""
+
+import math
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+import almacenamiento
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'archived', 'backend'))
+
+from datos_agregados import consultar_resumen  # noqa: E402
+
+INICIO = datetime(2024, 5, 1, 8, 0)
+
+# Esquema de init_db() en archived/backend/app.py (sin dispositivo, muestras
+# ni intervalos_bomba), en dialecto SQLite
+ESQUEMA_ARCHIVADO = (
+    """CREATE TABLE registros_ambiente (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+        temperatura FLOAT, humedad FLOAT, estado_bomba VARCHAR(15), alerta VARCHAR(50))""",
+    """CREATE TABLE registros_seguridad (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+        tipo_evento VARCHAR(50), descripcion TEXT, nivel_alerta VARCHAR(10))""",
+    """CREATE TABLE registros_acceso (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+        id_tarjeta VARCHAR(50), persona VARCHAR(100), estado_bomba VARCHAR(15),
+        temperatura FLOAT, humedad FLOAT, acceso_autorizado BOOLEAN, observacion TEXT)""",
+)
+
+
+def _formatear_fecha(fecha, formato):
+    # Los % llegan duplicados: CursorSQLite sólo traduce %s
+    return datetime.fromisoformat(fecha).strftime(formato.replace('%%', '%'))
+
+
+@pytest.fixture
+def conn(tmp_path):
+    nativa = sqlite3.connect(tmp_path / 'archivado.db', detect_types=sqlite3.PARSE_DECLTYPES)
+    nativa.row_factory = almacenamiento._fila_dict
+    nativa.create_function('DATE_FORMAT', 2, _formatear_fecha)
+    for sentencia in ESQUEMA_ARCHIVADO:
+        nativa.execute(sentencia)
+    yield almacenamiento.ConexionSQLite(nativa)
+    nativa.close()
+
+
+def guardar(conn, *filas):
+    with conn.cursor() as cur:
+        for minuto, temperatura, estado in filas:
+            cur.execute("INSERT INTO registros_ambiente (fecha, temperatura, humedad, estado_bomba, alerta) "
+                        "VALUES (%s, %s, %s, %s, %s)",
+                        (INICIO + timedelta(minutes=minuto), temperatura, 50.0, estado, 'Normal'))
+
+
+def test_resumen_sobre_el_esquema_archivado(conn):
+    guardar(conn, (0, 20.0, 'Apagada'), (30, 22.0, 'Encendida'), (90, 24.0, 'Apagada'))
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO registros_seguridad (fecha, tipo_evento, nivel_alerta) VALUES (%s, %s, %s)",
+                    (INICIO, 'humo', 'ALTO'))
+    conn.commit()
+
+    resumen, ambiente, seguridad, accesos = consultar_resumen(conn, INICIO, INICIO + timedelta(hours=2))
+    assert resumen.total == 3
+    assert resumen.temperatura['promedio'] == pytest.approx(22.0)
+    assert resumen.temperatura['desviacion'] == pytest.approx(math.sqrt(8 / 3))
+    assert resumen.bomba_encendida == 1
+    assert [p['lecturas'] for p in resumen.serie] == [2, 1]
+    assert resumen.seguridad_por_nivel == {'ALTO': 1}
+    # Sin intervalos_bomba el porcentaje sale de las lecturas
+    assert resumen.bomba_ciclo_trabajo is None
+    assert resumen.porcentaje_bomba == pytest.approx(100 / 3)
+    assert len(ambiente) == 3 and len(seguridad) == 1 and accesos == []
+
+
+def test_filas_comprimidas_pesan_por_sus_muestras(conn):
+    with conn.cursor() as cur:
+        cur.execute("ALTER TABLE registros_ambiente ADD COLUMN muestras INTEGER NOT NULL DEFAULT 1")
+    guardar(conn, (0, 20.0, 'Encendida'), (30, 30.0, 'Apagada'))
+    with conn.cursor() as cur:
+        cur.execute("UPDATE registros_ambiente SET muestras = 3 WHERE temperatura = 20.0")
+    conn.commit()
+
+    resumen = consultar_resumen(conn, INICIO, INICIO + timedelta(hours=2))[0]
+    assert resumen.total == 4
+    assert resumen.temperatura['promedio'] == pytest.approx(22.5)
+    assert resumen.temperatura['desviacion'] == pytest.approx(math.sqrt(18.75))
+    assert resumen.bomba_encendida == 3
+    assert resumen.rangos_humedad == (0, 4, 0)
+    assert [p['lecturas'] for p in resumen.serie] == [4]
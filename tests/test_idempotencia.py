@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Ingesta idempotente y fechas del dispositivo"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import almacenamiento
+import servidor_simple_arduino
+from compresion_lecturas import compresor_lecturas
+from idempotencia import insertar_lectura, insertar_lote, ventana_ingesta
+from marcas_tiempo import TIEMPO_MAX_ATRASO, fecha_lectura
+
+FECHA = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+AHORA = 1_760_000_000.0
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    almacenamiento.crear_esquema()
+    conexion = almacenamiento.get_conn()
+    with conexion.cursor() as cur:
+        cur.execute("DELETE FROM registros_ambiente")
+    conexion.commit()
+    monkeypatch.setattr(compresor_lecturas, 'activo', False)
+    ventana_ingesta.claves.clear()
+    monkeypatch.setattr(ventana_ingesta, 'duplicados', 0)
+    monkeypatch.setattr(ventana_ingesta, 'duplicados_bd', 0)
+    yield conexion
+    conexion.close()
+
+
+def filas(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, clave_idempotencia FROM registros_ambiente")
+        return {f['clave_idempotencia']: f['id'] for f in cur.fetchall()}
+
+
+def lectura(clave, temperatura=24.0, minuto=0):
+    return (FECHA + timedelta(minutes=minuto), temperatura, 60.0, 'Apagada', 'Normal', 'esp-a', clave)
+
+
+def test_reintento_http_resuelto_por_la_ventana(conn):
+    cliente = servidor_simple_arduino.app.test_client()
+    cuerpo = {'device_id': 'esp-a', 'seq': 1, 'temperatura': 24.0, 'humedad': 60.0}
+    primera = cliente.post('/api/sensores/ambiente', json=cuerpo)
+    reintento = cliente.post('/api/sensores/ambiente', json=cuerpo)
+    assert (primera.status_code, reintento.status_code) == (201, 200)
+    assert reintento.get_json() == {'status': 'duplicado', 'id': primera.get_json()['id']}
+    assert ventana_ingesta.duplicados == 1 and ventana_ingesta.duplicados_bd == 0
+    assert filas(conn) == {'esp-a:1': primera.get_json()['id']}
+
+
+def test_clave_fuera_de_la_ventana_la_detecta_el_indice_unico(conn):
+    registro_id, revision, duplicado = insertar_lectura(conn, *lectura('esp-a:1'))
+    assert revision is not None and not duplicado
+    ventana_ingesta.claves.clear()  # p. ej. tras reiniciar el servidor
+    assert insertar_lectura(conn, *lectura('esp-a:1')) == (registro_id, None, True)
+    assert ventana_ingesta.duplicados_bd == 1
+    assert ventana_ingesta.buscar('esp-a:1') == registro_id
+    assert filas(conn) == {'esp-a:1': registro_id}
+
+
+def test_lote_recupera_los_ids_por_clave(conn):
+    guardada, _, _ = insertar_lectura(conn, *lectura('esp-a:1'))
+    ventana_ingesta.claves.clear()
+    lote = [lectura('esp-a:1'), lectura('esp-a:2', 25.0, 1), lectura('esp-a:3', 26.0, 2)]
+    ids, revision = insertar_lote(conn, lote)
+    guardadas = filas(conn)
+    assert ids == guardadas and len(guardadas) == 3
+    assert ids['esp-a:1'] == guardada
+    assert revision is not None
+    assert all(ventana_ingesta.buscar(clave) == registro_id for clave, registro_id in ids.items())
+
+
+def test_sin_ts_se_fecha_al_recibir():
+    assert fecha_lectura({}, ahora=AHORA) == (datetime.fromtimestamp(AHORA), 0.0)
+
+
+@pytest.mark.parametrize('ts', [AHORA - 30, (AHORA - 30) * 1000, str(int(AHORA - 30)),
+                                datetime.fromtimestamp(AHORA - 30).isoformat()])
+def test_ts_en_segundos_milisegundos_o_iso(ts):
+    assert fecha_lectura({'ts': ts}, ahora=AHORA)[0] == datetime.fromtimestamp(AHORA - 30)
+
+
+def test_desfase_del_reloj_corrige_la_medicion():
+    # El reloj del ESP32 va 120 s atrasado: midió 30 s antes de enviar
+    reloj = AHORA - 120
+    fecha, desfase = fecha_lectura({'ts': (reloj - 30) * 1000, 'enviado': reloj * 1000}, ahora=AHORA)
+    assert desfase == pytest.approx(120)
+    assert fecha == datetime.fromtimestamp(AHORA - 30)
+
+
+def test_fecha_futura_se_recorta_y_antigua_se_rechaza():
+    assert fecha_lectura({'ts': AHORA + 3600}, ahora=AHORA)[0] == datetime.fromtimestamp(AHORA)
+    with pytest.raises(ValueError):
+        fecha_lectura({'ts': AHORA - TIEMPO_MAX_ATRASO - 60}, ahora=AHORA)
+    with pytest.raises(ValueError):
+        fecha_lectura({'ts': 'ayer'}, ahora=AHORA)
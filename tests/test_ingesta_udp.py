@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Contabilidad de secuencias de la ingesta UDP"""
+
+from ingesta_udp import ContabilidadSecuencias
+
+MAC = b'\x24\x6f\x28\xaa\xbb\xcc'
+ARRANQUE = 7 << 32
+
+
+def _contabilidad(*secuencias):
+    contabilidad = ContabilidadSecuencias()
+    aceptadas = [contabilidad.aceptar(MAC, ARRANQUE | seq) for seq in secuencias]
+    return contabilidad, aceptadas
+
+
+def test_primeras_lecturas_reordenadas_no_dan_perdidas_negativas():
+    contabilidad, aceptadas = _contabilidad(10, 9, 8)
+    resumen = contabilidad.resumen()
+    assert aceptadas == [True, True, True]
+    assert resumen['perdidos'] == 0
+    assert resumen['reordenados'] == 2
+    assert resumen['tasa_perdida'] == 0.0
+
+
+def test_hueco_rellenado_por_lectura_reordenada():
+    contabilidad, _ = _contabilidad(1, 2, 5)
+    assert contabilidad.resumen()['perdidos'] == 2
+    contabilidad.aceptar(MAC, ARRANQUE | 4)
+    contabilidad.aceptar(MAC, ARRANQUE | 3)
+    resumen = contabilidad.resumen()
+    assert resumen['perdidos'] == 0
+    assert resumen['reordenados'] == 2
+
+
+def test_duplicado_se_rechaza_y_cuenta():
+    contabilidad, aceptadas = _contabilidad(1, 2, 2, 1)
+    resumen = contabilidad.resumen()
+    assert aceptadas == [True, True, False, False]
+    assert resumen['duplicados'] == 2
+    assert resumen['recibidos'] == 2
+
+
+def test_reinicio_empieza_ventana_nueva_sin_perdidas():
+    contabilidad, _ = _contabilidad(100, 101)
+    otro_arranque = 8 << 32
+    assert contabilidad.aceptar(MAC, otro_arranque | 1)
+    assert contabilidad.aceptar(MAC, otro_arranque | 0)  # reordenada tras el reinicio
+    resumen = contabilidad.resumen()
+    assert resumen['perdidos'] == 0
+    assert resumen['recibidos'] == 4
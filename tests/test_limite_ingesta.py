@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Token bucket de la ingesta"""
+
+import pytest
+from flask import Flask
+
+import limite_ingesta
+from limite_ingesta import LimitadorTokenBucket, LimiteIngesta
+
+
+def test_rafaga_y_relleno():
+    cubo = LimitadorTokenBucket(tasa=2, rafaga=3, franjas=1)
+    assert [cubo.consumir('esp-a', ahora=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert cubo.consumir('esp-a', ahora=0.0) == pytest.approx(0.5)
+    assert cubo.consumir('esp-b', ahora=0.0) == 0.0  # cubo propio
+    assert cubo.consumir('esp-a', ahora=0.5) == 0.0  # medio segundo: una ficha
+    assert cubo.consumir('esp-a', ahora=0.5) == pytest.approx(0.5)
+    estadisticas = cubo.estadisticas()
+    assert (estadisticas['admitidas'], estadisticas['limitadas']) == (5, 2)
+    assert estadisticas['mas_limitadas'] == {'esp-a': 2}
+
+
+def test_relleno_no_supera_la_rafaga():
+    cubo = LimitadorTokenBucket(tasa=1, rafaga=2, franjas=1)
+    cubo.consumir('esp-a', ahora=0.0)
+    assert [cubo.consumir('esp-a', ahora=100.0) for _ in range(3)][2] > 0
+
+
+def test_purga_cubos_llenos_al_crecer_la_tabla():
+    cubo = LimitadorTokenBucket(tasa=1, rafaga=2, franjas=1, max_claves=2)
+    cubo.consumir('esp-a', ahora=0.0)
+    cubo.consumir('esp-b', ahora=0.0)
+    cubo.consumir('esp-c', ahora=10.0)
+    assert cubo.estadisticas()['claves'] == 1
+
+
+def test_sin_ip_solo_limita_por_dispositivo():
+    limite = LimiteIngesta()
+    limite.dispositivos = LimitadorTokenBucket(tasa=1, rafaga=1)
+    limite.ips = LimitadorTokenBucket(tasa=1, rafaga=1)
+    assert limite.admitir('esp-a') == (0.0, None)
+    assert limite.admitir('esp-b') == (0.0, None)
+    assert limite.admitir('esp-a')[1] == 'dispositivo'
+    assert limite.admitir('esp-c', '10.0.0.1') == (0.0, None)
+    assert limite.admitir('esp-d', '10.0.0.1')[1] == 'ip'
+
+
+@pytest.mark.parametrize('activo, cabecera, esperada', [
+    (False, '', None),
+    (True, '', '192.0.2.9'),
+    (True, 'X-Forwarded-For', '203.0.113.5'),
+])
+def test_ip_del_cliente(monkeypatch, activo, cabecera, esperada):
+    monkeypatch.setattr(limite_ingesta, 'LIMITE_IP', activo)
+    monkeypatch.setattr(limite_ingesta, 'LIMITE_IP_CABECERA', cabecera)
+    with Flask(__name__).test_request_context(
+            '/api/sensores/ambiente', method='POST', environ_base={'REMOTE_ADDR': '192.0.2.9'},
+            headers={'X-Forwarded-For': '203.0.113.5, 10.0.0.2'}):
+        assert limite_ingesta._ip() == esperada
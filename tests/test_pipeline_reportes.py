@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Alternativas del pipeline de reportes del backend archivado"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'archived', 'backend'))
+
+import pipeline_reportes  # noqa: E402
+from pipeline_reportes import DatosReporte, PipelineReportes  # noqa: E402
+
+liberar = threading.Event()
+
+
+@pytest.fixture
+def pipeline():
+    # Hilos en lugar de procesos: el generador de prueba vive en este módulo
+    instancia = PipelineReportes(procesos=2, timeout=0.2)
+    instancia._pool = ThreadPoolExecutor(2)
+    yield instancia
+    liberar.set()
+    instancia.cerrar()
+
+
+def _generadores(monkeypatch, resultados):
+    lanzados = []
+
+    def ejecutar(nombre, datos):
+        lanzados.append(nombre)
+        resultado = resultados[nombre]
+        if resultado == 'colgado':
+            liberar.wait(5)
+            return b'%PDF tarde'
+        if isinstance(resultado, Exception):
+            raise resultado
+        time.sleep(0.05)  # tiempo para que una alternativa lanzada a la vez empiece
+        return resultado
+
+    monkeypatch.setattr(pipeline_reportes, '_ejecutar_generador', ejecutar)
+    return lanzados
+
+
+def test_la_alternativa_no_se_lanza_si_el_preferido_funciona(pipeline, monkeypatch):
+    lanzados = _generadores(monkeypatch, {'avanzado': b'%PDF a', 'mejorado': b'%PDF m'})
+    assert pipeline.renderizar(['avanzado', 'mejorado'], DatosReporte([], [], [])) == ('avanzado', b'%PDF a')
+    assert lanzados == ['avanzado']
+
+
+@pytest.mark.parametrize('preferido', [RuntimeError('sin datos'), None, 'colgado'])
+def test_alternativa_tras_fallo_o_timeout(pipeline, monkeypatch, preferido):
+    liberar.clear()
+    lanzados = _generadores(monkeypatch, {'avanzado': preferido, 'mejorado': b'%PDF m'})
+    assert pipeline.renderizar(['avanzado', 'mejorado'], DatosReporte([], [], [])) == ('mejorado', b'%PDF m')
+    assert lanzados == ['avanzado', 'mejorado']
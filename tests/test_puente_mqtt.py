@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Claves idempotentes de los eventos de humo y seguridad por MQTT"""
+
+from datetime import datetime
+
+import pytest
+
+import almacenamiento
+from idempotencia import insertar_lote
+from puente_mqtt import clave_evento
+
+FECHA = datetime(2024, 5, 1, 8, 0)
+
+
+def test_clave_por_seq_o_ts():
+    assert clave_evento('esp-a', 'humo', {'seq': '7', 'ts': 1}) == 'esp-a:humo:7'
+    assert clave_evento('esp-a', 'seguridad', {'ts': 1714550400}) == 'esp-a:seguridad:t1714550400'
+    assert clave_evento('esp-a', 'humo', {'valor': 420}) is None
+    with pytest.raises(ValueError):
+        clave_evento('esp-a', 'humo', {'seq': 'x'})
+
+
+def test_reenvio_de_evento_no_se_duplica():
+    almacenamiento.crear_esquema()
+    conn = almacenamiento.get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM registros_seguridad")
+        conn.commit()
+        evento = (FECHA, 'Humo', 'Nivel de humo: 420', 'Medio', clave_evento('esp-a', 'humo', {'seq': 7}))
+        sin_clave = (FECHA, 'Movimiento', 'Zona norte', 'Bajo', None)
+        insertar_lote(conn, [], [evento, sin_clave])
+        insertar_lote(conn, [], [evento, sin_clave])  # reenvío QoS 1 del mismo lote
+        with conn.cursor() as cur:
+            cur.execute("SELECT tipo_evento, COUNT(*) AS n FROM registros_seguridad GROUP BY tipo_evento")
+            conteos = {f['tipo_evento']: f['n'] for f in cur.fetchall()}
+    finally:
+        conn.close()
+    assert conteos == {'Humo': 1, 'Movimiento': 2}
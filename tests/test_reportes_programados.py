@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""Programador de reportes del backend archivado"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'archived', 'backend'))
+
+from reportes_programados import PROGRAMACION, CatalogoReportes, ProgramadorReportes  # noqa: E402
+
+
+def test_genera_los_pendientes_al_arrancar(tmp_path):
+    programador = ProgramadorReportes(CatalogoReportes(str(tmp_path)),
+                                      lambda generadores, desde, hasta: (generadores[0], b'%PDF-1.4'))
+    programador.iniciar()
+    try:
+        # El hilo genera antes de esperar a REPORTES_HORA
+        for _ in range(100):
+            if programador.ultima_ejecucion:
+                break
+            programador.detener.wait(0.05)
+    finally:
+        programador.detener.set()
+    assert {m['reporte'] for m in programador.catalogo.listar()} == set(PROGRAMACION)
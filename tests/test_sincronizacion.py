@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""/api/ambiente con compresión por banda muerta (memoria y BD)"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+import almacenamiento
+import memoria_reciente
+import servidor_simple_arduino
+from compresion_lecturas import compresor_lecturas
+from idempotencia import insertar_lectura, ventana_ingesta
+from memoria_reciente import AlmacenAmbiente, almacen_ambiente
+
+INICIO = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+
+
+@pytest.fixture(params=[True, False], ids=['memoria', 'bd'])
+def cliente(request, monkeypatch):
+    almacenamiento.crear_esquema()
+    conn = almacenamiento.get_conn()
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM registros_ambiente")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(memoria_reciente, 'MEMORIA_ACTIVA', request.param)
+    monkeypatch.setattr(compresor_lecturas, 'activo', True)
+    compresor_lecturas.puntos.clear()
+    ventana_ingesta.claves.clear()
+    almacen_ambiente.__init__()
+    return servidor_simple_arduino.app.test_client()
+
+
+def enviar(cliente, dispositivo, seq, temperatura, humedad=60.0, desfase=0):
+    respuesta = cliente.post('/api/sensores/ambiente', json={
+        'device_id': dispositivo, 'seq': seq,
+        'ts': (INICIO + timedelta(seconds=30 * seq + desfase)).timestamp(),
+        'temperatura': temperatura, 'humedad': humedad, 'estado_bomba': 'Apagada', 'alerta': 'Normal',
+    })
+    assert respuesta.status_code == 201
+
+
+def ambiente(cliente, marca=None):
+    respuesta = cliente.get('/api/ambiente' + (f'?since={marca}' if marca is not None else ''))
+    assert respuesta.status_code == 200
+    return respuesta.get_json()
+
+
+def fechas(datos):
+    return {registro['fecha'] for registro in datos['registros']}
+
+
+def test_lecturas_absorbidas_avanzan_la_marca(cliente):
+    for seq in range(5):
+        enviar(cliente, 'esp-a', seq, 24.0)
+    inicial = ambiente(cliente)
+    assert len(inicial['registros']) == 5
+
+    # Dentro de la banda muerta: extienden la fila ya enviada, no insertan
+    enviar(cliente, 'esp-a', 5, 24.1)
+    enviar(cliente, 'esp-a', 6, 24.2)
+    nuevos = ambiente(cliente, inicial['ultimo_id'])
+    assert len(fechas(nuevos) - fechas(inicial)) == 2
+    assert not nuevos['truncado']
+    assert nuevos['ultimo_id'] > inicial['ultimo_id']
+
+    assert ambiente(cliente, nuevos['ultimo_id'])['registros'] == []
+
+
+def test_fila_tardia_y_extension_en_la_misma_espera(cliente):
+    for seq in range(10, 13):
+        enviar(cliente, 'esp-a', seq, 24.0)
+    inicial = ambiente(cliente)
+
+    enviar(cliente, 'esp-b', 1, 30.0)  # tardía: anterior a todo lo enviado
+    enviar(cliente, 'esp-a', 13, 24.0)
+    nuevos = ambiente(cliente, inicial['ultimo_id'])
+    assert 30.0 in {registro['temperatura'] for registro in nuevos['registros']}
+    assert len(fechas(nuevos) - fechas(inicial)) == 2
+    assert ambiente(cliente, nuevos['ultimo_id'])['registros'] == []
+
+
+def test_historial_incluye_filas_comprimidas_que_empezaron_antes(cliente):
+    # esp-a estable: una sola fila desde el principio; esp-b cambia en cada lectura
+    for seq in range(60):
+        enviar(cliente, 'esp-a', seq, 24.0)
+        enviar(cliente, 'esp-b', seq, 20.0 + seq % 2, desfase=15)
+    registros = ambiente(cliente)['registros']
+    assert len(registros) == 50
+    assert sum(registro['temperatura'] == 24.0 for registro in registros) == 25
+
+    # El calentamiento de la memoria elige las filas igual
+    almacen = AlmacenAmbiente(capacidad=50)
+    conn = almacenamiento.get_conn()
+    try:
+        almacen.calentar(conn)
+    finally:
+        conn.close()
+    assert sum(registro['temperatura'] == 24.0 for registro in almacen.ultimos(50)) == 25
+
+
+def test_escrituras_concurrentes_no_repiten_revision(monkeypatch):
+    almacenamiento.crear_esquema()
+    monkeypatch.setattr(compresor_lecturas, 'activo', False)
+    ventana_ingesta.claves.clear()
+    hilos, por_hilo, revisiones = 8, 25, []
+
+    def escribir(n):
+        conn = almacenamiento.get_conn()
+        try:
+            for seq in range(por_hilo):
+                _, revision, _ = insertar_lectura(conn, INICIO, 24.0, 60.0, 'Apagada', 'Normal',
+                                                  f'esp-{n}', f'esp-{n}:{seq}:{INICIO.timestamp()}')
+                revisiones.append(revision)
+        finally:
+            conn.close()
+
+    with ThreadPoolExecutor(hilos) as ejecutor:
+        list(ejecutor.map(escribir, range(hilos)))
+    assert len(set(revisiones)) == hilos * por_hilo
+    assert sorted(revisiones) == list(range(min(revisiones), min(revisiones) + hilos * por_hilo))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔐 TLS Y KEEP-ALIVE DEL SERVIDOR HTTPS
+======================================
+Con servidor_seguro_https.py el ESP32 hacía un handshake TLS completo por
+cada lectura (segundos en la placa, y CPU en el servidor), porque el
+servidor de desarrollo de Werkzeug habla HTTP/1.0 y cierra la conexión
+tras cada respuesta. Aquí se ajusta:
+
+- HTTP/1.1 con conexiones persistentes: la conexión queda abierta hasta
+  KEEPALIVE_INACTIVIDAD segundos sin peticiones (por encima del intervalo
+  de envío de 30 s del firmware), así que el handshake se hace una vez.
+  TCP_NODELAY evita que la respuesta espere al ACK retardado del cliente.
+- Reanudación de sesión: caché de sesiones del servidor (session ID) y
+  session tickets, en TLS 1.2 y 1.3 (TLS_TICKETS por conexión). Una
+  reconexión reanudada se ahorra la firma del certificado.
+- Handshake en el hilo de cada conexión: Werkzeug lo hacía dentro de
+  accept(), de modo que un cliente lento bloqueaba a todos los demás.
+- Certificados ECDSA P-256 (generar_certificado.py): la firma del
+  handshake cuesta una fracción de la de RSA 2048.
+
+`python benchmark_tls.py` compara handshakes/s y latencia por lectura.
+"""
+
+import io
+import os
+import socket
+import ssl
+
+from werkzeug.serving import WSGIRequestHandler
+
+KEEPALIVE_INACTIVIDAD = float(os.environ.get('KEEPALIVE_INACTIVIDAD', '40'))
+TLS_TICKETS = int(os.environ.get('TLS_TICKETS', '2'))
+KEEPALIVE_MAX_CUERPO = 1024 * 1024
+
+contexto_tls = None
+
+
+class ContextoTLS(ssl.SSLContext):
+    """SSLContext que deja el handshake para el hilo que atiende la conexión"""
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        kwargs['do_handshake_on_connect'] = False
+        return super().wrap_socket(sock, *args, **kwargs)
+
+
+class ManejadorKeepAlive(WSGIRequestHandler):
+    """HTTP/1.1 con conexiones persistentes; se cierran tras KEEPALIVE_INACTIVIDAD s
+
+    Werkzeug responde siempre `Connection: close` porque no sabe si la vista
+    leyó todo el cuerpo antes de la siguiente petición. Aquí el cuerpo (con
+    Content-Length, hasta KEEPALIVE_MAX_CUERPO) se lee entero antes de
+    llamar a la aplicación, así que la conexión queda alineada con la
+    siguiente petición y puede mantenerse abierta. Los cuerpos chunked, con
+    Expect: 100-continue o muy grandes siguen cerrando la conexión.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_INACTIVIDAD
+
+    def setup(self):
+        super().setup()
+        # Sin Nagle: la cabecera y el cuerpo de la respuesta salen sin esperar el ACK del cliente
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _admite_keepalive(self):
+        if self.close_connection or 'Transfer-Encoding' in self.headers or 'Expect' in self.headers:
+            return False
+        longitud = self.headers.get('Content-Length', '0')
+        return longitud.isdigit() and int(longitud) <= KEEPALIVE_MAX_CUERPO
+
+    def run_wsgi(self):
+        self.reutilizable = self._admite_keepalive()
+        self.longitud_enviada = False
+        if not self.reutilizable:
+            return super().run_wsgi()
+        conexion = self.rfile
+        self.rfile = io.BytesIO(conexion.read(int(self.headers.get('Content-Length') or 0)))
+        try:
+            super().run_wsgi()
+        finally:
+            self.rfile = conexion
+
+    def send_header(self, clave, valor):
+        if clave.lower() == 'content-length':
+            self.longitud_enviada = True
+        elif clave.lower() == 'connection' and getattr(self, 'reutilizable', False) and self.longitud_enviada:
+            super().send_header('Keep-Alive', f'timeout={int(KEEPALIVE_INACTIVIDAD)}')
+            valor = 'keep-alive'
+        super().send_header(clave, valor)
+
+    def log_error(self, formato, *args):
+        # El cierre por inactividad es lo normal, no un error
+        if formato.startswith('Request timed out'):
+            return
+        super().log_error(formato, *args)
+
+
+def crear_contexto_tls(certificado='server.crt', llave='server.key'):
+    """Contexto TLS del servidor con reanudación de sesión"""
+    global contexto_tls
+    contexto = ContextoTLS(ssl.PROTOCOL_TLS_SERVER)
+    contexto.minimum_version = ssl.TLSVersion.TLSv1_2
+    contexto.options &= ~ssl.OP_NO_TICKET  # tickets también en TLS 1.2
+    contexto.num_tickets = TLS_TICKETS
+    contexto.load_cert_chain(certificado, llave)
+    contexto_tls = contexto
+    return contexto
+
+
+def estadisticas():
+    """Handshakes completos y reanudados desde el arranque (None sin HTTPS)"""
+    if contexto_tls is None:
+        return None
+    sesiones = contexto_tls.session_stats()
+    return {
+        'handshakes': sesiones['accept_good'],
+        'reanudadas': sesiones['hits'],
+        'sesiones_en_cache': sesiones['number'],
+        'keepalive_s': KEEPALIVE_INACTIVIDAD,
+    }